@@ -71,7 +71,6 @@ class EMACallback(Callback):
         self.len_updates = len_updates
 
     def on_fit_start(self, trainer, pl_module):
-        # Todo (@lizeming@megvii.com): delete manually specified device
         from torch.nn.modules.batchnorm import SyncBatchNorm
 
         bn_model_list = list()
@@ -81,8 +80,9 @@ class EMACallback(Callback):
                 bn_model_list.append(model_ref)
                 bn_model_dist_group_list.append(model_ref.process_group)
                 model_ref.process_group = None
-        trainer.ema_model = ModelEMA(trainer.model.module.module.model.cuda(),
-                                     0.9990)
+        # `pl_module.model` is the model wrapped by DDP, if any, and is
+        # already on the device of this rank.
+        trainer.ema_model = ModelEMA(pl_module.model, 0.9990)
 
         for bn_model, dist_group in zip(bn_model_list,
                                         bn_model_dist_group_list):
@@ -96,7 +96,7 @@ class EMACallback(Callback):
                            batch,
                            batch_idx,
                            unused=0):
-        trainer.ema_model.update(trainer, trainer.model.module.module.model)
+        trainer.ema_model.update(trainer, pl_module.model)
 
     def on_train_epoch_end(self, trainer, pl_module) -> None:
         state_dict = trainer.ema_model.ema.state_dict()
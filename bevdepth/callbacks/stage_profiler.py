@@ -0,0 +1,86 @@
+# Copyright (c) Megvii Inc. All rights reserved.
+import json
+import os
+
+from pytorch_lightning.callbacks import Callback
+
+from bevdepth.utils.profiler import disable_profiler, enable_profiler
+from bevdepth.utils.torch_dist import get_rank
+
+__all__ = ['StageProfilerCallback']
+
+
+class StageProfilerCallback(Callback):
+    """Record per-stage timings during fit / test / predict.
+
+    The summary and the chrome trace of every rank are written to
+    `trainer.log_dir` when the run ends.
+
+    Args:
+        timer (str): Timer of `StageProfiler`. Default: None.
+        record_memory (bool): Whether to record peak CUDA memory.
+            Default: True.
+    """
+
+    def __init__(self, timer=None, record_memory=True) -> None:
+        super().__init__()
+        self.timer = timer
+        self.record_memory = record_memory
+        self.profiler = None
+
+    def _start(self):
+        self.profiler = enable_profiler(timer=self.timer,
+                                        record_memory=self.record_memory)
+
+    def _flush(self):
+        if self.profiler is not None:
+            self.profiler.flush()
+
+    def _end(self, trainer, stage):
+        profiler = disable_profiler()
+        if profiler is None:
+            return
+        rank = get_rank()
+        output_dir = trainer.log_dir or trainer.default_root_dir
+        os.makedirs(output_dir, exist_ok=True)
+        with open(
+                os.path.join(output_dir,
+                             f'stage_profile_{stage}_rank{rank}.json'),
+                'w') as f:
+            json.dump(profiler.summary(), f, indent=2)
+        profiler.export_chrome_trace(
+            os.path.join(output_dir, f'stage_trace_{stage}_rank{rank}.json'),
+            pid=rank)
+        if rank == 0:
+            print(profiler.format_summary())
+        self.profiler = None
+
+    def on_fit_start(self, trainer, pl_module):
+        self._start()
+
+    def on_test_start(self, trainer, pl_module):
+        self._start()
+
+    def on_predict_start(self, trainer, pl_module):
+        self._start()
+
+    def on_train_batch_end(self, trainer, pl_module, *args, **kwargs):
+        self._flush()
+
+    def on_validation_batch_end(self, trainer, pl_module, *args, **kwargs):
+        self._flush()
+
+    def on_test_batch_end(self, trainer, pl_module, *args, **kwargs):
+        self._flush()
+
+    def on_predict_batch_end(self, trainer, pl_module, *args, **kwargs):
+        self._flush()
+
+    def on_fit_end(self, trainer, pl_module):
+        self._end(trainer, 'fit')
+
+    def on_test_end(self, trainer, pl_module):
+        self._end(trainer, 'test')
+
+    def on_predict_end(self, trainer, pl_module):
+        self._end(trainer, 'predict')
@@ -0,0 +1,153 @@
+"""LRU cache of decoded images and lidar points.
+
+With previous key frames or sweeps, the key frame of a sample is decoded
+again as a previous frame of the next samples. `FrameCache` keeps decoded,
+un-augmented frames keyed by file name. Every dataloader worker has its own
+copy of the dataset, so every worker gets its own cache. The hit and miss
+counts of all the workers are also summed in shared memory, see
+`FrameCache.total_stats`.
+"""
+import multiprocessing
+import os
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+__all__ = ['FrameCache']
+
+
+class _LRU:
+    """LRU dict bounded by the total size in bytes of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Hits and misses of this cache and of its copies in the workers.
+        self.totals = multiprocessing.Array('q', 2) if max_bytes > 0 \
+            else None
+
+    def _count(self, hit):
+        if self.totals is not None:
+            with self.totals.get_lock():
+                self.totals[0 if hit else 1] += 1
+
+    def get(self, key, load, size_of):
+        if key in self.items:
+            self.hits += 1
+            self._count(True)
+            self.items.move_to_end(key)
+            return self.items[key]
+        self.misses += 1
+        self._count(False)
+        value = load(key)
+        size = size_of(value)
+        if size <= self.max_bytes:
+            self.items[key] = value
+            self.num_bytes += size
+            while self.num_bytes > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.num_bytes -= size_of(evicted)
+        return value
+
+    def stats(self):
+        num_lookups = self.hits + self.misses
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    hit_rate=self.hits / max(num_lookups, 1),
+                    num_items=len(self.items),
+                    num_bytes=self.num_bytes)
+
+    def total_stats(self):
+        hits, misses = self.totals[:]
+        return dict(hits=hits,
+                    misses=misses,
+                    hit_rate=hits / max(hits + misses, 1))
+
+    def reset_totals(self):
+        with self.totals.get_lock():
+            self.totals[:] = [0, 0]
+
+
+def _load_image(path):
+    img = Image.open(path)
+    # Decode now, `Image.open` is lazy.
+    img.load()
+    return img
+
+
+def _image_bytes(img):
+    return img.width * img.height * len(img.getbands())
+
+
+def _load_lidar(path):
+    return np.fromfile(path, dtype=np.float32,
+                       count=-1).reshape(-1, 5)[..., :4]
+
+
+def _lidar_bytes(points):
+    return points.base.nbytes if points.base is not None else points.nbytes
+
+
+class FrameCache:
+    """Bounded LRU cache of decoded images and lidar points.
+
+    Args:
+        data_root (str): Root that file names are relative to.
+        max_image_bytes (int): Max decoded bytes of cached images, 0 to
+            disable image caching. Default: 0.
+        max_lidar_bytes (int): Max bytes of cached lidar points, 0 to
+            disable lidar caching. Default: 0.
+    """
+
+    def __init__(self, data_root, max_image_bytes=0, max_lidar_bytes=0):
+        self.data_root = data_root
+        self.images = _LRU(max_image_bytes)
+        self.lidars = _LRU(max_lidar_bytes)
+
+    def get_image(self, filename):
+        """Get the decoded image of `filename`.
+
+        Cached images are shared, they must not be modified in place.
+        """
+        return self.images.get(os.path.join(self.data_root, filename),
+                               _load_image, _image_bytes)
+
+    def get_lidar(self, filename):
+        """Get x, y, z and intensity of the points of `filename`.
+
+        Returns:
+            np.ndarray: Points with shape (N, 4), which the caller is free
+                to modify. Only the points held by the cache are copied.
+        """
+        path = os.path.join(self.data_root, filename)
+        points = self.lidars.get(path, _load_lidar, _lidar_bytes)
+        if self.lidars.items.get(path) is points:
+            points = points.copy()
+        return points
+
+    def stats(self):
+        """Hit rate and size of the image and lidar caches of this worker."""
+        return dict(pid=os.getpid(),
+                    image=self.images.stats(),
+                    lidar=self.lidars.stats())
+
+    def total_stats(self):
+        """Hits, misses and hit rate of the enabled caches of all workers.
+
+        The counts are shared with the copies of the cache in the dataloader
+        workers, since the last `reset_total_stats`.
+        """
+        return {
+            name: cache.total_stats()
+            for name, cache in [('image', self.images), ('lidar', self.lidars)]
+            if cache.totals is not None
+        }
+
+    def reset_total_stats(self):
+        for cache in [self.images, self.lidars]:
+            if cache.totals is not None:
+                cache.reset_totals()
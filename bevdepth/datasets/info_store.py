@@ -0,0 +1,451 @@
+"""Columnar, memory-mapped storage of nuScenes infos.
+
+`nuscenes_infos_*.pkl` holds a list of nested dicts. Every dataloader worker
+touches these python objects, so the copy-on-write pages of the pickle are
+copied into every worker by refcount updates. `NuscInfoStore` keeps the same
+information as flat numpy arrays in a directory of `.npy` files which are
+memory-mapped, so all workers share one copy through the page cache.
+
+Only the fields used by BEVDepth are kept. Sensor records (camera and lidar
+frames, either key frames or sweeps) live in one table and are referenced by
+index from the samples. Ragged fields (sweeps and annotations) use offset
+arrays.
+"""
+import bisect
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+__all__ = ['convert_infos', 'NuscInfoStore', 'load_infos']
+
+STORE_SUFFIX = '.infostore'
+META_FILE = 'meta.json'
+ARRAY_NAMES = [
+    'filenames', 'rec_filename', 'rec_timestamp', 'rec_ego_rotation',
+    'rec_ego_translation', 'rec_calib_rotation', 'rec_calib_translation',
+    'rec_intrinsic', 'sample_tokens', 'scene_tokens', 'sample_scene',
+    'sample_timestamp', 'cam_records', 'lidar_records', 'cam_sweep_offsets',
+    'cam_sweep_records', 'lidar_sweep_offsets', 'lidar_sweep_records',
+    'ann_offsets', 'ann_category', 'ann_translation', 'ann_size',
+    'ann_rotation', 'ann_velocity', 'ann_num_lidar_pts', 'ann_num_radar_pts'
+]
+
+
+class _RecordTable:
+    """Accumulate sensor records while converting."""
+
+    def __init__(self):
+        self.filename_ids = dict()
+        self.columns = {
+            name: list()
+            for name in [
+                'rec_filename', 'rec_timestamp', 'rec_ego_rotation',
+                'rec_ego_translation', 'rec_calib_rotation',
+                'rec_calib_translation', 'rec_intrinsic'
+            ]
+        }
+
+    def add(self, record):
+        if record is None:
+            return -1
+        filename_id = self.filename_ids.setdefault(record['filename'],
+                                                   len(self.filename_ids))
+        calib = record['calibrated_sensor']
+        self.columns['rec_filename'].append(filename_id)
+        self.columns['rec_timestamp'].append(record['timestamp'])
+        self.columns['rec_ego_rotation'].append(record['ego_pose']['rotation'])
+        self.columns['rec_ego_translation'].append(
+            record['ego_pose']['translation'])
+        self.columns['rec_calib_rotation'].append(calib['rotation'])
+        self.columns['rec_calib_translation'].append(calib['translation'])
+        intrinsic = calib.get('camera_intrinsic', None)
+        self.columns['rec_intrinsic'].append(
+            np.zeros((3, 3)) if intrinsic is None or len(intrinsic) ==
+            0 else intrinsic)
+        return len(self.columns['rec_filename']) - 1
+
+
+def convert_infos(infos, out_dir):
+    """Convert infos generated by `scripts/gen_info.py` to a store.
+
+    Args:
+        infos (list[dict]): Infos loaded from the pkl file.
+        out_dir (str): Directory of the store.
+    """
+    cam_names = list(infos[0]['cam_infos'].keys())
+    lidar_names = list(infos[0]['lidar_infos'].keys())
+    records = _RecordTable()
+    scene_ids = dict()
+    category_ids = dict()
+    arrays = {
+        name: list()
+        for name in [
+            'sample_tokens', 'sample_scene', 'sample_timestamp',
+            'cam_records', 'lidar_records', 'cam_sweep_records',
+            'lidar_sweep_records', 'ann_category', 'ann_translation',
+            'ann_size', 'ann_rotation', 'ann_velocity', 'ann_num_lidar_pts',
+            'ann_num_radar_pts'
+        ]
+    }
+    cam_sweep_offsets = [0]
+    lidar_sweep_offsets = [0]
+    ann_offsets = [0]
+    for info in infos:
+        arrays['sample_tokens'].append(info['sample_token'])
+        arrays['sample_scene'].append(
+            scene_ids.setdefault(info['scene_token'], len(scene_ids)))
+        arrays['sample_timestamp'].append(info.get('timestamp', 0))
+        arrays['cam_records'].append(
+            [records.add(info['cam_infos'][cam]) for cam in cam_names])
+        arrays['lidar_records'].append(
+            [records.add(info['lidar_infos'][name]) for name in lidar_names])
+        for cam_sweep in info['cam_sweeps']:
+            arrays['cam_sweep_records'].append(
+                [records.add(cam_sweep.get(cam, None)) for cam in cam_names])
+        cam_sweep_offsets.append(cam_sweep_offsets[-1] +
+                                 len(info['cam_sweeps']))
+        for lidar_sweep in info['lidar_sweeps']:
+            arrays['lidar_sweep_records'].append([
+                records.add(lidar_sweep.get(name, None))
+                for name in lidar_names
+            ])
+        lidar_sweep_offsets.append(lidar_sweep_offsets[-1] +
+                                   len(info['lidar_sweeps']))
+        ann_infos = info.get('ann_infos', list())
+        for ann_info in ann_infos:
+            arrays['ann_category'].append(
+                category_ids.setdefault(ann_info['category_name'],
+                                        len(category_ids)))
+            arrays['ann_translation'].append(ann_info['translation'])
+            arrays['ann_size'].append(ann_info['size'])
+            arrays['ann_rotation'].append(ann_info['rotation'])
+            arrays['ann_velocity'].append(
+                np.asarray(ann_info['velocity'], np.float64)[:3])
+            arrays['ann_num_lidar_pts'].append(ann_info['num_lidar_pts'])
+            arrays['ann_num_radar_pts'].append(ann_info['num_radar_pts'])
+        ann_offsets.append(ann_offsets[-1] + len(ann_infos))
+
+    dtypes = dict(sample_scene=np.int32,
+                  sample_timestamp=np.int64,
+                  cam_records=np.int32,
+                  lidar_records=np.int32,
+                  cam_sweep_records=np.int32,
+                  lidar_sweep_records=np.int32,
+                  ann_category=np.int16,
+                  ann_translation=np.float64,
+                  ann_size=np.float64,
+                  ann_rotation=np.float64,
+                  ann_velocity=np.float64,
+                  ann_num_lidar_pts=np.int32,
+                  ann_num_radar_pts=np.int32,
+                  rec_filename=np.int32,
+                  rec_timestamp=np.int64,
+                  rec_ego_rotation=np.float64,
+                  rec_ego_translation=np.float64,
+                  rec_calib_rotation=np.float64,
+                  rec_calib_translation=np.float64,
+                  rec_intrinsic=np.float64)
+    shapes = dict(cam_sweep_records=(-1, len(cam_names)),
+                  lidar_sweep_records=(-1, len(lidar_names)),
+                  ann_translation=(-1, 3),
+                  ann_size=(-1, 3),
+                  ann_rotation=(-1, 4),
+                  ann_velocity=(-1, 3))
+    arrays.update(records.columns)
+    for name in list(arrays.keys()):
+        if name == 'sample_tokens':
+            arrays[name] = np.array(arrays[name], dtype=np.bytes_)
+            continue
+        arrays[name] = np.array(arrays[name], dtype=dtypes[name])
+        if name in shapes:
+            arrays[name] = arrays[name].reshape(shapes[name])
+    arrays['scene_tokens'] = np.array(list(scene_ids.keys()), dtype=np.bytes_)
+    arrays['filenames'] = np.array(list(records.filename_ids.keys()),
+                                   dtype=np.bytes_)
+    arrays['cam_sweep_offsets'] = np.array(cam_sweep_offsets, np.int64)
+    arrays['lidar_sweep_offsets'] = np.array(lidar_sweep_offsets, np.int64)
+    arrays['ann_offsets'] = np.array(ann_offsets, np.int64)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(out_dir, f'{name}.npy'), arrays[name])
+    with open(os.path.join(out_dir, META_FILE), 'w') as f:
+        json.dump(
+            dict(cam_names=cam_names,
+                 lidar_names=lidar_names,
+                 categories=list(category_ids.keys()),
+                 num_samples=len(infos)), f)
+
+
+class _InfoView(Mapping):
+    """Read-only dict-like view of one sample, with the same keys as an info
+    in the pkl file. Fields are built on first access and cached."""
+
+    _keys = ('sample_token', 'scene_token', 'timestamp', 'cam_infos',
+             'lidar_infos', 'cam_sweeps', 'lidar_sweeps', 'ann_infos')
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._idx = idx
+        self._fields = dict()
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        if key not in self._fields:
+            self._fields[key] = getattr(self._store, f'get_{key}')(self._idx)
+        return self._fields[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class NuscInfoStore:
+    """Memory-mapped infos produced by `convert_infos`.
+
+    Indexing returns a dict-like view with the same keys as the pkl infos,
+    so it is a drop-in replacement of the info list. Arrays are opened
+    lazily in every process and are not pickled.
+
+    Args:
+        store_dir (str): Directory of the store.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            meta = json.load(f)
+        self.cam_names = meta['cam_names']
+        self.lidar_names = meta['lidar_names']
+        self.categories = meta['categories']
+        self.num_samples = meta['num_samples']
+        self._arrays = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    @property
+    def arrays(self):
+        if self._arrays is None:
+            # Plain ndarray views of the memory maps, indexing `np.memmap`
+            # is several times slower.
+            self._arrays = {
+                name: np.load(os.path.join(self.store_dir, f'{name}.npy'),
+                              mmap_mode='r').view(np.ndarray)
+                for name in ARRAY_NAMES
+            }
+        return self._arrays
+
+    def __len__(self):
+        return self.num_samples
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.num_samples
+        if not 0 <= idx < self.num_samples:
+            raise IndexError(idx)
+        return _InfoView(self, idx)
+
+    def __iter__(self):
+        for idx in range(self.num_samples):
+            yield _InfoView(self, idx)
+
+    def _get_records(self, record_ids, names):
+        """Build the record dicts of several frames at once.
+
+        Args:
+            record_ids (np.ndarray): Record indexes with shape
+                (num_frames, len(names)), -1 for missing sensors.
+            names (list[str]): Sensor names.
+
+        Returns:
+            list[dict]: One dict of sensor name to record per frame.
+        """
+        arrays = self.arrays
+        record_ids = np.asarray(record_ids)
+        valid_ids = record_ids[record_ids >= 0]
+        # Gather every column once instead of indexing per record.
+        filenames = arrays['filenames'][arrays['rec_filename'][valid_ids]]
+        columns = zip(
+            filenames.tolist(), arrays['rec_timestamp'][valid_ids].tolist(),
+            arrays['rec_ego_rotation'][valid_ids].tolist(),
+            arrays['rec_ego_translation'][valid_ids].tolist(),
+            arrays['rec_calib_rotation'][valid_ids].tolist(),
+            arrays['rec_calib_translation'][valid_ids].tolist(),
+            arrays['rec_intrinsic'][valid_ids].tolist())
+        records = [
+            dict(filename=filename.decode(),
+                 timestamp=timestamp,
+                 ego_pose=dict(rotation=ego_rotation,
+                               translation=ego_translation),
+                 calibrated_sensor=dict(rotation=calib_rotation,
+                                        translation=calib_translation,
+                                        camera_intrinsic=intrinsic))
+            for (filename, timestamp, ego_rotation, ego_translation,
+                 calib_rotation, calib_translation, intrinsic) in columns
+        ]
+        records = iter(records)
+        return [{
+            name: next(records)
+            for name, record_idx in zip(names, frame_ids) if record_idx >= 0
+        } for frame_ids in record_ids.tolist()]
+
+    def get_scene_index(self, idx):
+        """Integer id of the scene, cheaper than comparing scene tokens."""
+        return int(self.arrays['sample_scene'][idx])
+
+    def get_sample_token(self, idx):
+        return self.arrays['sample_tokens'][idx].decode()
+
+    def get_scene_token(self, idx):
+        return self.arrays['scene_tokens'][self.get_scene_index(idx)].decode()
+
+    def get_timestamp(self, idx):
+        return int(self.arrays['sample_timestamp'][idx])
+
+    def get_cam_infos(self, idx):
+        return self._get_records(self.arrays['cam_records'][idx:idx + 1],
+                                 self.cam_names)[0]
+
+    def get_lidar_infos(self, idx):
+        return self._get_records(self.arrays['lidar_records'][idx:idx + 1],
+                                 self.lidar_names)[0]
+
+    def get_cam_sweeps(self, idx):
+        start, end = self.arrays['cam_sweep_offsets'][idx:idx + 2]
+        return self._get_records(self.arrays['cam_sweep_records'][start:end],
+                                 self.cam_names)
+
+    def get_lidar_sweeps(self, idx):
+        start, end = self.arrays['lidar_sweep_offsets'][idx:idx + 2]
+        return self._get_records(
+            self.arrays['lidar_sweep_records'][start:end], self.lidar_names)
+
+    def get_ann_arrays(self, idx):
+        """Annotations of a sample as arrays.
+
+        Returns:
+            dict[str, np.ndarray]: `category` (ids into `categories`),
+                `translation`, `size`, `rotation`, `velocity`,
+                `num_lidar_pts` and `num_radar_pts`.
+        """
+        arrays = self.arrays
+        start, end = arrays['ann_offsets'][idx:idx + 2]
+        return {
+            name: np.asarray(arrays[f'ann_{name}'][start:end])
+            for name in [
+                'category', 'translation', 'size', 'rotation', 'velocity',
+                'num_lidar_pts', 'num_radar_pts'
+            ]
+        }
+
+    def get_ann_categories(self):
+        """Categories of all annotations of the store.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, list[str]]: Sample index and
+                category id of every annotation, and the category names.
+        """
+        arrays = self.arrays
+        sample_idxes = np.repeat(np.arange(self.num_samples),
+                                 np.diff(arrays['ann_offsets']))
+        return sample_idxes, arrays['ann_category'].astype(
+            np.int64), list(self.categories)
+
+    def get_ann_infos(self, idx):
+        anns = self.get_ann_arrays(idx)
+        columns = zip(anns['category'].tolist(),
+                      anns['translation'].tolist(), anns['size'].tolist(),
+                      anns['rotation'].tolist(), anns['velocity'],
+                      anns['num_lidar_pts'].tolist(),
+                      anns['num_radar_pts'].tolist())
+        return [
+            dict(category_name=self.categories[category],
+                 translation=translation,
+                 size=size,
+                 rotation=rotation,
+                 velocity=velocity,
+                 num_lidar_pts=num_lidar_pts,
+                 num_radar_pts=num_radar_pts)
+            for (category, translation, size, rotation, velocity,
+                 num_lidar_pts, num_radar_pts) in columns
+        ]
+
+
+class _ConcatInfos:
+    """Concatenation of several info stores."""
+
+    def __init__(self, stores):
+        self.stores = stores
+        self.cumulative_sizes = np.cumsum([len(store)
+                                           for store in stores]).tolist()
+
+    def __len__(self):
+        return self.cumulative_sizes[-1]
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        store_idx = bisect.bisect_right(self.cumulative_sizes, idx)
+        if store_idx > 0:
+            idx -= self.cumulative_sizes[store_idx - 1]
+        return self.stores[store_idx][idx]
+
+    def __iter__(self):
+        for store in self.stores:
+            yield from store
+
+    def get_ann_categories(self):
+        all_sample_idxes = list()
+        all_category_ids = list()
+        categories = list()
+        for store_idx, store in enumerate(self.stores):
+            sample_idxes, category_ids, store_categories = \
+                store.get_ann_categories()
+            for category in store_categories:
+                if category not in categories:
+                    categories.append(category)
+            # Map the category ids of the store to the merged names.
+            id_map = np.array(
+                [categories.index(category) for category in store_categories],
+                dtype=np.int64)
+            offset = self.cumulative_sizes[store_idx - 1] if store_idx else 0
+            all_sample_idxes.append(sample_idxes + offset)
+            all_category_ids.append(id_map[category_ids] if len(id_map) else
+                                    category_ids)
+        return np.concatenate(all_sample_idxes), np.concatenate(
+            all_category_ids), categories
+
+
+def _load_info(info_path):
+    if os.path.isdir(info_path):
+        return NuscInfoStore(info_path)
+    import mmcv
+    return mmcv.load(info_path)
+
+
+def load_infos(info_paths):
+    """Load infos from pkl files or store directories.
+
+    Args:
+        info_paths (str | list[str]): Paths of pkl files or directories
+            created by `convert_infos`.
+
+    Returns:
+        list[dict] | NuscInfoStore: Indexable infos.
+    """
+    if not isinstance(info_paths, list):
+        return _load_info(info_paths)
+    infos = [_load_info(info_path) for info_path in info_paths]
+    if all(isinstance(info, list) for info in infos):
+        return sum(infos, list())
+    assert all(isinstance(info, NuscInfoStore) for info in infos), \
+        'Can not mix pkl files and info stores.'
+    return _ConcatInfos(infos)
@@ -6,8 +6,6 @@ main task
 2、计算各类矩阵   时序坐标系变换矩阵、图像变换矩阵、深度变换矩阵、各传感器坐标系变换矩阵
 '''
 
-import os
-
 import mmcv
 import numpy as np
 import torch
@@ -18,6 +16,12 @@ from PIL import Image
 from pyquaternion import Quaternion
 from torch.utils.data import Dataset
 
+from bevdepth.datasets.frame_cache import FrameCache
+from bevdepth.datasets.info_store import load_infos
+from bevdepth.datasets.temporal_index import (KEY_FRAME, MISSING,
+                                              load_temporal_index,
+                                              resolve_frames)
+
 __all__ = ['NuscDetDataset']
 
 map_name_from_general_to_detection = {
@@ -249,14 +253,18 @@ class NuscDetDataset(Dataset):
                  return_depth=False,
                  sweep_idxes=list(),
                  key_idxes=list(),
-                 use_fusion=False):
+                 use_fusion=False,
+                 img_cache_bytes=0,
+                 lidar_cache_bytes=0):
         """Dataset used for bevdetection task.
         Args:
             ida_aug_conf (dict): Config for ida augmentation.图像增强参数
             bda_aug_conf (dict): Config for bda augmentation.点云增强参数
             classes (list): Class names.
-            use_cbgs (bool): Whether to use cbgs strategy,
-                Default: False.
+            info_paths (str | list[str]): Info pkl files or info store
+                directories converted by `scripts/convert_infos.py`.
+            use_cbgs (bool): Whether to use cbgs strategy, samples are
+                drawn by `CBGSSampler`. Default: False.
             num_sweeps (int): Number of sweeps to be used for each sample.
                 default: 1.
             img_conf (dict): Config for image.
@@ -268,24 +276,21 @@ class NuscDetDataset(Dataset):
                 default: list().
             use_fusion (bool): Whether to use lidar data.
                 default: False.
+            img_cache_bytes (int): Max bytes of decoded images cached by
+                every worker, see `FrameCache`. default: 0.
+            lidar_cache_bytes (int): Max bytes of lidar points cached by
+                every worker. default: 0.
         """
         super().__init__()
         # data_info_paths,  nuscenes_dbinfos_10sweeps_withvelo.pkl
-        if isinstance(info_paths, list):
-            self.infos = list()
-            for info_path in info_paths:
-                self.infos.extend(mmcv.load(info_path))
-        else:
-            self.infos = mmcv.load(info_paths)
+        self.infos = load_infos(info_paths)
         self.is_train = is_train
         self.ida_aug_conf = ida_aug_conf
         self.bda_aug_conf = bda_aug_conf
         self.data_root = data_root
         self.classes = classes
         self.use_cbgs = use_cbgs
-        if self.use_cbgs:
-            self.cat2id = {name: i for i, name in enumerate(self.classes)}
-            self.sample_indices = self._get_sample_indices()
+        self.cat2id = {name: i for i, name in enumerate(self.classes)}
         self.num_sweeps = num_sweeps
         self.img_mean = np.array(img_conf['img_mean'], np.float32)
         self.img_std = np.array(img_conf['img_std'], np.float32)
@@ -300,17 +305,38 @@ class NuscDetDataset(Dataset):
             'All `key_idxes` must less than 0.'
         self.key_idxes = [0] + key_idxes
         self.use_fusion = use_fusion
+        self.frame_cache = FrameCache(data_root, img_cache_bytes,
+                                      lidar_cache_bytes)
+        # Frames of all samples, resolved with all cameras.
+        self.temporal_index = load_temporal_index(info_paths, self.infos,
+                                                  self.key_idxes,
+                                                  self.sweeps_idx,
+                                                  self.ida_aug_conf['cams'])
 
-    def _get_sample_indices(self):
-        """Load annotations from ann_file.
-
-        Args:
-            ann_file (str): Path of the annotation file.
+    def get_class_sample_indices(self):
+        """Get the samples that contain every class, used by CBGS.
 
         Returns:
-            list[dict]: List of annotations after class sampling.
+            list[np.ndarray]: Sorted indices of the samples that contain
+                objects of every class of `classes`.
         """
-        class_sample_idxs = {cat_id: [] for cat_id in self.cat2id.values()}
+        if hasattr(self.infos, 'get_ann_categories'):
+            # Info stores have annotation categories as arrays.
+            sample_idxes, category_ids, categories = \
+                self.infos.get_ann_categories()
+            cls_names = [
+                map_name_from_general_to_detection[category]
+                for category in categories
+            ]
+            category2cls = np.array(
+                [self.cat2id.get(cls_name, -1) for cls_name in cls_names],
+                dtype=np.int64)
+            cls_ids = category2cls[category_ids]
+            return [
+                np.unique(sample_idxes[cls_ids == cls_id])
+                for cls_id in range(len(self.classes))
+            ]
+        class_sample_idxs = [list() for _ in self.classes]
         for idx, info in enumerate(self.infos):
             gt_names = set(
                 [ann_info['category_name'] for ann_info in info['ann_infos']])
@@ -319,22 +345,7 @@ class NuscDetDataset(Dataset):
                 if gt_name not in self.classes:
                     continue
                 class_sample_idxs[self.cat2id[gt_name]].append(idx)
-        duplicated_samples = sum(
-            [len(v) for _, v in class_sample_idxs.items()])
-        class_distribution = {
-            k: len(v) / duplicated_samples
-            for k, v in class_sample_idxs.items()
-        }
-
-        sample_indices = []
-
-        frac = 1.0 / len(self.classes)
-        ratios = [frac / v for v in class_distribution.values()]
-        for cls_inds, ratio in zip(list(class_sample_idxs.values()), ratios):
-            sample_indices += np.random.choice(cls_inds,
-                                               int(len(cls_inds) *
-                                                   ratio)).tolist()
-        return sample_indices
+        return [np.array(idxs, dtype=np.int64) for idxs in class_sample_idxs]
 
     def sample_ida_augmentation(self):  # 生成具体增强参数
         """Generate ida augmentation values based on ida_config."""
@@ -422,10 +433,7 @@ class NuscDetDataset(Dataset):
             sweep_lidar_points = list()
             for lidar_info in lidar_infos:
                 lidar_path = lidar_info['LIDAR_TOP']['filename']
-                lidar_points = np.fromfile(os.path.join(
-                    self.data_root, lidar_path),
-                    dtype=np.float32,
-                    count=-1).reshape(-1, 5)[..., :4]
+                lidar_points = self.frame_cache.get_lidar(lidar_path)
                 sweep_lidar_points.append(lidar_points)
         # 根据info获取图像
         for cam in cams:
@@ -443,8 +451,7 @@ class NuscDetDataset(Dataset):
             # 或者说BEV Transform是一种统一增强方式
             for sweep_idx, cam_info in enumerate(cam_infos):
 
-                img = Image.open(
-                    os.path.join(self.data_root, cam_info[cam]['filename']))
+                img = self.frame_cache.get_image(cam_info[cam]['filename'])
                 # img = Image.fromarray(img)
                 w, x, y, z = cam_info[cam]['calibrated_sensor']['rotation']
                 # sweep sensor to sweep ego 当前 传感器 到 自车
@@ -626,50 +633,39 @@ class NuscDetDataset(Dataset):
             cams = self.ida_aug_conf['cams']
         return cams
 
+    def get_frames(self, idx, cams):
+        """Get the key frames and sweeps of a sample.
+
+        Args:
+            idx (int): Index of the sample.
+            cams (list): Camera names.
+
+        Returns:
+            list[tuple[int]]: `(sample_idx, cam_sweep_idx, lidar_sweep_idx)`
+                of every frame.
+        """
+        if list(cams) == list(self.ida_aug_conf['cams']):
+            return self.temporal_index[idx].tolist()
+        # Sweeps missing unused cameras are valid for a subset of cameras.
+        return resolve_frames(self.infos, idx, self.key_idxes, self.sweeps_idx,
+                              cams)
+
     def __getitem__(self, idx):  # 从预先生成好的info里面搭载数据，idx是info的索引
-        if self.use_cbgs:
-            idx = self.sample_indices[idx]
         cam_infos = list()
         lidar_infos = list()
         # TODO: Check if it still works when number of cameras is reduced.
         cams = self.choose_cams()
-        for key_idx in self.key_idxes:  # 多帧序列聚合
-            cur_idx = key_idx + idx
-            # Handle scenarios when current idx doesn't have previous key
-            # frame or previous key frame is from another scene.
-            if cur_idx < 0:
-                cur_idx = idx
-            elif self.infos[cur_idx]['scene_token'] != self.infos[idx][
-                    'scene_token']:
-                cur_idx = idx
-            info = self.infos[cur_idx]
-            cam_infos.append(info['cam_infos'])
-            lidar_infos.append(info['lidar_infos'])
-            lidar_sweep_timestamps = [
-                lidar_sweep['LIDAR_TOP']['timestamp']
-                for lidar_sweep in info['lidar_sweeps']
-            ]  # 拼接多帧info
-            for sweep_idx in self.sweeps_idx:  # sweep 未标注数据
-                if len(info['cam_sweeps']) == 0:
-                    cam_infos.append(info['cam_infos'])
-                    lidar_infos.append(info['lidar_infos'])
-                else:
-                    # Handle scenarios when current sweep doesn't have all
-                    # cam keys.
-                    for i in range(min(len(info['cam_sweeps']) - 1, sweep_idx),
-                                   -1, -1):
-                        if sum([cam in info['cam_sweeps'][i]
-                                for cam in cams]) == len(cams):
-                            cam_infos.append(info['cam_sweeps'][i])
-                            cam_timestamp = np.mean([
-                                val['timestamp']
-                                for val in info['cam_sweeps'][i].values()
-                            ])
-                            # Find the closest lidar frame to the cam frame.
-                            lidar_idx = np.abs(lidar_sweep_timestamps -
-                                               cam_timestamp).argmin()
-                            lidar_infos.append(info['lidar_sweeps'][lidar_idx])
-                            break
+        for sample_idx, cam_sweep_idx, lidar_sweep_idx in self.get_frames(
+                idx, cams):  # 多帧序列聚合
+            info = self.infos[sample_idx]
+            if cam_sweep_idx == MISSING:
+                continue
+            elif cam_sweep_idx == KEY_FRAME:
+                cam_infos.append(info['cam_infos'])
+                lidar_infos.append(info['lidar_infos'])
+            else:  # sweep 未标注数据
+                cam_infos.append(info['cam_sweeps'][cam_sweep_idx])
+                lidar_infos.append(info['lidar_sweeps'][lidar_sweep_idx])
         if self.return_depth or self.use_fusion:
             image_data_list = self.get_image(
                 cam_infos, cams, lidar_infos)  # 根据info获取具体数据,包括数据和矩阵
@@ -723,10 +719,7 @@ class NuscDetDataset(Dataset):
                     Augmentation Conf: {self.ida_aug_conf}"""
 
     def __len__(self):
-        if self.use_cbgs:
-            return len(self.sample_indices)
-        else:
-            return len(self.infos)
+        return len(self.infos)
 
 
 def collate_fn(data, is_return_depth=False):
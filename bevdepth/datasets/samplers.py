@@ -0,0 +1,188 @@
+"""Samplers of `NuscDetDataset`."""
+import math
+
+import numpy as np
+import torch.distributed as dist
+from torch.utils.data.distributed import DistributedSampler
+
+__all__ = ['CBGSSampler', 'SceneChunkSampler']
+
+
+def _get_dist_info(num_replicas, rank):
+    if num_replicas is None:
+        num_replicas = dist.get_world_size() if dist.is_available(
+        ) and dist.is_initialized() else 1
+    if rank is None:
+        rank = dist.get_rank() if dist.is_available(
+        ) and dist.is_initialized() else 0
+    return num_replicas, rank
+
+
+class SceneChunkSampler(DistributedSampler):
+    """Keep temporally adjacent samples on the same dataloader worker.
+
+    Samples are split into chunks of consecutive samples of one scene. Chunks
+    are (optionally shuffled and) split over ranks and then over the
+    dataloader workers of every rank. The indices are ordered so that the
+    batches of worker `w`, which `DataLoader` gets from batch
+    `w, w + num_workers, ...`, walk through the chunks of the worker in
+    temporal order, and the previous frames of a sample hit the `FrameCache`
+    of the worker.
+
+    It subclasses `DistributedSampler` so that pytorch lightning neither
+    replaces nor wraps it.
+
+    Args:
+        dataset (NuscDetDataset): Dataset.
+        batch_size (int): Batch size per device of the dataloader.
+        num_workers (int): Number of workers of the dataloader.
+        chunk_size (int): Max samples per chunk, a scene has about 40
+            samples. Default: 40.
+        shuffle (bool): Whether to shuffle the chunks every epoch.
+            Default: True.
+        seed (int): Seed of the shuffle. Default: 0.
+        num_replicas (int, optional): World size, default to the size of
+            the default process group.
+        rank (int, optional): Rank, default to the rank in the default
+            process group.
+    """
+
+    def __init__(self,
+                 dataset,
+                 batch_size,
+                 num_workers,
+                 chunk_size=40,
+                 shuffle=True,
+                 seed=0,
+                 num_replicas=None,
+                 rank=None):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.num_workers = max(num_workers, 1)
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.num_replicas, self.rank = _get_dist_info(num_replicas, rank)
+        self.chunks = self._split_chunks(
+            [info['scene_token'] for info in dataset.infos], chunk_size)
+        self.num_samples = math.ceil(len(dataset) / self.num_replicas)
+        self.total_size = self.num_samples * self.num_replicas
+
+    @staticmethod
+    def _split_chunks(scene_tokens, chunk_size):
+        chunks = list()
+        start = 0
+        for idx in range(1, len(scene_tokens) + 1):
+            if idx == len(scene_tokens) or scene_tokens[idx] != scene_tokens[
+                    start] or idx - start == chunk_size:
+                chunks.append(np.arange(start, idx))
+                start = idx
+        return chunks
+
+    def __iter__(self):
+        chunk_order = np.arange(len(self.chunks))
+        if self.shuffle:
+            rng = np.random.default_rng(self.seed + self.epoch)
+            rng.shuffle(chunk_order)
+        indices = np.concatenate([self.chunks[i] for i in chunk_order])
+        # Pad with the first samples to get the same length on all ranks,
+        # every rank takes a contiguous part.
+        indices = np.resize(indices, self.total_size)
+        indices = indices[self.rank * self.num_samples:(self.rank + 1) *
+                          self.num_samples]
+        # DataLoader sends batch k to worker k % num_workers, so give every
+        # worker a run of consecutive batches. A partial batch stays last.
+        num_batches = len(indices) // self.batch_size
+        batches = indices[:num_batches * self.batch_size].reshape(
+            num_batches, self.batch_size)
+        runs = [
+            iter(run) for run in np.array_split(batches, self.num_workers)
+        ]
+        ordered = [
+            next(runs[batch_idx % self.num_workers])
+            for batch_idx in range(num_batches)
+        ]
+        ordered.append(indices[num_batches * self.batch_size:])
+        return iter(np.concatenate(ordered).tolist())
+
+    def __len__(self):
+        return self.num_samples
+
+
+class CBGSSampler(DistributedSampler):
+    """Class-balanced grouping and sampling (CBGS) as a sampler.
+
+    Every epoch, the samples of every class are drawn with replacement so
+    that all classes have about the same number of samples, see
+    https://arxiv.org/abs/1908.09492. The draws are seeded by `seed` and the
+    epoch, so all ranks draw the same indices and take disjoint shards of
+    the same length.
+
+    Args:
+        dataset (NuscDetDataset): Dataset providing
+            `get_class_sample_indices`.
+        shuffle (bool): Whether to shuffle the drawn samples. Default: True.
+        seed (int): Seed of the draws. Default: 0.
+        infinite (bool): Whether to keep iterating over new epochs, for
+            step based training. Default: False.
+        num_replicas (int, optional): World size, default to the size of
+            the default process group.
+        rank (int, optional): Rank, default to the rank in the default
+            process group.
+    """
+
+    def __init__(self,
+                 dataset,
+                 shuffle=True,
+                 seed=0,
+                 infinite=False,
+                 num_replicas=None,
+                 rank=None):
+        self.dataset = dataset
+        self.shuffle = shuffle
+        self.seed = seed
+        self.infinite = infinite
+        self.epoch = 0
+        self.num_replicas, self.rank = _get_dist_info(num_replicas, rank)
+        self.class_sample_indices = [
+            indices for indices in dataset.get_class_sample_indices()
+            if len(indices) > 0
+        ]
+        num_duplicated = sum(
+            len(indices) for indices in self.class_sample_indices)
+        # Every class gets 1 / num_classes of the duplicated samples.
+        frac = 1.0 / len(self.class_sample_indices)
+        self.class_num_draws = [
+            int(len(indices) * frac / (len(indices) / num_duplicated))
+            for indices in self.class_sample_indices
+        ]
+        self.num_samples = math.ceil(
+            sum(self.class_num_draws) / self.num_replicas)
+        self.total_size = self.num_samples * self.num_replicas
+
+    def _epoch_indices(self, epoch):
+        rng = np.random.default_rng([self.seed, epoch])
+        indices = np.concatenate([
+            rng.choice(class_indices, num_draws)
+            for class_indices, num_draws in zip(self.class_sample_indices,
+                                                self.class_num_draws)
+        ])
+        if self.shuffle:
+            rng.shuffle(indices)
+        # Pad to the same length on all ranks, then shard.
+        indices = np.resize(indices, self.total_size)
+        return indices[self.rank:self.total_size:self.num_replicas].tolist()
+
+    def __iter__(self):
+        if not self.infinite:
+            return iter(self._epoch_indices(self.epoch))
+        return self._infinite_iter()
+
+    def _infinite_iter(self):
+        epoch = self.epoch
+        while True:
+            yield from self._epoch_indices(epoch)
+            epoch += 1
+
+    def __len__(self):
+        return self.num_samples
@@ -0,0 +1,133 @@
+"""Precomputed references of the temporal frames of every sample.
+
+For every sample, `NuscDetDataset` gathers the key frames of `key_idxes` and
+the camera / lidar sweeps of `sweep_idxes`. Resolving them only depends on
+the infos, so it is done once for the whole dataset and saved next to the
+info file. Every frame is referenced by a `(sample_idx, cam_sweep_idx,
+lidar_sweep_idx)` triplet, where a sweep index of `KEY_FRAME` means the key
+frame of the sample and `MISSING` means that no frame is used.
+"""
+import hashlib
+import json
+import os
+import warnings
+
+import numpy as np
+
+__all__ = ['resolve_frames', 'build_temporal_index', 'load_temporal_index']
+
+KEY_FRAME = -1
+MISSING = -2
+
+
+def resolve_frames(infos, idx, key_idxes, sweep_idxes, cams):
+    """Resolve the frames of one sample.
+
+    Args:
+        infos (list[dict]): Infos of the dataset.
+        idx (int): Index of the sample.
+        key_idxes (list[int]): Key frame offsets, starting with 0.
+        sweep_idxes (list[int]): Sweep indexes for every key frame.
+        cams (list[str]): Cameras that must all exist in a sweep.
+
+    Returns:
+        list[tuple[int]]: `(sample_idx, cam_sweep_idx, lidar_sweep_idx)` of
+            the key frame and sweeps of every key idx, in this order.
+    """
+    frames = list()
+    for key_idx in key_idxes:
+        cur_idx = key_idx + idx
+        # Handle scenarios when current idx doesn't have previous key
+        # frame or previous key frame is from another scene.
+        if cur_idx < 0:
+            cur_idx = idx
+        elif infos[cur_idx]['scene_token'] != infos[idx]['scene_token']:
+            cur_idx = idx
+        info = infos[cur_idx]
+        frames.append((cur_idx, KEY_FRAME, KEY_FRAME))
+        cam_sweeps = info['cam_sweeps']
+        lidar_sweep_timestamps = [
+            lidar_sweep['LIDAR_TOP']['timestamp']
+            for lidar_sweep in info['lidar_sweeps']
+        ]
+        for sweep_idx in sweep_idxes:
+            if len(cam_sweeps) == 0:
+                frames.append((cur_idx, KEY_FRAME, KEY_FRAME))
+                continue
+            frame = (cur_idx, MISSING, MISSING)
+            # Handle scenarios when current sweep doesn't have all cam keys.
+            for i in range(min(len(cam_sweeps) - 1, sweep_idx), -1, -1):
+                if sum([cam in cam_sweeps[i] for cam in cams]) == len(cams):
+                    cam_timestamp = np.mean(
+                        [val['timestamp'] for val in cam_sweeps[i].values()])
+                    # Find the closest lidar frame to the cam frame.
+                    lidar_idx = np.abs(lidar_sweep_timestamps -
+                                       cam_timestamp).argmin()
+                    frame = (cur_idx, i, int(lidar_idx))
+                    break
+            frames.append(frame)
+    return frames
+
+
+def build_temporal_index(infos, key_idxes, sweep_idxes, cams):
+    """Resolve the frames of all samples.
+
+    Returns:
+        np.ndarray: Frame references with shape
+            (len(infos), len(key_idxes) * (len(sweep_idxes) + 1), 3).
+    """
+    num_frames = len(key_idxes) * (len(sweep_idxes) + 1)
+    index = np.empty((len(infos), num_frames, 3), dtype=np.int32)
+    for idx in range(len(infos)):
+        index[idx] = resolve_frames(infos, idx, key_idxes, sweep_idxes, cams)
+    return index
+
+
+def _signature(info_path):
+    """Identify the content of an info file by its path, size and mtime."""
+    if os.path.isdir(info_path):
+        info_path = os.path.join(info_path, 'meta.json')
+    stat = os.stat(info_path)
+    return [os.path.abspath(info_path), stat.st_size, stat.st_mtime_ns]
+
+
+def load_temporal_index(info_paths, infos, key_idxes, sweep_idxes, cams):
+    """Load the temporal index saved next to the info file, or build and
+    save it.
+
+    The file name contains a hash of the info files and the frame config,
+    so changing either of them builds a new index.
+
+    Args:
+        info_paths (str | list[str]): Paths the infos were loaded from.
+        infos (list[dict]): Infos loaded from `info_paths`.
+        key_idxes (list[int]): Key frame offsets, starting with 0.
+        sweep_idxes (list[int]): Sweep indexes for every key frame.
+        cams (list[str]): Cameras that must all exist in a sweep.
+
+    Returns:
+        np.ndarray: Frame references, see `build_temporal_index`.
+    """
+    if not isinstance(info_paths, list):
+        info_paths = [info_paths]
+    config = dict(infos=[_signature(info_path) for info_path in info_paths],
+                  key_idxes=list(key_idxes),
+                  sweep_idxes=list(sweep_idxes),
+                  cams=list(cams))
+    digest = hashlib.md5(json.dumps(config).encode()).hexdigest()[:12]
+    index_path = f'{info_paths[0].rstrip(os.sep)}.temporal_{digest}.npy'
+    if os.path.exists(index_path):
+        index = np.load(index_path)
+        if len(index) == len(infos):
+            return index
+    index = build_temporal_index(infos, key_idxes, sweep_idxes, cams)
+    try:
+        # Write to a temporary file first, as several ranks may build the
+        # index at the same time.
+        tmp_path = f'{index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, index)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        warnings.warn(f'Failed to save temporal index to {index_path}: {e}')
+    return index
@@ -206,15 +206,17 @@ class DetNuscEvaluator():
         result_files, tmp_dir = self.format_results(results, img_metas,
                                                     result_names,
                                                     jsonfile_prefix)
+        results_dict = dict()
         if isinstance(result_files, dict):
             for name in result_names:
                 print('Evaluating bboxes of {}'.format(name))
-                self._evaluate_single(result_files[name])
+                results_dict.update(self._evaluate_single(result_files[name]))
         elif isinstance(result_files, str):
-            self._evaluate_single(result_files)
+            results_dict.update(self._evaluate_single(result_files))
 
         if tmp_dir is not None:
             tmp_dir.cleanup()
+        return results_dict
 
     def _format_bbox(self, results, img_metas, jsonfile_prefix=None):
         """Convert the results to the standard format.
@@ -5,6 +5,7 @@ from argparse import ArgumentParser
 import pytorch_lightning as pl
 
 from bevdepth.callbacks.ema import EMACallback
+from bevdepth.callbacks.stage_profiler import StageProfilerCallback
 from bevdepth.utils.torch_dist import all_gather_object, synchronize
 
 from .nuscenes.base_exp import BEVDepthLightningModel
@@ -32,6 +33,17 @@ def run_cli(model_class=BEVDepthLightningModel,
                                default=0,
                                help='seed for initializing training.')
     parent_parser.add_argument('--ckpt_path', type=str)
+    parent_parser.add_argument('--profile_stages',
+                               action='store_true',
+                               help='record time and memory of every stage')
+    parent_parser.add_argument('--profile_timer',
+                               type=str,
+                               choices=['cuda_event', 'cpu'],
+                               help='timer used by --profile_stages')
+    parent_parser.add_argument('--checkpoint_segments',
+                               nargs='*',
+                               help='segments to checkpoint in training, '
+                               'default to the checkpoint_segments of the exp')
     parser = BEVDepthLightningModel.add_model_specific_args(parent_parser)
     parser.set_defaults(profiler='simple',
                         deterministic=False,
@@ -47,14 +59,30 @@ def run_cli(model_class=BEVDepthLightningModel,
     if args.seed is not None:
         pl.seed_everything(args.seed)
 
-    model = model_class(**vars(args))
+    model_args = vars(args).copy()
+    if args.accelerator == 'cpu':
+        # Native amp only supports bf16 on cpu.
+        if args.precision == 16:
+            args.precision = 32
+        # SyncBatchNorm needs cuda.
+        args.sync_batchnorm = False
+        if args.num_processes > 1 and args.strategy is None:
+            args.strategy = 'ddp'
+            os.environ.setdefault('PL_TORCH_DISTRIBUTED_BACKEND', 'gloo')
+        # The learning rate is scaled by the number of devices.
+        model_args['gpus'] = args.num_processes
+    model = model_class(**model_args)
+    if args.checkpoint_segments is not None:
+        model.checkpoint_segments = args.checkpoint_segments
+    callbacks = list()
     if use_ema:
         train_dataloader = model.train_dataloader()
         ema_callback = EMACallback(
             len(train_dataloader.dataset) * args.max_epochs)
-        trainer = pl.Trainer.from_argparse_args(args, callbacks=[ema_callback])
-    else:
-        trainer = pl.Trainer.from_argparse_args(args)
+        callbacks.append(ema_callback)
+    if args.profile_stages:
+        callbacks.append(StageProfilerCallback(timer=args.profile_timer))
+    trainer = pl.Trainer.from_argparse_args(args, callbacks=callbacks)
     if args.evaluate:
         trainer.test(model, ckpt_path=args.ckpt_path)
     elif args.predict:
@@ -14,8 +14,13 @@ from torch.cuda.amp.autocast_mode import autocast
 from torch.optim.lr_scheduler import MultiStepLR
 
 from bevdepth.datasets.nusc_det_dataset import NuscDetDataset, collate_fn
+from bevdepth.datasets.samplers import CBGSSampler, SceneChunkSampler
 from bevdepth.evaluators.det_evaluators import DetNuscEvaluator
 from bevdepth.models.base_bev_depth import BaseBEVDepth
+from bevdepth.utils.checkpointing import set_checkpoint_segments
+from bevdepth.utils.precision import (apply_precision_policy,
+                                      get_default_precision_policy)
+from bevdepth.utils.profiler import profile_stage
 from bevdepth.utils.torch_dist import all_gather_object, get_rank, synchronize
 
 H = 900
@@ -226,6 +231,20 @@ class BEVDepthLightningModel(LightningModule):
         self.sweep_idxes = list()
         self.key_idxes = list()
         self.data_return_depth = True
+        # Per worker LRU of decoded frames, see `FrameCache`.
+        self.data_img_cache_bytes = 0
+        self.data_lidar_cache_bytes = 0
+        # `FrameCache` of the train dataset, its hit rates are logged at the
+        # end of every epoch.
+        self.train_frame_cache = None
+        # Keep adjacent samples on the same worker so the cache hits.
+        self.data_use_scene_chunk_sampler = False
+        # Segments of the model to checkpoint in training, see
+        # `bevdepth.utils.checkpointing` and `scripts/plan_checkpointing.py`.
+        self.checkpoint_segments = list()
+        # Dtype and memory format of submodules on top of the default fp32
+        # islands, see `bevdepth.utils.precision`.
+        self.precision_policy = dict()
         self.downsample_factor = self.backbone_conf['downsample_factor']
         self.dbound = self.backbone_conf['d_bound']
         self.depth_channels = int(
@@ -243,12 +262,11 @@ class BEVDepthLightningModel(LightningModule):
 
     def training_step(self, batch):  # 一个batch中train的行为
         (sweep_imgs, mats, _, _, gt_boxes, gt_labels, depth_labels) = batch
-        if torch.cuda.is_available():
-            for key, value in mats.items():
-                mats[key] = value.cuda()
-            sweep_imgs = sweep_imgs.cuda()
-            gt_boxes = [gt_box.cuda() for gt_box in gt_boxes]
-            gt_labels = [gt_label.cuda() for gt_label in gt_labels]
+        for key, value in mats.items():
+            mats[key] = value.to(self.device)
+        sweep_imgs = sweep_imgs.to(self.device)
+        gt_boxes = [gt_box.to(self.device) for gt_box in gt_boxes]
+        gt_labels = [gt_label.to(self.device) for gt_label in gt_labels]
         preds, depth_preds = self(sweep_imgs, mats)
         if isinstance(self.model, torch.nn.parallel.DistributedDataParallel):
             targets = self.model.module.get_targets(gt_boxes, gt_labels)
@@ -260,20 +278,23 @@ class BEVDepthLightningModel(LightningModule):
         if len(depth_labels.shape) == 5:
             # only key-frame will calculate depth loss
             depth_labels = depth_labels[:, 0, ...]
-        depth_loss = self.get_depth_loss(depth_labels.cuda(), depth_preds)
+        depth_loss = self.get_depth_loss(depth_labels.to(self.device),
+                                         depth_preds)
         self.log('detection_loss', detection_loss)
         self.log('depth_loss', depth_loss)
         return detection_loss + depth_loss
 
+    @profile_stage('depth_loss')
     def get_depth_loss(self, depth_labels, depth_preds):  # 深度监督损失
         depth_labels = self.get_downsampled_gt_depth(depth_labels)
         depth_preds = depth_preds.permute(0, 2, 3, 1).contiguous().view(
             -1, self.depth_channels)
         fg_mask = torch.max(depth_labels, dim=1).values > 0.0
 
+        # fp32 island of the depth probabilities of the loss.
         with autocast(enabled=False):
             depth_loss = (F.binary_cross_entropy(
-                depth_preds[fg_mask],
+                depth_preds[fg_mask].float(),
                 depth_labels[fg_mask],
                 reduction='none',
             ).sum() / max(1.0, fg_mask.sum()))
@@ -318,12 +339,11 @@ class BEVDepthLightningModel(LightningModule):
         return gt_depths.float()
 
     def eval_step(self, batch, batch_idx, prefix: str):  # 一个batch中eval的行为
-        (sweep_imgs, mats, _, img_metas, _, _) = batch
-        if torch.cuda.is_available():
-            for key, value in mats.items():
-                mats[key] = value.cuda()
-            sweep_imgs = sweep_imgs.cuda()
-        preds = self.model(sweep_imgs, mats)
+        (sweep_imgs, mats, timestamps, img_metas, _, _) = batch
+        for key, value in mats.items():
+            mats[key] = value.to(self.device)
+        sweep_imgs = sweep_imgs.to(self.device)
+        preds = self.model(sweep_imgs, mats, timestamps)
         if isinstance(self.model, torch.nn.parallel.DistributedDataParallel):
             results = self.model.module.get_bboxes(preds, img_metas)
         else:
@@ -373,6 +393,24 @@ class BEVDepthLightningModel(LightningModule):
         if get_rank() == 0:
             self.evaluator.evaluate(all_pred_results, all_img_metas)
 
+    def setup(self, stage=None):
+        # Exps may rebuild `self.model` after `__init__`.
+        policy = get_default_precision_policy(self.model)
+        policy.update(self.precision_policy)
+        apply_precision_policy(self.model, policy)
+
+    def on_train_epoch_end(self):
+        if self.train_frame_cache is None:
+            return
+        # Summed over the dataloader workers of this rank.
+        for name, stats in self.train_frame_cache.total_stats().items():
+            self.log(f'{name}_cache_hit_rate', stats['hit_rate'])
+        self.train_frame_cache.reset_total_stats()
+
+    def on_fit_start(self):
+        # Exps may rebuild `self.model` after `__init__`.
+        set_checkpoint_segments(self.model, self.checkpoint_segments)
+
     def configure_optimizers(self):  # 优化器
         lr = self.basic_lr_per_img * \
             self.batch_size_per_device * self.gpus
@@ -383,6 +421,7 @@ class BEVDepthLightningModel(LightningModule):
         return [[optimizer], [scheduler]]
 
     def train_dataloader(self):
+        # 定义NuscDetDataset
         train_dataset = NuscDetDataset(ida_aug_conf=self.ida_aug_conf,
                                        bda_aug_conf=self.bda_aug_conf,
                                        classes=self.class_names,
@@ -395,21 +434,42 @@ class BEVDepthLightningModel(LightningModule):
                                        sweep_idxes=self.sweep_idxes,
                                        key_idxes=self.key_idxes,
                                        return_depth=self.data_return_depth,
-                                       use_fusion=self.use_fusion)  # 定义NuscDetDataset
+                                       use_fusion=self.use_fusion,
+                                       img_cache_bytes=self.
+                                       data_img_cache_bytes,
+                                       lidar_cache_bytes=self.
+                                       data_lidar_cache_bytes)
+        self.train_frame_cache = train_dataset.frame_cache
+        num_workers = 4
+        sampler = self._build_train_sampler(train_dataset, num_workers)
 
         train_loader = torch.utils.data.DataLoader(  # 训练数据加载器
             train_dataset,
             batch_size=self.batch_size_per_device,
-            num_workers=4,
+            num_workers=num_workers,
             drop_last=True,
             shuffle=False,
             collate_fn=partial(collate_fn,
                                is_return_depth=self.data_return_depth
                                or self.use_fusion),
-            sampler=None,
+            sampler=sampler,
         )
         return train_loader
 
+    def _build_train_sampler(self, train_dataset, num_workers):
+        assert not (self.data_use_cbgs and self.data_use_scene_chunk_sampler)
+        # Same seed on all ranks, set by `pl.seed_everything`.
+        seed = int(os.environ.get('PL_GLOBAL_SEED', 0))
+        if self.data_use_cbgs:
+            return CBGSSampler(train_dataset, seed=seed)
+        if self.data_use_scene_chunk_sampler:
+            return SceneChunkSampler(train_dataset,
+                                     self.batch_size_per_device,
+                                     num_workers,
+                                     shuffle=True,
+                                     seed=seed)
+        return None
+
     def val_dataloader(self):
         val_dataset = NuscDetDataset(ida_aug_conf=self.ida_aug_conf,
                                      bda_aug_conf=self.bda_aug_conf,
@@ -24,12 +24,12 @@ class BEVDepthLightningModel(BaseBEVDepthLightningModel):
 
     def training_step(self, batch):
         (sweep_imgs, mats, _, _, gt_boxes, gt_labels, lidar_depth) = batch
-        if torch.cuda.is_available():
-            for key, value in mats.items():
-                mats[key] = value.cuda()
-            sweep_imgs = sweep_imgs.cuda()
-            gt_boxes = [gt_box.cuda() for gt_box in gt_boxes]
-            gt_labels = [gt_label.cuda() for gt_label in gt_labels]
+        for key, value in mats.items():
+            mats[key] = value.to(self.device)
+        sweep_imgs = sweep_imgs.to(self.device)
+        gt_boxes = [gt_box.to(self.device) for gt_box in gt_boxes]
+        gt_labels = [gt_label.to(self.device) for gt_label in gt_labels]
+        lidar_depth = lidar_depth.to(self.device)
         preds = self(sweep_imgs, mats, lidar_depth)
         if isinstance(self.model, torch.nn.parallel.DistributedDataParallel):
             targets = self.model.module.get_targets(gt_boxes, gt_labels)
@@ -46,10 +46,10 @@ class BEVDepthLightningModel(BaseBEVDepthLightningModel):
 
     def eval_step(self, batch, batch_idx, prefix: str):
         (sweep_imgs, mats, _, img_metas, _, _, lidar_depth) = batch
-        if torch.cuda.is_available():
-            for key, value in mats.items():
-                mats[key] = value.cuda()
-            sweep_imgs = sweep_imgs.cuda()
+        for key, value in mats.items():
+            mats[key] = value.to(self.device)
+        sweep_imgs = sweep_imgs.to(self.device)
+        lidar_depth = lidar_depth.to(self.device)
         preds = self.model(sweep_imgs, mats, lidar_depth)
         if isinstance(self.model, torch.nn.parallel.DistributedDataParallel):
             results = self.model.module.get_bboxes(preds, img_metas)
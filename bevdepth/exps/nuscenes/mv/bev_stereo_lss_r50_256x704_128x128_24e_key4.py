@@ -33,6 +33,9 @@ class BEVDepthLightningModel(BaseBEVDepthLightningModel):
         self.num_sweeps = 2
         self.sweep_idxes = [4]
         self.key_idxes = list()
+        # Warp the cost volume in chunks whose warped features take at most
+        # 1 GB, which does not change the results.
+        self.model.backbone.cost_volume_max_bytes = 2**30
 
 
 if __name__ == '__main__':
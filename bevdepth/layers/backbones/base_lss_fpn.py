@@ -1,12 +1,14 @@
 # Copyright (c) Megvii Inc. All rights reserved.
 import torch
 import torch.nn.functional as F
+import torch.utils.checkpoint as cp
 from mmcv.cnn import build_conv_layer
 from mmdet3d.models import build_neck
 from mmdet.models import build_backbone
 from mmdet.models.backbones.resnet import BasicBlock
 from torch import nn
-from torch.cuda.amp.autocast_mode import autocast
+
+from bevdepth.utils.profiler import profile_region, profile_stage
 
 try:
     from bevdepth.ops.voxel_pooling_inference import voxel_pooling_inference
@@ -14,7 +16,7 @@ try:
 except ImportError:
     print('Import VoxelPooling fail.')
 
-__all__ = ['BaseLSSFPN']
+__all__ = ['BaseLSSFPN', 'SEGateCache']
 
 
 class _ASPPModule(nn.Module):  # 空洞卷积块
@@ -159,14 +161,196 @@ class SELayer(nn.Module):  # channel Attention
         self.conv_expand = nn.Conv2d(channels, channels, 1, bias=True)  # 预测重要性
         self.gate = gate_layer()
 
-    def forward(self, x, x_se):
+        # Constant gate of a fixed camera rig, see `fold`.
+        self.register_buffer('folded_gate', None)
+
+    def get_gate(self, x_se):
         x_se = self.conv_reduce(x_se)
         x_se = self.act1(x_se)
         x_se = self.conv_expand(x_se)
-        return x * self.gate(x_se)
+        return self.gate(x_se)
+
+    def fold(self, gate):
+        """Use the constant `gate` of the cameras of one sample instead of
+        computing it from `x_se`, e.g. for export. Pass None to unfold.
+
+        Args:
+            gate (Tensor): Gate with shape of (num_cams, C, 1, 1).
+        """
+        self.folded_gate = None if gate is None else gate.detach()
+
+    def forward(self, x, x_se=None, gate=None):
+        if gate is None:
+            if self.folded_gate is not None:
+                gate = self.folded_gate.repeat(
+                    x.shape[0] // self.folded_gate.shape[0], 1, 1, 1)
+            else:
+                gate = self.get_gate(x_se)
+        return x * gate
+
 
+class SEGateCache(object):
+    """Gates of the camera-aware SE layers of the last camera parameters.
 
-class DepthNet(nn.Module):
+    The gates only depend on the camera parameters, which are constant for
+    a fixed rig at inference. The cache keeps the gates of the last camera
+    parameters and is invalidated when they change. It must be cleared when
+    the weights change, depth nets clear it when switched to train mode.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.gates = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, camera_params):
+        """Get the gates of `camera_params`, None if they are not cached."""
+        if (self.key is not None and self.key.shape == camera_params.shape
+                and torch.equal(self.key, camera_params)):
+            self.hits += 1
+            return self.gates
+        self.misses += 1
+        return None
+
+    def put(self, camera_params, gates):
+        self.key = camera_params.detach().clone()
+        self.gates = {
+            name: gate.detach()
+            for name, gate in gates.items()
+        }
+
+    def clear(self):
+        self.key = None
+        self.gates = None
+
+    def stats(self):
+        num_lookups = self.hits + self.misses
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    hit_rate=self.hits / num_lookups if num_lookups else 0.)
+
+
+def get_camera_params(mats_dict):
+    """Camera parameters of the key sweep fed to the camera-aware MLPs.
+
+    Args:
+        mats_dict (dict): Matrices with `intrin_mats`, `ida_mats`,
+            `sensor2ego_mats` and `bda_mat`, see `BaseLSSFPN.forward`.
+
+    Returns:
+        Tensor: 27 parameters of every image with shape of
+            (B * num_cams, 27).
+    """
+    # BEVDepth的做法是将变换矩阵编码进网络
+    intrins = mats_dict['intrin_mats'][:, 0:1, ...,
+                                       :3, :3]  # batchsize*1*camera_number*4*4,内参
+    batch_size = intrins.shape[0]
+    num_cams = intrins.shape[2]
+    ida = mats_dict['ida_mats'][:, 0:1, ...]
+    sensor2ego = mats_dict['sensor2ego_mats'][:, 0:1, ..., :3, :]
+    bda = mats_dict['bda_mat'].view(batch_size, 1, 1, 4,
+                                    4).repeat(1, 1, num_cams, 1, 1)
+    mlp_input = torch.cat(
+        [
+            torch.stack(
+                [
+                    intrins[:, 0:1, ..., 0, 0],
+                    intrins[:, 0:1, ..., 1, 1],
+                    intrins[:, 0:1, ..., 0, 2],
+                    intrins[:, 0:1, ..., 1, 2],
+                    ida[:, 0:1, ..., 0, 0],
+                    ida[:, 0:1, ..., 0, 1],
+                    ida[:, 0:1, ..., 0, 3],
+                    ida[:, 0:1, ..., 1, 0],
+                    ida[:, 0:1, ..., 1, 1],
+                    ida[:, 0:1, ..., 1, 3],
+                    bda[:, 0:1, ..., 0, 0],
+                    bda[:, 0:1, ..., 0, 1],
+                    bda[:, 0:1, ..., 1, 0],
+                    bda[:, 0:1, ..., 1, 1],
+                    bda[:, 0:1, ..., 2, 2],
+                ],
+                dim=-1,
+            ),
+            sensor2ego.view(batch_size, 1, num_cams, -1),
+        ],
+        -1,
+    )
+    return mlp_input.reshape(-1, mlp_input.shape[-1])
+
+
+class CameraAwareSEMixin(object):
+    """Gates of the camera-aware SE layers of a depth net.
+
+    The depth net defines `SE_LAYERS`, mapping the names of its SE layers to
+    the names of their MLPs, and `se_cache`. In eval mode the gates are
+    looked up in `se_cache` if it is set, and SE layers folded with `fold_se`
+    use their constant gates.
+    """
+
+    def _get_camera_params(self, mats_dict, *args):
+        return get_camera_params(mats_dict)
+
+    def _get_mlp_input(self, camera_params):
+        return self.bn(camera_params)
+
+    def get_se_gates(self, mats_dict, *args):
+        """Get the gates of the SE layers, None for folded SE layers.
+
+        Args:
+            mats_dict (dict): Matrices, see `BaseLSSFPN.forward`.
+            *args: Other arguments of the camera parameters of the depth net.
+        """
+        if all(
+                getattr(self, name).folded_gate is not None
+                for name in self.SE_LAYERS):
+            return {name: None for name in self.SE_LAYERS}
+        camera_params = self._get_camera_params(mats_dict, *args)
+        use_cache = self.se_cache is not None and not self.training
+        if use_cache:
+            gates = self.se_cache.get(camera_params)
+            if gates is not None:
+                return gates
+        mlp_input = self._get_mlp_input(camera_params)
+        gates = {
+            name: getattr(self, name).get_gate(
+                getattr(self, mlp_name)(mlp_input)[..., None, None])
+            for name, mlp_name in self.SE_LAYERS.items()
+        }
+        if use_cache:
+            self.se_cache.put(camera_params, gates)
+        return gates
+
+    def fold_se(self, mats_dict):
+        """Fold the gates of the cameras of one sample into the SE layers.
+
+        For a fixed rig without IDA and BDA, the folded model does not
+        depend on the camera parameters of the SE layers any more. Pass
+        None to unfold.
+
+        Args:
+            mats_dict (dict): Matrices of a batch of one sample.
+        """
+        for name in self.SE_LAYERS:
+            getattr(self, name).fold(None)
+        if mats_dict is None:
+            return
+        assert not self.training, 'SE layers are folded in eval mode.'
+        with torch.no_grad():
+            gates = self.get_se_gates(mats_dict)
+        for name, gate in gates.items():
+            getattr(self, name).fold(gate)
+
+    def train(self, mode=True):
+        if self.se_cache is not None:
+            self.se_cache.clear()
+        return super().train(mode)
+
+
+class DepthNet(CameraAwareSEMixin, nn.Module):
+
+    SE_LAYERS = dict(depth_se='depth_mlp', context_se='context_mlp')
 
     def __init__(self, in_channels, mid_channels, context_channels,
                  depth_channels):  # in、mid、context+depth
@@ -210,52 +394,23 @@ class DepthNet(nn.Module):
                       stride=1,
                       padding=0),
         )
+        # Checkpoint `depth_conv` during training, see
+        # `bevdepth.utils.checkpointing`.
+        self.with_cp = False
+        # Optional `SEGateCache` used in eval mode.
+        self.se_cache = None
 
     def forward(self, x, mats_dict):
-        # 获取各类矩阵
-        # BEVDepth的做法是将变换矩阵编码进网络
-        intrins = mats_dict['intrin_mats'][:, 0:1, ...,
-                                           :3, :3]  # batchsize*1*camera_number*4*4,内参
-        batch_size = intrins.shape[0]
-        num_cams = intrins.shape[2]
-        ida = mats_dict['ida_mats'][:, 0:1, ...]
-        sensor2ego = mats_dict['sensor2ego_mats'][:, 0:1, ..., :3, :]
-        bda = mats_dict['bda_mat'].view(batch_size, 1, 1, 4,
-                                        4).repeat(1, 1, num_cams, 1, 1)
-        mlp_input = torch.cat(
-            [
-                torch.stack(
-                    [
-                        intrins[:, 0:1, ..., 0, 0],
-                        intrins[:, 0:1, ..., 1, 1],
-                        intrins[:, 0:1, ..., 0, 2],
-                        intrins[:, 0:1, ..., 1, 2],
-                        ida[:, 0:1, ..., 0, 0],
-                        ida[:, 0:1, ..., 0, 1],
-                        ida[:, 0:1, ..., 0, 3],
-                        ida[:, 0:1, ..., 1, 0],
-                        ida[:, 0:1, ..., 1, 1],
-                        ida[:, 0:1, ..., 1, 3],
-                        bda[:, 0:1, ..., 0, 0],
-                        bda[:, 0:1, ..., 0, 1],
-                        bda[:, 0:1, ..., 1, 0],
-                        bda[:, 0:1, ..., 1, 1],
-                        bda[:, 0:1, ..., 2, 2],
-                    ],
-                    dim=-1,
-                ),
-                sensor2ego.view(batch_size, 1, num_cams, -1),
-            ],
-            -1,
-        )
-        mlp_input = self.bn(mlp_input.reshape(-1, mlp_input.shape[-1]))
+        # 将变换矩阵编码为通道注意力
+        gates = self.get_se_gates(mats_dict)
         x = self.reduce_conv(x)
-        context_se = self.context_mlp(mlp_input)[..., None, None]
-        context = self.context_se(x, context_se)
+        context = self.context_se(x, gate=gates['context_se'])
         context = self.context_conv(context)
-        depth_se = self.depth_mlp(mlp_input)[..., None, None]
-        depth = self.depth_se(x, depth_se)
-        depth = self.depth_conv(depth)
+        depth = self.depth_se(x, gate=gates['depth_se'])
+        if self.with_cp and depth.requires_grad:
+            depth = cp.checkpoint(self.depth_conv, depth, use_reentrant=False)
+        else:
+            depth = self.depth_conv(depth)
         return torch.cat([depth, context], dim=1)
 
 
@@ -307,13 +462,19 @@ class DepthAggregation(nn.Module):
             # nn.BatchNorm3d(out_channels),
             # nn.ReLU(inplace=True),
         )
+        self.with_cp = False
 
-    @autocast(False)
     def forward(self, x):
-        x = self.reduce_conv(x)
-        x = self.conv(x) + x
-        x = self.out_conv(x)
-        return x
+
+        def _inner_forward(x):
+            x = self.reduce_conv(x)
+            x = self.conv(x) + x
+            x = self.out_conv(x)
+            return x
+
+        if self.with_cp and x.requires_grad:
+            return cp.checkpoint(_inner_forward, x, use_reentrant=False)
+        return _inner_forward(x)
 
 
 class BaseLSSFPN(nn.Module):
@@ -373,6 +534,8 @@ class BaseLSSFPN(nn.Module):
         self.img_neck = build_neck(img_neck_conf)
         # mmdet3d构建neck
         self.depth_net = self._configure_depth_net(depth_net_conf)
+        if depth_net_conf.get('se_cache', False):
+            self.depth_net.se_cache = SEGateCache()
 
         self.img_neck.init_weights()
         self.img_backbone.init_weights()
@@ -427,6 +590,7 @@ class BaseLSSFPN(nn.Module):
         frustum = torch.stack((x_coords, y_coords, d_coords, paddings), -1)
         return frustum
 
+    @profile_stage('get_geometry')
     def get_geometry(self, sensor2ego_mat, intrin_mat, ida_mat, bda_mat):  # 伪点云坐标系变换
         """Transfer points from camera coord to ego coord.
 
@@ -464,6 +628,7 @@ class BaseLSSFPN(nn.Module):
             points = points.squeeze(-1)
         return points[..., :3]
 
+    @profile_stage('get_cam_feats')
     def get_cam_feats(self, imgs):  # 获取图像特征
         """Get feature maps from images."""
         batch_size, num_sweeps, num_cams, num_channels, imH, imW = imgs.shape
@@ -477,6 +642,7 @@ class BaseLSSFPN(nn.Module):
                                       img_feats.shape[3])  # 恢复形状
         return img_feats
 
+    @profile_stage('depth_net')
     def _forward_depth_net(self, feat, mats_dict):
         return self.depth_net(feat, mats_dict)
 
@@ -548,14 +714,16 @@ class BaseLSSFPN(nn.Module):
 
             img_feat_with_depth = img_feat_with_depth.permute(0, 1, 3, 4, 5, 2)
 
-            feature_map = voxel_pooling_train(geom_xyz,
-                                              img_feat_with_depth.contiguous(),
-                                              self.voxel_num.cuda())
+            with profile_region('voxel_pooling'):
+                feature_map = voxel_pooling_train(
+                    geom_xyz, img_feat_with_depth.contiguous(),
+                    self.voxel_num)
         else:
-            feature_map = voxel_pooling_inference(
-                geom_xyz, depth, depth_feature[:, self.depth_channels:(
-                    self.depth_channels + self.output_channels)].contiguous(),
-                self.voxel_num.cuda())
+            with profile_region('voxel_pooling'):
+                feature_map = voxel_pooling_inference(
+                    geom_xyz, depth, depth_feature[:, self.depth_channels:(
+                        self.depth_channels +
+                        self.output_channels)].contiguous(), self.voxel_num)
         if is_return_depth:
             # final_depth has to be fp32, otherwise the depth
             # loss will colapse during the traing process.
@@ -1,17 +1,21 @@
 # Copyright (c) Megvii Inc. All rights reserved.
 import math
+from collections import OrderedDict
 
 import numpy as np
 import torch
 import torch.nn.functional as F
+import torch.utils.checkpoint as cp
 from mmcv.cnn import build_conv_layer
 from mmdet.models.backbones.resnet import BasicBlock
 from scipy.special import erf
 from scipy.stats import norm
 from torch import nn
 
-from bevdepth.layers.backbones.base_lss_fpn import (ASPP, BaseLSSFPN, Mlp,
+from bevdepth.layers.backbones.base_lss_fpn import (ASPP, BaseLSSFPN,
+                                                    CameraAwareSEMixin, Mlp,
                                                     SELayer)
+from bevdepth.utils.profiler import profile_region, profile_stage
 
 try:
     from bevdepth.ops.voxel_pooling_inference import voxel_pooling_inference
@@ -19,7 +23,7 @@ try:
 except ImportError:
     print('Import VoxelPooling fail.')
 
-__all__ = ['BEVStereoLSSFPN']
+__all__ = ['BEVStereoLSSFPN', 'SweepCache']
 
 
 class ConvBnReLU3D(nn.Module):
@@ -59,7 +63,9 @@ class ConvBnReLU3D(nn.Module):
         return F.relu(self.bn(self.conv(x)), inplace=True)
 
 
-class DepthNet(nn.Module):
+class DepthNet(CameraAwareSEMixin, nn.Module):
+
+    SE_LAYERS = dict(depth_se='depth_mlp', context_se='context_mlp')
 
     def __init__(self,
                  in_channels,
@@ -136,55 +142,31 @@ class DepthNet(nn.Module):
         )
         self.d_bound = d_bound
         self.num_ranges = num_ranges
+        # Checkpoint `depth_feat_conv` during training, see
+        # `bevdepth.utils.checkpointing`.
+        self.with_cp = False
+        # Optional `SEGateCache` used in eval mode.
+        self.se_cache = None
 
     # @autocast(False)
     def forward(self, x, mats_dict, scale_depth_factor=1000.0):
         B, _, H, W = x.shape
-        intrins = mats_dict['intrin_mats'][:, 0:1, ..., :3, :3]
-        batch_size = intrins.shape[0]
-        num_cams = intrins.shape[2]
-        ida = mats_dict['ida_mats'][:, 0:1, ...]
-        sensor2ego = mats_dict['sensor2ego_mats'][:, 0:1, ..., :3, :]
-        bda = mats_dict['bda_mat'].view(batch_size, 1, 1, 4,
-                                        4).repeat(1, 1, num_cams, 1, 1)
-        mlp_input = torch.cat(
-            [
-                torch.stack(
-                    [
-                        intrins[:, 0:1, ..., 0, 0],
-                        intrins[:, 0:1, ..., 1, 1],
-                        intrins[:, 0:1, ..., 0, 2],
-                        intrins[:, 0:1, ..., 1, 2],
-                        ida[:, 0:1, ..., 0, 0],
-                        ida[:, 0:1, ..., 0, 1],
-                        ida[:, 0:1, ..., 0, 3],
-                        ida[:, 0:1, ..., 1, 0],
-                        ida[:, 0:1, ..., 1, 1],
-                        ida[:, 0:1, ..., 1, 3],
-                        bda[:, 0:1, ..., 0, 0],
-                        bda[:, 0:1, ..., 0, 1],
-                        bda[:, 0:1, ..., 1, 0],
-                        bda[:, 0:1, ..., 1, 1],
-                        bda[:, 0:1, ..., 2, 2],
-                    ],
-                    dim=-1,
-                ),
-                sensor2ego.view(batch_size, 1, num_cams, -1),
-            ],
-            -1,
-        )
-        mlp_input = self.bn(mlp_input.reshape(-1, mlp_input.shape[-1]))
+        gates = self.get_se_gates(mats_dict)
         x = self.reduce_conv(x)
-        context_se = self.context_mlp(mlp_input)[..., None, None]
-        context = self.context_se(x, context_se)
+        context = self.context_se(x, gate=gates['context_se'])
         context = self.context_conv(context)
-        depth_se = self.depth_mlp(mlp_input)[..., None, None]
-        depth_feat = self.depth_se(x, depth_se)
-        depth_feat = self.depth_feat_conv(depth_feat)
+        depth_feat = self.depth_se(x, gate=gates['depth_se'])
+        if self.with_cp and depth_feat.requires_grad:
+            depth_feat = cp.checkpoint(self.depth_feat_conv,
+                                       depth_feat,
+                                       use_reentrant=False)
+        else:
+            depth_feat = self.depth_feat_conv(depth_feat)
         mono_depth = self.mono_depth_net(depth_feat)
         mu_sigma_score = self.mu_sigma_range_net(depth_feat)
         d_coords = torch.arange(*self.d_bound,
-                                dtype=torch.float).reshape(1, -1, 1, 1).cuda()
+                                dtype=torch.float,
+                                device=x.device).reshape(1, -1, 1, 1)
         d_coords = d_coords.repeat(B, 1, H, W)
         mu = mu_sigma_score[:, 0:self.num_ranges, ...]
         sigma = mu_sigma_score[:, self.num_ranges:2 * self.num_ranges, ...]
@@ -195,6 +177,87 @@ class DepthNet(nn.Module):
         return x, context, mu, sigma, range_score, mono_depth
 
 
+class SweepCache:
+    """LRU cache of the per image results of key frames.
+
+    In sequential inference, the previous key frame of a sample is the key
+    frame of the previous sample. The stereo features, mono depth, context
+    and depth score of every key frame image are cached by camera and
+    timestamp, so that a later sample reuses them for its sweep instead of
+    running the image backbone, the depth net and the stereo matching again.
+    The reused depth score was matched against the previous frames of that
+    image instead of the current key frame, so results are close to but not
+    the same as without the cache.
+
+    Args:
+        max_images (int): Max number of cached images.
+    """
+
+    FIELDS = ('stereo_feat', 'mono_depth', 'context', 'depth_score')
+
+    def __init__(self, max_images):
+        self.max_images = max_images
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _keys(timestamps):
+        return [(cam_idx, timestamp)
+                for sample_timestamps in timestamps.tolist()
+                for cam_idx, timestamp in enumerate(sample_timestamps)]
+
+    def get(self, timestamps):
+        """Get the results of the images of a sweep.
+
+        Args:
+            timestamps (Tensor): Timestamps of the images with shape of
+                (B, num_cameras).
+
+        Returns:
+            dict[str, Tensor] | None: Results of all images, batched as
+                (B * num_cameras, ...), or None unless all images are cached.
+        """
+        keys = self._keys(timestamps)
+        if not all(key in self.items for key in keys):
+            self.misses += 1
+            return None
+        self.hits += 1
+        for key in keys:
+            self.items.move_to_end(key)
+        return {
+            field: torch.stack([self.items[key][i] for key in keys])
+            for i, field in enumerate(self.FIELDS)
+        }
+
+    def put(self, timestamps, **results):
+        """Cache the results of the images of a sweep.
+
+        Args:
+            timestamps (Tensor): Timestamps of the images with shape of
+                (B, num_cameras).
+            results (Tensor): Every field of `FIELDS`, batched as
+                (B * num_cameras, ...).
+        """
+        for i, key in enumerate(self._keys(timestamps)):
+            self.items[key] = tuple(results[field][i].detach().clone()
+                                    for field in self.FIELDS)
+            self.items.move_to_end(key)
+        while len(self.items) > self.max_images:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+    def stats(self):
+        """Hit rate of sweep lookups and number of cached images."""
+        num_lookups = self.hits + self.misses
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    hit_rate=self.hits / max(num_lookups, 1),
+                    num_images=len(self.items))
+
+
 class BEVStereoLSSFPN(BaseLSSFPN):
 
     def __init__(self,
@@ -218,7 +281,12 @@ class BEVStereoLSSFPN(BaseLSSFPN):
                  num_ranges=4,
                  range_list=[[2, 8], [8, 16], [16, 28], [28, 58]],
                  k_list=None,
-                 use_mask=True):
+                 use_mask=True,
+                 cost_volume_chunk_size=None,
+                 cost_volume_max_bytes=None,
+                 sweep_cache_size=0,
+                 em_range_threshold=None,
+                 em_epsilon=None):
         """Modified from `https://github.com/nv-tlabs/lift-splat-shoot`.
         Args:
             x_bound (list): Boundaries for x.
@@ -247,6 +315,23 @@ class BEVStereoLSSFPN(BaseLSSFPN):
             k_list (list): Depth of all candidates inside the range.
                 Defaults to None.
             use_mask (bool): Whether to use mask_net. Defaults to True.
+            cost_volume_chunk_size (int, optional): Max number of depth
+                candidates warped at once by the cost volume. Defaults to
+                None, all candidates.
+            cost_volume_max_bytes (int, optional): Cap of the memory of the
+                warped features of a chunk, chunks are split over candidates
+                and then over images to stay below it. With gradients, the
+                chunks are checkpointed so that the cap also holds in
+                training. Defaults to None, no cap.
+            sweep_cache_size (int): Number of key frame images cached for
+                sequential inference, see `SweepCache`. Defaults to 0,
+                disabled.
+            em_range_threshold (float, optional): In eval mode, skip the EM
+                of a range for pixels whose range score is below it.
+                Defaults to None, no skipping.
+            em_epsilon (float, optional): In eval mode, stop the EM of pixels
+                whose mu moved less than it in meters. Defaults to None, no
+                early exit.
         """
         self.num_ranges = num_ranges
         self.sampling_range = sampling_range
@@ -259,6 +344,15 @@ class BEVStereoLSSFPN(BaseLSSFPN):
 
         self.depth_channels, _, _, _ = self.frustum.shape
         self.use_mask = use_mask
+        self.cost_volume_chunk_size = cost_volume_chunk_size
+        self.cost_volume_max_bytes = cost_volume_max_bytes
+        self.sweep_cache = SweepCache(
+            sweep_cache_size) if sweep_cache_size > 0 else None
+        self.em_range_threshold = em_range_threshold
+        self.em_epsilon = em_epsilon
+        # Pixels entering every EM iteration under the schedule.
+        self.em_active_pixels = [0] * em_iteration
+        self.em_total_pixels = 0
         if k_list is None:
             self.register_buffer('k_list', torch.Tensor(self.depth_sampling()))
         else:
@@ -340,8 +434,16 @@ class BEVStereoLSSFPN(BaseLSSFPN):
         depth_sample,
         depth_sample_frustum,
         sensor2sensor_mats,
+        projection_cache=None,
     ):
         """Generate cost volume based on depth sample.
+
+        Depth candidates are warped in chunks, see `_get_cost_chunks`, and
+        every chunk is reduced to the group correlation right away, so the
+        full warped feature volume is never materialized. If the stereo
+        features require grad, chunks are checkpointed and their warped
+        features are recomputed one chunk at a time in the backward pass.
+
         Args:
             sweep_index (int): Index of sweep.
             stereo_feats_all_sweeps (list[Tensor]): Stereo feature
@@ -360,41 +462,235 @@ class BEVStereoLSSFPN(BaseLSSFPN):
                 bda_mat (Tensor): Rotation matrix for bda with shape
                     of (B, 4, 4).
             depth_sample (Tensor): Depth map of all candidates.
-            depth_sample_frustum (Tensor): Pre-generated frustum.
+            depth_sample_frustum (Tensor): Pre-generated frustum, unused,
+                pixel coordinates are part of the projections.
             sensor2sensor_mats (Tensor): Transformation matrix from reference
                 sensor to source sensor.
+            projection_cache (dict, optional): Projections of the source
+                sweeps by `_project_pixels`, filled on the first call and
+                reused by the following EM iterations and ranges of the same
+                reference sweep.
         Returns:
             Tensor: Depth score for all sweeps.
         """
+        if projection_cache is None:
+            projection_cache = dict()
         batch_size, num_channels, height, width = stereo_feats_all_sweeps[
             0].shape
         num_sweeps = len(stereo_feats_all_sweeps)
+        ref_stereo_feat = stereo_feats_all_sweeps[sweep_index].reshape(
+            batch_size, self.num_groups, num_channels // self.num_groups, 1,
+            height, width)
+        sample_chunk_size, batch_chunk_size = self._get_cost_chunks(
+            stereo_feats_all_sweeps[0])
+        # The stereo features of `get_cam_feats` are detached and the depth
+        # samples are built without grad, so autograd saves no warped
+        # features. Chunks are only checkpointed for features requiring grad.
+        use_checkpoint = torch.is_grad_enabled() and any(
+            feat.requires_grad for feat in stereo_feats_all_sweeps) and (
+                self.cost_volume_chunk_size is not None
+                or self.cost_volume_max_bytes is not None)
         depth_score_all_sweeps = list()
         for idx in range(num_sweeps):
             if idx == sweep_index:
                 continue
-            warped_stereo_fea = self.homo_warping(
-                stereo_feats_all_sweeps[idx],
-                mats_dict['intrin_mats'][:, sweep_index, ...],
-                mats_dict['intrin_mats'][:, idx, ...],
-                sensor2sensor_mats[idx],
-                mats_dict['ida_mats'][:, sweep_index, ...],
-                mats_dict['ida_mats'][:, idx, ...],
-                depth_sample,
-                depth_sample_frustum.type_as(stereo_feats_all_sweeps[idx]),
-            )
-            warped_stereo_fea = warped_stereo_fea.reshape(
-                batch_size, self.num_groups, num_channels // self.num_groups,
-                self.num_samples, height, width)
-            ref_stereo_feat = stereo_feats_all_sweeps[sweep_index].reshape(
-                batch_size, self.num_groups, num_channels // self.num_groups,
-                height, width)
-            feat_cost = torch.mean(
-                (ref_stereo_feat.unsqueeze(3) * warped_stereo_fea), axis=2)
+            if idx not in projection_cache:
+                projection_cache[idx] = self._project_pixels(
+                    mats_dict['intrin_mats'][:, sweep_index, ...],
+                    mats_dict['intrin_mats'][:, idx, ...],
+                    sensor2sensor_mats[idx],
+                    mats_dict['ida_mats'][:, sweep_index, ...],
+                    height,
+                    width,
+                )
+            rays, offsets = projection_cache[idx]
+            sweep_ida_mats = mats_dict['ida_mats'][:, idx,
+                                                   ...].reshape(
+                                                       batch_size, 4, 4)
+            feat_cost = ref_stereo_feat.new_empty(batch_size, self.num_groups,
+                                                  self.num_samples, height,
+                                                  width)
+            for batch_start in range(0, batch_size, batch_chunk_size):
+                batch_slice = slice(batch_start,
+                                    batch_start + batch_chunk_size)
+                for sample_start in range(0, self.num_samples,
+                                          sample_chunk_size):
+                    sample_slice = slice(sample_start,
+                                         sample_start + sample_chunk_size)
+                    chunk_args = (
+                        ref_stereo_feat[batch_slice],
+                        stereo_feats_all_sweeps[idx][batch_slice],
+                        rays[batch_slice],
+                        offsets[batch_slice],
+                        sweep_ida_mats[batch_slice],
+                        depth_sample[batch_slice, sample_slice],
+                    )
+                    if use_checkpoint:
+                        chunk_cost = cp.checkpoint(self._get_chunk_cost,
+                                                   *chunk_args,
+                                                   use_reentrant=False)
+                    else:
+                        chunk_cost = self._get_chunk_cost(*chunk_args)
+                    feat_cost[batch_slice, :, sample_slice] = chunk_cost
             depth_score = self.similarity_net(feat_cost).squeeze(1)
             depth_score_all_sweeps.append(depth_score)
         return torch.stack(depth_score_all_sweeps).mean(0)
 
+    def _get_chunk_cost(self, ref_stereo_feat, stereo_feat, rays, offsets,
+                        sweep_ida_mats, depth_sample):
+        """Group correlation of a chunk, see `_warp_chunk` for the args.
+
+        Returns:
+            Tensor: Correlation with shape of
+                (N, num_groups, num_depth, H, W).
+        """
+        warped_stereo_fea = self._warp_chunk(stereo_feat, rays, offsets,
+                                             sweep_ida_mats, depth_sample)
+        warped_stereo_fea = warped_stereo_fea.reshape(
+            warped_stereo_fea.shape[0], self.num_groups,
+            stereo_feat.shape[1] // self.num_groups,
+            *warped_stereo_fea.shape[2:])
+        return torch.mean(ref_stereo_feat * warped_stereo_fea, axis=2)
+
+    def _get_cost_chunks(self, stereo_feat, num_pixels=None):
+        """Get the number of candidates and images warped at once.
+
+        Args:
+            stereo_feat (Tensor): Stereo features with shape of
+                (N, C, H, W).
+            num_pixels (int, optional): Number of warped pixels per image,
+                defaults to H * W.
+
+        Returns:
+            tuple[int]: Candidates and images per chunk.
+        """
+        batch_size, num_channels, height, width = stereo_feat.shape
+        sample_chunk_size = self.num_samples
+        if self.cost_volume_chunk_size is not None:
+            sample_chunk_size = min(sample_chunk_size,
+                                    self.cost_volume_chunk_size)
+        if self.cost_volume_max_bytes is None:
+            return sample_chunk_size, batch_size
+        # Warped features, their product with the reference features and
+        # the sampling grid of one candidate of one image.
+        if num_pixels is None:
+            num_pixels = height * width
+        bytes_per_sample = num_pixels * (
+            2 * num_channels * stereo_feat.element_size() + 4 * 4)
+        max_samples = max(self.cost_volume_max_bytes // bytes_per_sample, 1)
+        if max_samples >= batch_size:
+            return min(sample_chunk_size, max_samples // batch_size), \
+                batch_size
+        return 1, max_samples
+
+    def _project_pixels(
+        self,
+        key_intrin_mats,
+        sweep_intrin_mats,
+        sensor2sensor_mats,
+        key_ida_mats,
+        height,
+        width,
+    ):
+        """Project the pixels of the key feature map to the sweep camera.
+
+        The point of a key pixel at depth `d` is at `d * ray + offset` in the
+        sweep camera before the perspective division, so the projection is
+        computed once and shared by all depth candidates.
+
+        Args:
+            key_intrin_mats(Tensor): Intrin matrix for key sensor.
+            sweep_intrin_mats(Tensor): Intrin matrix for sweep sensor.
+            sensor2sensor_mats(Tensor): Transformation matrix from key
+                sensor to sweep sensor.
+            key_ida_mats(Tensor): Ida matrix for key frame.
+            height (int): Height of the stereo feature map.
+            width (int): Width of the stereo feature map.
+        Returns:
+            tuple[Tensor]: Rays and offsets with shape of
+                (B * num_cameras, height * width, 4).
+        """
+        ogfH, ogfW = self.final_dim
+        batch_size_with_num_cams = key_intrin_mats.shape[0] * \
+            key_intrin_mats.shape[1]
+        with torch.no_grad():
+            device = key_intrin_mats.device
+            x_coords = torch.linspace(0, ogfW - 1, width,
+                                      device=device).view(1, width).expand(
+                                          height, width)
+            y_coords = torch.linspace(0, ogfH - 1, height,
+                                      device=device).view(height, 1).expand(
+                                          height, width)
+            ones = torch.ones_like(x_coords)
+            pixels = torch.stack([x_coords, y_coords, ones, ones],
+                                 -1).view(-1, 4)
+            # Undo ida for key frame.
+            points = pixels @ key_ida_mats.reshape(
+                batch_size_with_num_cams, 4, 4).inverse().transpose(1, 2)
+            # Key pixel coord -> key camera -> sweep camera -> sweep pixel
+            # coord.
+            proj_mats = sweep_intrin_mats.reshape(
+                batch_size_with_num_cams, 4, 4) @ sensor2sensor_mats.reshape(
+                    batch_size_with_num_cams, 4,
+                    4) @ key_intrin_mats.reshape(batch_size_with_num_cams, 4,
+                                                 4).inverse()
+            rays = points[..., :3] @ proj_mats[..., :3].transpose(1, 2)
+            offsets = points[..., 3:] * proj_mats[:, None, :, 3]
+        return rays, offsets
+
+    def _warp_chunk(self, stereo_feat, rays, offsets, sweep_ida_mats,
+                    depth_sample):
+        """Warp sweep features to the key frame at some depth candidates.
+
+        Args:
+            stereo_feat (Tensor): Sweep features with shape of
+                (N, C, H, W).
+            rays (Tensor): Rays by `_project_pixels` with shape of
+                (N, H * W, 4).
+            offsets (Tensor): Offsets by `_project_pixels` with shape of
+                (N, H * W, 4).
+            sweep_ida_mats (Tensor): Ida matrix for sweep frame with shape
+                of (N, 4, 4).
+            depth_sample (Tensor): Depth of the candidates with shape of
+                (N, num_depth, H', W'), the pixels of `rays` and `offsets`
+                in the shape of (H', W').
+        Returns:
+            Tensor: Warped features with shape of (N, C, num_depth, H', W').
+        """
+        batch_size, channels, height, width = stereo_feat.shape
+        num_depth, sample_height, sample_width = depth_sample.shape[1:]
+        with torch.no_grad():
+            points = depth_sample.reshape(
+                batch_size, num_depth, -1,
+                1) * rays.unsqueeze(1) + offsets.unsqueeze(1)
+            # points in sweep pixel coord.
+            points = torch.cat(
+                [points[..., :2] / points[..., 2:3], points[..., 2:]], -1)
+            points = points @ sweep_ida_mats.transpose(1, 2).unsqueeze(1)
+            neg_mask = points[..., 2] < 1e-3
+            proj_x = torch.where(
+                neg_mask, points.new_tensor(width *
+                                            self.stereo_downsample_factor),
+                points[..., 0])
+            proj_y = torch.where(
+                neg_mask,
+                points.new_tensor(height * self.stereo_downsample_factor),
+                points[..., 1])
+            grid = torch.stack([
+                proj_x / ((width * self.stereo_downsample_factor - 1) / 2) -
+                1, proj_y / ((height * self.stereo_downsample_factor - 1) / 2)
+                - 1
+            ], -1)
+        warped_stereo_fea = F.grid_sample(
+            stereo_feat,
+            grid.view(batch_size, num_depth * sample_height, sample_width,
+                      2).type_as(stereo_feat),
+            mode='bilinear',
+            padding_mode='zeros',
+        )
+        return warped_stereo_fea.view(batch_size, channels, num_depth,
+                                      sample_height, sample_width)
+
     def homo_warping(
         self,
         stereo_feat,
@@ -534,48 +830,57 @@ class BEVStereoLSSFPN(BaseLSSFPN):
             feat_width * self.stereo_downsample_factor //
             self.downsample_factor,
         )
-        score_all_ranges = list()
         range_score = range_score_all_sweeps[sweep_index].softmax(1)
+        # Projections of the source sweeps, shared by all ranges and EM
+        # iterations.
+        projection_cache = dict()
         for range_idx in range(self.num_ranges):
             # Map mu to the corresponding interval.
             range_start = self.range_list[range_idx][0]
-            mu_all_sweeps_single_range = [
-                mu[:, range_idx:range_idx + 1, ...].sigmoid() *
-                (self.range_list[range_idx][1] - self.range_list[range_idx][0])
-                + range_start for mu in mu_all_sweeps
-            ]
-            sigma_all_sweeps_single_range = [
-                sigma[:, range_idx:range_idx + 1, ...]
-                for sigma in sigma_all_sweeps
-            ]
-            batch_size_with_cams, _, feat_height, feat_width =\
-                stereo_feats_all_sweeps[0].shape
-            mu = mu_all_sweeps_single_range[sweep_index]
-            sigma = sigma_all_sweeps_single_range[sweep_index]
-            for _ in range(self.em_iteration):
-                depth_sample = torch.cat([mu + sigma * k for k in self.k_list],
-                                         1)
-                depth_sample_frustum = self.create_depth_sample_frustum(
-                    depth_sample, self.stereo_downsample_factor)
-                mu_score = self._generate_cost_volume(
+            # Only the reference sweep is used, sources may be cached sweeps
+            # without mu and sigma.
+            mu = mu_all_sweeps[sweep_index][:, range_idx:range_idx + 1,
+                                            ...].sigmoid() * (
+                                                self.range_list[range_idx][1] -
+                                                self.range_list[range_idx][0]
+                                            ) + range_start
+            sigma = sigma_all_sweeps[sweep_index][:,
+                                                  range_idx:range_idx + 1, ...]
+            if self._use_em_schedule():
+                mu, sigma = self._forward_scheduled_em(
                     sweep_index,
                     stereo_feats_all_sweeps,
                     mats_dict,
-                    depth_sample,
-                    depth_sample_frustum,
                     sensor2sensor_mats,
+                    projection_cache,
+                    mu,
+                    sigma,
+                    range_score[:, range_idx:range_idx + 1, ...],
                 )
-                mu_score = mu_score.softmax(1)
-                scale_factor = torch.clamp(
-                    0.5 / (1e-4 + mu_score[:, self.num_samples //
-                                           2:self.num_samples // 2 + 1, ...]),
-                    min=0.1,
-                    max=10)
-
-                sigma = torch.clamp(sigma * scale_factor, min=0.1, max=10)
-                mu = (depth_sample * mu_score).sum(1, keepdim=True)
-                del depth_sample
-                del depth_sample_frustum
+            else:
+                for _ in range(self.em_iteration):
+                    depth_sample = torch.cat(
+                        [mu + sigma * k for k in self.k_list], 1)
+                    mu_score = self._generate_cost_volume(
+                        sweep_index,
+                        stereo_feats_all_sweeps,
+                        mats_dict,
+                        depth_sample,
+                        None,
+                        sensor2sensor_mats,
+                        projection_cache,
+                    )
+                    mu_score = mu_score.softmax(1)
+                    scale_factor = torch.clamp(
+                        0.5 / (1e-4 +
+                               mu_score[:, self.num_samples //
+                                        2:self.num_samples // 2 + 1, ...]),
+                        min=0.1,
+                        max=10)
+
+                    sigma = torch.clamp(sigma * scale_factor, min=0.1, max=10)
+                    mu = (depth_sample * mu_score).sum(1, keepdim=True)
+                    del depth_sample
             range_length = int(
                 (self.range_list[range_idx][1] - self.range_list[range_idx][0])
                 // self.d_bound[2])
@@ -613,7 +918,6 @@ class BEVStereoLSSFPN(BaseLSSFPN):
                                   self.d_bound[2]), ..., ] - mu_repeated) /
                 torch.sqrt(sigma))**2)
             depth_score_single_range = depth_score_single_range.exp()
-            score_all_ranges.append(mu_score.sum(1).unsqueeze(1))
             depth_score_single_range = depth_score_single_range / (
                 sigma * math.sqrt(2 * math.pi) + eps)
             stereo_depth[:,
@@ -630,6 +934,181 @@ class BEVStereoLSSFPN(BaseLSSFPN):
         else:
             return stereo_depth
 
+    def _use_em_schedule(self):
+        return not self.training and (self.em_range_threshold is not None
+                                      or self.em_epsilon is not None)
+
+    def _forward_scheduled_em(
+        self,
+        sweep_index,
+        stereo_feats_all_sweeps,
+        mats_dict,
+        sensor2sensor_mats,
+        projection_cache,
+        mu,
+        sigma,
+        range_score,
+    ):
+        """EM of one range on the active pixels only.
+
+        Pixels whose range score is below `em_range_threshold` keep their
+        initial mu and sigma, and pixels whose mu moved less than
+        `em_epsilon` leave the following iterations. The similarity net is
+        applied per pixel, so active pixels get the same results as with
+        the default schedule in eval mode.
+
+        Args:
+            sweep_index (int): Index of the reference sweep.
+            stereo_feats_all_sweeps (list[Tensor]): Stereo feature
+                of all sweeps.
+            mats_dict (dict): Matrices, see `_forward_stereo`.
+            sensor2sensor_mats (list[Tensor]): Transformation matrix from
+                reference sensor to source sensor.
+            projection_cache (dict): Projections of the source sweeps, see
+                `_generate_cost_volume`.
+            mu (Tensor): Initial mu with shape of (N, 1, H, W).
+            sigma (Tensor): Initial sigma with shape of (N, 1, H, W).
+            range_score (Tensor): Softmax score of the range with shape of
+                (N, 1, H, W).
+        Returns:
+            tuple[Tensor]: mu and sigma after the EM.
+        """
+        batch_size, _, height, width = mu.shape
+        mu = mu.reshape(batch_size, 1, -1).clone()
+        sigma = sigma.reshape(batch_size, 1, -1).clone()
+        active = torch.ones_like(mu[:, 0], dtype=torch.bool)
+        if self.em_range_threshold is not None:
+            active &= range_score.reshape(batch_size,
+                                          -1) >= self.em_range_threshold
+        self.em_total_pixels += active.numel()
+        for iteration in range(self.em_iteration):
+            num_active = active.sum(1)
+            self.em_active_pixels[iteration] += int(num_active.sum())
+            max_active = int(num_active.max())
+            if max_active == 0:
+                break
+            # Active pixels of every image first, padded with inactive
+            # pixels whose results are discarded.
+            pixel_idxes = torch.sort(active.int(), 1,
+                                     descending=True)[1][:, :max_active]
+            valid = torch.arange(max_active, device=mu.device).unsqueeze(
+                0) < num_active.unsqueeze(1)
+            gather_idxes = pixel_idxes.unsqueeze(1)
+            active_mu = mu.gather(2, gather_idxes)
+            active_sigma = sigma.gather(2, gather_idxes)
+            depth_sample = torch.cat(
+                [active_mu + active_sigma * k for k in self.k_list], 1)
+            mu_score = self._generate_sparse_cost_volume(
+                sweep_index,
+                stereo_feats_all_sweeps,
+                mats_dict,
+                depth_sample,
+                pixel_idxes,
+                sensor2sensor_mats,
+                projection_cache,
+            ).softmax(1)
+            scale_factor = torch.clamp(
+                0.5 / (1e-4 + mu_score[:, self.num_samples //
+                                       2:self.num_samples // 2 + 1, ...]),
+                min=0.1,
+                max=10)
+            new_sigma = torch.clamp(active_sigma * scale_factor,
+                                    min=0.1,
+                                    max=10)
+            new_mu = (depth_sample * mu_score).sum(1, keepdim=True)
+            valid = valid.unsqueeze(1)
+            mu.scatter_(2, gather_idxes,
+                        torch.where(valid, new_mu, active_mu))
+            sigma.scatter_(2, gather_idxes,
+                           torch.where(valid, new_sigma, active_sigma))
+            if self.em_epsilon is not None:
+                moving = (new_mu - active_mu).abs()[:, 0] >= self.em_epsilon
+                active.scatter_(1, pixel_idxes, valid[:, 0] & moving)
+        return mu.reshape(batch_size, 1, height,
+                          width), sigma.reshape(batch_size, 1, height, width)
+
+    def _generate_sparse_cost_volume(
+        self,
+        sweep_index,
+        stereo_feats_all_sweeps,
+        mats_dict,
+        depth_sample,
+        pixel_idxes,
+        sensor2sensor_mats,
+        projection_cache,
+    ):
+        """Generate the cost volume of some pixels of every image.
+
+        Args:
+            sweep_index (int): Index of sweep.
+            stereo_feats_all_sweeps (list[Tensor]): Stereo feature
+                of all sweeps.
+            mats_dict (dict): Matrices, see `_generate_cost_volume`.
+            depth_sample (Tensor): Depth of the candidates of the pixels
+                with shape of (N, num_samples, P).
+            pixel_idxes (Tensor): Flat indexes of the pixels with shape of
+                (N, P).
+            sensor2sensor_mats (list[Tensor]): Transformation matrix from
+                reference sensor to source sensor.
+            projection_cache (dict): Projections of the source sweeps, see
+                `_generate_cost_volume`.
+        Returns:
+            Tensor: Depth score with shape of (N, num_samples, P).
+        """
+        batch_size, num_channels, height, width = stereo_feats_all_sweeps[
+            0].shape
+        num_pixels = pixel_idxes.shape[1]
+        ref_stereo_feat = stereo_feats_all_sweeps[sweep_index].reshape(
+            batch_size, num_channels, -1).gather(
+                2,
+                pixel_idxes.unsqueeze(1).expand(-1, num_channels, -1))
+        ref_stereo_feat = ref_stereo_feat.reshape(
+            batch_size, self.num_groups, num_channels // self.num_groups, 1,
+            num_pixels)
+        sample_chunk_size, _ = self._get_cost_chunks(
+            stereo_feats_all_sweeps[0], num_pixels)
+        ray_idxes = pixel_idxes.unsqueeze(-1).expand(-1, -1, 4)
+        depth_score_all_sweeps = list()
+        for idx in range(len(stereo_feats_all_sweeps)):
+            if idx == sweep_index:
+                continue
+            if idx not in projection_cache:
+                projection_cache[idx] = self._project_pixels(
+                    mats_dict['intrin_mats'][:, sweep_index, ...],
+                    mats_dict['intrin_mats'][:, idx, ...],
+                    sensor2sensor_mats[idx],
+                    mats_dict['ida_mats'][:, sweep_index, ...],
+                    height,
+                    width,
+                )
+            rays, offsets = projection_cache[idx]
+            rays = rays.gather(1, ray_idxes)
+            offsets = offsets.gather(1, ray_idxes)
+            sweep_ida_mats = mats_dict['ida_mats'][:, idx,
+                                                   ...].reshape(
+                                                       batch_size, 4, 4)
+            feat_cost = ref_stereo_feat.new_empty(batch_size, self.num_groups,
+                                                  self.num_samples,
+                                                  num_pixels)
+            for sample_start in range(0, self.num_samples, sample_chunk_size):
+                sample_slice = slice(sample_start,
+                                     sample_start + sample_chunk_size)
+                warped_stereo_fea = self._warp_chunk(
+                    stereo_feats_all_sweeps[idx], rays, offsets,
+                    sweep_ida_mats,
+                    depth_sample[:, sample_slice].unsqueeze(-2))
+                warped_stereo_fea = warped_stereo_fea.reshape(
+                    batch_size, self.num_groups,
+                    num_channels // self.num_groups, -1, num_pixels)
+                feat_cost[:, :, sample_slice] = torch.mean(
+                    ref_stereo_feat * warped_stereo_fea, axis=2)
+                del warped_stereo_fea
+            depth_score = self.similarity_net(
+                feat_cost.unsqueeze(-1)).reshape(batch_size,
+                                                 self.num_samples, num_pixels)
+            depth_score_all_sweeps.append(depth_score)
+        return torch.stack(depth_score_all_sweeps).mean(0)
+
     def create_depth_sample_frustum(self, depth_sample, downsample_factor=16):
         """Generate frustum"""
         # make grid in image plane
@@ -668,6 +1147,7 @@ class BEVStereoLSSFPN(BaseLSSFPN):
             self.num_ranges,
         )
 
+    @profile_stage('get_cam_feats')
     def get_cam_feats(self, imgs):
         """Get feature maps from images."""
         batch_size, num_sweeps, num_cams, num_channels, imH, imW = imgs.shape
@@ -793,13 +1273,15 @@ class BEVStereoLSSFPN(BaseLSSFPN):
             )
             img_feat_with_depth = img_feat_with_depth.permute(0, 1, 3, 4, 5, 2)
 
-            feature_map = voxel_pooling_train(geom_xyz,
-                                              img_feat_with_depth.contiguous(),
-                                              self.voxel_num.cuda())
+            with profile_region('voxel_pooling'):
+                feature_map = voxel_pooling_train(
+                    geom_xyz, img_feat_with_depth.contiguous(),
+                    self.voxel_num)
         else:
-            feature_map = voxel_pooling_inference(geom_xyz, depth.contiguous(),
-                                                  context.contiguous(),
-                                                  self.voxel_num.cuda())
+            with profile_region('voxel_pooling'):
+                feature_map = voxel_pooling_inference(
+                    geom_xyz, depth.contiguous(), context.contiguous(),
+                    self.voxel_num)
         if is_return_depth:
             return feature_map.contiguous(), depth
         return feature_map.contiguous()
@@ -827,12 +1309,20 @@ class BEVStereoLSSFPN(BaseLSSFPN):
                 bda_mat(Tensor): Rotation matrix for bda with shape
                     of (B, 4, 4).
             timestamps(Tensor): Timestamp for all images with the shape of(B,
-                num_sweeps, num_cameras).
+                num_sweeps, num_cameras). Sweeps are looked up in the
+                `SweepCache` by them in eval mode.
         Return:
             Tensor: bev feature map.
         """
         batch_size, num_sweeps, num_cams, num_channels, img_height, \
             img_width = sweep_imgs.shape
+        use_sweep_cache = self.sweep_cache is not None and \
+            not self.training and timestamps is not None
+        cached_sweeps = [None] * num_sweeps
+        if use_sweep_cache:
+            for sweep_index in range(1, num_sweeps):
+                cached_sweeps[sweep_index] = self.sweep_cache.get(
+                    timestamps[:, sweep_index])
         context_all_sweeps = list()
         depth_feat_all_sweeps = list()
         img_feats_all_sweeps = list()
@@ -842,6 +1332,17 @@ class BEVStereoLSSFPN(BaseLSSFPN):
         mono_depth_all_sweeps = list()
         range_score_all_sweeps = list()
         for sweep_index in range(0, num_sweeps):
+            cached = cached_sweeps[sweep_index]
+            if cached is not None:
+                stereo_feats_all_sweeps.append(cached['stereo_feat'])
+                context_all_sweeps.append(cached['context'])
+                mono_depth_all_sweeps.append(cached['mono_depth'])
+                # Only needed by the reference sweep of the stereo matching.
+                for results in (img_feats_all_sweeps, depth_feat_all_sweeps,
+                                mu_all_sweeps, sigma_all_sweeps,
+                                range_score_all_sweeps):
+                    results.append(None)
+                continue
             if sweep_index > 0:
                 with torch.no_grad():
                     img_feats, stereo_feats = self.get_cam_feats(
@@ -850,9 +1351,12 @@ class BEVStereoLSSFPN(BaseLSSFPN):
                         img_feats.view(batch_size * num_cams,
                                        *img_feats.shape[3:]))
                     stereo_feats_all_sweeps.append(stereo_feats)
-                    depth_feat, context, mu, sigma, range_score, mono_depth =\
-                        self.depth_net(img_feats.view(batch_size * num_cams,
-                                       *img_feats.shape[3:]), mats_dict)
+                    with profile_region('depth_net'):
+                        depth_feat, context, mu, sigma, range_score, \
+                            mono_depth = self.depth_net(
+                                img_feats.view(batch_size * num_cams,
+                                               *img_feats.shape[3:]),
+                                mats_dict)
                     context_all_sweeps.append(
                         self.context_downsample_net(
                             context.reshape(batch_size * num_cams,
@@ -865,9 +1369,10 @@ class BEVStereoLSSFPN(BaseLSSFPN):
                     img_feats.view(batch_size * num_cams,
                                    *img_feats.shape[3:]))
                 stereo_feats_all_sweeps.append(stereo_feats)
-                depth_feat, context, mu, sigma, range_score, mono_depth =\
-                    self.depth_net(img_feats.view(batch_size * num_cams,
-                                   *img_feats.shape[3:]), mats_dict)
+                with profile_region('depth_net'):
+                    depth_feat, context, mu, sigma, range_score, mono_depth =\
+                        self.depth_net(img_feats.view(batch_size * num_cams,
+                                       *img_feats.shape[3:]), mats_dict)
                 depth_feat_all_sweeps.append(depth_feat)
                 context_all_sweeps.append(
                     self.context_downsample_net(
@@ -880,6 +1385,10 @@ class BEVStereoLSSFPN(BaseLSSFPN):
         depth_score_all_sweeps = list()
         final_depth = None
         for ref_idx in range(num_sweeps):
+            if cached_sweeps[ref_idx] is not None:
+                depth_score_all_sweeps.append(
+                    cached_sweeps[ref_idx]['depth_score'])
+                continue
             sensor2sensor_mats = list()
             for src_idx in range(num_sweeps):
                 ref2keysensor_mats = mats_dict[
@@ -961,6 +1470,12 @@ class BEVStereoLSSFPN(BaseLSSFPN):
                 final_depth = (
                     mono_depth_all_sweeps[ref_idx] +
                     self.depth_downsample_net(stereo_depth)).softmax(1)
+        if use_sweep_cache:
+            self.sweep_cache.put(timestamps[:, 0],
+                                 stereo_feat=stereo_feats_all_sweeps[0],
+                                 mono_depth=mono_depth_all_sweeps[0],
+                                 context=context_all_sweeps[0],
+                                 depth_score=depth_score_all_sweeps[0])
         key_frame_res = self._forward_single_sweep(
             0,
             context_all_sweeps[0].reshape(batch_size, num_cams,
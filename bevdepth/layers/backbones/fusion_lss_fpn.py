@@ -1,6 +1,7 @@
 # Copyright (c) Megvii Inc. All rights reserved.
 import torch
 import torch.nn as nn
+import torch.utils.checkpoint as cp
 from mmdet.models.backbones.resnet import BasicBlock
 
 try:
@@ -9,12 +10,16 @@ try:
 except ImportError:
     print('Import VoxelPooling fail.')
 
-from .base_lss_fpn import ASPP, BaseLSSFPN, Mlp, SELayer
+from bevdepth.utils.profiler import profile_region, profile_stage
+
+from .base_lss_fpn import ASPP, BaseLSSFPN, CameraAwareSEMixin, Mlp, SELayer
 
 __all__ = ['FusionLSSFPN']
 
 
-class DepthNet(nn.Module):  # 一层卷积网络回归深度
+class DepthNet(CameraAwareSEMixin, nn.Module):  # 一层卷积网络回归深度
+
+    SE_LAYERS = dict(se='mlp')
 
     def __init__(self, in_channels, mid_channels, context_channels,
                  depth_channels):
@@ -52,10 +57,13 @@ class DepthNet(nn.Module):  # 一层卷积网络回归深度
                                     kernel_size=1,
                                     stride=1,
                                     padding=0)  # 生成目标通道数的深度结果
+        # Checkpoint `depth_conv` and `aspp` during training, see
+        # `bevdepth.utils.checkpointing`.
+        self.with_cp = False
+        # Optional `SEGateCache` used in eval mode.
+        self.se_cache = None
 
-    def forward(self, x, mats_dict, lidar_depth, scale_depth_factor=1000.0):
-        x = self.reduce_conv(x)  # 1倍将采样
-        context = self.context_conv(x)  # 改变通道数 512->80
+    def _get_camera_params(self, mats_dict, scale_depth_factor=1000.0):
         inv_intrinsics = torch.inverse(mats_dict['intrin_mats'][:, 0:1, ...])
         pixel_size = torch.norm(torch.stack(
             [inv_intrinsics[..., 0, 0], inv_intrinsics[..., 1, 1]], dim=-1),
@@ -63,12 +71,28 @@ class DepthNet(nn.Module):  # 一层卷积网络回归深度
         aug_scale = torch.sqrt(mats_dict['ida_mats'][:, 0, :, 0, 0]**2 +
                                mats_dict['ida_mats'][:, 0, :, 0,
                                                      0]**2).reshape(-1, 1)
-        scaled_pixel_size = pixel_size * scale_depth_factor / aug_scale
-        x_se = self.mlp(scaled_pixel_size)[..., None, None]  # 根据内参矩阵，增强矩阵生成特征量
-        x = self.se(x, x_se)  # 通道加权
+        return pixel_size * scale_depth_factor / aug_scale
+
+    def _get_mlp_input(self, camera_params):
+        return camera_params
+
+    def forward(self, x, mats_dict, lidar_depth, scale_depth_factor=1000.0):
+        x = self.reduce_conv(x)  # 1倍将采样
+        context = self.context_conv(x)  # 改变通道数 512->80
+        # 根据内参矩阵，增强矩阵生成特征量
+        gates = self.get_se_gates(mats_dict, scale_depth_factor)
+        x = self.se(x, gate=gates['se'])  # 通道加权
         depth = self.depth_gt_conv(lidar_depth)  # 先升维
-        depth = self.depth_conv(x + depth)  # 语义与深度融合
-        depth = self.aspp(depth)  # 多尺度融合
+
+        def _inner_forward(depth):
+            depth = self.depth_conv(depth)  # 语义与深度融合
+            return self.aspp(depth)  # 多尺度融合
+
+        depth = x + depth
+        if self.with_cp and depth.requires_grad:
+            depth = cp.checkpoint(_inner_forward, depth, use_reentrant=False)
+        else:
+            depth = _inner_forward(depth)
         # 预测深度depth feature channel
         depth = self.depth_pred(depth)
         return torch.cat([depth, context], dim=1)
@@ -84,6 +108,7 @@ class FusionLSSFPN(BaseLSSFPN):
             self.depth_channels,
         )
 
+    @profile_stage('depth_net')
     def _forward_depth_net(self, feat, mats_dict, lidar_depth):
         return self.depth_net(feat, mats_dict, lidar_depth)
 
@@ -161,14 +186,17 @@ class FusionLSSFPN(BaseLSSFPN):
             img_feat_with_depth = img_feat_with_depth.permute(
                 0, 1, 3, 4, 5, 2)  # batchsize*camera*D*H*W*C
 
-            feature_map = voxel_pooling_train(geom_xyz,
-                                              img_feat_with_depth.contiguous(),
-                                              self.voxel_num.cuda())  # 基于cuda的voxel_pooling_train batchsize*C*H*W
+            with profile_region('voxel_pooling'):
+                feature_map = voxel_pooling_train(
+                    geom_xyz, img_feat_with_depth.contiguous(),
+                    self.voxel_num)  # voxel_pooling_train batchsize*C*H*W
         else:
-            feature_map = voxel_pooling_inference(
-                geom_xyz, depth, depth_feature[:, self.depth_channels:(
-                    self.depth_channels + self.output_channels)].contiguous(),
-                self.voxel_num.cuda())
+            with profile_region('voxel_pooling'):
+                feature_map = voxel_pooling_inference(
+                    geom_xyz, depth, depth_feature[:, self.depth_channels:(
+                        self.depth_channels +
+                        self.output_channels)].contiguous(),
+                    self.voxel_num)
         if is_return_depth:
             return feature_map.contiguous(), depth.float()
         return feature_map.contiguous()  # 输出voxel_pooling结果
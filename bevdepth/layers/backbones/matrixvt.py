@@ -4,6 +4,7 @@ from torch import nn
 from torch.cuda.amp import autocast
 
 from bevdepth.layers.backbones.base_lss_fpn import BaseLSSFPN
+from bevdepth.utils.profiler import profile_region, profile_stage
 
 
 class HoriConv(nn.Module):
@@ -102,7 +103,6 @@ class HoriConv(nn.Module):
             nn.ReLU(inplace=True),
         )
 
-    @autocast(False)
     def forward(self, x, pe=None):
         # [N,C,H,W]
         if pe is not None:
@@ -139,7 +139,6 @@ class DepthReducer(nn.Module):
             nn.Conv2d(mid_channels, 1, kernel_size=3, stride=1, padding=1),
         )
 
-    @autocast(False)
     def forward(self, feat, depth):
         vert_weight = self.vertical_weighter(feat).softmax(2)  # [N,1,H,W]
         depth = (depth * vert_weight).sum(2)
@@ -290,7 +289,7 @@ class MatrixVT(BaseLSSFPN):
 
         return circle_map, ray_map
 
-    @autocast(False)
+    @profile_stage('view_transform')
     def reduce_and_project(self, feature, depth, mats_dict):
         """reduce the feature and depth in height
             dimension and make BEV feature
@@ -341,26 +340,28 @@ class MatrixVT(BaseLSSFPN):
         ) = sweep_imgs.shape
         img_feats = self.get_cam_feats(sweep_imgs)
         source_features = img_feats[:, 0, ...]
-        depth_feature = self.depth_net(
-            source_features.reshape(
-                batch_size * num_cams,
-                source_features.shape[2],
-                source_features.shape[3],
-                source_features.shape[4],
-            ),
-            mats_dict,
-        )
+        with profile_region('depth_net'):
+            depth_feature = self.depth_net(
+                source_features.reshape(
+                    batch_size * num_cams,
+                    source_features.shape[2],
+                    source_features.shape[3],
+                    source_features.shape[4],
+                ),
+                mats_dict,
+            )
+        feature = depth_feature[:, self.depth_channels:(
+            self.depth_channels + self.output_channels)]
         with autocast(enabled=False):
-            feature = depth_feature[:, self.depth_channels:(
-                self.depth_channels + self.output_channels)].float()
             depth = depth_feature[:, :self.depth_channels].float().softmax(1)
 
-            img_feat_with_depth = self.reduce_and_project(
-                feature, depth, mats_dict)  # [b*n, c, d, w]
+        # fp32 by default, see `bevdepth.utils.precision`.
+        img_feat_with_depth = self.reduce_and_project(
+            feature, depth, mats_dict)  # [b*n, c, d, w]
 
-            if is_return_depth:
-                return img_feat_with_depth.contiguous(), depth
-            return img_feat_with_depth.contiguous()
+        if is_return_depth:
+            return img_feat_with_depth.contiguous(), depth
+        return img_feat_with_depth.contiguous()
 
 
 if __name__ == '__main__':
@@ -8,7 +8,8 @@ from mmdet3d.models.dense_heads.centerpoint_head import CenterHead, circle_nms
 from mmdet3d.models.utils import clip_sigmoid
 from mmdet.core import reduce_mean
 from mmdet.models import build_backbone
-from torch.cuda.amp import autocast
+
+from bevdepth.utils.profiler import profile_region, profile_stage
 
 __all__ = ['BEVDepthHead']
 
@@ -137,7 +138,6 @@ class BEVDepthHead(CenterHead):
         self.train_cfg = train_cfg
         self.test_cfg = test_cfg
 
-    @autocast(False)
     def forward(self, x):
         """Forward pass.
 
@@ -148,22 +148,24 @@ class BEVDepthHead(CenterHead):
         Returns:
             tuple(list[dict]): Output results for tasks.
         """
-        x = x.float()
         # FPN
         trunk_outs = [x]
-        if self.trunk.deep_stem:
-            x = self.trunk.stem(x)
-        else:
-            x = self.trunk.conv1(x)
-            x = self.trunk.norm1(x)
-            x = self.trunk.relu(x)
-        for i, layer_name in enumerate(self.trunk.res_layers):
-            res_layer = getattr(self.trunk, layer_name)
-            x = res_layer(x)
-            if i in self.trunk.out_indices:
-                trunk_outs.append(x)
-        fpn_output = self.neck(trunk_outs)
-        ret_values = super().forward(fpn_output)
+        with profile_region('bev_trunk'):
+            if self.trunk.deep_stem:
+                x = self.trunk.stem(x)
+            else:
+                x = self.trunk.conv1(x)
+                x = self.trunk.norm1(x)
+                x = self.trunk.relu(x)
+            for i, layer_name in enumerate(self.trunk.res_layers):
+                res_layer = getattr(self.trunk, layer_name)
+                x = res_layer(x)
+                if i in self.trunk.out_indices:
+                    trunk_outs.append(x)
+        with profile_region('bev_neck'):
+            fpn_output = self.neck(trunk_outs)
+        with profile_region('task_heads'):
+            ret_values = super().forward(fpn_output)
         return ret_values
 
     def get_targets_single(self, gt_bboxes_3d, gt_labels_3d):  # center point
@@ -222,20 +224,14 @@ class BEVDepthHead(CenterHead):
         for idx, task_head in enumerate(self.task_heads):
             heatmap = gt_bboxes_3d.new_zeros(
                 (len(self.class_names[idx]), feature_map_size[1],
-                 feature_map_size[0]),
-                device='cuda')
+                 feature_map_size[0]))
 
             anno_box = gt_bboxes_3d.new_zeros(
                 (max_objs, len(self.train_cfg['code_weights'])),
-                dtype=torch.float32,
-                device='cuda')
+                dtype=torch.float32)
 
-            ind = gt_labels_3d.new_zeros((max_objs),
-                                         dtype=torch.int64,
-                                         device='cuda')
-            mask = gt_bboxes_3d.new_zeros((max_objs),
-                                          dtype=torch.uint8,
-                                          device='cuda')
+            ind = gt_labels_3d.new_zeros((max_objs), dtype=torch.int64)
+            mask = gt_bboxes_3d.new_zeros((max_objs), dtype=torch.uint8)
 
             num_objs = min(task_boxes[idx].shape[0], max_objs)
 
@@ -269,7 +265,7 @@ class BEVDepthHead(CenterHead):
 
                     center = torch.tensor([coor_x, coor_y],
                                           dtype=torch.float32,
-                                          device='cuda')
+                                          device=gt_bboxes_3d.device)
                     center_int = center.to(torch.int32)
 
                     # throw out not in range objects to avoid out of array
@@ -297,7 +293,7 @@ class BEVDepthHead(CenterHead):
                         box_dim = box_dim.log()
                     if len(task_boxes[idx][k]) > 7:
                         anno_box[new_idx] = torch.cat([
-                            center - torch.tensor([x, y], device='cuda'),
+                            center - center.new_tensor([x, y]),
                             z.unsqueeze(0),
                             box_dim,
                             torch.sin(rot).unsqueeze(0),
@@ -307,7 +303,7 @@ class BEVDepthHead(CenterHead):
                         ])
                     else:
                         anno_box[new_idx] = torch.cat([
-                            center - torch.tensor([x, y], device='cuda'),
+                            center - center.new_tensor([x, y]),
                             z.unsqueeze(0), box_dim,
                             torch.sin(rot).unsqueeze(0),
                             torch.cos(rot).unsqueeze(0)
@@ -319,6 +315,7 @@ class BEVDepthHead(CenterHead):
             inds.append(ind)
         return heatmaps, anno_boxes, inds, masks
 
+    @profile_stage('loss')
     def loss(self, targets, preds_dicts, **kwargs):
         """Loss function for BEVDepthHead.
 
@@ -410,14 +407,15 @@ class BEVDepthHead(CenterHead):
                 batch_vel = preds_dict[0]['vel']
             else:
                 batch_vel = None
-            temp = self.bbox_coder.decode(batch_heatmap,
-                                          batch_rots,
-                                          batch_rotc,
-                                          batch_hei,
-                                          batch_dim,
-                                          batch_vel,
-                                          reg=batch_reg,
-                                          task_id=task_id)
+            with profile_region('decode'):
+                temp = self.bbox_coder.decode(batch_heatmap,
+                                              batch_rots,
+                                              batch_rotc,
+                                              batch_hei,
+                                              batch_dim,
+                                              batch_vel,
+                                              reg=batch_reg,
+                                              task_id=task_id)
             assert self.test_cfg['nms_type'] in [
                 'size_aware_circle', 'circle', 'rotate'
             ]
@@ -432,12 +430,13 @@ class BEVDepthHead(CenterHead):
                     labels = temp[i]['labels']
                     centers = boxes3d[:, [0, 1]]
                     boxes = torch.cat([centers, scores.view(-1, 1)], dim=1)
-                    keep = torch.tensor(circle_nms(
-                        boxes.detach().cpu().numpy(),
-                        self.test_cfg['min_radius'][task_id],
-                        post_max_size=self.test_cfg['post_max_size']),
-                        dtype=torch.long,
-                        device=boxes.device)
+                    with profile_region('nms'):
+                        keep = torch.tensor(circle_nms(
+                            boxes.detach().cpu().numpy(),
+                            self.test_cfg['min_radius'][task_id],
+                            post_max_size=self.test_cfg['post_max_size']),
+                            dtype=torch.long,
+                            device=boxes.device)
 
                     boxes3d = boxes3d[keep]
                     scores = scores[keep]
@@ -453,15 +452,16 @@ class BEVDepthHead(CenterHead):
                     labels = temp[i]['labels']
                     boxes_2d = boxes3d[:, [0, 1, 3, 4, 6]]
                     boxes = torch.cat([boxes_2d, scores.view(-1, 1)], dim=1)
-                    keep = torch.tensor(
-                        size_aware_circle_nms(
-                            boxes.detach().cpu().numpy(),
-                            self.test_cfg['thresh_scale'][task_id],
-                            post_max_size=self.test_cfg['post_max_size'],
-                        ),
-                        dtype=torch.long,
-                        device=boxes.device,
-                    )
+                    with profile_region('nms'):
+                        keep = torch.tensor(
+                            size_aware_circle_nms(
+                                boxes.detach().cpu().numpy(),
+                                self.test_cfg['thresh_scale'][task_id],
+                                post_max_size=self.test_cfg['post_max_size'],
+                            ),
+                            dtype=torch.long,
+                            device=boxes.device,
+                        )
 
                     boxes3d = boxes3d[keep]
                     scores = scores[keep]
@@ -470,10 +470,12 @@ class BEVDepthHead(CenterHead):
                     ret_task.append(ret)
                 rets.append(ret_task)
             else:
-                rets.append(
-                    self.get_task_detections(num_class_with_bg,
-                                             batch_cls_preds, batch_reg_preds,
-                                             batch_cls_labels, img_metas))
+                with profile_region('nms'):
+                    rets.append(
+                        self.get_task_detections(num_class_with_bg,
+                                                 batch_cls_preds,
+                                                 batch_reg_preds,
+                                                 batch_cls_labels, img_metas))
 
         # Merge branches results
         num_samples = len(rets[0])
@@ -2,6 +2,9 @@ from torch import nn
 
 from bevdepth.layers.backbones.base_lss_fpn import BaseLSSFPN
 from bevdepth.layers.heads.bev_depth_head import BEVDepthHead
+from bevdepth.utils.precision import (apply_precision_policy,
+                                      get_default_precision_policy)
+from bevdepth.utils.profiler import profile_stage
 
 __all__ = ['BaseBEVDepth']
 
@@ -22,6 +25,12 @@ class BaseBEVDepth(nn.Module):
         self.backbone = BaseLSSFPN(**backbone_conf)
         self.head = BEVDepthHead(**head_conf)
         self.is_train_depth = is_train_depth
+        self._apply_fp32_islands()
+
+    def _apply_fp32_islands(self):
+        """Keep the fp32 islands of `get_default_precision_policy` in fp32
+        under autocast, also called after replacing submodules."""
+        apply_precision_policy(self, get_default_precision_policy(self))
 
     def forward(
         self,
@@ -64,6 +73,7 @@ class BaseBEVDepth(nn.Module):
             preds = self.head(x)
             return preds
 
+    @profile_stage('get_targets')
     def get_targets(self, gt_boxes, gt_labels):
         """Generate training targets for a single sample.
 
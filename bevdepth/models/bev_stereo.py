@@ -19,3 +19,4 @@ class BEVStereo(BaseBEVDepth):
         super(BEVStereo, self).__init__(backbone_conf, head_conf,
                                         is_train_depth)
         self.backbone = BEVStereoLSSFPN(**backbone_conf)
+        self._apply_fp32_islands()
@@ -22,6 +22,7 @@ class FusionBEVDepth(BaseBEVDepth):
         self.backbone = FusionLSSFPN(**backbone_conf)
         self.head = BEVDepthHead(**head_conf)
         self.is_train_depth = is_train_depth
+        self._apply_fp32_islands()
 
     def forward(
         self,
@@ -15,3 +15,4 @@ class MatrixVT_Det(BaseBEVDepth):
     def __init__(self, backbone_conf, head_conf, is_train_depth=False):
         super().__init__(backbone_conf, head_conf, is_train_depth)
         self.backbone = MatrixVT(**backbone_conf)
+        self._apply_fp32_islands()
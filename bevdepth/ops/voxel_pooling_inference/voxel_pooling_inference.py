@@ -2,7 +2,56 @@
 import torch
 from torch.autograd import Function
 
-from . import voxel_pooling_inference_ext
+try:
+    from . import voxel_pooling_inference_ext
+except ImportError:
+    voxel_pooling_inference_ext = None
+
+
+def voxel_pooling_inference_cpu(geom_xyz, depth_features, context_features,
+                                voxel_num):
+    """Pure PyTorch implementation of `voxel_pooling_inference`.
+
+    It mirrors the CUDA kernel: every frustum point whose voxel index lies
+    inside `voxel_num` adds `depth * context` to its BEV cell.
+
+    Args:
+        geom_xyz (Tensor): Voxel index of every frustum point with the shape
+            of [B, N, D, H, W, 3].
+        depth_features (Tensor): Depth probability with the shape of
+            [B * N, D, H, W].
+        context_features (Tensor): Context feature with the shape of
+            [B * N, C, H, W].
+        voxel_num (Tensor): Number of voxels for each dim with the shape
+            of [3].
+
+    Returns:
+        Tensor: (B, C, H, W) bev feature map.
+    """
+    batch_size, num_cams, num_depth, num_height, num_width, _ = \
+        geom_xyz.shape
+    num_channels = context_features.shape[1]
+    num_voxel_x, num_voxel_y, num_voxel_z = [int(v) for v in voxel_num]
+    geom_xyz = geom_xyz.reshape(batch_size, -1, 3).long()
+    kept = ((geom_xyz[..., 0] >= 0) & (geom_xyz[..., 0] < num_voxel_x) &
+            (geom_xyz[..., 1] >= 0) & (geom_xyz[..., 1] < num_voxel_y) &
+            (geom_xyz[..., 2] >= 0) & (geom_xyz[..., 2] < num_voxel_z))
+    batch_idx = torch.arange(batch_size, device=geom_xyz.device).view(
+        -1, 1).expand_as(kept)
+    flat_idx = (batch_idx * num_voxel_y + geom_xyz[..., 1]) * num_voxel_x + \
+        geom_xyz[..., 0]
+    # [B, N, D, H, W, C]
+    point_features = depth_features.view(
+        batch_size, num_cams, num_depth, num_height, num_width,
+        1) * context_features.view(batch_size, num_cams, num_channels, 1,
+                                   num_height, num_width).permute(
+                                       0, 1, 3, 4, 5, 2)
+    point_features = point_features.reshape(batch_size, -1, num_channels)
+    output_features = depth_features.new_zeros(
+        (batch_size * num_voxel_y * num_voxel_x, num_channels))
+    output_features.index_add_(0, flat_idx[kept], point_features[kept])
+    return output_features.view(batch_size, num_voxel_y, num_voxel_x,
+                                num_channels).permute(0, 3, 1, 2)
 
 
 class VoxelPoolingInference(Function):
@@ -29,6 +78,9 @@ class VoxelPoolingInference(Function):
         assert context_features.is_contiguous()
         # no gradient for input_features and geom_feats
         ctx.mark_non_differentiable(geom_xyz)
+        if not depth_features.is_cuda:
+            return voxel_pooling_inference_cpu(geom_xyz, depth_features,
+                                               context_features, voxel_num)
         batch_size = geom_xyz.shape[0]
         num_cams = geom_xyz.shape[1]
         num_depth = geom_xyz.shape[2]
@@ -2,7 +2,48 @@
 import torch
 from torch.autograd import Function
 
-from . import voxel_pooling_train_ext
+try:
+    from . import voxel_pooling_train_ext
+except ImportError:
+    voxel_pooling_train_ext = None
+
+
+def voxel_pooling_train_cpu(geom_xyz, input_features, voxel_num):
+    """Pure PyTorch implementation of `voxel_pooling_train`.
+
+    It mirrors the CUDA kernel: every point whose voxel index lies inside
+    `voxel_num` adds its feature to its BEV cell. Gradients flow back to
+    `input_features` through autograd.
+
+    Args:
+        geom_xyz (Tensor): xyz coord for each voxel with the shape
+            of [B, N, 3].
+        input_features (Tensor): feature for each voxel with the
+            shape of [B, N, C].
+        voxel_num (Tensor): Number of voxels for each dim with the
+            shape of [3].
+
+    Returns:
+        Tensor: (B, C, H, W) bev feature map.
+    """
+    batch_size = geom_xyz.shape[0]
+    num_channels = input_features.shape[-1]
+    num_voxel_x, num_voxel_y, num_voxel_z = [int(v) for v in voxel_num]
+    geom_xyz = geom_xyz.reshape(batch_size, -1, 3).long()
+    input_features = input_features.reshape(batch_size, -1, num_channels)
+    kept = ((geom_xyz[..., 0] >= 0) & (geom_xyz[..., 0] < num_voxel_x) &
+            (geom_xyz[..., 1] >= 0) & (geom_xyz[..., 1] < num_voxel_y) &
+            (geom_xyz[..., 2] >= 0) & (geom_xyz[..., 2] < num_voxel_z))
+    batch_idx = torch.arange(batch_size, device=geom_xyz.device).view(
+        -1, 1).expand_as(kept)
+    flat_idx = (batch_idx * num_voxel_y + geom_xyz[..., 1]) * num_voxel_x + \
+        geom_xyz[..., 0]
+    output_features = input_features.new_zeros(
+        (batch_size * num_voxel_y * num_voxel_x, num_channels))
+    output_features = output_features.index_add(0, flat_idx[kept],
+                                                input_features[kept])
+    return output_features.view(batch_size, num_voxel_y, num_voxel_x,
+                                num_channels).permute(0, 3, 1, 2)
 
 
 class VoxelPoolingTrain(Function):
@@ -70,4 +111,7 @@ class VoxelPoolingTrain(Function):
         return None, grad_input_features, None
 
 
-voxel_pooling_train = VoxelPoolingTrain.apply
+def voxel_pooling_train(geom_xyz, input_features, voxel_num):
+    if not input_features.is_cuda:
+        return voxel_pooling_train_cpu(geom_xyz, input_features, voxel_num)
+    return VoxelPoolingTrain.apply(geom_xyz, input_features, voxel_num)
@@ -0,0 +1,134 @@
+"""Activation checkpointing of BEVDepth segments.
+
+A segment is a part of the model whose activations can be dropped after the
+forward pass and recomputed in the backward pass:
+
+- every stage of a ResNet, e.g. `backbone.img_backbone.layer1` or
+  `head.trunk.layer2`, through the `with_cp` flag of its mmdet blocks,
+- every other module with a `with_cp` flag, e.g. `backbone.depth_net`
+  (its `depth_conv`) and `backbone.depth_aggregation_net`.
+
+Segments only checkpoint in training mode with gradients enabled. They trade
+step time for peak memory, `plan_checkpointing` picks the segments to
+checkpoint under a memory budget from per-segment measurements, see
+`scripts/plan_checkpointing.py`.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import torch
+
+__all__ = [
+    'get_checkpoint_segments', 'set_checkpoint_segments',
+    'count_saved_activations', 'plan_checkpointing'
+]
+
+
+def get_checkpoint_segments(model):
+    """Get the checkpointable segments of `model`.
+
+    Returns:
+        OrderedDict[str, list[nn.Module]]: Modules whose `with_cp` flag
+            controls every segment, in forward order.
+    """
+    segments = OrderedDict()
+    claimed = set()
+    for name, module in model.named_modules():
+        if id(module) in claimed:
+            continue
+        if hasattr(module, 'res_layers'):
+            # mmdet ResNet, blocks of a stage are checkpointed one by one.
+            for layer_name in module.res_layers:
+                blocks = list(getattr(module, layer_name))
+                segments[f'{name}.{layer_name}'] = blocks
+                claimed.update(id(block) for block in blocks)
+        elif isinstance(getattr(module, 'with_cp', None), bool):
+            segments[name] = [module]
+    return segments
+
+
+def set_checkpoint_segments(model, names):
+    """Checkpoint the segments `names` of `model` and no other segment.
+
+    Args:
+        model (nn.Module): Model.
+        names (list[str]): Names of the segments, see
+            `get_checkpoint_segments`.
+    """
+    segments = get_checkpoint_segments(model)
+    unknown = set(names) - set(segments)
+    if unknown:
+        raise KeyError(f'Unknown checkpoint segments {sorted(unknown)}, '
+                       f'available segments are {list(segments)}.')
+    for name, modules in segments.items():
+        for module in modules:
+            module.with_cp = name in names
+
+
+def _storage(tensor):
+    if hasattr(tensor, 'untyped_storage'):
+        return tensor.untyped_storage()
+    return tensor.storage()
+
+
+@contextmanager
+def count_saved_activations():
+    """Count the bytes of tensors saved for backward in the context.
+
+    Parameters are not counted and a storage saved several times is only
+    counted once. Saved tensors are released together in the backward pass,
+    so this is the activation memory at the end of the forward pass.
+
+    Yields:
+        dict: `num_bytes` is updated while tensors are saved.
+    """
+    stats = dict(num_bytes=0)
+    seen = set()
+
+    def pack(tensor):
+        if not (tensor.requires_grad and tensor.is_leaf):
+            storage = _storage(tensor)
+            key = (storage.data_ptr(), tensor.device)
+            if key not in seen:
+                seen.add(key)
+                stats['num_bytes'] += storage.nbytes()
+        return tensor
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda x: x):
+        yield stats
+
+
+def plan_checkpointing(segments, peak_bytes, budget_bytes):
+    """Pick the segments to checkpoint under a memory budget.
+
+    Segments are greedily added in decreasing order of memory saved per
+    millisecond of recomputation, until the estimated peak memory fits the
+    budget.
+
+    Args:
+        segments (list[dict]): `name`, `saved_bytes` (memory saved by
+            checkpointing the segment alone) and `extra_ms` (step time added
+            by checkpointing it alone) of every segment.
+        peak_bytes (int): Peak memory without checkpointing.
+        budget_bytes (int): Memory budget.
+
+    Returns:
+        tuple[list[dict], bool]: The steps of the plan, every step has the
+            `names` of the checkpointed segments and the estimated
+            `peak_bytes` and `extra_ms`, the first step checkpoints nothing.
+            And whether the last step fits the budget.
+    """
+    order = sorted(
+        (segment for segment in segments if segment['saved_bytes'] > 0),
+        key=lambda segment: segment['saved_bytes'] / max(
+            segment['extra_ms'], 1e-3),
+        reverse=True)
+    steps = [dict(names=list(), peak_bytes=peak_bytes, extra_ms=0.)]
+    for segment in order:
+        if steps[-1]['peak_bytes'] <= budget_bytes:
+            break
+        steps.append(
+            dict(names=steps[-1]['names'] + [segment['name']],
+                 peak_bytes=steps[-1]['peak_bytes'] - segment['saved_bytes'],
+                 extra_ms=steps[-1]['extra_ms'] + segment['extra_ms']))
+    return steps, steps[-1]['peak_bytes'] <= budget_bytes
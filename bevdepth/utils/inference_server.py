@@ -0,0 +1,394 @@
+"""In-process inference server with dynamic batching for BEVDepth models.
+
+Requests go through three pipelined stages. A thread pool preprocesses the
+images, a single model thread groups ready requests into batches (bounded by
+`max_batch_size` and `max_latency_ms`) and runs the model, and a
+post-processing thread decodes the boxes and resolves the futures.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import mmcv
+import numpy as np
+import torch
+from PIL import Image
+from pyquaternion import Quaternion
+
+from bevdepth.datasets.nusc_det_dataset import img_transform
+
+__all__ = ['prepare_inputs', 'boxes_to_global', 'BEVDepthInferenceServer']
+
+
+def _pose_to_mat(pose):
+    mat = torch.eye(4)
+    mat[:3, :3] = torch.Tensor(Quaternion(pose['rotation']).rotation_matrix)
+    mat[:3, 3] = torch.Tensor(pose['translation'])
+    return mat
+
+
+def _load_img(cam_info, data_root):
+    img = cam_info.get('img', None)
+    if img is None:
+        return Image.open(os.path.join(data_root, cam_info['filename']))
+    if isinstance(img, np.ndarray):
+        return Image.fromarray(img)
+    return img
+
+
+def prepare_inputs(cam_infos, cams, ida_aug_conf, img_conf, data_root=''):
+    """Build the inputs of one sample the same way as `NuscDetDataset` in
+    test mode.
+
+    Args:
+        cam_infos (list[dict]): Frames in the order used by the dataset, i.e.
+            every key frame followed by its sweeps. Each frame maps camera
+            names to a dict with `calibrated_sensor` (rotation, translation
+            and camera_intrinsic), `ego_pose` (rotation and translation),
+            `timestamp` and either `img` (PIL image or RGB array) or
+            `filename`.
+        cams (list[str]): Camera names.
+        ida_aug_conf (dict): Config of image transformation.
+        img_conf (dict): Config of image normalization.
+        data_root (str): Root of `filename`. Default: ''.
+
+    Returns:
+        tuple(Tensor, dict, Tensor, dict): Images, matrices, timestamps and
+            img_metas, without the batch dimension.
+    """
+    H, W = ida_aug_conf['H'], ida_aug_conf['W']
+    fH, fW = ida_aug_conf['final_dim']
+    resize = max(fH / H, fW / W)
+    resize_dims = (int(W * resize), int(H * resize))
+    newW, newH = resize_dims
+    crop_h = int((1 - np.mean(ida_aug_conf['bot_pct_lim'])) * newH) - fH
+    crop_w = int(max(0, newW - fW) / 2)
+    crop = (crop_w, crop_h, crop_w + fW, crop_h + fH)
+    img_mean = np.array(img_conf['img_mean'], np.float32)
+    img_std = np.array(img_conf['img_std'], np.float32)
+
+    key_info = cam_infos[0]
+    imgs = list()
+    sensor2ego_mats = list()
+    intrin_mats = list()
+    ida_mats = list()
+    sensor2sensor_mats = list()
+    timestamps = list()
+    for cam in cams:
+        global2keyego = _pose_to_mat(key_info[cam]['ego_pose']).inverse()
+        keyego2keysensor = _pose_to_mat(
+            key_info[cam]['calibrated_sensor']).inverse()
+        for cam_info in cam_infos:
+            sweepsensor2global = _pose_to_mat(
+                cam_info[cam]['ego_pose']) @ _pose_to_mat(
+                    cam_info[cam]['calibrated_sensor'])
+            sensor2ego_mats.append(global2keyego @ sweepsensor2global)
+            sensor2sensor_mats.append(
+                (keyego2keysensor @ global2keyego
+                 @ sweepsensor2global).inverse())
+            intrin_mat = torch.eye(4)
+            intrin_mat[:3, :3] = torch.Tensor(
+                cam_info[cam]['calibrated_sensor']['camera_intrinsic'])
+            intrin_mats.append(intrin_mat)
+            img, ida_mat = img_transform(_load_img(cam_info[cam], data_root),
+                                         resize=resize,
+                                         resize_dims=resize_dims,
+                                         crop=crop,
+                                         flip=False,
+                                         rotate=0)
+            ida_mats.append(ida_mat)
+            img = mmcv.imnormalize(np.array(img), img_mean, img_std,
+                                   img_conf['to_rgb'])
+            imgs.append(torch.from_numpy(img).permute(2, 0, 1))
+            timestamps.append(cam_info[cam]['timestamp'])
+
+    num_cams, num_frames = len(cams), len(cam_infos)
+
+    def _stack(tensors):
+        tensors = torch.stack(tensors)
+        tensors = tensors.view(num_cams, num_frames, *tensors.shape[1:])
+        return tensors.transpose(0, 1).contiguous()
+
+    mats = dict(
+        sensor2ego_mats=_stack(sensor2ego_mats),
+        intrin_mats=_stack(intrin_mats),
+        ida_mats=_stack(ida_mats),
+        sensor2sensor_mats=_stack(sensor2sensor_mats),
+        bda_mat=torch.eye(4),
+    )
+    img_metas = dict(
+        ego2global_translation=np.mean(
+            [key_info[cam]['ego_pose']['translation'] for cam in cams], 0),
+        ego2global_rotation=np.mean(
+            [key_info[cam]['ego_pose']['rotation'] for cam in cams], 0),
+    )
+    return _stack(imgs), mats, _stack(
+        [torch.tensor(timestamp) for timestamp in timestamps]), img_metas
+
+
+def boxes_to_global(boxes, ego2global_translation, ego2global_rotation):
+    """Transform boxes from ego frame to global frame.
+
+    Args:
+        boxes (np.ndarray): Boxes with shape of (N, 9), in the order of
+            x, y, z, dx, dy, dz, yaw, vx, vy.
+        ego2global_translation (np.ndarray): Translation of the ego car.
+        ego2global_rotation (np.ndarray): Rotation quaternion of the ego car.
+
+    Returns:
+        np.ndarray: Boxes in global frame.
+    """
+    rot = Quaternion(ego2global_rotation)
+    rot_mat = rot.rotation_matrix
+    boxes = boxes.copy()
+    boxes[:, :3] = boxes[:, :3] @ rot_mat.T + np.array(ego2global_translation)
+    boxes[:, 6] += rot.yaw_pitch_roll[0]
+    boxes[:, 7:9] = boxes[:, 7:9] @ rot_mat[:2, :2].T
+    return boxes
+
+
+class _Request:
+
+    __slots__ = ('cam_infos', 'future', 'submit_time', 'ready_time', 'imgs',
+                 'mats', 'timestamps', 'img_metas')
+
+    def __init__(self, cam_infos):
+        self.cam_infos = cam_infos
+        self.future = Future()
+        self.submit_time = time.perf_counter()
+
+
+class BEVDepthInferenceServer:
+    """Serve a `BaseBEVDepth` model with dynamic batching.
+
+    Args:
+        model (nn.Module): A camera-only `BaseBEVDepth` variant.
+        ida_aug_conf (dict): Config of image transformation.
+        img_conf (dict): Config of image normalization.
+        device (str | torch.device): Device of the model. Default: cuda if
+            available, otherwise cpu.
+        max_batch_size (int): Max number of requests in a batch. Default: 4.
+        max_latency_ms (float): Max time a ready request waits for other
+            requests to form a batch. Default: 10.
+        num_preprocess_workers (int): Number of preprocessing threads.
+            Default: 4.
+        output_frame (str): `ego` or `global`. Default: 'ego'.
+        data_root (str): Root of image filenames in requests. Default: ''.
+        max_stats (int): Number of recent requests kept for statistics.
+            Default: 10000.
+    """
+
+    def __init__(self,
+                 model,
+                 ida_aug_conf,
+                 img_conf,
+                 device=None,
+                 max_batch_size=4,
+                 max_latency_ms=10.0,
+                 num_preprocess_workers=4,
+                 output_frame='ego',
+                 data_root='',
+                 max_stats=10000):
+        assert output_frame in ['ego', 'global']
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.device = torch.device(device)
+        self.model = model.to(self.device).eval()
+        self.ida_aug_conf = ida_aug_conf
+        self.img_conf = img_conf
+        self.cams = ida_aug_conf['cams']
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.num_preprocess_workers = num_preprocess_workers
+        self.output_frame = output_frame
+        self.data_root = data_root
+        self.max_stats = max_stats
+        self._ready_queue = queue.Queue()
+        self._model_thread = None
+        self._preprocess_pool = None
+        self._postprocess_pool = None
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def from_exp(cls, pl_model, **kwargs):
+        """Build a server from a `BEVDepthLightningModel`."""
+        assert not pl_model.use_fusion, 'Fusion models need lidar inputs.'
+        return cls(pl_model.model, pl_model.ida_aug_conf, pl_model.img_conf,
+                   **kwargs)
+
+    def start(self):
+        assert self._model_thread is None, 'The server is already running.'
+        self._preprocess_pool = ThreadPoolExecutor(
+            self.num_preprocess_workers)
+        self._postprocess_pool = ThreadPoolExecutor(1)
+        self._model_thread = threading.Thread(target=self._model_loop,
+                                              daemon=True)
+        self._model_thread.start()
+        return self
+
+    def stop(self):
+        """Finish all submitted requests and stop the workers."""
+        if self._model_thread is None:
+            return
+        self._preprocess_pool.shutdown(wait=True)
+        self._ready_queue.put(None)
+        self._model_thread.join()
+        self._postprocess_pool.shutdown(wait=True)
+        self._model_thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def submit(self, cam_infos):
+        """Submit a sample.
+
+        Args:
+            cam_infos (list[dict]): Frames of the sample, see
+                `prepare_inputs`.
+
+        Returns:
+            Future: Resolved to a dict with `boxes_3d` (N, 9), `scores_3d`
+                and `labels_3d` as numpy arrays.
+        """
+        assert self._model_thread is not None, 'The server is not running.'
+        request = _Request(cam_infos)
+        self._preprocess_pool.submit(self._preprocess, request)
+        return request.future
+
+    def infer(self, cam_infos, timeout=None):
+        """Submit a sample and wait for its result."""
+        return self.submit(cam_infos).result(timeout)
+
+    def _preprocess(self, request):
+        try:
+            request.imgs, request.mats, request.timestamps, \
+                request.img_metas = \
+                prepare_inputs(request.cam_infos, self.cams,
+                               self.ida_aug_conf, self.img_conf,
+                               self.data_root)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        request.ready_time = time.perf_counter()
+        self._ready_queue.put(request)
+
+    def _next_batch(self):
+        request = self._ready_queue.get()
+        if request is None:
+            return None, True
+        batch = [request]
+        deadline = request.ready_time + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    request = self._ready_queue.get(timeout=timeout)
+                else:
+                    # Requests that are already ready still join the batch.
+                    request = self._ready_queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _model_loop(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch is None:
+                break
+            batch_time = time.perf_counter()
+            try:
+                imgs = torch.stack([request.imgs for request in batch
+                                    ]).to(self.device, non_blocking=True)
+                mats = {
+                    key: torch.stack([request.mats[key]
+                                      for request in batch]).to(self.device)
+                    for key in batch[0].mats
+                }
+                # Lets BEVStereo reuse previous key frames from its
+                # `SweepCache`.
+                timestamps = torch.stack(
+                    [request.timestamps for request in batch])
+                with torch.no_grad():
+                    preds = self.model(imgs, mats, timestamps)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self._postprocess_pool.submit(self._postprocess, batch, preds,
+                                          batch_time)
+
+    def _postprocess(self, batch, preds, batch_time):
+        try:
+            with torch.no_grad():
+                results = self.model.get_bboxes(
+                    preds, [request.img_metas for request in batch])
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        done_time = time.perf_counter()
+        for request, (boxes, scores, labels) in zip(batch, results):
+            boxes = boxes.detach().cpu().numpy()
+            if self.output_frame == 'global':
+                boxes = boxes_to_global(
+                    boxes, request.img_metas['ego2global_translation'],
+                    request.img_metas['ego2global_rotation'])
+            request.future.set_result(
+                dict(boxes_3d=boxes,
+                     scores_3d=scores.detach().cpu().numpy(),
+                     labels_3d=labels.detach().cpu().numpy()))
+        with self._stats_lock:
+            self._batch_sizes.append(len(batch))
+            for request in batch:
+                self._latencies.append(done_time - request.submit_time)
+                self._queue_times.append(batch_time - request.ready_time)
+                self._first_submit = min(self._first_submit,
+                                         request.submit_time)
+            self._num_done += len(batch)
+            self._last_done = done_time
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._latencies = deque(maxlen=self.max_stats)
+            self._queue_times = deque(maxlen=self.max_stats)
+            self._batch_sizes = deque(maxlen=self.max_stats)
+            self._num_done = 0
+            self._first_submit = float('inf')
+            self._last_done = float('-inf')
+
+    def get_stats(self):
+        """Get throughput and latency percentiles of finished requests.
+
+        Returns:
+            dict: Number of requests, throughput in requests per second,
+                mean batch size and p50 / p90 / p99 end-to-end latency and
+                batching wait, in ms.
+        """
+        with self._stats_lock:
+            if self._num_done == 0:
+                return dict(num_requests=0)
+            latencies = np.array(self._latencies) * 1000
+            queue_times = np.array(self._queue_times) * 1000
+            stats = dict(
+                num_requests=self._num_done,
+                throughput=self._num_done /
+                max(self._last_done - self._first_submit, 1e-9),
+                mean_batch_size=float(np.mean(self._batch_sizes)),
+            )
+        for percentile in [50, 90, 99]:
+            stats[f'latency_p{percentile}_ms'] = float(
+                np.percentile(latencies, percentile))
+            stats[f'batch_wait_p{percentile}_ms'] = float(
+                np.percentile(queue_times, percentile))
+        return stats
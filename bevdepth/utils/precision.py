@@ -0,0 +1,213 @@
+"""Per-module precision and memory format of BEVDepth models.
+
+A precision policy maps names of submodules, or of methods of submodules, to
+a `dtype` and a `memory_format`, e.g.
+
+    policy = {
+        'backbone.img_backbone': dict(dtype='fp16',
+                                      memory_format='channels_last'),
+        'head': dict(dtype='fp32'),
+        'head.trunk': dict(dtype='fp16'),
+    }
+
+- `dtype` is `fp32`, `fp16`, `bf16` or None (run as the caller). fp32
+  entries run without autocast on fp32 inputs. Half entries run under
+  autocast of their dtype, and return fp32 outputs when the caller does not
+  run under autocast. Inner entries take precedence over outer ones.
+- `memory_format` is `channels_last` or None. `channels_last` converts the
+  4D weights of a module entry and the 4D inputs of the entry.
+
+`get_default_precision_policy` gives the fp32 islands of the BEV head, the
+depth aggregation net and the MatrixVT view transform. The models apply it
+when they are built, and the exps apply it again together with their own
+policy. Half entries should be validated with
+`scripts/study_precision_policy.py`, fp16 entries also need the loss scaling
+of `precision=16`.
+"""
+import functools
+import types
+from collections import OrderedDict
+
+import torch
+from torch import nn
+
+__all__ = [
+    'DTYPES', 'FP32_ISLANDS', 'get_default_precision_policy',
+    'apply_precision_policy', 'remove_precision_policy',
+    'get_applied_precision_policy'
+]
+
+DTYPES = dict(fp32=torch.float32, fp16=torch.float16, bf16=torch.bfloat16)
+# Modules and methods kept in fp32 under mixed precision by default.
+FP32_ISLANDS = [
+    'head',
+    'backbone.depth_aggregation_net',
+    'backbone.horiconv',
+    'backbone.depth_reducer',
+    'backbone.reduce_and_project',
+]
+MEMORY_FORMATS = dict(channels_last=torch.channels_last)
+
+
+def _resolve(model, name):
+    """Get the owner of the callable `name` and the attribute to wrap."""
+    parent_name, _, attr = name.rpartition('.')
+    owner = model
+    for parent_attr in parent_name.split('.') if parent_name else []:
+        owner = getattr(owner, parent_attr, None)
+    target = getattr(owner, attr, None)
+    if isinstance(target, nn.Module):
+        return target, 'forward'
+    if isinstance(owner, nn.Module) and isinstance(target, types.MethodType):
+        return owner, attr
+    raise KeyError(f'Unknown precision policy entry {name}.')
+
+
+def get_default_precision_policy(model):
+    """Get the fp32 islands of `model`.
+
+    Returns:
+        OrderedDict[str, dict]: Entries of the islands in `FP32_ISLANDS`
+            that `model` has.
+    """
+    policy = OrderedDict()
+    for name in FP32_ISLANDS:
+        try:
+            _resolve(model, name)
+        except KeyError:
+            continue
+        policy[name] = dict(dtype='fp32')
+    return policy
+
+
+def _map_tensors(obj, func):
+    if isinstance(obj, torch.Tensor):
+        return func(obj)
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_map_tensors(item, func) for item in obj)
+    if isinstance(obj, dict):
+        return type(obj)(
+            (key, _map_tensors(value, func)) for key, value in obj.items())
+    return obj
+
+
+def _cast(obj, dtype):
+    return _map_tensors(
+        obj, lambda tensor: tensor.to(dtype)
+        if tensor.is_floating_point() else tensor)
+
+
+def _get_device_type(obj):
+    device_types = list()
+    _map_tensors(obj, lambda tensor: device_types.append(tensor.device.type))
+    return device_types[0] if device_types else 'cpu'
+
+
+def _is_autocast_enabled(device_type):
+    try:
+        return torch.is_autocast_enabled(device_type)
+    except TypeError:
+        # torch < 2.4
+        if device_type == 'cuda':
+            return torch.is_autocast_enabled()
+        return torch.is_autocast_cpu_enabled()
+
+
+class _PolicyMethod:
+    """Method of a module run under a precision policy.
+
+    Unlike a closure bound to the module, it survives pickling, e.g. by
+    `torch.save` or by spawned DDP processes.
+    """
+
+    def __init__(self, owner, func, dtype, memory_format):
+        functools.update_wrapper(self, func)
+        self.__self__ = owner
+        self.__func__ = func
+        self.precision_policy = (dtype, memory_format)
+
+    def __call__(self, *args, **kwargs):
+        dtype, memory_format = self.precision_policy
+        if memory_format is not None:
+            args, kwargs = _map_tensors(
+                (args, kwargs),
+                lambda tensor: tensor.contiguous(memory_format=memory_format)
+                if tensor.dim() == 4 else tensor)
+        if dtype is None:
+            return self.__func__(self.__self__, *args, **kwargs)
+        device_type = _get_device_type((args, kwargs))
+        if dtype == torch.float32:
+            args, kwargs = _cast((args, kwargs), torch.float32)
+            with torch.autocast(device_type, enabled=False):
+                return self.__func__(self.__self__, *args, **kwargs)
+        caller_autocast = _is_autocast_enabled(device_type)
+        with torch.autocast(device_type, dtype=dtype):
+            outputs = self.__func__(self.__self__, *args, **kwargs)
+        if caller_autocast:
+            return outputs
+        return _cast(outputs, torch.float32)
+
+
+def apply_precision_policy(model, policy):
+    """Apply `policy` to `model`, replacing the policy applied before.
+
+    Args:
+        model (nn.Module): Model.
+        policy (dict[str, dict]): `dtype` and `memory_format` of submodules
+            or methods of submodules, by name relative to `model`.
+    """
+    remove_precision_policy(model)
+    for name, entry in policy.items():
+        dtype = entry.get('dtype')
+        memory_format = entry.get('memory_format')
+        if dtype is not None and dtype not in DTYPES:
+            raise ValueError(f'Unknown dtype {dtype} of {name}, expected one '
+                             f'of {list(DTYPES)}.')
+        if (memory_format is not None and memory_format not in MEMORY_FORMATS):
+            raise ValueError(f'Unknown memory format {memory_format} of '
+                             f'{name}, expected one of '
+                             f'{list(MEMORY_FORMATS)}.')
+        owner, attr = _resolve(model, name)
+        memory_format = MEMORY_FORMATS.get(memory_format)
+        if memory_format is not None and attr == 'forward':
+            owner.to(memory_format=memory_format)
+        # Bound to `owner` so that copies of the model call their own
+        # modules.
+        owner.__dict__[attr] = _PolicyMethod(owner, getattr(type(owner), attr),
+                                             DTYPES.get(dtype), memory_format)
+
+
+def remove_precision_policy(model):
+    """Run every submodule of `model` as defined by its class again."""
+    for module in model.modules():
+        for attr, value in list(vars(module).items()):
+            if not isinstance(value, _PolicyMethod):
+                continue
+            if value.precision_policy[1] is not None and attr == 'forward':
+                module.to(memory_format=torch.contiguous_format)
+            del module.__dict__[attr]
+
+
+def get_applied_precision_policy(model):
+    """Get the policy applied to `model`.
+
+    Returns:
+        OrderedDict[str, dict]: `dtype` and `memory_format` of every entry.
+    """
+    dtype_names = {dtype: name for name, dtype in DTYPES.items()}
+    memory_format_names = {
+        memory_format: name
+        for name, memory_format in MEMORY_FORMATS.items()
+    }
+    policy = OrderedDict()
+    for module_name, module in model.named_modules():
+        for attr, value in vars(module).items():
+            if not isinstance(value, _PolicyMethod):
+                continue
+            entry = value.precision_policy
+            name = module_name if attr == 'forward' else '.'.join(
+                filter(None, [module_name, attr]))
+            policy[name] = dict(dtype=dtype_names.get(entry[0]),
+                                memory_format=memory_format_names.get(
+                                    entry[1]))
+    return policy
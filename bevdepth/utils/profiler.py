@@ -0,0 +1,283 @@
+"""Per-stage profiler for BEVDepth.
+
+Stages are marked with the `profile_region` context manager or the
+`profile_stage` decorator. Both are no-ops until `enable_profiler` is called,
+so instrumented code only pays for a global lookup when profiling is off.
+"""
+import functools
+import json
+import time
+from collections import defaultdict
+
+import numpy as np
+import torch
+
+__all__ = [
+    'StageProfiler', 'enable_profiler', 'disable_profiler', 'get_profiler',
+    'profile_region', 'profile_stage'
+]
+
+_profiler = None
+
+
+class _NullRegion:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_REGION = _NullRegion()
+
+
+class _Region:
+
+    __slots__ = ('profiler', 'name', 'start_time', 'start_event',
+                 'peak_memory')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start_event = None
+        self.peak_memory = 0
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        return self
+
+    def __exit__(self, *args):
+        self.profiler._exit(self)
+        return False
+
+
+class StageProfiler:
+    """Collect wall time and peak memory of named regions.
+
+    Args:
+        timer (str): `cuda_event` records CUDA events around every region,
+            `cpu` uses `time.perf_counter` and synchronizes the device at
+            region boundaries. Default: `cuda_event` if CUDA is available,
+            otherwise `cpu`.
+        record_memory (bool): Whether to record the peak CUDA memory of every
+            region. Default: True.
+        max_trace_events (int): Max number of events kept for the chrome
+            trace. Default: 100000.
+    """
+
+    def __init__(self,
+                 timer=None,
+                 record_memory=True,
+                 max_trace_events=100000):
+        self.use_cuda = torch.cuda.is_available()
+        if timer is None:
+            timer = 'cuda_event' if self.use_cuda else 'cpu'
+        assert timer in ['cuda_event', 'cpu'], f'Unknown timer {timer}.'
+        assert timer == 'cpu' or self.use_cuda, 'CUDA events need a gpu.'
+        self.timer = timer
+        self.record_memory = record_memory and self.use_cuda
+        self.max_trace_events = max_trace_events
+        self.reset()
+
+    def reset(self):
+        self._stack = list()
+        self._pending = list()
+        self._durations = defaultdict(list)
+        self._peak_memory = defaultdict(int)
+        self._trace_events = list()
+        self._origin = time.perf_counter()
+        # Device time origin of the trace, recorded before the first region.
+        self._origin_event = None
+
+    def region(self, name):
+        return _Region(self, name)
+
+    def _synchronize(self):
+        if self.use_cuda and torch.cuda.is_initialized():
+            torch.cuda.synchronize()
+
+    def _enter(self, region):
+        if self.record_memory:
+            # Peak stats are reset for every region, so the running peak of
+            # the parent is saved before it is lost.
+            if len(self._stack) > 0:
+                parent = self._stack[-1]
+                parent.peak_memory = max(parent.peak_memory,
+                                         torch.cuda.max_memory_allocated())
+            torch.cuda.reset_peak_memory_stats()
+        if self.timer == 'cuda_event':
+            if self._origin_event is None:
+                self._origin_event = torch.cuda.Event(enable_timing=True)
+                self._origin_event.record()
+            region.start_event = torch.cuda.Event(enable_timing=True)
+            region.start_event.record()
+        else:
+            self._synchronize()
+        region.start_time = time.perf_counter()
+        self._stack.append(region)
+
+    def _exit(self, region):
+        self._stack.pop()
+        end_event = None
+        duration = None
+        if self.timer == 'cuda_event':
+            end_event = torch.cuda.Event(enable_timing=True)
+            end_event.record()
+        else:
+            self._synchronize()
+            duration = time.perf_counter() - region.start_time
+        if self.record_memory:
+            peak_memory = max(region.peak_memory,
+                              torch.cuda.max_memory_allocated())
+            self._peak_memory[region.name] = max(
+                self._peak_memory[region.name], peak_memory)
+            if len(self._stack) > 0:
+                parent = self._stack[-1]
+                parent.peak_memory = max(parent.peak_memory, peak_memory)
+        self._pending.append((region.name, region.start_time,
+                              region.start_event, end_event, duration))
+
+    def flush(self):
+        """Resolve the timings of finished regions.
+
+        CUDA events are only read here, so call it once per step instead of
+        once per region.
+        """
+        if len(self._pending) == 0:
+            return
+        if self.timer == 'cuda_event':
+            self._pending[-1][3].synchronize()
+        for name, start_time, start_event, end_event, duration in \
+                self._pending:
+            if duration is None:
+                # Launches are asynchronous, so the start of the span is
+                # taken on the device timeline as well as its duration.
+                duration = start_event.elapsed_time(end_event) / 1000
+                start_offset = self._origin_event.elapsed_time(
+                    start_event) / 1000
+            else:
+                start_offset = start_time - self._origin
+            self._durations[name].append(duration)
+            if len(self._trace_events) < self.max_trace_events:
+                self._trace_events.append(
+                    dict(name=name,
+                         ph='X',
+                         ts=start_offset * 1e6,
+                         dur=duration * 1e6,
+                         pid=0,
+                         tid=0))
+        self._pending = list()
+
+    def summary(self):
+        """Get the statistics of every region.
+
+        Returns:
+            dict[str, dict]: Count, total / mean / p50 / p95 / max time in ms
+                and peak memory in MB of every region, in order of first
+                completion.
+        """
+        self.flush()
+        stats = dict()
+        for name, durations in self._durations.items():
+            durations = np.array(durations) * 1000
+            stats[name] = dict(
+                count=len(durations),
+                total_ms=float(durations.sum()),
+                mean_ms=float(durations.mean()),
+                p50_ms=float(np.percentile(durations, 50)),
+                p95_ms=float(np.percentile(durations, 95)),
+                max_ms=float(durations.max()),
+            )
+            if self.record_memory:
+                stats[name]['peak_memory_mb'] = self._peak_memory[name] / 2**20
+        return stats
+
+    def format_summary(self):
+        """Format `summary` as a table."""
+        stats = self.summary()
+        name_width = max([len(name) for name in stats] + [len('Stage')])
+        keys = ['count', 'mean_ms', 'p50_ms', 'p95_ms', 'total_ms']
+        if self.record_memory:
+            keys.append('peak_memory_mb')
+        lines = [
+            'Stage'.ljust(name_width) + ''.join(key.rjust(16) for key in keys)
+        ]
+        for name, stat in stats.items():
+            lines.append(
+                name.ljust(name_width) +
+                ''.join(f'{stat[key]:>16.2f}' if isinstance(stat[key], float)
+                        else f'{stat[key]:>16d}' for key in keys))
+        return '\n'.join(lines)
+
+    def export_chrome_trace(self, path, pid=0):
+        """Export regions in the chrome trace format.
+
+        The file can be opened in `chrome://tracing` or Perfetto. With the
+        `cuda_event` timer, the timestamps are device time since the first
+        region, otherwise host time since `reset`.
+
+        Args:
+            path (str): Path of the json file.
+            pid (int): Process id shown in the trace, e.g. the rank.
+                Default: 0.
+        """
+        self.flush()
+        trace_events = [dict(event, pid=pid) for event in self._trace_events]
+        with open(path, 'w') as f:
+            json.dump(dict(traceEvents=trace_events), f)
+
+
+def enable_profiler(**kwargs):
+    """Create the global `StageProfiler` and start recording.
+
+    Args:
+        kwargs: Arguments of `StageProfiler`.
+
+    Returns:
+        StageProfiler: The global profiler.
+    """
+    global _profiler
+    _profiler = StageProfiler(**kwargs)
+    return _profiler
+
+
+def disable_profiler():
+    """Stop recording and return the global profiler, if any."""
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    return profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def profile_region(name):
+    """Context manager recording the region `name`.
+
+    Example:
+        >>> with profile_region('voxel_pooling'):
+        >>>     feature_map = voxel_pooling_inference(...)
+    """
+    if _profiler is None:
+        return _NULL_REGION
+    return _profiler.region(name)
+
+
+def profile_stage(name):
+    """Decorator recording every call of a function as the region `name`."""
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.region(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,243 @@
+"""Post-training int8 quantization helpers for the image branch.
+
+The image backbone, the image neck and most of `DepthNet` are quantized with
+FX graph mode. Every quantized submodule is traced on its own, so its inputs
+and outputs stay float and the surrounding code (camera-aware SE layers, DCN,
+depth softmax, voxel pooling and the BEV head) keeps running in fp32.
+"""
+import inspect
+
+import torch
+
+try:
+    from torch.ao.quantization import get_default_qconfig
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+except ImportError:
+    from torch.quantization import get_default_qconfig
+    from torch.quantization.quantize_fx import convert_fx, prepare_fx
+
+__all__ = [
+    'get_quantizable_module_names', 'record_example_inputs', 'prepare_ptq',
+    'calibrate', 'convert_ptq', 'save_quantized_checkpoint',
+    'load_quantized_checkpoint', 'get_model_size'
+]
+
+
+def _is_float_only(module):
+    """Modules that have no int8 kernel and therefore stay in float."""
+    return 'Deform' in type(module).__name__
+
+
+def _get_submodule(root, name):
+    for attr in name.split('.'):
+        root = getattr(root, attr)
+    return root
+
+
+def _set_submodule(root, name, module):
+    parent_name, _, attr = name.rpartition('.')
+    parent = _get_submodule(root, parent_name) if parent_name else root
+    setattr(parent, attr, module)
+
+
+def get_quantizable_module_names(model):
+    """Get the names of the submodules to be quantized.
+
+    Args:
+        model (nn.Module): A `BaseBEVDepth` model.
+
+    Returns:
+        list[str]: Names of the submodules relative to `model`.
+    """
+    backbone = model.backbone
+    names = ['backbone.img_backbone']
+    # SECONDFPN is not traceable as a whole (it calls `len` on its input),
+    # so every deblock is quantized on its own.
+    names += [
+        f'backbone.img_neck.deblocks.{i}'
+        for i in range(len(backbone.img_neck.deblocks))
+    ]
+    depth_net = backbone.depth_net
+    for name in ['reduce_conv', 'context_conv']:
+        if hasattr(depth_net, name):
+            names.append(f'backbone.depth_net.{name}')
+    # The DCN inside `depth_conv` has no int8 kernel and stays in float.
+    for idx, module in enumerate(getattr(depth_net, 'depth_conv', [])):
+        if not _is_float_only(module):
+            names.append(f'backbone.depth_net.depth_conv.{idx}')
+    return names
+
+
+def record_example_inputs(model, module_names, *args):
+    """Run a float forward and record the first input of every submodule.
+
+    Args:
+        model (nn.Module): Model to be run.
+        module_names (list[str]): Names of submodules whose input is needed.
+        args: Inputs of `model`.
+
+    Returns:
+        dict[str, tuple[Tensor]]: Example inputs of every submodule.
+    """
+    example_inputs = dict()
+    handles = list()
+
+    def _hook(name):
+
+        def _record(module, inputs):
+            if name not in example_inputs:
+                example_inputs[name] = tuple(
+                    input.detach().clone() for input in inputs)
+
+        return _record
+
+    for name in module_names:
+        handles.append(
+            _get_submodule(model, name).register_forward_pre_hook(_hook(name)))
+    with torch.no_grad():
+        model(*args)
+    for handle in handles:
+        handle.remove()
+    return example_inputs
+
+
+def _prepare_fx(module, qconfig, example_inputs):
+    qconfig_dict = {'': qconfig}
+    if 'example_inputs' in inspect.signature(prepare_fx).parameters:
+        return prepare_fx(module, qconfig_dict, example_inputs)
+    return prepare_fx(module, qconfig_dict)
+
+
+def prepare_ptq(model, example_inputs, backend='fbgemm'):
+    """Insert observers into the quantizable submodules of `model`.
+
+    Args:
+        model (nn.Module): A `BaseBEVDepth` model on cpu.
+        example_inputs (dict[str, tuple[Tensor]]): Example inputs of the
+            submodules to be quantized, keyed by submodule name.
+        backend (str): Quantized engine, `fbgemm` for x86 and `qnnpack`
+            for arm. Default: 'fbgemm'.
+
+    Returns:
+        nn.Module: The model with observed submodules, in eval mode.
+    """
+    torch.backends.quantized.engine = backend
+    qconfig = get_default_qconfig(backend)
+    model.eval()
+    for name, inputs in example_inputs.items():
+        observed = _prepare_fx(_get_submodule(model, name), qconfig, inputs)
+        _set_submodule(model, name, observed)
+    return model
+
+
+def calibrate(model, data_iter, forward_fn, num_batches):
+    """Feed calibration data through the observed model.
+
+    Args:
+        model (nn.Module): Model returned by `prepare_ptq`.
+        data_iter (Iterable): Iterable of batches.
+        forward_fn (Callable): Called as `forward_fn(model, batch)`.
+        num_batches (int): Number of batches used for calibration.
+    """
+    model.eval()
+    with torch.no_grad():
+        for batch_idx, batch in enumerate(data_iter):
+            if batch_idx >= num_batches:
+                break
+            forward_fn(model, batch)
+
+
+def convert_ptq(model, module_names):
+    """Convert the observed submodules to int8 ones.
+
+    Args:
+        model (nn.Module): Calibrated model.
+        module_names (list[str]): Names of the observed submodules.
+
+    Returns:
+        nn.Module: The quantized model.
+    """
+    for name in module_names:
+        _set_submodule(model, name, convert_fx(_get_submodule(model, name)))
+    return model
+
+
+def save_quantized_checkpoint(model, example_inputs, path, backend='fbgemm'):
+    """Save a quantized model.
+
+    Shapes of the example inputs are stored together with the weights, so
+    the same graph can be rebuilt without calibration data.
+    """
+    torch.save(
+        dict(
+            state_dict=model.state_dict(),
+            quant_meta=dict(
+                backend=backend,
+                example_input_shapes={
+                    name: [list(input.shape) for input in inputs]
+                    for name, inputs in example_inputs.items()
+                },
+            ),
+        ), path)
+
+
+def load_quantized_checkpoint(model, path):
+    """Load a checkpoint saved by `save_quantized_checkpoint`.
+
+    Args:
+        model (nn.Module): A float `BaseBEVDepth` model with the same config
+            as the quantized one.
+        path (str): Path of the checkpoint.
+
+    Returns:
+        nn.Module: The quantized model on cpu.
+    """
+    load_kwargs = dict(map_location='cpu')
+    if 'weights_only' in inspect.signature(torch.load).parameters:
+        # Packed int8 weights are stored as script objects.
+        load_kwargs['weights_only'] = False
+    checkpoint = torch.load(path, **load_kwargs)
+    quant_meta = checkpoint['quant_meta']
+    example_inputs = {
+        name: tuple(torch.zeros(shape) for shape in shapes)
+        for name, shapes in quant_meta['example_input_shapes'].items()
+    }
+    model = prepare_ptq(model.cpu(), example_inputs, quant_meta['backend'])
+    with torch.no_grad():
+        # Observers need statistics to produce the same int8 graph, the
+        # real scales and zero points are restored from the state dict.
+        for name, inputs in example_inputs.items():
+            _get_submodule(model, name)(*inputs)
+    module_names = list(example_inputs.keys())
+    model = convert_ptq(model, module_names)
+    state_dict = checkpoint['state_dict']
+    missing_keys, unexpected_keys = model.load_state_dict(state_dict,
+                                                          strict=False)
+    # Packed int8 weights held directly by a GraphModule are only restored
+    # when the GraphModule itself loads the state dict.
+    for name in module_names:
+        prefix = name + '.'
+        if not any(key.startswith(prefix) for key in unexpected_keys):
+            continue
+        _get_submodule(model, name).load_state_dict({
+            key[len(prefix):]: value
+            for key, value in state_dict.items() if key.startswith(prefix)
+        })
+        unexpected_keys = [
+            key for key in unexpected_keys if not key.startswith(prefix)
+        ]
+    assert len(missing_keys) == 0 and len(unexpected_keys) == 0, \
+        f'Missing keys: {missing_keys}, unexpected keys: {unexpected_keys}.'
+    return model
+
+
+def get_model_size(model):
+    """Get the size in bytes of all parameters and buffers of `model`."""
+    state_dict = model.state_dict()
+    size = 0
+    for value in state_dict.values():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for tensor in values:
+            if isinstance(tensor, torch.Tensor):
+                size += tensor.numel() * tensor.element_size()
+    return size
@@ -68,83 +68,66 @@ def eval_det_cls(pred, gt, iou_thr=None):
             average precision.
     """
 
-    # {img_id: {'bbox': box structure, 'det': matched list}}
-    class_recs = {}
+    # {img_id: box structure}
+    gt_bboxes = {}
+    # index of the first gt box of every image among all gt boxes
+    gt_offsets = {}
     npos = 0
     for img_id in gt.keys():
         cur_gt_num = len(gt[img_id])
         if cur_gt_num != 0:
-            gt_cur = torch.zeros([cur_gt_num, 7], dtype=torch.float32)
-            for i in range(cur_gt_num):
-                gt_cur[i] = gt[img_id][i].tensor
+            gt_cur = torch.cat([box.tensor for box in gt[img_id]])
             bbox = gt[img_id][0].new_box(gt_cur)
         else:
             bbox = gt[img_id]
-        det = [[False] * len(bbox) for i in iou_thr]
+        gt_bboxes[img_id] = bbox
+        gt_offsets[img_id] = npos
         npos += len(bbox)
-        class_recs[img_id] = {'bbox': bbox, 'det': det}
 
-    # construct dets
-    image_ids = []
+    # construct dets with the max iou and the index of the best gt
     confidence = []
-    ious = []
+    ious_max = []
+    gt_inds = []
     for img_id in pred.keys():
         cur_num = len(pred[img_id])
         if cur_num == 0:
             continue
-        pred_cur = torch.zeros((cur_num, 7), dtype=torch.float32)
-        box_idx = 0
-        for box, score in pred[img_id]:
-            image_ids.append(img_id)
-            confidence.append(score)
-            pred_cur[box_idx] = box.tensor
-            box_idx += 1
-        pred_cur = box.new_box(pred_cur)
-        gt_cur = class_recs[img_id]['bbox']
+        boxes, scores = zip(*pred[img_id])
+        confidence.extend(scores)
+        pred_cur = boxes[-1].new_box(torch.cat([box.tensor for box in boxes]))
+        gt_cur = gt_bboxes[img_id]
         if len(gt_cur) > 0:
             # calculate iou in each image
-            iou_cur = pred_cur.overlaps(pred_cur, gt_cur)
-            for i in range(cur_num):
-                ious.append(iou_cur[i])
+            iou_cur = pred_cur.overlaps(pred_cur, gt_cur).cpu().numpy()
+            jmax = iou_cur.argmax(axis=1)
+            ious_max.append(iou_cur[np.arange(cur_num), jmax])
+            gt_inds.append(jmax + gt_offsets[img_id])
         else:
-            for i in range(cur_num):
-                ious.append(np.zeros(1))
+            ious_max.append(np.full(cur_num, -np.inf, dtype=np.float32))
+            gt_inds.append(np.full(cur_num, -1))
 
     confidence = np.array(confidence)
 
     # sort by confidence
     sorted_ind = np.argsort(-confidence)
-    image_ids = [image_ids[x] for x in sorted_ind]
-    ious = [ious[x] for x in sorted_ind]
-
-    # go down dets and mark TPs and FPs
-    nd = len(image_ids)
-    tp_thr = [np.zeros(nd) for i in iou_thr]
-    fp_thr = [np.zeros(nd) for i in iou_thr]
-    for d in range(nd):
-        R = class_recs[image_ids[d]]
-        iou_max = -np.inf
-        BBGT = R['bbox']
-        cur_iou = ious[d]
-
-        if len(BBGT) > 0:
-            # compute overlaps
-            for j in range(len(BBGT)):
-                # iou = get_iou_main(get_iou_func, (bb, BBGT[j,...]))
-                iou = cur_iou[j]
-                if iou > iou_max:
-                    iou_max = iou
-                    jmax = j
-
-        for iou_idx, thresh in enumerate(iou_thr):
-            if iou_max > thresh:
-                if not R['det'][iou_idx][jmax]:
-                    tp_thr[iou_idx][d] = 1.
-                    R['det'][iou_idx][jmax] = 1
-                else:
-                    fp_thr[iou_idx][d] = 1.
-            else:
-                fp_thr[iou_idx][d] = 1.
+    nd = len(sorted_ind)
+    if nd > 0:
+        ious_max = np.concatenate(ious_max)[sorted_ind]
+        gt_inds = np.concatenate(gt_inds)[sorted_ind]
+    else:
+        ious_max = np.zeros(0, dtype=np.float32)
+        gt_inds = np.zeros(0, dtype=np.int64)
+
+    # go down dets and mark TPs and FPs of all thresholds at once. A det is
+    # a TP if its max iou is above the threshold (in the dtype of the ious)
+    # and no det of a higher score has matched the same gt, otherwise a FP.
+    thresholds = np.array(iou_thr, dtype=ious_max.dtype)
+    thr_inds, det_inds = np.nonzero(ious_max > thresholds[:, np.newaxis])
+    _, first_inds = np.unique(
+        thr_inds * npos + gt_inds[det_inds], return_index=True)
+    tp_thr = np.zeros((len(iou_thr), nd))
+    tp_thr[thr_inds[first_inds], det_inds[first_inds]] = 1.
+    fp_thr = 1. - tp_thr
 
     ret = []
     for iou_idx, thresh in enumerate(iou_thr):
@@ -234,10 +217,13 @@ def indoor_eval(gt_annos,
     for img_id in range(len(dt_annos)):
         # parse detected annotations
         det_anno = dt_annos[img_id]
-        for i in range(len(det_anno['labels_3d'])):
-            label = det_anno['labels_3d'].numpy()[i]
-            bbox = det_anno['boxes_3d'].convert_to(box_mode_3d)[i]
-            score = det_anno['scores_3d'].numpy()[i]
+        det_labels = det_anno['labels_3d'].numpy()
+        det_boxes = det_anno['boxes_3d'].convert_to(box_mode_3d)
+        det_scores = det_anno['scores_3d'].numpy()
+        for i in range(len(det_labels)):
+            label = det_labels[i]
+            bbox = det_boxes[i]
+            score = det_scores[i]
             if label not in pred:
                 pred[int(label)] = {}
             if img_id not in pred[label]:
@@ -114,9 +114,10 @@ def image_box_overlap(boxes, query_boxes, criterion=-1):
     return overlaps
 
 
-def bev_box_overlap(boxes, qboxes, criterion=-1):
-    from .rotate_iou import rotate_iou_gpu_eval
-    riou = rotate_iou_gpu_eval(boxes, qboxes, criterion)
+def bev_box_overlap(boxes, qboxes, criterion=-1, use_gpu=True):
+    from .rotate_iou import rotate_iou_cpu_eval, rotate_iou_gpu_eval
+    rotate_iou_eval = rotate_iou_gpu_eval if use_gpu else rotate_iou_cpu_eval
+    riou = rotate_iou_eval(boxes, qboxes, criterion)
     return riou
 
 
@@ -152,10 +153,11 @@ def d3_box_overlap_kernel(boxes, qboxes, rinc, criterion=-1):
                     rinc[i, j] = 0.0
 
 
-def d3_box_overlap(boxes, qboxes, criterion=-1):
-    from .rotate_iou import rotate_iou_gpu_eval
-    rinc = rotate_iou_gpu_eval(boxes[:, [0, 2, 3, 5, 6]],
-                               qboxes[:, [0, 2, 3, 5, 6]], 2)
+def d3_box_overlap(boxes, qboxes, criterion=-1, use_gpu=True):
+    from .rotate_iou import rotate_iou_cpu_eval, rotate_iou_gpu_eval
+    rotate_iou_eval = rotate_iou_gpu_eval if use_gpu else rotate_iou_cpu_eval
+    rinc = rotate_iou_eval(boxes[:, [0, 2, 3, 5, 6]],
+                           qboxes[:, [0, 2, 3, 5, 6]], 2)
     d3_box_overlap_kernel(boxes, qboxes, rinc, criterion)
     return rinc
 
@@ -340,7 +342,11 @@ def fused_compute_statistics(overlaps,
         dc_num += dc_nums[i]
 
 
-def calculate_iou_partly(gt_annos, dt_annos, metric, num_parts=50):
+def calculate_iou_partly(gt_annos,
+                         dt_annos,
+                         metric,
+                         num_parts=50,
+                         use_gpu=None):
     """Fast iou algorithm. this function can be used independently to do result
     analysis. Must be used in CAMERA coordinate system.
 
@@ -349,8 +355,14 @@ def calculate_iou_partly(gt_annos, dt_annos, metric, num_parts=50):
         dt_annos (dict): Must from get_label_annos() in kitti_common.py.
         metric (int): Eval type. 0: bbox, 1: bev, 2: 3d.
         num_parts (int): A parameter for fast calculate algorithm.
+        use_gpu (bool, optional): Whether to compute the rotated iou of bev
+            and 3d boxes on the gpu. Defaults to None, using the gpu if
+            there is one and the parallel cpu backend otherwise.
     """
     assert len(gt_annos) == len(dt_annos)
+    if use_gpu is None:
+        from numba import cuda
+        use_gpu = cuda.is_available()
     total_dt_num = np.stack([len(a['name']) for a in dt_annos], 0)
     total_gt_num = np.stack([len(a['name']) for a in gt_annos], 0)
     num_examples = len(gt_annos)
@@ -380,8 +392,8 @@ def calculate_iou_partly(gt_annos, dt_annos, metric, num_parts=50):
             rots = np.concatenate([a['rotation_y'] for a in dt_annos_part], 0)
             dt_boxes = np.concatenate([loc, dims, rots[..., np.newaxis]],
                                       axis=1)
-            overlap_part = bev_box_overlap(gt_boxes,
-                                           dt_boxes).astype(np.float64)
+            overlap_part = bev_box_overlap(
+                gt_boxes, dt_boxes, use_gpu=use_gpu).astype(np.float64)
         elif metric == 2:
             loc = np.concatenate([a['location'] for a in gt_annos_part], 0)
             dims = np.concatenate([a['dimensions'] for a in gt_annos_part], 0)
@@ -393,8 +405,8 @@ def calculate_iou_partly(gt_annos, dt_annos, metric, num_parts=50):
             rots = np.concatenate([a['rotation_y'] for a in dt_annos_part], 0)
             dt_boxes = np.concatenate([loc, dims, rots[..., np.newaxis]],
                                       axis=1)
-            overlap_part = d3_box_overlap(gt_boxes,
-                                          dt_boxes).astype(np.float64)
+            overlap_part = d3_box_overlap(
+                gt_boxes, dt_boxes, use_gpu=use_gpu).astype(np.float64)
         else:
             raise ValueError('unknown metric')
         parted_overlaps.append(overlap_part)
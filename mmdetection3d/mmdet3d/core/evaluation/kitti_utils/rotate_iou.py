@@ -277,9 +277,9 @@ def devRotateIoUEval(rbox1, rbox2, criterion=-1):
         return area_inter
 
 
-@cuda.jit(
-    '(int64, int64, float32[:], float32[:], float32[:], int32)',
-    fastmath=False)
+# compiled lazily at the first launch, so that the module and its cpu
+# backend can be imported on machines without cuda
+@cuda.jit(fastmath=False)
 def rotate_iou_kernel_eval(N,
                            K,
                            dev_boxes,
@@ -377,3 +377,247 @@ def rotate_iou_gpu_eval(boxes, query_boxes, criterion=-1, device_id=0):
                                        iou_dev, criterion)
         iou_dev.copy_to_host(iou.reshape([-1]), stream=stream)
     return iou.astype(boxes.dtype)
+
+
+# The CPU backend below mirrors the device functions above with njit
+# functions, the scratch arrays are allocated once per row of boxes.
+@numba.njit(inline='always')
+def trangle_area_cpu(a0, a1, b0, b1, c0, c1):
+    return ((a0 - c0) * (b1 - c1) - (a1 - c1) * (b0 - c0)) / 2.0
+
+
+@numba.njit
+def area_cpu(int_pts, num_of_inter):
+    area_val = 0.0
+    for i in range(num_of_inter - 2):
+        area_val += abs(
+            trangle_area_cpu(int_pts[0], int_pts[1], int_pts[2 * i + 2],
+                             int_pts[2 * i + 3], int_pts[2 * i + 4],
+                             int_pts[2 * i + 5]))
+    return area_val
+
+
+@numba.njit
+def sort_vertex_in_convex_polygon_cpu(int_pts, num_of_inter, vs):
+    if num_of_inter > 0:
+        center0 = numba.float32(0.0)
+        center1 = numba.float32(0.0)
+        for i in range(num_of_inter):
+            center0 += int_pts[2 * i]
+            center1 += int_pts[2 * i + 1]
+        center0 = numba.float32(center0 / num_of_inter)
+        center1 = numba.float32(center1 / num_of_inter)
+        for i in range(num_of_inter):
+            v0 = int_pts[2 * i] - center0
+            v1 = int_pts[2 * i + 1] - center1
+            d = math.sqrt(v0 * v0 + v1 * v1)
+            v0 = v0 / d
+            v1 = v1 / d
+            if v1 < 0:
+                v0 = -2 - v0
+            vs[i] = v0
+        for i in range(1, num_of_inter):
+            if vs[i - 1] > vs[i]:
+                temp = vs[i]
+                tx = int_pts[2 * i]
+                ty = int_pts[2 * i + 1]
+                j = i
+                while j > 0 and vs[j - 1] > temp:
+                    vs[j] = vs[j - 1]
+                    int_pts[j * 2] = int_pts[j * 2 - 2]
+                    int_pts[j * 2 + 1] = int_pts[j * 2 - 1]
+                    j -= 1
+
+                vs[j] = temp
+                int_pts[j * 2] = tx
+                int_pts[j * 2 + 1] = ty
+
+
+@numba.njit
+def line_segment_intersection_cpu(pts1, pts2, i, j, temp_pts):
+    A0 = pts1[2 * i]
+    A1 = pts1[2 * i + 1]
+    B0 = pts1[2 * ((i + 1) % 4)]
+    B1 = pts1[2 * ((i + 1) % 4) + 1]
+    C0 = pts2[2 * j]
+    C1 = pts2[2 * j + 1]
+    D0 = pts2[2 * ((j + 1) % 4)]
+    D1 = pts2[2 * ((j + 1) % 4) + 1]
+    BA0 = B0 - A0
+    BA1 = B1 - A1
+    DA0 = D0 - A0
+    CA0 = C0 - A0
+    DA1 = D1 - A1
+    CA1 = C1 - A1
+    acd = DA1 * CA0 > CA1 * DA0
+    bcd = (D1 - B1) * (C0 - B0) > (C1 - B1) * (D0 - B0)
+    if acd != bcd:
+        abc = CA1 * BA0 > BA1 * CA0
+        abd = DA1 * BA0 > BA1 * DA0
+        if abc != abd:
+            DC0 = D0 - C0
+            DC1 = D1 - C1
+            ABBA = A0 * B1 - B0 * A1
+            CDDC = C0 * D1 - D0 * C1
+            DH = BA1 * DC0 - BA0 * DC1
+            Dx = ABBA * DC0 - BA0 * CDDC
+            Dy = ABBA * DC1 - BA1 * CDDC
+            temp_pts[0] = Dx / DH
+            temp_pts[1] = Dy / DH
+            return True
+    return False
+
+
+@numba.njit(inline='always')
+def point_in_quadrilateral_cpu(pt_x, pt_y, corners):
+    ab0 = corners[2] - corners[0]
+    ab1 = corners[3] - corners[1]
+
+    ad0 = corners[6] - corners[0]
+    ad1 = corners[7] - corners[1]
+
+    ap0 = pt_x - corners[0]
+    ap1 = pt_y - corners[1]
+
+    abab = ab0 * ab0 + ab1 * ab1
+    abap = ab0 * ap0 + ab1 * ap1
+    adad = ad0 * ad0 + ad1 * ad1
+    adap = ad0 * ap0 + ad1 * ap1
+
+    return abab >= abap and abap >= 0 and adad >= adap and adap >= 0
+
+
+@numba.njit
+def quadrilateral_intersection_cpu(pts1, pts2, int_pts, temp_pts):
+    num_of_inter = 0
+    for i in range(4):
+        if point_in_quadrilateral_cpu(pts1[2 * i], pts1[2 * i + 1], pts2):
+            int_pts[num_of_inter * 2] = pts1[2 * i]
+            int_pts[num_of_inter * 2 + 1] = pts1[2 * i + 1]
+            num_of_inter += 1
+        if point_in_quadrilateral_cpu(pts2[2 * i], pts2[2 * i + 1], pts1):
+            int_pts[num_of_inter * 2] = pts2[2 * i]
+            int_pts[num_of_inter * 2 + 1] = pts2[2 * i + 1]
+            num_of_inter += 1
+    for i in range(4):
+        for j in range(4):
+            has_pts = line_segment_intersection_cpu(pts1, pts2, i, j,
+                                                    temp_pts)
+            if has_pts:
+                int_pts[num_of_inter * 2] = temp_pts[0]
+                int_pts[num_of_inter * 2 + 1] = temp_pts[1]
+                num_of_inter += 1
+
+    return num_of_inter
+
+
+@numba.njit
+def rbbox_to_corners_cpu(corners, rbbox):
+    # generate clockwise corners and rotate it clockwise
+    angle = rbbox[4]
+    a_cos = math.cos(angle)
+    a_sin = math.sin(angle)
+    center_x = rbbox[0]
+    center_y = rbbox[1]
+    x_d = rbbox[2]
+    y_d = rbbox[3]
+    for i in range(4):
+        corner_x = numba.float32(x_d / 2 if i >= 2 else -x_d / 2)
+        corner_y = numba.float32(y_d / 2 if i == 1 or i == 2 else -y_d / 2)
+        corners[2 * i] = a_cos * corner_x + a_sin * corner_y + center_x
+        corners[2 * i + 1] = -a_sin * corner_x + a_cos * corner_y + center_y
+
+
+@numba.njit(parallel=True, error_model='numpy')
+def rotate_iou_kernel_eval_cpu(boxes, query_boxes, iou, criterion=-1):
+    """CPU kernel of computing rotated IoU, parallel over the boxes.
+
+    Pairs whose axis aligned bounding boxes do not overlap have no
+    intersection and are skipped.
+
+    Args:
+        boxes (np.ndarray): Boxes with the shape of [N, 5].
+        query_boxes (np.ndarray): Query boxes with the shape of [K, 5].
+        iou (np.ndarray): Computed iou to return with the shape of [N, K],
+            zero initialized.
+        criterion (int, optional): Indicate different type of iou.
+            -1 indicate `area_inter / (area1 + area2 - area_inter)`,
+            0 indicate `area_inter / area1`,
+            1 indicate `area_inter / area2`.
+    """
+    N, K = boxes.shape[0], query_boxes.shape[0]
+    # half extents of the axis aligned bounding boxes
+    box_ext = np.empty((N, 2), dtype=np.float32)
+    for n in range(N):
+        a_cos = abs(math.cos(boxes[n, 4]))
+        a_sin = abs(math.sin(boxes[n, 4]))
+        box_ext[n, 0] = (a_cos * boxes[n, 2] + a_sin * boxes[n, 3]) / 2
+        box_ext[n, 1] = (a_sin * boxes[n, 2] + a_cos * boxes[n, 3]) / 2
+    query_ext = np.empty((K, 2), dtype=np.float32)
+    for k in range(K):
+        a_cos = abs(math.cos(query_boxes[k, 4]))
+        a_sin = abs(math.sin(query_boxes[k, 4]))
+        query_ext[k, 0] = (a_cos * query_boxes[k, 2] +
+                           a_sin * query_boxes[k, 3]) / 2
+        query_ext[k, 1] = (a_sin * query_boxes[k, 2] +
+                           a_cos * query_boxes[k, 3]) / 2
+    for n in numba.prange(N):
+        corners1 = np.empty(8, dtype=np.float32)
+        box_corners = np.empty(8, dtype=np.float32)
+        intersection_corners = np.empty(16, dtype=np.float32)
+        temp_pts = np.empty(2, dtype=np.float32)
+        vs = np.empty(16, dtype=np.float32)
+        rbbox_to_corners_cpu(box_corners, boxes[n])
+        for k in range(K):
+            # the margin keeps the pairs touching within rounding errors
+            if (abs(boxes[n, 0] - query_boxes[k, 0]) >
+                    (box_ext[n, 0] + query_ext[k, 0]) * 1.001 or
+                    abs(boxes[n, 1] - query_boxes[k, 1]) >
+                    (box_ext[n, 1] + query_ext[k, 1]) * 1.001):
+                continue
+            # same argument order as rotate_iou_kernel_eval
+            rbbox_to_corners_cpu(corners1, query_boxes[k])
+            num_intersection = quadrilateral_intersection_cpu(
+                corners1, box_corners, intersection_corners, temp_pts)
+            sort_vertex_in_convex_polygon_cpu(intersection_corners,
+                                              num_intersection, vs)
+            area_inter = area_cpu(intersection_corners, num_intersection)
+            area1 = query_boxes[k, 2] * query_boxes[k, 3]
+            area2 = boxes[n, 2] * boxes[n, 3]
+            if criterion == -1:
+                iou[n, k] = area_inter / (area1 + area2 - area_inter)
+            elif criterion == 0:
+                iou[n, k] = area_inter / area1
+            elif criterion == 1:
+                iou[n, k] = area_inter / area2
+            else:
+                iou[n, k] = area_inter
+
+
+def rotate_iou_cpu_eval(boxes, query_boxes, criterion=-1):
+    """Rotated box iou running in parallel on cpu, the same as
+    :func:`rotate_iou_gpu_eval` for machines without a gpu.
+
+    This function is for bev boxes in camera coordinate system ONLY
+    (the rotation is clockwise).
+
+    Args:
+        boxes (np.ndarray): rbboxes. format: centers, dims,
+            angles(clockwise when positive) with the shape of [N, 5].
+        query_boxes (np.ndarray, shape=(K, 5)):
+            rbboxes to compute iou with boxes.
+        criterion (int, optional): Indicate different type of iou.
+            -1 indicate `area_inter / (area1 + area2 - area_inter)`,
+            0 indicate `area_inter / area1`,
+            1 indicate `area_inter / area2`.
+
+    Returns:
+        np.ndarray: IoU results.
+    """
+    boxes = np.ascontiguousarray(boxes, dtype=np.float32)
+    query_boxes = np.ascontiguousarray(query_boxes, dtype=np.float32)
+    iou = np.zeros((boxes.shape[0], query_boxes.shape[0]), dtype=np.float32)
+    if iou.size == 0:
+        return iou
+    rotate_iou_kernel_eval_cpu(boxes, query_boxes, iou, criterion)
+    return iou
@@ -12,13 +12,20 @@ class VoxelGenerator(object):
         max_num_points (int): Maximum number of points in a single voxel
         max_voxels (int, optional): Maximum number of voxels.
             Defaults to 20000.
+        engine (str, optional): Engine of the voxelization, 'numba' for the
+            point by point numba kernel or 'numpy' for the sort based
+            grouping of :func:`points_to_voxel_sorted`. Both give the same
+            voxels. Defaults to 'numba'.
     """
 
     def __init__(self,
                  voxel_size,
                  point_cloud_range,
                  max_num_points,
-                 max_voxels=20000):
+                 max_voxels=20000,
+                 engine='numba'):
+        assert engine in ('numba', 'numpy'), \
+            f'Unsupported voxelization engine {engine}'
 
         point_cloud_range = np.array(point_cloud_range, dtype=np.float32)
         # [0, -40, -3, 70.4, 40, 1]
@@ -32,13 +39,32 @@ class VoxelGenerator(object):
         self._max_num_points = max_num_points
         self._max_voxels = max_voxels
         self._grid_size = grid_size
+        self._engine = engine
 
     def generate(self, points):
         """Generate voxels given points."""
+        if self._engine == 'numpy':
+            return points_to_voxel_sorted(points, self._voxel_size,
+                                          self._point_cloud_range,
+                                          self._max_num_points, True,
+                                          self._max_voxels)
         return points_to_voxel(points, self._voxel_size,
                                self._point_cloud_range, self._max_num_points,
                                True, self._max_voxels)
 
+    def generate_dynamic(self, points):
+        """Generate the voxel coordinates of every point for dynamic voxels.
+
+        Args:
+            points (np.ndarray): [N, ndim]. points[:, :3] contain xyz points.
+
+        Returns:
+            np.ndarray: [N, 3] int32 zyx coordinates of the voxel of each
+                point, -1 for the points out of the point cloud range.
+        """
+        return dynamic_points_to_voxel(points, self._voxel_size,
+                                       self._point_cloud_range, True)
+
     @property
     def voxel_size(self):
         """list[float]: Size of a single voxel."""
@@ -134,6 +160,120 @@ def points_to_voxel(points,
     return voxels, coors, num_points_per_voxel
 
 
+def _points_to_voxel_coors(points, voxel_size, coors_range):
+    """Get the xyz voxel coordinates of points and whether they are in range.
+
+    Returns:
+        tuple[np.ndarray]:
+            coors: [N, 3] int32 xyz voxel coordinates.
+            valid: [N] bool mask of the points in the voxel range.
+            grid_size: [3] int32 xyz size of the voxel grid.
+    """
+    if not isinstance(voxel_size, np.ndarray):
+        voxel_size = np.array(voxel_size, dtype=points.dtype)
+    if not isinstance(coors_range, np.ndarray):
+        coors_range = np.array(coors_range, dtype=points.dtype)
+    grid_size = (coors_range[3:] - coors_range[:3]) / voxel_size
+    grid_size = np.round(grid_size).astype(np.int32)
+    # same arithmetic as the numba kernels so that boundary points agree
+    coors = np.floor((points[:, :3] - coors_range[:3]) / voxel_size)
+    valid = np.all((coors >= 0) & (coors < grid_size), axis=1)
+    return coors.astype(np.int32), valid, grid_size
+
+
+def points_to_voxel_sorted(points,
+                           voxel_size,
+                           coors_range,
+                           max_points=35,
+                           reverse_index=True,
+                           max_voxels=20000):
+    """Vectorized version of :func:`points_to_voxel`.
+
+    Instead of visiting the points one by one, the points are grouped by a
+    stable sort of the linear index of their voxels. Voxels are numbered by
+    the first point falling into them and points of a voxel keep their
+    order, so the same voxels and points as :func:`points_to_voxel` are
+    kept under the ``max_voxels`` and ``max_points`` truncation.
+
+    Args:
+        points (np.ndarray): [N, ndim]. points[:, :3] contain xyz points and
+            points[:, 3:] contain other information such as reflectivity.
+        voxel_size (list, tuple, np.ndarray): [3] xyz, indicate voxel size
+        coors_range (list[float | tuple[float] | ndarray]): Voxel range.
+            format: xyzxyz, minmax
+        max_points (int): Indicate maximum points contained in a voxel.
+        reverse_index (bool): Whether return reversed coordinates.
+            if points has xyz format and reverse_index is True, output
+            coordinates will be zyx format, but points in features always
+            xyz format.
+        max_voxels (int): Maximum number of voxels this function creates.
+
+    Returns:
+        tuple[np.ndarray]:
+            voxels: [M, max_points, ndim] float tensor. only contain points.
+            coordinates: [M, 3] int32 tensor.
+            num_points_per_voxel: [M] int32 tensor.
+    """
+    coors, valid, grid_size = _points_to_voxel_coors(points, voxel_size,
+                                                     coors_range)
+    point_inds = np.flatnonzero(valid)
+    coors = coors[point_inds]
+    keys = (coors[:, 2].astype(np.int64) * grid_size[1] +
+            coors[:, 1]) * grid_size[0] + coors[:, 0]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    is_start = np.ones(sorted_keys.shape[0], dtype=bool)
+    is_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    starts = np.flatnonzero(is_start)
+    group = np.cumsum(is_start) - 1
+    # position of every point in its voxel
+    point_pos = np.arange(sorted_keys.shape[0]) - starts[group]
+    # number the voxels by their first point
+    first_points = order[starts]
+    voxel_order = np.argsort(first_points)
+    voxel_inds = np.empty_like(voxel_order)
+    voxel_inds[voxel_order] = np.arange(voxel_order.shape[0])
+    voxel_num = min(voxel_order.shape[0], max_voxels)
+
+    point_voxel_inds = voxel_inds[group]
+    kept = (point_voxel_inds < voxel_num) & (point_pos < max_points)
+    voxels = np.zeros(
+        shape=(voxel_num, max_points, points.shape[-1]), dtype=points.dtype)
+    voxels[point_voxel_inds[kept],
+           point_pos[kept]] = points[point_inds[order[kept]]]
+    num_points = np.diff(np.append(starts, sorted_keys.shape[0]))
+    num_points_per_voxel = np.minimum(num_points[voxel_order[:voxel_num]],
+                                      max_points).astype(np.int32)
+    coors = coors[first_points[voxel_order[:voxel_num]]]
+    if reverse_index:
+        coors = coors[:, ::-1]
+    return voxels, np.ascontiguousarray(coors), num_points_per_voxel
+
+
+def dynamic_points_to_voxel(points,
+                            voxel_size,
+                            coors_range,
+                            reverse_index=True):
+    """Get the voxel coordinates of every point for dynamic voxelization.
+
+    Args:
+        points (np.ndarray): [N, ndim]. points[:, :3] contain xyz points.
+        voxel_size (list, tuple, np.ndarray): [3] xyz, indicate voxel size
+        coors_range (list[float | tuple[float] | ndarray]): Voxel range.
+            format: xyzxyz, minmax
+        reverse_index (bool): Whether return zyx coordinates instead of xyz.
+
+    Returns:
+        np.ndarray: [N, 3] int32 coordinates of the voxel of each point,
+            -1 for the points out of the voxel range.
+    """
+    coors, valid, _ = _points_to_voxel_coors(points, voxel_size, coors_range)
+    coors[~valid] = -1
+    if reverse_index:
+        coors = coors[:, ::-1]
+    return np.ascontiguousarray(coors)
+
+
 @numba.jit(nopython=True)
 def _points_to_voxel_reverse_kernel(points,
                                     voxel_size,
@@ -1,6 +1,15 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import collections
+import glob
+import os
+import time
+import tracemalloc
+from multiprocessing import util
+from os import path as osp
 
+import mmcv
+import numpy as np
+import torch
 from mmcv.utils import build_from_cfg
 
 from mmdet.datasets.builder import PIPELINES as MMDET_PIPELINES
@@ -58,3 +67,162 @@ class Compose:
             format_string += f'    {t}'
         format_string += '\n)'
         return format_string
+
+
+def _nbytes(data):
+    """Number of bytes of the arrays and tensors in data."""
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, torch.Tensor):
+        return data.element_size() * data.numel()
+    if isinstance(data, dict):
+        return sum(_nbytes(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return sum(_nbytes(value) for value in data)
+    # points, boxes and data containers
+    for attr in ['tensor', '_data']:
+        if hasattr(data, attr):
+            return _nbytes(getattr(data, attr))
+    return 0
+
+
+@PIPELINES.register_module()
+class ProfileCompose(Compose):
+    """Compose multiple transforms sequentially and profile every transform.
+
+    The wall time, the memory allocated and the size of the output of every
+    transform are recorded for every sample. Every process, e.g. every
+    worker of a dataloader, keeps its own records and dumps them to
+    ``{out_dir}/pipeline_profile_{pid}.pkl`` every ``dump_interval`` samples
+    and when it exits. Use :meth:`load` and :meth:`summarize` to aggregate
+    the records of all the processes into a report.
+
+    Args:
+        transforms (Sequence[dict | callable]): Sequence of transform object or
+            config dict to be composed.
+        out_dir (str, optional): Directory to dump the records to. If None,
+            the records are only kept in ``records``. Defaults to None.
+        dump_interval (int, optional): Interval of samples to dump the
+            records. Defaults to 50.
+        trace_memory (bool, optional): Whether to trace the peak memory
+            allocated in every transform with :mod:`tracemalloc`, which
+            covers Python objects and numpy arrays but not torch tensors,
+            and slows down the transforms. Defaults to False.
+    """
+
+    def __init__(self,
+                 transforms,
+                 out_dir=None,
+                 dump_interval=50,
+                 trace_memory=False):
+        super().__init__(transforms)
+        self.names = [
+            f'{i}.{type(t).__name__}' for i, t in enumerate(self.transforms)
+        ]
+        self.out_dir = out_dir
+        self.dump_interval = dump_interval
+        self.trace_memory = trace_memory
+        if out_dir is not None:
+            mmcv.mkdir_or_exist(out_dir)
+        self._pid = None
+
+    def _init_process(self):
+        """Reset the records copied from the parent in a new process."""
+        self._pid = os.getpid()
+        self.records = {name: [] for name in self.names}
+        self.num_samples = 0
+        if self.out_dir is not None:
+            util.Finalize(self, self._dump_at_exit, exitpriority=10)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, data):
+        """Call function to apply and profile transforms sequentially.
+
+        Args:
+            data (dict): A result dict contains the data to transform.
+
+        Returns:
+           dict: Transformed data.
+        """
+        if self._pid != os.getpid():
+            self._init_process()
+        for name, t in zip(self.names, self.transforms):
+            if self.trace_memory:
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+                start_memory = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            data = t(data)
+            seconds = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[1] - start_memory \
+                if self.trace_memory else 0
+            self.records[name].append((seconds, memory, _nbytes(data)))
+            if data is None:
+                break
+        self.num_samples += 1
+        if self.out_dir is not None and \
+                self.num_samples % self.dump_interval == 0:
+            self.dump()
+        return data
+
+    def dump(self):
+        """Dump the records of the current process."""
+        if self._pid == os.getpid():
+            mmcv.dump(
+                self.records,
+                osp.join(self.out_dir, f'pipeline_profile_{self._pid}.pkl'))
+
+    def _dump_at_exit(self):
+        """Dump the records unless the directory was removed meanwhile."""
+        if osp.isdir(self.out_dir):
+            self.dump()
+
+    @staticmethod
+    def load(out_dir):
+        """Load and merge the records dumped by all the processes.
+
+        Args:
+            out_dir (str): Directory of the dumped records.
+
+        Returns:
+            dict[str, list[tuple]]: Wall time in seconds, allocated memory and
+                output size in bytes of every call of every transform.
+        """
+        records = dict()
+        for path in sorted(
+                glob.glob(osp.join(out_dir, 'pipeline_profile_*.pkl'))):
+            for name, calls in mmcv.load(path).items():
+                records.setdefault(name, []).extend(calls)
+        return records
+
+    @staticmethod
+    def summarize(records):
+        """Summarize the records to a report of the p50 and p95 per transform.
+
+        Args:
+            records (dict[str, list[tuple]]): Records of the transforms.
+
+        Returns:
+            str: Report of the transforms.
+        """
+        total = sum(sum(call[0] for call in calls)
+                    for calls in records.values())
+        lines = [
+            f'{"transform":<32} {"calls":>7} {"p50 ms":>9} {"p95 ms":>9} '
+            f'{"time %":>7} {"p50 alloc MB":>13} {"p95 alloc MB":>13} '
+            f'{"p50 out MB":>11}'
+        ]
+        for name, calls in records.items():
+            if len(calls) == 0:
+                continue
+            calls = np.array(calls, dtype=np.float64)
+            seconds, memory, nbytes = calls.T
+            p50_ms, p95_ms = np.percentile(seconds, [50, 95]) * 1000
+            p50_memory, p95_memory = np.percentile(memory, [50, 95]) / 2**20
+            lines.append(
+                f'{name[:32]:<32} {len(calls):>7} {p50_ms:9.2f} {p95_ms:9.2f} '
+                f'{seconds.sum() / max(total, 1e-12) * 100:7.1f} '
+                f'{p50_memory:13.2f} {p95_memory:13.2f} '
+                f'{np.median(nbytes) / 2**20:11.2f}')
+        return '\n'.join(lines)
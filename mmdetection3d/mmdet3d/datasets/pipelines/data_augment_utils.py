@@ -28,6 +28,84 @@ def _rotation_box2d_jit_(corners, angle, rot_mat_T):
     corners[:] = corners @ rot_mat_T
 
 
+@numba.njit
+def _box_collision(boxes, qboxes, lines_boxes, lines_qboxes, i, j,
+                   clockwise):
+    """Collision test of a pair of boxes whose standup boxes overlap.
+
+    Args:
+        boxes (np.ndarray): Corners of current boxes.
+        qboxes (np.ndarray): Boxes to be avoid colliding.
+        lines_boxes (np.ndarray): Edges of current boxes.
+        lines_qboxes (np.ndarray): Edges of boxes to be avoid colliding.
+        i (int): Index of the current box.
+        j (int): Index of the box to be avoid colliding.
+        clockwise (bool): Whether the corners are in clockwise order.
+
+    Returns:
+        bool: Whether the boxes collide.
+    """
+    collision = False
+    for k in range(4):
+        for box_l in range(4):
+            A_x, A_y = lines_boxes[i, k, 0, 0], lines_boxes[i, k, 0, 1]
+            B_x, B_y = lines_boxes[i, k, 1, 0], lines_boxes[i, k, 1, 1]
+            C_x, C_y = lines_qboxes[j, box_l, 0, 0], lines_qboxes[j, box_l, 0,
+                                                                  1]
+            D_x, D_y = lines_qboxes[j, box_l, 1, 0], lines_qboxes[j, box_l, 1,
+                                                                  1]
+            acd = (D_y - A_y) * (C_x - A_x) > (C_y - A_y) * (D_x - A_x)
+            bcd = (D_y - B_y) * (C_x - B_x) > (C_y - B_y) * (D_x - B_x)
+            if acd != bcd:
+                abc = (C_y - A_y) * (B_x - A_x) > (B_y - A_y) * (C_x - A_x)
+                abd = (D_y - A_y) * (B_x - A_x) > (B_y - A_y) * (D_x - A_x)
+                if abc != abd:
+                    collision = True  # collision.
+                    break
+        if collision is True:
+            break
+    if collision is False:
+        # now check complete overlap.
+        # box overlap qbox:
+        box_overlap_qbox = True
+        for box_l in range(4):  # point l in qboxes
+            for k in range(4):  # corner k in boxes
+                vec_x = boxes[i, k, 0] - boxes[i, (k + 1) % 4, 0]
+                vec_y = boxes[i, k, 1] - boxes[i, (k + 1) % 4, 1]
+                if clockwise:
+                    vec_x = -vec_x
+                    vec_y = -vec_y
+                cross = vec_y * (boxes[i, k, 0] - qboxes[j, box_l, 0])
+                cross -= vec_x * (boxes[i, k, 1] - qboxes[j, box_l, 1])
+                if cross >= 0:
+                    box_overlap_qbox = False
+                    break
+            if box_overlap_qbox is False:
+                break
+
+        if box_overlap_qbox is False:
+            qbox_overlap_box = True
+            for box_l in range(4):  # point box_l in boxes
+                for k in range(4):  # corner k in qboxes
+                    vec_x = qboxes[j, k, 0] - qboxes[j, (k + 1) % 4, 0]
+                    vec_y = qboxes[j, k, 1] - qboxes[j, (k + 1) % 4, 1]
+                    if clockwise:
+                        vec_x = -vec_x
+                        vec_y = -vec_y
+                    cross = vec_y * (qboxes[j, k, 0] - boxes[i, box_l, 0])
+                    cross -= vec_x * (qboxes[j, k, 1] - boxes[i, box_l, 1])
+                    if cross >= 0:  #
+                        qbox_overlap_box = False
+                        break
+                if qbox_overlap_box is False:
+                    break
+            if qbox_overlap_box:
+                collision = True  # collision.
+        else:
+            collision = True  # collision.
+    return collision
+
+
 @numba.jit(nopython=True)
 def box_collision_test(boxes, qboxes, clockwise=True):
     """Box collision test.
@@ -45,7 +123,6 @@ def box_collision_test(boxes, qboxes, clockwise=True):
     lines_boxes = np.stack((boxes, boxes[:, slices, :]),
                            axis=2)  # [N, 4, 2(line), 2(xy)]
     lines_qboxes = np.stack((qboxes, qboxes[:, slices, :]), axis=2)
-    # vec = np.zeros((2,), dtype=boxes.dtype)
     boxes_standup = box_np_ops.corner_to_standup_nd_jit(boxes)
     qboxes_standup = box_np_ops.corner_to_standup_nd_jit(qboxes)
     for i in range(N):
@@ -59,72 +136,129 @@ def box_collision_test(boxes, qboxes, clockwise=True):
                     min(boxes_standup[i, 3], qboxes_standup[j, 3]) -
                     max(boxes_standup[i, 1], qboxes_standup[j, 1]))
                 if ih > 0:
-                    for k in range(4):
-                        for box_l in range(4):
-                            A = lines_boxes[i, k, 0]
-                            B = lines_boxes[i, k, 1]
-                            C = lines_qboxes[j, box_l, 0]
-                            D = lines_qboxes[j, box_l, 1]
-                            acd = (D[1] - A[1]) * (C[0] -
-                                                   A[0]) > (C[1] - A[1]) * (
-                                                       D[0] - A[0])
-                            bcd = (D[1] - B[1]) * (C[0] -
-                                                   B[0]) > (C[1] - B[1]) * (
-                                                       D[0] - B[0])
-                            if acd != bcd:
-                                abc = (C[1] - A[1]) * (B[0] - A[0]) > (
-                                    B[1] - A[1]) * (
-                                        C[0] - A[0])
-                                abd = (D[1] - A[1]) * (B[0] - A[0]) > (
-                                    B[1] - A[1]) * (
-                                        D[0] - A[0])
-                                if abc != abd:
-                                    ret[i, j] = True  # collision.
-                                    break
-                        if ret[i, j] is True:
-                            break
-                    if ret[i, j] is False:
-                        # now check complete overlap.
-                        # box overlap qbox:
-                        box_overlap_qbox = True
-                        for box_l in range(4):  # point l in qboxes
-                            for k in range(4):  # corner k in boxes
-                                vec = boxes[i, k] - boxes[i, (k + 1) % 4]
-                                if clockwise:
-                                    vec = -vec
-                                cross = vec[1] * (
-                                    boxes[i, k, 0] - qboxes[j, box_l, 0])
-                                cross -= vec[0] * (
-                                    boxes[i, k, 1] - qboxes[j, box_l, 1])
-                                if cross >= 0:
-                                    box_overlap_qbox = False
-                                    break
-                            if box_overlap_qbox is False:
-                                break
-
-                        if box_overlap_qbox is False:
-                            qbox_overlap_box = True
-                            for box_l in range(4):  # point box_l in boxes
-                                for k in range(4):  # corner k in qboxes
-                                    vec = qboxes[j, k] - qboxes[j, (k + 1) % 4]
-                                    if clockwise:
-                                        vec = -vec
-                                    cross = vec[1] * (
-                                        qboxes[j, k, 0] - boxes[i, box_l, 0])
-                                    cross -= vec[0] * (
-                                        qboxes[j, k, 1] - boxes[i, box_l, 1])
-                                    if cross >= 0:  #
-                                        qbox_overlap_box = False
-                                        break
-                                if qbox_overlap_box is False:
-                                    break
-                            if qbox_overlap_box:
-                                ret[i, j] = True  # collision.
-                        else:
-                            ret[i, j] = True  # collision.
+                    ret[i, j] = _box_collision(boxes, qboxes, lines_boxes,
+                                               lines_qboxes, i, j, clockwise)
     return ret
 
 
+@numba.njit
+def _box_collision_test_grid(boxes, standup, cells_min, cells_max,
+                             clockwise):
+    """Box collision test of boxes with each other on a grid.
+
+    Args:
+        boxes (np.ndarray): Corners of boxes.
+        standup (np.ndarray): Standup boxes of boxes.
+        cells_min (np.ndarray): Min cells covered by the boxes.
+        cells_max (np.ndarray): Max cells covered by the boxes.
+        clockwise (bool): Whether the corners are in clockwise order.
+
+    Returns:
+        np.ndarray: Pairs of colliding boxes.
+    """
+    num_boxes = boxes.shape[0]
+    num_cols = cells_max[:, 1].max() + 1
+    # bucket the boxes into the cells they cover
+    num_entries = 0
+    for i in range(num_boxes):
+        num_entries += (cells_max[i, 0] - cells_min[i, 0] + 1) * (
+            cells_max[i, 1] - cells_min[i, 1] + 1)
+    keys = np.empty(num_entries, dtype=np.int64)
+    box_inds = np.empty(num_entries, dtype=np.int64)
+    num_entries = 0
+    for i in range(num_boxes):
+        for x in range(cells_min[i, 0], cells_max[i, 0] + 1):
+            for y in range(cells_min[i, 1], cells_max[i, 1] + 1):
+                keys[num_entries] = x * num_cols + y
+                box_inds[num_entries] = i
+                num_entries += 1
+    order = np.argsort(keys, kind='mergesort')
+    keys = keys[order]
+    box_inds = box_inds[order]
+
+    max_pairs = 0
+    start = 0
+    for end in range(1, num_entries + 1):
+        if end == num_entries or keys[end] != keys[start]:
+            max_pairs += (end - start) * (end - start - 1)
+            start = end
+    pairs = np.empty((max_pairs, 2), dtype=np.int64)
+    num_pairs = 0
+    slices = np.array([1, 2, 3, 0])
+    lines_boxes = np.stack((boxes, boxes[:, slices, :]), axis=2)
+    start = 0
+    for end in range(1, num_entries + 1):
+        if end < num_entries and keys[end] == keys[start]:
+            continue
+        cell_x = keys[start] // num_cols
+        cell_y = keys[start] % num_cols
+        for a in range(start, end):
+            i = box_inds[a]
+            for b in range(a + 1, end):
+                j = box_inds[b]
+                iw = (
+                    min(standup[i, 2], standup[j, 2]) -
+                    max(standup[i, 0], standup[j, 0]))
+                ih = (
+                    min(standup[i, 3], standup[j, 3]) -
+                    max(standup[i, 1], standup[j, 1]))
+                # test the pairs of overlapping standup boxes once, in the
+                # cell of the min corner of their intersection
+                if iw > 0 and ih > 0 and max(
+                        cells_min[i, 0], cells_min[j, 0]) == cell_x and max(
+                            cells_min[i, 1], cells_min[j, 1]) == cell_y:
+                    if _box_collision(boxes, boxes, lines_boxes, lines_boxes,
+                                      i, j, clockwise):
+                        pairs[num_pairs, 0] = i
+                        pairs[num_pairs, 1] = j
+                        num_pairs += 1
+                    if _box_collision(boxes, boxes, lines_boxes, lines_boxes,
+                                      j, i, clockwise):
+                        pairs[num_pairs, 0] = j
+                        pairs[num_pairs, 1] = i
+                        num_pairs += 1
+        start = end
+    return pairs[:num_pairs]
+
+
+def box_collision_test_grid(boxes, cell_size=None, clockwise=True):
+    """Box collision test of boxes with each other on a BEV grid.
+
+    The standup boxes are bucketed into the cells of a grid and only the
+    pairs sharing a cell are tested by the polygon test of
+    :func:`box_collision_test`, so the collisions are the same as those of
+    ``box_collision_test(boxes, boxes)`` off its diagonal.
+
+    Args:
+        boxes (np.ndarray): Corners of boxes with shape (N, 4, 2).
+        cell_size (float, optional): Size of the cells. Default: None, the
+            largest side of the standup boxes, so that every box covers
+            at most 2x2 cells.
+        clockwise (bool, optional): Whether the corners are in
+            clockwise order. Default: True.
+
+    Returns:
+        np.ndarray: Pairs (i, j) of colliding boxes sorted by i with shape
+            (M, 2), i.e. ``box_collision_test(boxes, boxes)[i, j]`` is True.
+    """
+    num_boxes = boxes.shape[0]
+    if num_boxes < 2:
+        return np.zeros((0, 2), dtype=np.int64)
+    standup = box_np_ops.corner_to_standup_nd_jit(boxes)
+    if cell_size is None:
+        cell_size = (standup[:, 2:] - standup[:, :2]).max()
+        if not cell_size > 0:
+            cell_size = 1.0
+    cells_min = np.floor(standup[:, :2] / cell_size).astype(np.int64)
+    cells_max = np.floor(standup[:, 2:] / cell_size).astype(np.int64)
+    offset = cells_min.min(0)
+    cells_min -= offset
+    cells_max -= offset
+    pairs = _box_collision_test_grid(boxes, standup, cells_min, cells_max,
+                                     clockwise)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
 @numba.njit
 def noise_per_box(boxes, valid_mask, loc_noises, rot_noises):
     """Add noise to every box (only on the horizontal plane).
@@ -7,6 +7,7 @@ import mmcv
 import numpy as np
 
 from mmdet3d.core.bbox import box_np_ops
+from mmdet3d.core.points import get_points_type
 from mmdet3d.datasets.pipelines import data_augment_utils
 from ..builder import OBJECTSAMPLERS, PIPELINES
 
@@ -93,6 +94,14 @@ class DataBaseSampler(object):
             Default: None.
         points_loader(dict, optional): Config of points loader. Default:
             dict(type='LoadPointsFromFile', load_dim=4, use_dim=[0,1,2,3])
+        packed_db (str, optional): Prefix of the packed database created by
+            ``tools/data_converter/pack_gt_database.py``. If given, the
+            objects and their points are read from the memory-mapped
+            ``{packed_db}_objects.npy`` and ``{packed_db}_points.npy``
+            instead of ``info_path`` and a file per object, and only the
+            ``coord_type``, ``load_dim`` and ``use_dim`` of ``points_loader``
+            are used. The memory maps are opened lazily in every process and
+            are not pickled. Default: None.
     """
 
     def __init__(self,
@@ -108,7 +117,8 @@ class DataBaseSampler(object):
                      coord_type='LIDAR',
                      load_dim=4,
                      use_dim=[0, 1, 2, 3]),
-                 file_client_args=dict(backend='disk')):
+                 file_client_args=dict(backend='disk'),
+                 packed_db=None):
         super().__init__()
         self.data_root = data_root
         self.info_path = info_path
@@ -119,9 +129,14 @@ class DataBaseSampler(object):
         self.label2cat = {i: name for i, name in enumerate(classes)}
         self.points_loader = mmcv.build_from_cfg(points_loader, PIPELINES)
         self.file_client = mmcv.FileClient(**file_client_args)
+        self.packed_db = packed_db
+        self._packed_objects = None
+        self._packed_points = None
 
         # load data base infos
-        if hasattr(self.file_client, 'get_local_path'):
+        if packed_db is not None:
+            db_infos = self._load_packed_db(packed_db)
+        elif hasattr(self.file_client, 'get_local_path'):
             with self.file_client.get_local_path(info_path) as local_path:
                 # loading data from a file-like object needs file format
                 db_infos = mmcv.load(open(local_path, 'rb'), file_format='pkl')
@@ -147,7 +162,16 @@ class DataBaseSampler(object):
         self.db_infos = db_infos
 
         self.bbox_code_size = bbox_code_size
-        if bbox_code_size is not None:
+        if packed_db is not None:
+            # the objects of packed databases are sampled by index
+            self.packed_boxes = np.ascontiguousarray(
+                self.packed_objects['box3d_lidar'][:, :bbox_code_size])
+            self.packed_names = np.array(self.packed_objects['name'])
+            self.db_infos = {
+                k: np.array([info['packed_idx'] for info in v], dtype=np.int64)
+                for k, v in self.db_infos.items()
+            }
+        elif bbox_code_size is not None:
             for k, info_cls in self.db_infos.items():
                 for info in info_cls:
                     info['box3d_lidar'] = info['box3d_lidar'][:self.
@@ -172,6 +196,61 @@ class DataBaseSampler(object):
             self.sampler_dict[k] = BatchSampler(v, k, shuffle=True)
         # TODO: No group_sampling currently
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_packed_objects'] = None
+        state['_packed_points'] = None
+        return state
+
+    @property
+    def packed_objects(self):
+        """np.ndarray: Memory-mapped objects of the packed database."""
+        if self._packed_objects is None:
+            self._packed_objects = np.load(
+                f'{self.packed_db}_objects.npy', mmap_mode='r')
+        return self._packed_objects
+
+    @property
+    def packed_points(self):
+        """np.ndarray: Memory-mapped points of the packed database."""
+        if self._packed_points is None:
+            self._packed_points = np.load(
+                f'{self.packed_db}_points.npy', mmap_mode='r')
+        return self._packed_points
+
+    def _load_packed_db(self, packed_db):
+        """Load a packed database.
+
+        Args:
+            packed_db (str): Prefix of the packed database.
+
+        Returns:
+            dict: Info of groundtruth database, the infos of objects have
+                their index in the packed database as ``packed_idx``.
+        """
+        loader = self.points_loader
+        assert not getattr(loader, 'shift_height', False) and not getattr(
+            loader, 'use_color', False), \
+            'Packed databases do not support shift_height and use_color'
+        assert self.packed_points.shape[1] == loader.load_dim, \
+            f'The points of {packed_db} have {self.packed_points.shape[1]} ' \
+            f'dims, but load_dim is {loader.load_dim}'
+        self.points_class = get_points_type(loader.coord_type)
+        db_infos = {}
+        names = self.packed_objects['name'].tolist()
+        difficulties = self.packed_objects['difficulty'].tolist()
+        num_points_in_gt = self.packed_objects['num_points_in_gt'].tolist()
+        for i, name in enumerate(names):
+            db_infos.setdefault(name, []).append(
+                dict(
+                    name=name,
+                    difficulty=difficulties[i],
+                    num_points_in_gt=num_points_in_gt[i],
+                    packed_idx=i))
+        for name in self.classes:
+            db_infos.setdefault(name, [])
+        return db_infos
+
     @staticmethod
     def filter_by_difficulty(db_infos, removed_difficulty):
         """Filter ground truths by difficulties.
@@ -255,7 +334,9 @@ class DataBaseSampler(object):
 
                 sampled += sampled_cls
                 if len(sampled_cls) > 0:
-                    if len(sampled_cls) == 1:
+                    if self.packed_db is not None:
+                        sampled_gt_box = self.packed_boxes[sampled_cls]
+                    elif len(sampled_cls) == 1:
                         sampled_gt_box = sampled_cls[0]['box3d_lidar'][
                             np.newaxis, ...]
                     else:
@@ -273,20 +354,17 @@ class DataBaseSampler(object):
 
             # num_sampled = len(sampled)
             s_points_list = []
-            count = 0
-            for info in sampled:
-                file_path = os.path.join(
-                    self.data_root,
-                    info['path']) if self.data_root else info['path']
-                results = dict(pts_filename=file_path)
-                s_points = self.points_loader(results)['points']
-                s_points.translate(info['box3d_lidar'][:3])
-
-                count += 1
+            for i, info in enumerate(sampled):
+                s_points = self._load_sampled_points(info)
+                s_points.translate(sampled_gt_bboxes[i, :3])
 
                 s_points_list.append(s_points)
 
-            gt_labels = np.array([self.cat2label[s['name']] for s in sampled],
+            if self.packed_db is not None:
+                names = self.packed_names[sampled]
+            else:
+                names = [s['name'] for s in sampled]
+            gt_labels = np.array([self.cat2label[name] for name in names],
                                  dtype=np.long)
 
             if ground_plane is not None:
@@ -311,6 +389,28 @@ class DataBaseSampler(object):
 
         return ret
 
+    def _load_sampled_points(self, info):
+        """Load the points of a sampled object.
+
+        Args:
+            info (dict | int): Info of the object, or its index in the
+                packed database.
+
+        Returns:
+            :obj:`BasePoints`: Points of the object.
+        """
+        if self.packed_db is None:
+            file_path = os.path.join(
+                self.data_root,
+                info['path']) if self.data_root else info['path']
+            results = dict(pts_filename=file_path)
+            return self.points_loader(results)['points']
+        start = self.packed_objects['point_offset'][info]
+        num_points = self.packed_objects['num_points'][info]
+        points = np.asarray(self.packed_points[start:start + num_points])
+        points = points[:, self.points_loader.use_dim]
+        return self.points_class(points, points_dim=points.shape[-1])
+
     def sample_class_v2(self, name, num, gt_bboxes):
         """Sampling specific categories of bounding boxes.
 
@@ -320,16 +420,20 @@ class DataBaseSampler(object):
             gt_bboxes (np.ndarray): Ground truth boxes.
 
         Returns:
-            list[dict]: Valid samples after collision test.
+            list[dict | int]: Valid samples after collision test, indices of
+                the objects for packed databases.
         """
         sampled = self.sampler_dict[name].sample(num)
-        sampled = copy.deepcopy(sampled)
         num_gt = gt_bboxes.shape[0]
         num_sampled = len(sampled)
         gt_bboxes_bv = box_np_ops.center_to_corner_box2d(
             gt_bboxes[:, 0:2], gt_bboxes[:, 3:5], gt_bboxes[:, 6])
 
-        sp_boxes = np.stack([i['box3d_lidar'] for i in sampled], axis=0)
+        if self.packed_db is not None:
+            sp_boxes = self.packed_boxes[sampled]
+        else:
+            sampled = copy.deepcopy(sampled)
+            sp_boxes = np.stack([i['box3d_lidar'] for i in sampled], axis=0)
         boxes = np.concatenate([gt_bboxes, sp_boxes], axis=0).copy()
 
         sp_boxes_new = boxes[gt_bboxes.shape[0]:]
@@ -337,15 +441,18 @@ class DataBaseSampler(object):
             sp_boxes_new[:, 0:2], sp_boxes_new[:, 3:5], sp_boxes_new[:, 6])
 
         total_bv = np.concatenate([gt_bboxes_bv, sp_boxes_bv], axis=0)
-        coll_mat = data_augment_utils.box_collision_test(total_bv, total_bv)
-        diag = np.arange(total_bv.shape[0])
-        coll_mat[diag, diag] = False
-
-        valid_samples = []
-        for i in range(num_gt, num_gt + num_sampled):
-            if coll_mat[i].any():
-                coll_mat[i] = False
-                coll_mat[:, i] = False
-            else:
-                valid_samples.append(sampled[i - num_gt])
+        coll_pairs = data_augment_utils.box_collision_test_grid(total_bv)
+        bounds = np.searchsorted(coll_pairs[:, 0],
+                                 np.arange(num_gt, num_gt + num_sampled + 1))
+
+        # a sample is dropped if it collides with a ground truth, a kept
+        # sample before it or any sample after it
+        valid = np.ones(total_bv.shape[0], dtype=np.bool_)
+        for i in np.nonzero(bounds[1:] > bounds[:-1])[0]:
+            coll_inds = coll_pairs[bounds[i]:bounds[i + 1], 1]
+            if valid[coll_inds].any():
+                valid[num_gt + i] = False
+        valid_samples = [
+            sampled[i] for i in np.nonzero(valid[num_gt:])[0].tolist()
+        ]
         return valid_samples
@@ -1,4 +1,8 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import hashlib
+import os
+from os import path as osp
+
 import mmcv
 import numpy as np
 
@@ -121,6 +125,13 @@ class LoadPointsFromMultiSweeps(object):
         test_mode (bool, optional): If `test_mode=True`, it will not
             randomly sample sweeps but select the nearest N frames.
             Defaults to False.
+        cache_dir (str, optional): Local directory to cache the sweeps in.
+            If given, all the sweeps of a sample are loaded, filtered and
+            transformed to the lidar frame with their time lags once, and
+            saved as memory-mapped arrays keyed by ``results['sample_idx']``
+            and the sweep configuration. The nearest sweeps are then served
+            as a single slice and randomly chosen sweeps as a slice each.
+            Defaults to None.
     """
 
     def __init__(self,
@@ -131,7 +142,8 @@ class LoadPointsFromMultiSweeps(object):
                  file_client_args=dict(backend='disk'),
                  pad_empty_sweeps=False,
                  remove_close=False,
-                 test_mode=False):
+                 test_mode=False,
+                 cache_dir=None):
         self.load_dim = load_dim
         self.sweeps_num = sweeps_num
         self.use_dim = use_dim
@@ -143,8 +155,11 @@ class LoadPointsFromMultiSweeps(object):
         self.pad_empty_sweeps = pad_empty_sweeps
         self.remove_close = remove_close
         self.test_mode = test_mode
+        self.cache_dir = cache_dir
         assert max(use_dim) < load_dim, \
             f'Expect all used dimensions < {load_dim}, got {use_dim}'
+        if cache_dir is not None:
+            mmcv.mkdir_or_exist(cache_dir)
 
     def _load_points(self, pts_filename):
         """Private function to load point clouds data.
@@ -190,6 +205,70 @@ class LoadPointsFromMultiSweeps(object):
         not_close = np.logical_not(np.logical_and(x_filt, y_filt))
         return points[not_close]
 
+    def _load_sweep(self, sweep, ts):
+        """Load a sweep and transform it to the lidar frame.
+
+        Args:
+            sweep (dict): Info of the sweep.
+            ts (float): Timestamp of the sample.
+
+        Returns:
+            np.ndarray: Points of the sweep with their time lags.
+        """
+        points_sweep = self._load_points(sweep['data_path'])
+        points_sweep = np.copy(points_sweep).reshape(-1, self.load_dim)
+        if self.remove_close:
+            points_sweep = self._remove_close(points_sweep)
+        sweep_ts = sweep['timestamp'] / 1e6
+        points_sweep[:, :3] = points_sweep[:, :3] @ sweep[
+            'sensor2lidar_rotation'].T
+        points_sweep[:, :3] += sweep['sensor2lidar_translation']
+        points_sweep[:, self.time_dim] = ts - sweep_ts
+        return points_sweep
+
+    def _load_cached_sweeps(self, results):
+        """Load all the sweeps of a sample from the cache.
+
+        The sweeps are loaded by :meth:`_load_sweep` and saved to the cache
+        first if they are not in it.
+
+        Args:
+            results (dict): Result dict containing the sample index, the
+                timestamp and the sweeps.
+
+        Returns:
+            tuple[np.ndarray]: Memory-mapped points of all the sweeps and
+                the offsets of every sweep in them.
+        """
+        sweeps = results['sweeps']
+        config = [
+            self.load_dim, self.time_dim, self.remove_close,
+            results['timestamp']
+        ] + [(sweep['data_path'], sweep['timestamp']) for sweep in sweeps]
+        key = hashlib.md5(str(config).encode()).hexdigest()[:16]
+        prefix = osp.join(self.cache_dir, f'{results["sample_idx"]}_{key}')
+        # the offsets are saved last and mark a complete entry
+        if not osp.exists(f'{prefix}_offsets.npy'):
+            points_sweeps = [
+                self._load_sweep(sweep, results['timestamp'])
+                for sweep in sweeps
+            ]
+            offsets = np.cumsum([0] + [len(p) for p in points_sweeps])
+            points_sweeps = np.concatenate(
+                [np.zeros((0, self.load_dim), dtype=np.float32)] +
+                points_sweeps,
+                axis=0)
+            for name, array in [('points', points_sweeps),
+                                ('offsets', offsets)]:
+                # write to a temporary file first for concurrent workers
+                tmp_path = f'{prefix}_{name}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, array)
+                os.replace(tmp_path, f'{prefix}_{name}.npy')
+        points_sweeps = np.load(f'{prefix}_points.npy', mmap_mode='r')
+        offsets = np.load(f'{prefix}_offsets.npy')
+        return points_sweeps, offsets
+
     def __call__(self, results):
         """Call function to load multi-sweep point clouds from files.
 
@@ -222,19 +301,23 @@ class LoadPointsFromMultiSweeps(object):
             else:
                 choices = np.random.choice(
                     len(results['sweeps']), self.sweeps_num, replace=False)
-            for idx in choices:
-                sweep = results['sweeps'][idx]
-                points_sweep = self._load_points(sweep['data_path'])
-                points_sweep = np.copy(points_sweep).reshape(-1, self.load_dim)
-                if self.remove_close:
-                    points_sweep = self._remove_close(points_sweep)
-                sweep_ts = sweep['timestamp'] / 1e6
-                points_sweep[:, :3] = points_sweep[:, :3] @ sweep[
-                    'sensor2lidar_rotation'].T
-                points_sweep[:, :3] += sweep['sensor2lidar_translation']
-                points_sweep[:, self.time_dim] = ts - sweep_ts
-                points_sweep = points.new_point(points_sweep)
-                sweep_points_list.append(points_sweep)
+            if self.cache_dir is None:
+                for idx in choices:
+                    points_sweep = self._load_sweep(results['sweeps'][idx],
+                                                    ts)
+                    sweep_points_list.append(points.new_point(points_sweep))
+            elif len(choices) > 0:
+                points_sweeps, offsets = self._load_cached_sweeps(results)
+                if np.array_equal(choices, np.arange(len(choices))):
+                    # the nearest sweeps are a single slice of the cache
+                    num_points = offsets[len(choices)]
+                    sweep_points_list.append(
+                        points.new_point(points_sweeps[:num_points]))
+                else:
+                    for idx in choices:
+                        sweep_points_list.append(
+                            points.new_point(
+                                points_sweeps[offsets[idx]:offsets[idx + 1]]))
 
         points = points.cat(sweep_points_list)
         points = points[:, self.use_dim]
@@ -28,8 +28,6 @@ class PointPillarsScatter(nn.Module):
     @auto_fp16(apply_to=('voxel_features', ))
     def forward(self, voxel_features, coors, batch_size=None):
         """Foraward function to scatter features."""
-        # TODO: rewrite the function in a batch manner
-        # no need to deal with different batch cases
         if batch_size is not None:
             return self.forward_batch(voxel_features, coors, batch_size)
         else:
@@ -60,40 +58,26 @@ class PointPillarsScatter(nn.Module):
         return canvas
 
     def forward_batch(self, voxel_features, coors, batch_size):
-        """Scatter features of single sample.
+        """Scatter features of all samples in the batch at once.
 
         Args:
             voxel_features (torch.Tensor): Voxel features in shape (N, C).
             coors (torch.Tensor): Coordinates of each voxel in shape (N, 4).
                 The first column indicates the sample ID.
             batch_size (int): Number of samples in the current batch.
+
+        Returns:
+            torch.Tensor: Pseudo image in shape
+                (batch_size, in_channels, ny, nx).
         """
         # batch_canvas will be the final output.
-        batch_canvas = []
-        for batch_itt in range(batch_size):
-            # Create the canvas for this sample
-            canvas = torch.zeros(
-                self.in_channels,
-                self.nx * self.ny,
-                dtype=voxel_features.dtype,
-                device=voxel_features.device)
-
-            # Only include non-empty pillars
-            batch_mask = coors[:, 0] == batch_itt
-            this_coors = coors[batch_mask, :]
-            indices = this_coors[:, 2] * self.nx + this_coors[:, 3]
-            indices = indices.type(torch.long)
-            voxels = voxel_features[batch_mask, :]
-            voxels = voxels.t()
-
-            # Now scatter the blob back to the canvas.
-            canvas[:, indices] = voxels
-
-            # Append to a list for later stacking.
-            batch_canvas.append(canvas)
-
-        # Stack to 3-dim tensor (batch-size, in_channels, nrows*ncols)
-        batch_canvas = torch.stack(batch_canvas, 0)
+        batch_canvas = voxel_features.new_zeros(
+            (batch_size, self.in_channels, self.ny * self.nx))
+        batch_indices = coors[:, 0].long()
+        indices = (coors[:, 2] * self.nx + coors[:, 3]).long()
+        # Scatter the pillars of all samples with a single indexing op,
+        # the indexed dimensions go first so the values are in (N, C).
+        batch_canvas[batch_indices, :, indices] = voxel_features
 
         # Undo the column stacking to final 4-dim tensor
         batch_canvas = batch_canvas.view(batch_size, self.in_channels, self.ny,
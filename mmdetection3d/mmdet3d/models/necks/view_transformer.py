@@ -94,7 +94,7 @@ class LSSViewTransformer(BaseModule):
             acceleration. Note: the intrinsic and extrinsic of cameras should
             be constant when 'accelerate' is set true.
         max_voxel_points (int): Specify the maximum point number in a single
-            voxel during the acceleration.
+            voxel during the acceleration. Points beyond it are dropped.
     """
 
     def __init__(self,
@@ -277,29 +277,25 @@ class LSSViewTransformer(BaseModule):
                 (B, N_cams, D, H, W, C).
         """
         x, coor, ranks, point_idx = self.voxel_pooling_prepare(coor, x)
-        # count for the repeat times of the same voxel rank in the point queue.
-        repeat_times = torch.ones(
-            coor.shape[0], device=coor.device, dtype=coor.dtype)
-        times = 0
-        repeat_times[0] = 0
-        cur_rank = ranks[0]
-
-        for i in range(1, ranks.shape[0]):
-            if cur_rank == ranks[i]:
-                times += 1
-                repeat_times[i] = times
-            else:
-                cur_rank = ranks[i]
-                times = 0
-                repeat_times[i] = times
+        # count for the repeat times of the same voxel rank in the point queue,
+        # i.e. the offset of every point from the first point of its voxel.
+        interval_starts = torch.ones(
+            ranks.shape[0], device=ranks.device, dtype=torch.bool)
+        interval_starts[1:] = ranks[1:] != ranks[:-1]
+        start_idx = torch.where(interval_starts)[0]
+        interval_idx = interval_starts.long().cumsum(0) - 1
+        repeat_times = torch.arange(
+            ranks.shape[0], device=ranks.device) - start_idx[interval_idx]
         # remove the point whose repeat time is exceed the threshold.
         kept = repeat_times < self.max_voxel_points
-        repeat_times, coor = repeat_times[kept], coor[kept]
-        x, point_idx = x[kept], point_idx[kept]
-
-        coor = torch.cat([coor, repeat_times.unsqueeze(-1)], dim=-1)
-        self.coor = coor
-        self.point_idx = point_idx
+        coor, point_idx = coor[kept], point_idx[kept]
+
+        # flat index of the voxel of every point in (B, Z, Y, X)
+        gs = self.grid_size.to(torch.long).tolist()
+        voxel_idx = ((coor[:, 3] * gs[2] + coor[:, 2]) * gs[1] +
+                     coor[:, 1]) * gs[0] + coor[:, 0]
+        self.voxel_idx = voxel_idx
+        self.point_idx = point_idx.to(voxel_idx.device)
         self.initial_flag = False
 
     def voxel_pooling_accelerated(self, x):
@@ -315,19 +311,16 @@ class LSSViewTransformer(BaseModule):
         B, N, D, H, W, C = x.shape
         Nprime = B * N * D * H * W
         # flatten x
-        x = x.reshape(Nprime, C)[self.point_idx]
+        x = x.reshape(Nprime, C)[self.point_idx.to(x.device)]
 
-        # griddify (B x C x Z x X x Y)
-        gs = self.grid_size.to(torch.long)
-        final = torch.zeros((B, C, gs[2], gs[1], gs[0], self.max_voxel_points),
-                            device=x.device)
-        c = self.coor
-        final[c[:, 3], :, c[:, 2], c[:, 1], c[:, 0], c[:, 4]] = x
-        final = final.sum(-1)
+        # griddify (B x Z x Y x X x C)
+        gs = self.grid_size.to(torch.long).tolist()
+        final = x.new_zeros((B * gs[2] * gs[1] * gs[0], C))
+        final.index_add_(0, self.voxel_idx.to(x.device), x)
 
         # collapse Z
-        final = torch.cat(final.unbind(dim=2), 1)
-        return final
+        final = final.view(B, gs[2], gs[1], gs[0], C).permute(0, 1, 4, 2, 3)
+        return final.reshape(B, gs[2] * C, gs[1], gs[0])
 
     def forward(self, input):
         """Transform image-view feature into bird-eye-view feature.
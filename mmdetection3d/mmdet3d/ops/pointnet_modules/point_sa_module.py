@@ -2,12 +2,12 @@
 import torch
 from mmcv.cnn import ConvModule
 from mmcv.ops import GroupAll
-from mmcv.ops import PointsSampler as Points_Sampler
-from mmcv.ops import QueryAndGroup, gather_points
 from torch import nn as nn
 from torch.nn import functional as F
 
 from mmdet3d.ops import PAConv
+from ..pointnet_ops import PointsSampler as Points_Sampler
+from ..pointnet_ops import QueryAndGroup, gather_points
 from .builder import SA_MODULES
 
 
@@ -0,0 +1,406 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Device dispatching sampling and grouping ops of PointNets.
+
+The ops of ``mmcv.ops`` used by the PointNet modules only have CUDA kernels.
+The wrappers here call them for CUDA tensors and fall back to numba kernels
+or to torch indexing for CPU tensors, which follow the CUDA kernels so that
+the outputs of both devices match.
+"""
+import numba
+import numpy as np
+import torch
+from mmcv.ops import PointsSampler as _PointsSampler
+from mmcv.ops import QueryAndGroup as _QueryAndGroup
+from mmcv.ops import ball_query as _ball_query
+from mmcv.ops import furthest_point_sample as _furthest_point_sample
+from mmcv.ops import \
+    furthest_point_sample_with_dist as _furthest_point_sample_with_dist
+from mmcv.ops import gather_points as _gather_points
+from mmcv.ops import grouping_operation as _grouping_operation
+from mmcv.ops import knn
+from mmcv.ops import three_interpolate as _three_interpolate
+from mmcv.ops import three_nn as _three_nn
+from mmcv.ops.points_sampler import calc_square_dist
+from torch import nn as nn
+
+
+@numba.jit(nopython=True, parallel=True)
+def _furthest_point_sample_kernel(points, num_points):
+    """D-FPS of every batch in parallel, see ``furthest_point_sample``."""
+    batch_size, num_input = points.shape[:2]
+    indices = np.zeros((batch_size, num_points), dtype=np.int32)
+    for b in numba.prange(batch_size):
+        temp = np.empty(num_input, dtype=np.float32)
+        temp[:] = 1e10
+        old = 0
+        for j in range(1, num_points):
+            x1 = points[b, old, 0]
+            y1 = points[b, old, 1]
+            z1 = points[b, old, 2]
+            best = -1.0
+            besti = 0
+            for k in range(num_input):
+                dx = points[b, k, 0] - x1
+                dy = points[b, k, 1] - y1
+                dz = points[b, k, 2] - z1
+                d2 = min(dx * dx + dy * dy + dz * dz, temp[k])
+                temp[k] = d2
+                if d2 > best:
+                    best = d2
+                    besti = k
+            indices[b, j] = besti
+            old = besti
+    return indices
+
+
+@numba.jit(nopython=True, parallel=True)
+def _furthest_point_sample_with_dist_kernel(points_dist, num_points):
+    """FPS on distances of every batch in parallel."""
+    batch_size, num_input = points_dist.shape[:2]
+    indices = np.zeros((batch_size, num_points), dtype=np.int32)
+    for b in numba.prange(batch_size):
+        temp = np.empty(num_input, dtype=np.float32)
+        temp[:] = 1e10
+        old = 0
+        for j in range(1, num_points):
+            best = -1.0
+            besti = 0
+            for k in range(num_input):
+                d2 = min(points_dist[b, old, k], temp[k])
+                temp[k] = d2
+                if d2 > best:
+                    best = d2
+                    besti = k
+            indices[b, j] = besti
+            old = besti
+    return indices
+
+
+@numba.jit(nopython=True, parallel=True)
+def _ball_query_kernel(min_radius, max_radius, sample_num, xyz, center_xyz):
+    """Ball query of every center in parallel, see ``ball_query``."""
+    batch_size, num_center = center_xyz.shape[:2]
+    num_input = xyz.shape[1]
+    min_radius2 = np.float32(min_radius) * np.float32(min_radius)
+    max_radius2 = np.float32(max_radius) * np.float32(max_radius)
+    indices = np.zeros((batch_size, num_center, sample_num), dtype=np.int32)
+    for i in numba.prange(batch_size * num_center):
+        b = i // num_center
+        m = i % num_center
+        cnt = 0
+        for k in range(num_input):
+            dx = center_xyz[b, m, 0] - xyz[b, k, 0]
+            dy = center_xyz[b, m, 1] - xyz[b, k, 1]
+            dz = center_xyz[b, m, 2] - xyz[b, k, 2]
+            d2 = dx * dx + dy * dy + dz * dz
+            if d2 == 0 or (d2 >= min_radius2 and d2 < max_radius2):
+                if cnt == 0:
+                    indices[b, m, :] = k
+                indices[b, m, cnt] = k
+                cnt += 1
+                if cnt >= sample_num:
+                    break
+    return indices
+
+
+@numba.jit(nopython=True, parallel=True)
+def _three_nn_kernel(target, source):
+    """Three nearest neighbors of every target in parallel."""
+    batch_size, num_target = target.shape[:2]
+    num_source = source.shape[1]
+    dist2 = np.zeros((batch_size, num_target, 3), dtype=np.float32)
+    indices = np.zeros((batch_size, num_target, 3), dtype=np.int32)
+    for i in numba.prange(batch_size * num_target):
+        b = i // num_target
+        n = i % num_target
+        best1 = best2 = best3 = 1e40
+        besti1 = besti2 = besti3 = 0
+        for k in range(num_source):
+            dx = target[b, n, 0] - source[b, k, 0]
+            dy = target[b, n, 1] - source[b, k, 1]
+            dz = target[b, n, 2] - source[b, k, 2]
+            d = dx * dx + dy * dy + dz * dz
+            if d < best1:
+                best3, besti3 = best2, besti2
+                best2, besti2 = best1, besti1
+                best1, besti1 = d, k
+            elif d < best2:
+                best3, besti3 = best2, besti2
+                best2, besti2 = d, k
+            elif d < best3:
+                best3, besti3 = d, k
+        dist2[b, n, 0] = best1
+        dist2[b, n, 1] = best2
+        dist2[b, n, 2] = best3
+        indices[b, n, 0] = besti1
+        indices[b, n, 1] = besti2
+        indices[b, n, 2] = besti3
+    return dist2, indices
+
+
+def _to_numpy(tensor):
+    """Float32 contiguous array sharing the memory of a CPU tensor."""
+    return tensor.detach().float().contiguous().numpy()
+
+
+def furthest_point_sample(points_xyz, num_points):
+    """Furthest point sampling on Euclidean distances (D-FPS).
+
+    Args:
+        points_xyz (torch.Tensor): (B, N, 3) xyz coordinates of the points.
+        num_points (int): Number of points to sample.
+
+    Returns:
+        torch.Tensor: (B, num_points) int32 indices of the sampled points.
+    """
+    if points_xyz.is_cuda:
+        return _furthest_point_sample(points_xyz, num_points)
+    return torch.from_numpy(
+        _furthest_point_sample_kernel(_to_numpy(points_xyz), num_points))
+
+
+def furthest_point_sample_with_dist(points_dist, num_points):
+    """Furthest point sampling on given distances of the points.
+
+    Args:
+        points_dist (torch.Tensor): (B, N, N) distances between the points.
+        num_points (int): Number of points to sample.
+
+    Returns:
+        torch.Tensor: (B, num_points) int32 indices of the sampled points.
+    """
+    if points_dist.is_cuda:
+        return _furthest_point_sample_with_dist(points_dist, num_points)
+    return torch.from_numpy(
+        _furthest_point_sample_with_dist_kernel(
+            _to_numpy(points_dist), num_points))
+
+
+def ball_query(min_radius, max_radius, sample_num, xyz, center_xyz):
+    """Query the first points within a spherical shell of every center.
+
+    The slots left when less than ``sample_num`` points are found are filled
+    with the first point found, or with 0 if no point is found.
+
+    Args:
+        min_radius (float): Minimum radius of the balls.
+        max_radius (float): Maximum radius of the balls.
+        sample_num (int): Maximum number of points in the balls.
+        xyz (torch.Tensor): (B, N, 3) xyz coordinates of the points.
+        center_xyz (torch.Tensor): (B, npoint, 3) centers of the balls.
+
+    Returns:
+        torch.Tensor: (B, npoint, sample_num) int32 indices of the points.
+    """
+    if xyz.is_cuda:
+        return _ball_query(min_radius, max_radius, sample_num, xyz,
+                           center_xyz)
+    return torch.from_numpy(
+        _ball_query_kernel(min_radius, max_radius, sample_num, _to_numpy(xyz),
+                           _to_numpy(center_xyz)))
+
+
+def gather_points(features, indices):
+    """Gather the features of points.
+
+    Args:
+        features (torch.Tensor): (B, C, N) features of the points.
+        indices (torch.Tensor): (B, M) indices of the points to gather.
+
+    Returns:
+        torch.Tensor: (B, C, M) gathered features.
+    """
+    if features.is_cuda:
+        return _gather_points(features, indices)
+    indices = indices.long().unsqueeze(1).expand(-1, features.shape[1], -1)
+    return features.gather(2, indices)
+
+
+def grouping_operation(features, indices):
+    """Group the features of points.
+
+    Args:
+        features (torch.Tensor): (B, C, N) features of the points.
+        indices (torch.Tensor): (B, npoint, nsample) indices of the points of
+            every group.
+
+    Returns:
+        torch.Tensor: (B, C, npoint, nsample) grouped features.
+    """
+    if features.is_cuda:
+        return _grouping_operation(features, indices)
+    batch_size, num_group, num_sample = indices.shape
+    return gather_points(features, indices.view(batch_size, -1)).view(
+        batch_size, -1, num_group, num_sample)
+
+
+def three_nn(target, source):
+    """Find the three nearest neighbors of the target points in the source.
+
+    Args:
+        target (torch.Tensor): (B, n, 3) xyz coordinates of the targets.
+        source (torch.Tensor): (B, m, 3) xyz coordinates of the source.
+
+    Returns:
+        tuple[torch.Tensor]: (B, n, 3) distances to the neighbors and (B, n,
+            3) int32 indices of the neighbors.
+    """
+    if target.is_cuda:
+        return _three_nn(target, source)
+    dist2, indices = _three_nn_kernel(_to_numpy(target), _to_numpy(source))
+    return torch.sqrt(torch.from_numpy(dist2)), torch.from_numpy(indices)
+
+
+def three_interpolate(features, indices, weight):
+    """Weighted sum of the features of three neighbors of every target.
+
+    Args:
+        features (torch.Tensor): (B, C, m) features of the source points.
+        indices (torch.Tensor): (B, n, 3) indices of the neighbors.
+        weight (torch.Tensor): (B, n, 3) weights of the neighbors.
+
+    Returns:
+        torch.Tensor: (B, C, n) interpolated features of the targets.
+    """
+    if features.is_cuda:
+        return _three_interpolate(features, indices, weight)
+    batch_size, num_target = indices.shape[:2]
+    neighbor_features = gather_points(
+        features, indices.view(batch_size, -1)).view(batch_size, -1,
+                                                     num_target, 3)
+    return (neighbor_features * weight.unsqueeze(1)).sum(dim=3)
+
+
+class DFPSSampler(nn.Module):
+    """Using Euclidean distances of points for FPS."""
+
+    def forward(self, points, features, npoint):
+        """Sampling points with D-FPS."""
+        return furthest_point_sample(points.contiguous(), npoint)
+
+
+class FFPSSampler(nn.Module):
+    """Using feature distances for FPS."""
+
+    def forward(self, points, features, npoint):
+        """Sampling points with F-FPS."""
+        assert features is not None, \
+            'feature input to FFPS_Sampler should not be None'
+        features_for_fps = torch.cat([points, features.transpose(1, 2)],
+                                     dim=2)
+        features_dist = calc_square_dist(
+            features_for_fps, features_for_fps, norm=False)
+        return furthest_point_sample_with_dist(features_dist, npoint)
+
+
+class FSSampler(nn.Module):
+    """Using F-FPS and D-FPS simultaneously."""
+
+    def forward(self, points, features, npoint):
+        """Sampling points with FS_Sampling."""
+        assert features is not None, \
+            'feature input to FS_Sampler should not be None'
+        fps_idx_ffps = FFPSSampler()(points, features, npoint)
+        fps_idx_dfps = DFPSSampler()(points, features, npoint)
+        return torch.cat([fps_idx_ffps, fps_idx_dfps], dim=1)
+
+
+class PointsSampler(_PointsSampler):
+    """Points sampling of ``mmcv.ops`` dispatching the FPS by device.
+
+    Args:
+        num_point (list[int]): Number of sample points.
+        fps_mod_list (list[str], optional): Type of FPS method, valid mod
+            ['F-FPS', 'D-FPS', 'FS'], Default: ['D-FPS'].
+        fps_sample_range_list (list[int], optional):
+            Range of points to apply FPS. Default: [-1].
+    """
+
+    def __init__(self,
+                 num_point,
+                 fps_mod_list=['D-FPS'],
+                 fps_sample_range_list=[-1]):
+        super().__init__(num_point, fps_mod_list, fps_sample_range_list)
+        samplers = {
+            'D-FPS': DFPSSampler,
+            'F-FPS': FFPSSampler,
+            'FS': FSSampler
+        }
+        self.samplers = nn.ModuleList(
+            [samplers[fps_mod]() for fps_mod in fps_mod_list])
+
+
+class QueryAndGroup(_QueryAndGroup):
+    """Ball query and grouping of ``mmcv.ops`` dispatching the ops by device.
+
+    The arguments are the same as ``mmcv.ops.QueryAndGroup``.
+    """
+
+    def forward(self, points_xyz, center_xyz, features=None):
+        """
+        Args:
+            points_xyz (torch.Tensor): (B, N, 3) xyz coordinates of the
+                points.
+            center_xyz (torch.Tensor): (B, npoint, 3) coordinates of the
+                centriods.
+            features (torch.Tensor): (B, C, N) The features of grouped
+                points.
+
+        Returns:
+            torch.Tensor: (B, 3 + C, npoint, sample_num) Grouped
+            concatenated coordinates and features of points.
+        """
+        # if self.max_radius is None, we will perform kNN instead of ball query
+        if self.max_radius is None:
+            idx = knn(self.sample_num, points_xyz, center_xyz, False)
+            idx = idx.transpose(1, 2).contiguous()
+        else:
+            idx = ball_query(self.min_radius, self.max_radius,
+                             self.sample_num, points_xyz, center_xyz)
+
+        if self.uniform_sample:
+            unique_cnt = torch.zeros((idx.shape[0], idx.shape[1]))
+            for i_batch in range(idx.shape[0]):
+                for i_region in range(idx.shape[1]):
+                    unique_ind = torch.unique(idx[i_batch, i_region, :])
+                    num_unique = unique_ind.shape[0]
+                    unique_cnt[i_batch, i_region] = num_unique
+                    sample_ind = torch.randint(
+                        0,
+                        num_unique, (self.sample_num - num_unique, ),
+                        dtype=torch.long)
+                    all_ind = torch.cat((unique_ind, unique_ind[sample_ind]))
+                    idx[i_batch, i_region, :] = all_ind
+
+        xyz_trans = points_xyz.transpose(1, 2).contiguous()
+        # (B, 3, npoint, sample_num)
+        grouped_xyz = grouping_operation(xyz_trans, idx)
+        grouped_xyz_diff = grouped_xyz - \
+            center_xyz.transpose(1, 2).unsqueeze(-1)  # relative offsets
+        if self.normalize_xyz:
+            grouped_xyz_diff /= self.max_radius
+
+        if features is not None:
+            grouped_features = grouping_operation(features, idx)
+            if self.use_xyz:
+                # (B, C + 3, npoint, sample_num)
+                new_features = torch.cat([grouped_xyz_diff, grouped_features],
+                                         dim=1)
+            else:
+                new_features = grouped_features
+        else:
+            assert (self.use_xyz
+                    ), 'Cannot have not features and not use xyz as a feature!'
+            new_features = grouped_xyz_diff
+
+        ret = [new_features]
+        if self.return_grouped_xyz:
+            ret.append(grouped_xyz)
+        if self.return_unique_cnt:
+            ret.append(unique_cnt)
+        if self.return_grouped_idx:
+            ret.append(idx)
+        if len(ret) == 1:
+            return ret[0]
+        else:
+            return tuple(ret)
@@ -2,8 +2,10 @@
 import mmcv
 import numpy as np
 
+from mmdet3d.core.bbox import box_np_ops
 from mmdet3d.datasets.pipelines.data_augment_utils import (
-    noise_per_object_v3_, points_transform_)
+    box_collision_test, box_collision_test_grid, noise_per_object_v3_,
+    points_transform_)
 
 
 def test_noise_per_object_v3_():
@@ -70,3 +72,26 @@ def test_points_transform():
                       rot_transforms, valid_mask)
     assert points.shape == (5, 4)
     assert gt_boxes.shape == (5, 7)
+
+
+def test_box_collision_test_grid():
+    np.random.seed(0)
+    boxes = np.concatenate([
+        np.random.uniform(-20, 20, (100, 2)),
+        np.random.uniform(0.5, 5, (100, 2)),
+        np.random.uniform(-np.pi, np.pi, (100, 1))
+    ],
+                           axis=1).astype(np.float32)
+    # identical and concentric boxes
+    boxes[1] = boxes[0]
+    boxes[3, :2] = boxes[2, :2]
+    boxes_bv = box_np_ops.center_to_corner_box2d(boxes[:, :2], boxes[:, 2:4],
+                                                 boxes[:, 4])
+    coll_mat = box_collision_test(boxes_bv, boxes_bv)
+    coll_mat[np.arange(100), np.arange(100)] = False
+    expected_pairs = np.stack(np.nonzero(coll_mat), axis=1)
+    assert expected_pairs.shape[0] > 0
+    for cell_size in [None, 0.5, 100.]:
+        pairs = box_collision_test_grid(boxes_bv, cell_size)
+        assert np.array_equal(pairs, expected_pairs)
+    assert box_collision_test_grid(boxes_bv[:1]).shape == (0, 2)
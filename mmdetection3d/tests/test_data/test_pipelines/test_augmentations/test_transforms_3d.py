@@ -113,6 +113,56 @@ def test_object_sample():
     assert np.all(gt_labels_3d == [0])
 
 
+def test_object_sample_packed_db():
+    import pickle
+    import tempfile
+
+    from tools.data_converter.pack_gt_database import pack_gt_database
+    gt_bboxes_3d = np.array(
+        [[10.8740, -1.0827, -1.3310, 0.6000, 0.5200, 1.7100, 1.3500]],
+        dtype=np.float32)
+    gt_labels_3d = np.array([0], dtype=np.int64)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        packed_db = pack_gt_database(
+            './tests/data/kitti/kitti_dbinfos_train.pkl',
+            './tests/data/kitti/', f'{tmp_dir}/kitti_dbinfos_train')
+        sampled_dicts = []
+        for cur_packed_db in [None, packed_db]:
+            db_sampler = mmcv.ConfigDict({
+                'data_root': './tests/data/kitti/',
+                'info_path': './tests/data/kitti/kitti_dbinfos_train.pkl',
+                'rate': 1.0,
+                'prepare': {
+                    'filter_by_difficulty': [-1],
+                    'filter_by_min_points': {
+                        'Pedestrian': 10
+                    }
+                },
+                'classes': ['Pedestrian', 'Cyclist', 'Car'],
+                'sample_groups': {
+                    'Pedestrian': 6
+                },
+                'packed_db': cur_packed_db
+            })
+            np.random.seed(0)
+            object_sample = ObjectSample(db_sampler)
+            if cur_packed_db is not None:
+                # the memory maps are reopened instead of pickled
+                assert object_sample.db_sampler._packed_points is not None
+                object_sample.db_sampler = pickle.loads(
+                    pickle.dumps(object_sample.db_sampler))
+                assert object_sample.db_sampler._packed_points is None
+            sampled_dicts.append(
+                object_sample.db_sampler.sample_all(gt_bboxes_3d,
+                                                    gt_labels_3d))
+    sampled_dict, packed_sampled_dict = sampled_dicts
+    assert sampled_dict is not None
+    for key in ['gt_labels_3d', 'gt_bboxes_3d', 'group_ids']:
+        assert np.array_equal(packed_sampled_dict[key], sampled_dict[key])
+    assert torch.equal(packed_sampled_dict['points'].tensor,
+                       sampled_dict['points'].tensor)
+
+
 def test_object_noise():
     np.random.seed(0)
     object_noise = ObjectNoise()
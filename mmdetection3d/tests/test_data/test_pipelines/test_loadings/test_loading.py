@@ -1,4 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import os
+import tempfile
 from os import path as osp
 
 import mmcv
@@ -294,6 +296,59 @@ def test_load_points_from_multi_sweeps():
     assert repr_str == expected_repr_str
     assert points.shape == (403, 4)
 
+    # test the cache of sweeps
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sweep_points = np.fromfile(
+            sweep['data_path'], dtype=np.float32).reshape(-1, 5)
+        sweeps = [sweep]
+        for i in range(1, 3):
+            data_path = osp.join(tmp_dir, f'sweep_{i}.bin')
+            shifted_points = sweep_points.copy()
+            shifted_points[:, :2] += i
+            shifted_points.tofile(data_path)
+            sweeps.append(
+                dict(
+                    data_path=data_path,
+                    timestamp=sweep['timestamp'] - i * 50000,
+                    sensor2lidar_translation=np.array(
+                        sweep['sensor2lidar_translation']) + i,
+                    sensor2lidar_rotation=sweep['sensor2lidar_rotation']))
+        cache_dir = osp.join(tmp_dir, 'cache')
+        # the random choices of seed 1 are not the nearest sweeps
+        np.random.seed(1)
+        assert not np.array_equal(
+            np.random.choice(3, 2, replace=False), np.arange(2))
+        all_points = []
+        for test_mode, seed in [(True, 0), (False, 1)]:
+            expected_points = None
+            for sweeps_num, sweeps_cache_dir in [(2, None), (2, cache_dir),
+                                                 (2, cache_dir),
+                                                 (0, cache_dir)]:
+                load_points_from_multi_sweeps = LoadPointsFromMultiSweeps(
+                    sweeps_num=sweeps_num,
+                    remove_close=True,
+                    test_mode=test_mode,
+                    cache_dir=sweeps_cache_dir)
+                results = dict(
+                    points=LiDARPoints(
+                        np.array([[1., 2., 3., 4., 5.]]).repeat(3, 0),
+                        points_dim=5),
+                    timestamp=1537290014899034,
+                    sweeps=sweeps,
+                    sample_idx='sample')
+                np.random.seed(seed)
+                results = load_points_from_multi_sweeps(results)
+                points = results['points'].tensor.numpy()
+                if sweeps_num == 0:
+                    assert points.shape == (3, 4)
+                elif expected_points is None:
+                    expected_points = points
+                else:
+                    assert np.array_equal(points, expected_points)
+            all_points.append(expected_points)
+        assert not np.array_equal(all_points[0], all_points[1])
+        assert len(os.listdir(cache_dir)) == 2
+
 
 def test_load_image_from_file_mono_3d():
     load_image_from_file_mono_3d = LoadImageFromFileMono3D()
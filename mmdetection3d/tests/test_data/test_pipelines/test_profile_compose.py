@@ -0,0 +1,46 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from mmdet3d.datasets.pipelines import ProfileCompose
+
+
+def add_points(results):
+    results['points'] = np.zeros((100, 4), dtype=np.float32)
+    return results
+
+
+def drop_empty(results):
+    return results if results['idx'] > 0 else None
+
+
+def test_profile_compose():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pipeline = ProfileCompose([add_points, drop_empty],
+                                  out_dir=tmp_dir,
+                                  dump_interval=2,
+                                  trace_memory=True)
+        assert pipeline(dict(idx=0)) is None
+        results = pipeline(dict(idx=1))
+        assert results['points'].shape == (100, 4)
+        assert pipeline(dict(idx=2)) is not None
+
+        # records of every call, dumped every 2 samples
+        assert len(pipeline.records['0.function']) == 3
+        assert len(pipeline.records['1.function']) == 3
+        assert pipeline.records['0.function'][0][2] == 1600
+        assert pipeline.records['1.function'][0][2] == 0
+        assert pipeline.records['0.function'][0][1] >= 1600
+        records = ProfileCompose.load(tmp_dir)
+        assert len(records['0.function']) == 2
+        pipeline.dump()
+        records = ProfileCompose.load(tmp_dir)
+        assert records == pipeline.records
+
+    tracemalloc.stop()
+
+    report = ProfileCompose.summarize(records).split('\n')
+    assert len(report) == 3
+    assert report[1].startswith('0.function')
@@ -3,7 +3,8 @@ import numpy as np
 import pytest
 import torch
 
-from mmdet3d.core.evaluation.indoor_eval import average_precision, indoor_eval
+from mmdet3d.core.evaluation.indoor_eval import (average_precision,
+                                                 eval_det_cls, indoor_eval)
 
 
 def test_indoor_eval():
@@ -181,6 +182,32 @@ def test_indoor_eval_less_classes():
     assert np.isclose(ret_value['mAR_0.25'], 0.666667)
 
 
+def test_eval_det_cls():
+    if not torch.cuda.is_available():
+        pytest.skip()
+    from mmdet3d.core.bbox.structures import DepthInstance3DBoxes
+    gt_boxes = DepthInstance3DBoxes(
+        torch.tensor([[0., 0., 0., 1., 1., 1., 0.], [3., 0., 0., 1., 1., 1.,
+                                                     0.]]))
+    pred_boxes = DepthInstance3DBoxes(
+        torch.tensor([[0., 0., 0., 1., 1., 1., 0.],
+                      [0.2, 0., 0., 1., 1., 1., 0.],
+                      [3.5, 0., 0., 1., 1., 1., 0.],
+                      [0., 0., 0., 1., 1., 1., 0.]]))
+    gt = {0: [gt_boxes[0], gt_boxes[1]], 1: []}
+    # the second det duplicates the first one, the third one has an iou of
+    # 1/3 and the image of the last one has no gt
+    pred = {
+        0: [(pred_boxes[0], 0.9), (pred_boxes[1], 0.8), (pred_boxes[2], 0.7)],
+        1: [(pred_boxes[3], 0.6)]
+    }
+    ret = eval_det_cls(pred, gt, [0.25, 0.5])
+    assert np.allclose(ret[0][0], [0.5, 0.5, 1., 1.])
+    assert np.allclose(ret[0][1], [1., 0.5, 2 / 3, 0.5])
+    assert np.allclose(ret[1][0], [0.5, 0.5, 0.5, 0.5])
+    assert np.allclose(ret[1][1], [1., 0.5, 1 / 3, 0.25])
+
+
 def test_average_precision():
     ap = average_precision(
         np.array([[0.25, 0.5, 0.75], [0.25, 0.5, 0.75]]),
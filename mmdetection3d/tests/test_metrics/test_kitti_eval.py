@@ -1,15 +1,14 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import numpy as np
-import pytest
 import torch
 
 from mmdet3d.core.evaluation.kitti_utils.eval import (do_eval, eval_class,
                                                       kitti_eval)
+from mmdet3d.core.evaluation.kitti_utils.rotate_iou import (
+    rotate_iou_cpu_eval, rotate_iou_gpu_eval)
 
 
 def test_do_eval():
-    if not torch.cuda.is_available():
-        pytest.skip('test requires GPU and CUDA')
     gt_name = np.array(
         ['Pedestrian', 'Cyclist', 'Car', 'Car', 'Car', 'DontCare', 'DontCare'])
     gt_truncated = np.array([0., 0., 0., -1., -1., -1., -1.])
@@ -129,8 +128,6 @@ def test_do_eval():
 
 
 def test_kitti_eval():
-    if not torch.cuda.is_available():
-        pytest.skip('test requires GPU and CUDA')
     gt_name = np.array(
         ['Pedestrian', 'Cyclist', 'Car', 'Car', 'Car', 'DontCare', 'DontCare'])
     gt_truncated = np.array([0., 0., 0., -1., -1., -1., -1.])
@@ -265,3 +262,67 @@ def test_eval_class():
     assert np.isclose(recall_sum, 16)
     assert np.isclose(precision_sum, 16)
     assert np.isclose(orientation_sum, 10.252829201850309)
+
+
+def test_rotate_iou_cpu_eval():
+    boxes = np.array([[0., 0., 2., 2., 0.], [1., 0.5, 2., 2., 0.],
+                      [0., 0., 2., 2., np.pi / 4], [10., 10., 2., 2., 0.3]])
+    query_boxes = boxes[:1]
+    iou = rotate_iou_cpu_eval(boxes, query_boxes)
+    expected_iou = np.array([[1.], [1.5 / 6.5], [1 / np.sqrt(2)], [0.]])
+    assert iou.dtype == np.float32
+    # identical boxes are degenerate in the polygon clipping
+    assert np.allclose(iou[1:], expected_iou[1:], atol=1e-5)
+    inter = rotate_iou_cpu_eval(boxes, query_boxes, criterion=2)
+    assert np.allclose(
+        inter[1:], [[1.5], [8 * (np.sqrt(2) - 1)], [0.]], atol=1e-5)
+    assert rotate_iou_cpu_eval(boxes, np.zeros((0, 5))).shape == (4, 0)
+
+    # reference results of rotate_iou_gpu_eval
+    boxes = np.array([[0., 0., 4., 2., 0.3], [1., 0.5, 3., 1.5, -0.6],
+                      [-1., 1., 2.5, 2.5, 1.2], [2., -1., 5., 1., 0.],
+                      [0.5, 0.5, 1., 1., 2.5]])
+    query_boxes = np.array([[0.5, 0., 3., 2., 0.], [0., 1., 2., 3., 0.8],
+                            [1.5, -0.5, 4., 1.5, -0.3]])
+    expected_iou = np.array([[0.606343, 0.284614, 0.282722],
+                             [0.437286, 0.217294, 0.123293],
+                             [0.146199, 0.348167, 0.],
+                             [0.128205, 0.00545, 0.344474],
+                             [0.158627, 0.128201, 0.004313]])
+    expected_inter = np.array([[5.284552, 3.101788, 3.08571],
+                               [3.194563, 1.874309, 1.152486],
+                               [1.5625, 3.163588, 0.],
+                               [1.25, 0.059621, 2.81836],
+                               [0.958367, 0.795431, 0.030058]])
+    assert np.allclose(
+        rotate_iou_cpu_eval(boxes, query_boxes), expected_iou, atol=1e-5)
+    assert np.allclose(
+        rotate_iou_cpu_eval(boxes, query_boxes, criterion=2),
+        expected_inter,
+        atol=1e-5)
+    box_areas = boxes[:, 2] * boxes[:, 3]
+    query_areas = query_boxes[:, 2] * query_boxes[:, 3]
+    assert np.allclose(
+        rotate_iou_cpu_eval(boxes, query_boxes, criterion=0),
+        expected_inter / query_areas,
+        atol=1e-5)
+    assert np.allclose(
+        rotate_iou_cpu_eval(boxes, query_boxes, criterion=1),
+        expected_inter / box_areas[:, None],
+        atol=1e-5)
+
+    if not torch.cuda.is_available():
+        return
+    np.random.seed(0)
+    boxes = np.concatenate([
+        np.random.uniform(-20, 20, (200, 2)),
+        np.random.uniform(0.5, 5, (200, 2)),
+        np.random.uniform(-np.pi, np.pi, (200, 1))
+    ], 1)
+    query_boxes = boxes[:100] + np.random.normal(0, 0.5, (100, 5))
+    query_boxes[:, 2:4] = np.abs(query_boxes[:, 2:4]) + 0.1
+    for criterion in [-1, 0, 1, 2]:
+        assert np.allclose(
+            rotate_iou_cpu_eval(boxes, query_boxes, criterion),
+            rotate_iou_gpu_eval(boxes, query_boxes, criterion),
+            atol=1e-4)
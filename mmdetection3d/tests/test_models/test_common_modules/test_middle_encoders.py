@@ -47,3 +47,30 @@ def test_sparse_encoder_for_ssd():
 
     ret, _ = sparse_encoder(voxel_features, coors, 4, True)
     assert ret.shape == torch.Size([4, 256, 128, 128])
+
+
+def test_pointpillars_scatter():
+    scatter = build_middle_encoder(
+        dict(type='PointPillarsScatter', in_channels=4, output_shape=[6, 8]))
+    indices = [torch.randperm(48)[:10], torch.randperm(48)[:7]]
+    # The samples are not sorted and one of them is empty.
+    coors = torch.cat([
+        torch.stack([
+            torch.full((10, ), 2),
+            torch.zeros(10).long(), indices[0] // 8, indices[0] % 8
+        ], 1),
+        torch.stack([
+            torch.zeros(7).long(),
+            torch.zeros(7).long(), indices[1] // 8, indices[1] % 8
+        ], 1)
+    ]).int()
+    for dtype in [torch.float32, torch.float16]:
+        voxel_features = torch.rand(17, 4).to(dtype)
+        ret = scatter(voxel_features, coors, 3)
+        assert ret.shape == torch.Size([3, 4, 6, 8])
+        assert ret.dtype == dtype
+        assert torch.equal(ret[0],
+                           scatter(voxel_features[10:], coors[10:])[0])
+        assert not ret[1].any()
+        assert torch.equal(ret[2],
+                           scatter(voxel_features[:10], coors[:10])[0])
@@ -0,0 +1,151 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import pytest
+import torch
+
+from mmdet3d.ops import (PointFPModule, Points_Sampler, PointSAModuleMSG,
+                         ball_query, furthest_point_sample,
+                         furthest_point_sample_with_dist, gather_points,
+                         grouping_operation, three_interpolate, three_nn)
+
+
+def test_furthest_point_sample():
+    xyz = torch.tensor([[[-0.2748, 1.0020, -1.1674],
+                         [0.1015, 1.3952, -1.2681],
+                         [-0.8070, 2.4137, -0.5845],
+                         [-1.0001, 2.1982, -0.5859],
+                         [0.3841, 1.8983, -0.7431]],
+                        [[-1.0696, 3.0758, -0.1899],
+                         [-0.2559, 3.5521, -0.1402],
+                         [0.8164, 4.0081, -0.1839],
+                         [-1.1000, 3.0213, -0.8205],
+                         [-0.0518, 3.7251, -0.3950]]])
+    expected_idx = torch.tensor([[0, 2, 4], [0, 2, 1]], dtype=torch.int32)
+
+    idx = furthest_point_sample(xyz, 3)
+    assert torch.equal(idx, expected_idx)
+
+    xyz_dist = ((xyz.unsqueeze(2) - xyz.unsqueeze(1))**2).sum(-1)
+    idx = furthest_point_sample_with_dist(xyz_dist, 3)
+    assert torch.equal(idx, expected_idx)
+
+
+def test_ball_query():
+    xyz = torch.tensor([[[0., 0., 0.], [0.1, 0., 0.], [0.2, 0., 0.],
+                         [0.3, 0., 0.], [0.4, 0., 0.], [1., 1., 1.]]])
+    center_xyz = torch.tensor([[[0.2, 0., 0.], [1., 1., 1.2], [5., 5., 5.]]])
+
+    idx = ball_query(0, 0.25, 4, xyz, center_xyz)
+    expected_idx = torch.tensor(
+        [[[0, 1, 2, 3], [5, 5, 5, 5], [0, 0, 0, 0]]], dtype=torch.int32)
+    assert torch.equal(idx, expected_idx)
+
+    # the center itself is kept within the min radius
+    idx = ball_query(0.15, 0.25, 4, xyz, center_xyz)
+    expected_idx = torch.tensor(
+        [[[0, 2, 4, 0], [5, 5, 5, 5], [0, 0, 0, 0]]], dtype=torch.int32)
+    assert torch.equal(idx, expected_idx)
+
+
+def test_grouping_ops():
+    torch.manual_seed(0)
+    features = torch.rand(2, 4, 10, requires_grad=True)
+    idx = torch.randint(0, 10, (2, 5, 3), dtype=torch.int32)
+
+    grouped_features = grouping_operation(features, idx)
+    assert grouped_features.shape == torch.Size([2, 4, 5, 3])
+    assert torch.equal(grouped_features[1, :, 2, 1],
+                       features[1, :, idx[1, 2, 1]])
+
+    gathered_features = gather_points(features, idx[:, :, 0])
+    assert torch.equal(gathered_features, grouped_features[..., 0])
+
+    grouped_features.sum().backward()
+    assert features.grad.sum() == grouped_features.numel()
+
+
+def test_three_nn_interpolate():
+    torch.manual_seed(0)
+    target = torch.rand(2, 20, 3)
+    source = torch.rand(2, 8, 3)
+
+    dist, idx = three_nn(target, source)
+    expected_dist, expected_idx = torch.cdist(target, source).topk(
+        3, dim=2, largest=False)
+    assert idx.dtype == torch.int32
+    assert torch.equal(idx.long(), expected_idx)
+    assert torch.allclose(dist, expected_dist, atol=1e-6)
+
+    features = torch.rand(2, 4, 8)
+    weight = torch.rand(2, 20, 3)
+    interpolated_feats = three_interpolate(features, idx, weight)
+    expected_feats = (features[0][:, idx[0].long()] * weight[0]).sum(-1)
+    assert interpolated_feats.shape == torch.Size([2, 4, 20])
+    assert torch.allclose(interpolated_feats[0], expected_feats)
+
+
+def test_pointnet_modules_cpu():
+    torch.manual_seed(0)
+    xyz = torch.rand(2, 100, 3)
+    features = torch.rand(2, 4, 100)
+
+    sa_module = PointSAModuleMSG(
+        num_point=[8, 8],
+        radii=[0.2, 0.4],
+        sample_nums=[4, 8],
+        mlp_channels=[[4, 16], [4, 32]],
+        fps_mod=['F-FPS', 'D-FPS'],
+        fps_sample_range_list=[50, -1]).eval()
+    with torch.no_grad():
+        new_xyz, new_features, inds = sa_module(xyz, features)
+    assert new_xyz.shape == torch.Size([2, 16, 3])
+    assert new_features.shape == torch.Size([2, 48, 16])
+    assert (inds[:, :8] < 50).all() and (inds[:, 8:] >= 50).all()
+    assert torch.equal(new_xyz[1, 3], xyz[1, inds[1, 3]])
+
+    fp_module = PointFPModule(mlp_channels=[52, 16]).eval()
+    with torch.no_grad():
+        fp_features = fp_module(xyz, new_xyz, features, new_features)
+    assert fp_features.shape == torch.Size([2, 16, 100])
+
+
+def test_pointnet_ops_cuda_parity():
+    if not torch.cuda.is_available():
+        pytest.skip()
+    torch.manual_seed(0)
+    xyz = torch.rand(2, 1000, 3)
+    features = torch.rand(2, 8, 1000)
+
+    idx = furthest_point_sample(xyz, 64)
+    assert torch.equal(idx, furthest_point_sample(xyz.cuda(), 64).cpu())
+    for fps_mod in ['D-FPS', 'F-FPS', 'FS']:
+        sampler = Points_Sampler([64], [fps_mod])
+        assert torch.equal(
+            sampler(xyz, features),
+            sampler(xyz.cuda(), features.cuda()).cpu())
+
+    center_xyz = gather_points(xyz.transpose(1, 2).contiguous(),
+                               idx).transpose(1, 2).contiguous()
+    assert torch.equal(
+        center_xyz,
+        gather_points(xyz.transpose(1, 2).contiguous().cuda(),
+                      idx.cuda()).transpose(1, 2).cpu())
+    for min_radius, max_radius in [(0, 0.1), (0.05, 0.2)]:
+        group_idx = ball_query(min_radius, max_radius, 16, xyz, center_xyz)
+        assert torch.equal(
+            group_idx,
+            ball_query(min_radius, max_radius, 16, xyz.cuda(),
+                       center_xyz.cuda()).cpu())
+    assert torch.equal(
+        grouping_operation(features, group_idx),
+        grouping_operation(features.cuda(), group_idx.cuda()).cpu())
+
+    dist, nn_idx = three_nn(xyz, center_xyz)
+    cuda_dist, cuda_nn_idx = three_nn(xyz.cuda(), center_xyz.cuda())
+    assert torch.equal(nn_idx, cuda_nn_idx.cpu())
+    assert torch.allclose(dist, cuda_dist.cpu())
+    weight = torch.rand(2, 1000, 3)
+    center_features = torch.rand(2, 8, 64)
+    assert torch.allclose(
+        three_interpolate(center_features, nn_idx, weight),
+        three_interpolate(center_features.cuda(), nn_idx.cuda(),
+                          weight.cuda()).cpu())
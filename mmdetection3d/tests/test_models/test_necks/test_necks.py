@@ -193,3 +193,47 @@ def test_lss_view_transformer():
     assert torch.sum(
         (feats_bev - feats_bev_acc).abs() < 0.0001).float() / (64 * 128 *
                                                                128) > 0.99
+
+
+def test_lss_view_transformer_acceleration():
+    grid_config = {
+        'x': [-12.8, 12.8, 0.8],
+        'y': [-12.8, 12.8, 0.8],
+        'z': [-10.0, 10.0, 20.0],
+        'depth': [1.0, 20.0, 1.0],
+    }
+    neck_cfg = dict(
+        type='LSSViewTransformer',
+        grid_config=grid_config,
+        input_size=(64, 176),
+        downsample=16,
+        in_channels=8,
+        out_channels=8,
+        accelerate=True,
+        max_voxel_points=4)
+    neck = build_neck(neck_cfg)
+    rots = torch.eye(3).expand(1, 2, 3, 3)
+    trans = torch.tensor([[[0.0, 0.0, 0.0], [0.5, -0.5, 0.0]]])
+    intrins = torch.tensor([[100.0, 0.0, 88.0], [0.0, 100.0, 32.0],
+                            [0.0, 0.0, 1.0]]).expand(1, 2, 3, 3)
+    post_rots = torch.eye(3).expand(1, 2, 3, 3)
+    post_trans = torch.zeros(1, 2, 3)
+    coor = neck.get_lidar_coor(rots, trans, intrins, post_rots, post_trans)
+    volume = torch.rand(1, 2, neck.D, 4, 11, 8)
+
+    # points of a voxel beyond max_voxel_points are dropped
+    neck.init_acceleration(coor, volume)
+    _, _, ranks, point_idx = neck.voxel_pooling_prepare(coor, volume)
+    repeat_times = [0]
+    for i in range(1, ranks.shape[0]):
+        repeat_times.append(repeat_times[-1] +
+                            1 if ranks[i] == ranks[i - 1] else 0)
+    kept = torch.tensor(repeat_times) < 4
+    assert torch.equal(neck.point_idx, point_idx[kept])
+
+    neck.max_voxel_points = ranks.shape[0]
+    neck.init_acceleration(coor, volume)
+    feats_bev_acc = neck.voxel_pooling_accelerated(volume)
+    feats_bev = neck.voxel_pooling(coor, volume)
+    assert feats_bev_acc.shape == (1, 8, 32, 32)
+    assert torch.allclose(feats_bev_acc, feats_bev, atol=1e-4)
@@ -20,3 +20,37 @@ def test_voxel_generator():
     assert voxels.shape == (8, 1000, 4)
     assert np.all(coors == expected_coors)
     assert np.all(num_points_per_voxel == expected_num_points_per_voxel)
+
+
+def test_voxel_generator_numpy_engine():
+    np.random.seed(0)
+    voxel_size = [0.5, 0.5, 0.5]
+    point_cloud_range = [0, -4, -3, 7.2, 4, 1]
+    points = np.random.rand(2000, 4).astype(np.float32)
+    points[:, :3] = points[:, :3] * [8, 10, 5] + [0, -5, -3]
+    # points on the boundaries of voxels
+    points[:20, :3] = np.array([0.5, -4, 1])
+    for max_num_points, max_voxels in [(1000, 20000), (5, 20000), (5, 30)]:
+        numba_generator = VoxelGenerator(voxel_size, point_cloud_range,
+                                         max_num_points, max_voxels)
+        numpy_generator = VoxelGenerator(
+            voxel_size,
+            point_cloud_range,
+            max_num_points,
+            max_voxels,
+            engine='numpy')
+        expected = numba_generator.generate(points)
+        results = numpy_generator.generate(points)
+        for result, expected_result in zip(results, expected):
+            assert result.dtype == expected_result.dtype
+            assert np.array_equal(result, expected_result)
+
+    coors = numpy_generator.generate_dynamic(points)
+    assert coors.shape == (2000, 3)
+    valid = np.all(coors >= 0, axis=1)
+    expected_coors = np.floor(
+        (points[:, :3] - np.array(point_cloud_range[:3], dtype=np.float32)) /
+        np.array(voxel_size, dtype=np.float32))[:, ::-1]
+    assert np.all(coors[~valid] == -1)
+    assert np.array_equal(coors[valid], expected_coors[valid])
+    assert np.all(coors[valid] < numpy_generator.grid_size[::-1])
@@ -0,0 +1,134 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the collision test of ``DataBaseSampler.sample_class_v2``.
+
+``sample_class_v2`` with the grid bucketed collision test is compared with
+the test of all pairs of boxes it replaced (``legacy_sample_class_v2``) on
+synthetic scenes of increasing densities, and the valid samples are checked
+to be identical. The boxes are sampled by index as from a packed database,
+so that the time is not dominated by copying the infos.
+
+Example:
+    python tools/analysis_tools/benchmark_box_collision.py \
+        --num-gts 10 50 100 200 --num-samples 50 100 200 400
+"""
+import argparse
+import time
+
+import numpy as np
+
+from mmdet3d.core.bbox import box_np_ops
+from mmdet3d.datasets.pipelines import data_augment_utils
+from mmdet3d.datasets.pipelines.dbsampler import BatchSampler, DataBaseSampler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the collision test of DataBaseSampler')
+    parser.add_argument(
+        '--num-gts',
+        type=int,
+        nargs='+',
+        default=[10, 50, 100, 200],
+        help='Number of ground truths of the scenes')
+    parser.add_argument(
+        '--num-samples',
+        type=int,
+        nargs='+',
+        default=[50, 100, 200, 400],
+        help='Number of sampled boxes of the scenes')
+    parser.add_argument(
+        '--range', type=float, default=51.2, help='Half size of the scenes')
+    parser.add_argument('--num-iters', type=int, default=20)
+    return parser.parse_args()
+
+
+def legacy_sample_class_v2(self, name, num, gt_bboxes):
+    """The collision test of all pairs replaced in ``sample_class_v2``."""
+    sampled = self.sampler_dict[name].sample(num)
+    num_gt = gt_bboxes.shape[0]
+    num_sampled = len(sampled)
+    gt_bboxes_bv = box_np_ops.center_to_corner_box2d(
+        gt_bboxes[:, 0:2], gt_bboxes[:, 3:5], gt_bboxes[:, 6])
+
+    sp_boxes = self.packed_boxes[sampled]
+    boxes = np.concatenate([gt_bboxes, sp_boxes], axis=0).copy()
+
+    sp_boxes_new = boxes[gt_bboxes.shape[0]:]
+    sp_boxes_bv = box_np_ops.center_to_corner_box2d(
+        sp_boxes_new[:, 0:2], sp_boxes_new[:, 3:5], sp_boxes_new[:, 6])
+
+    total_bv = np.concatenate([gt_bboxes_bv, sp_boxes_bv], axis=0)
+    coll_mat = data_augment_utils.box_collision_test(total_bv, total_bv)
+    diag = np.arange(total_bv.shape[0])
+    coll_mat[diag, diag] = False
+
+    valid_samples = []
+    for i in range(num_gt, num_gt + num_sampled):
+        if coll_mat[i].any():
+            coll_mat[i] = False
+            coll_mat[:, i] = False
+        else:
+            valid_samples.append(sampled[i - num_gt])
+    return valid_samples
+
+
+def make_boxes(num, scene_range, rng):
+    """Random lidar boxes of the sizes of cars and pedestrians."""
+    return np.concatenate([
+        rng.uniform(-scene_range, scene_range, (num, 2)),
+        rng.uniform(-2, 0, (num, 1)),
+        rng.uniform(0.5, 5, (num, 1)),
+        rng.uniform(0.5, 2.5, (num, 1)),
+        rng.uniform(1, 2, (num, 1)),
+        rng.uniform(-np.pi, np.pi, (num, 1))
+    ], 1).astype(np.float32)
+
+
+def make_sampler(boxes):
+    """A DataBaseSampler of a single class sampling ``boxes`` by index."""
+    sampler = DataBaseSampler.__new__(DataBaseSampler)
+    sampler.packed_db = 'synthetic'
+    sampler.packed_boxes = boxes
+    sampler.sampler_dict = dict(
+        Car=BatchSampler(np.arange(boxes.shape[0]), 'Car', shuffle=True))
+    return sampler
+
+
+def measure(func, num_iters):
+    """Median time of ``func`` in ms and its outputs."""
+    times, outputs = list(), list()
+    for _ in range(num_iters):
+        start = time.perf_counter()
+        outputs.append(func())
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000, outputs
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(0)
+    print(f'{"gts":>5} {"samples":>8} {"valid":>6} {"all pairs ms":>13} '
+          f'{"grid ms":>8} {"speedup":>8}')
+    for num_gt, num_sample in zip(args.num_gts, args.num_samples):
+        gt_bboxes = make_boxes(num_gt, args.range, rng)
+        boxes = make_boxes(num_sample * args.num_iters, args.range, rng)
+        # warm up the numba kernels
+        make_sampler(boxes).sample_class_v2('Car', num_sample, gt_bboxes)
+        np.random.seed(0)
+        sampler = make_sampler(boxes)
+        legacy_ms, expected = measure(
+            lambda: legacy_sample_class_v2(sampler, 'Car', num_sample,
+                                           gt_bboxes), args.num_iters)
+        np.random.seed(0)
+        sampler = make_sampler(boxes)
+        ms, outputs = measure(
+            lambda: sampler.sample_class_v2('Car', num_sample, gt_bboxes),
+            args.num_iters)
+        assert outputs == expected
+        num_valid = np.mean([len(valid) for valid in outputs])
+        print(f'{num_gt:>5} {num_sample:>8} {num_valid:>6.1f} '
+              f'{legacy_ms:13.2f} {ms:8.2f} {legacy_ms / ms:8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the matching of ``indoor_eval.eval_det_cls``.
+
+The vectorized ``eval_det_cls`` is compared with the per-detection loop it
+replaced (``legacy_eval_det_cls``) on synthetic predictions of the size of
+the ScanNet or SUN RGB-D val sets, and the recalls, precisions and APs are
+checked to be identical.
+
+Example:
+    python tools/analysis_tools/benchmark_indoor_eval.py --dataset scannet
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from mmdet3d.core.bbox.structures import DepthInstance3DBoxes
+from mmdet3d.core.evaluation.indoor_eval import average_precision, eval_det_cls
+
+# number of val scenes, classes, gts per scene and class and dets per scene
+DATASETS = dict(
+    scannet=dict(num_scenes=312, num_classes=18, num_gts=2, num_dets=256),
+    sunrgbd=dict(num_scenes=5050, num_classes=10, num_gts=1, num_dets=64))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the matching of indoor_eval')
+    parser.add_argument(
+        '--dataset', choices=list(DATASETS), default='scannet')
+    parser.add_argument(
+        '--iou-thr', type=float, nargs='+', default=[0.25, 0.5])
+    parser.add_argument(
+        '--num-classes',
+        type=int,
+        default=None,
+        help='Only evaluate the first classes to save time')
+    return parser.parse_args()
+
+
+def legacy_eval_det_cls(pred, gt, iou_thr=None):
+    """The per-detection matching replaced by ``eval_det_cls``."""
+    class_recs = {}
+    npos = 0
+    for img_id in gt.keys():
+        cur_gt_num = len(gt[img_id])
+        if cur_gt_num != 0:
+            gt_cur = torch.zeros([cur_gt_num, 7], dtype=torch.float32)
+            for i in range(cur_gt_num):
+                gt_cur[i] = gt[img_id][i].tensor
+            bbox = gt[img_id][0].new_box(gt_cur)
+        else:
+            bbox = gt[img_id]
+        det = [[False] * len(bbox) for i in iou_thr]
+        npos += len(bbox)
+        class_recs[img_id] = {'bbox': bbox, 'det': det}
+
+    image_ids = []
+    confidence = []
+    ious = []
+    for img_id in pred.keys():
+        cur_num = len(pred[img_id])
+        if cur_num == 0:
+            continue
+        pred_cur = torch.zeros((cur_num, 7), dtype=torch.float32)
+        box_idx = 0
+        for box, score in pred[img_id]:
+            image_ids.append(img_id)
+            confidence.append(score)
+            pred_cur[box_idx] = box.tensor
+            box_idx += 1
+        pred_cur = box.new_box(pred_cur)
+        gt_cur = class_recs[img_id]['bbox']
+        if len(gt_cur) > 0:
+            iou_cur = pred_cur.overlaps(pred_cur, gt_cur)
+            for i in range(cur_num):
+                ious.append(iou_cur[i])
+        else:
+            for i in range(cur_num):
+                ious.append(np.zeros(1))
+
+    confidence = np.array(confidence)
+    sorted_ind = np.argsort(-confidence)
+    image_ids = [image_ids[x] for x in sorted_ind]
+    ious = [ious[x] for x in sorted_ind]
+
+    nd = len(image_ids)
+    tp_thr = [np.zeros(nd) for i in iou_thr]
+    fp_thr = [np.zeros(nd) for i in iou_thr]
+    for d in range(nd):
+        R = class_recs[image_ids[d]]
+        iou_max = -np.inf
+        BBGT = R['bbox']
+        cur_iou = ious[d]
+        if len(BBGT) > 0:
+            for j in range(len(BBGT)):
+                iou = cur_iou[j]
+                if iou > iou_max:
+                    iou_max = iou
+                    jmax = j
+        for iou_idx, thresh in enumerate(iou_thr):
+            if iou_max > thresh:
+                if not R['det'][iou_idx][jmax]:
+                    tp_thr[iou_idx][d] = 1.
+                    R['det'][iou_idx][jmax] = 1
+                else:
+                    fp_thr[iou_idx][d] = 1.
+            else:
+                fp_thr[iou_idx][d] = 1.
+
+    ret = []
+    for iou_idx, thresh in enumerate(iou_thr):
+        fp = np.cumsum(fp_thr[iou_idx])
+        tp = np.cumsum(tp_thr[iou_idx])
+        recall = tp / float(npos)
+        precision = tp / np.maximum(tp + fp, np.finfo(np.float64).eps)
+        ap = average_precision(recall, precision)
+        ret.append((recall, precision, ap))
+    return ret
+
+
+def make_class(num_scenes, num_gts, num_dets, rng):
+    """Synthetic gts and preds of one class in the format of indoor_eval."""
+    pred, gt = {}, {}
+    for img_id in range(num_scenes):
+        num_gt = rng.poisson(num_gts)
+        gt_boxes = np.concatenate([
+            rng.uniform(-4, 4, (num_gt, 2)),
+            rng.uniform(0, 1, (num_gt, 1)),
+            rng.uniform(0.3, 2, (num_gt, 3)),
+            rng.uniform(-np.pi, np.pi, (num_gt, 1))
+        ], 1)
+        num_det = rng.poisson(num_dets)
+        det_boxes = np.concatenate([
+            rng.uniform(-4, 4, (num_det, 2)),
+            rng.uniform(0, 1, (num_det, 1)),
+            rng.uniform(0.3, 2, (num_det, 3)),
+            rng.uniform(-np.pi, np.pi, (num_det, 1))
+        ], 1)
+        # jitter the gts for part of the dets
+        num_jittered = min(num_gt * 2, num_det) if num_gt > 0 else 0
+        jittered_inds = np.arange(num_jittered) % max(num_gt, 1)
+        det_boxes[:num_jittered] = gt_boxes[jittered_inds] + rng.normal(
+            0, 0.1, (num_jittered, 7))
+        det_boxes[:, 3:6] = np.abs(det_boxes[:, 3:6])
+        gt_boxes = DepthInstance3DBoxes(
+            torch.tensor(gt_boxes, dtype=torch.float32))
+        det_boxes = DepthInstance3DBoxes(
+            torch.tensor(det_boxes, dtype=torch.float32))
+        scores = rng.random(num_det).astype(np.float32)
+        gt[img_id] = [gt_boxes[i] for i in range(num_gt)]
+        pred[img_id] = [(det_boxes[i], scores[i]) for i in range(num_det)]
+    return pred, gt
+
+
+def main():
+    args = parse_args()
+    cfg = DATASETS[args.dataset]
+    num_classes = args.num_classes or cfg['num_classes']
+    rng = np.random.default_rng(0)
+    classes = [
+        make_class(cfg['num_scenes'], cfg['num_gts'],
+                   cfg['num_dets'] // cfg['num_classes'], rng)
+        for _ in range(num_classes)
+    ]
+    num_dets = sum(
+        len(dets) for pred, _ in classes for dets in pred.values())
+    print(f'{args.dataset}: {cfg["num_scenes"]} scenes, {num_classes} '
+          f'classes, {num_dets} dets')
+    times = dict(legacy=0., vectorized=0.)
+    identical = True
+    for pred, gt in classes:
+        start = time.perf_counter()
+        expected = legacy_eval_det_cls(pred, gt, args.iou_thr)
+        times['legacy'] += time.perf_counter() - start
+        start = time.perf_counter()
+        results = eval_det_cls(pred, gt, args.iou_thr)
+        times['vectorized'] += time.perf_counter() - start
+        identical &= all(
+            np.array_equal(result, expected_result)
+            for ret, expected_ret in zip(results, expected)
+            for result, expected_result in zip(ret, expected_ret))
+    for name, seconds in times.items():
+        print(f'{name:<12} {seconds:8.2f} s')
+    print(f'Speedup: {times["legacy"] / times["vectorized"]:.2f}x, '
+          f'identical results: {identical}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the accelerated voxel pooling of LSSViewTransformer.
+
+The initialization time and the per-forward time and memory of the
+accelerated voxel pooling are compared with the loop based initialization
+and the dense ``max_voxel_points`` buffer it replaced (``--legacy``), and
+with the non-accelerated ``voxel_pooling``.
+
+Example:
+    python tools/analysis_tools/benchmark_lss_acceleration.py \
+        --input-size 256 704 --legacy
+"""
+import argparse
+import time
+
+import torch
+
+from mmdet3d.models import build_neck
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the acceleration of LSSViewTransformer')
+    parser.add_argument(
+        '--input-size', type=int, nargs=2, default=[256, 704])
+    parser.add_argument('--downsample', type=int, default=16)
+    parser.add_argument('--num-cams', type=int, default=6)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--out-channels', type=int, default=64)
+    parser.add_argument('--max-voxel-points', type=int, default=300)
+    parser.add_argument(
+        '--legacy',
+        action='store_true',
+        help='Also run the loop based initialization, which is slow for '
+        'large inputs, especially on cuda')
+    parser.add_argument('--num-iters', type=int, default=10)
+    parser.add_argument(
+        '--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    return parser.parse_args()
+
+
+def legacy_init_acceleration(neck, coor, x):
+    """The loop based initialization replaced by ``init_acceleration``."""
+    x, coor, ranks, point_idx = neck.voxel_pooling_prepare(coor, x)
+    repeat_times = torch.ones(
+        coor.shape[0], device=coor.device, dtype=coor.dtype)
+    times = 0
+    repeat_times[0] = 0
+    cur_rank = ranks[0]
+    for i in range(1, ranks.shape[0]):
+        if cur_rank == ranks[i]:
+            times += 1
+            repeat_times[i] = times
+        else:
+            cur_rank = ranks[i]
+            times = 0
+            repeat_times[i] = times
+    kept = repeat_times < neck.max_voxel_points
+    repeat_times, coor = repeat_times[kept], coor[kept]
+    return torch.cat([coor, repeat_times.unsqueeze(-1)],
+                     dim=-1), point_idx[kept]
+
+
+def legacy_voxel_pooling_accelerated(neck, coor, point_idx, x):
+    """The dense voxel pooling replaced by ``voxel_pooling_accelerated``."""
+    B, N, D, H, W, C = x.shape
+    x = x.reshape(B * N * D * H * W, C)[point_idx]
+    gs = neck.grid_size.to(torch.long)
+    final = torch.zeros((B, C, gs[2], gs[1], gs[0], neck.max_voxel_points),
+                        device=x.device)
+    final[coor[:, 3], :, coor[:, 2], coor[:, 1], coor[:, 0], coor[:, 4]] = x
+    final = final.sum(-1)
+    return torch.cat(final.unbind(dim=2), 1)
+
+
+def _synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def measure(func, device, num_iters=1):
+    """Median time in ms and peak memory in MB (cuda only) of ``func``."""
+    times = list()
+    if device.type == 'cuda':
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats(device)
+        base_memory = torch.cuda.memory_allocated(device)
+    for _ in range(num_iters):
+        _synchronize(device)
+        start = time.perf_counter()
+        output = func()
+        _synchronize(device)
+        times.append(time.perf_counter() - start)
+    memory = float('nan')
+    if device.type == 'cuda':
+        memory = (torch.cuda.max_memory_allocated(device) -
+                  base_memory) / 2**20
+    return sorted(times)[len(times) // 2] * 1000, memory, output
+
+
+def main():
+    args = parse_args()
+    device = torch.device(args.device)
+    grid_config = {
+        'x': [-51.2, 51.2, 0.8],
+        'y': [-51.2, 51.2, 0.8],
+        'z': [-10.0, 10.0, 20.0],
+        'depth': [1.0, 60.0, 1.0],
+    }
+    neck = build_neck(
+        dict(
+            type='LSSViewTransformer',
+            grid_config=grid_config,
+            input_size=tuple(args.input_size),
+            downsample=args.downsample,
+            in_channels=args.out_channels,
+            out_channels=args.out_channels,
+            accelerate=True,
+            max_voxel_points=args.max_voxel_points)).to(device)
+    B, N = args.batch_size, args.num_cams
+    H, W = [size // args.downsample for size in args.input_size]
+    rots = torch.eye(3, device=device).expand(B, N, 3, 3)
+    trans = torch.zeros(B, N, 3, device=device)
+    img_h, img_w = args.input_size
+    cam2imgs = torch.tensor(
+        [[560., 0., img_w / 2], [0., 560., img_h / 2], [0., 0., 1.]],
+        device=device).expand(B, N, 3, 3)
+    post_rots = torch.eye(3, device=device).expand(B, N, 3, 3)
+    post_trans = torch.zeros(B, N, 3, device=device)
+    volume = torch.rand(B, N, neck.D, H, W, args.out_channels, device=device)
+    with torch.no_grad():
+        coor = neck.get_lidar_coor(rots, trans, cam2imgs, post_rots,
+                                   post_trans)
+        print(f'{coor.shape[:-1].numel()} frustum points, '
+              f'{args.out_channels} channels on {device.type}')
+        # Size of the pooling buffer of every forward.
+        gs = neck.grid_size.to(torch.long).tolist()
+        buffer_mb = B * args.out_channels * gs[0] * gs[1] * gs[2] * 4 / 2**20
+        print(f'{"":<28} {"ms":>10} {"peak MB":>10} {"buffer MB":>10}')
+        init_ms, _, _ = measure(lambda: neck.init_acceleration(coor, volume),
+                                device)
+        print(f'{"init_acceleration":<28} {init_ms:10.1f}')
+        ms, memory, output = measure(
+            lambda: neck.voxel_pooling_accelerated(volume), device,
+            args.num_iters)
+        print(f'{"voxel_pooling_accelerated":<28} {ms:10.2f} {memory:10.1f} '
+              f'{buffer_mb:10.1f}')
+        ref_ms, ref_memory, ref = measure(
+            lambda: neck.voxel_pooling(coor, volume), device, args.num_iters)
+        print(f'{"voxel_pooling":<28} {ref_ms:10.2f} {ref_memory:10.1f}')
+        if args.legacy:
+            legacy_init_ms, _, (legacy_coor, legacy_point_idx) = measure(
+                lambda: legacy_init_acceleration(neck, coor, volume), device)
+            print(f'{"legacy init_acceleration":<28} {legacy_init_ms:10.1f}')
+            legacy_ms, legacy_memory, legacy = measure(
+                lambda: legacy_voxel_pooling_accelerated(
+                    neck, legacy_coor, legacy_point_idx, volume), device,
+                args.num_iters)
+            print(f'{"legacy pooling":<28} {legacy_ms:10.2f} '
+                  f'{legacy_memory:10.1f} '
+                  f'{buffer_mb * args.max_voxel_points:10.1f}')
+            print('Max difference to the legacy acceleration: '
+                  f'{(output - legacy).abs().max().item():.2e}')
+        print('Max difference to voxel_pooling (points beyond '
+              f'max_voxel_points are dropped): '
+              f'{(output - ref).abs().max().item():.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the sweep cache of LoadPointsFromMultiSweeps.
+
+The throughput of ``LoadPointsFromMultiSweeps`` is measured on synthetic
+nuScenes-like samples when loading every sweep from its file, when filling
+the cache in the first epoch and when serving the sweeps from the cache,
+and the points are checked to be identical.
+
+Example:
+    python tools/analysis_tools/benchmark_multi_sweeps.py \
+        --sweeps-num 10 --sweeps-per-sample 10 --num-samples 50
+    # random choice of the sweeps in training
+    python tools/analysis_tools/benchmark_multi_sweeps.py \
+        --sweeps-num 10 --sweeps-per-sample 20 --train
+"""
+import argparse
+import tempfile
+import time
+from os import path as osp
+
+import numpy as np
+
+from mmdet3d.core.points import LiDARPoints
+from mmdet3d.datasets.pipelines import LoadPointsFromMultiSweeps
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the sweep cache of LoadPointsFromMultiSweeps')
+    parser.add_argument('--sweeps-num', type=int, default=10)
+    parser.add_argument('--sweeps-per-sample', type=int, default=10)
+    parser.add_argument('--num-samples', type=int, default=50)
+    parser.add_argument(
+        '--points-per-sweep',
+        type=int,
+        default=34720,
+        help='Average number of points of a nuScenes sweep')
+    parser.add_argument(
+        '--train',
+        action='store_true',
+        help='Randomly choose the sweeps instead of the nearest ones')
+    parser.add_argument('--remove-close', action='store_true')
+    parser.add_argument(
+        '--tmp-dir',
+        default=None,
+        help='Directory of the synthetic sweeps and the cache')
+    return parser.parse_args()
+
+
+def make_samples(root, num_samples, sweeps_per_sample, points_per_sweep):
+    """Synthetic samples with sweeps saved as nuScenes .bin files."""
+    rng = np.random.default_rng(0)
+    samples = []
+    for i in range(num_samples):
+        sweeps = []
+        for j in range(sweeps_per_sample):
+            data_path = osp.join(root, f'{i}_{j}.pcd.bin')
+            rng.normal(0, 20, (points_per_sweep, 5)).astype(
+                np.float32).tofile(data_path)
+            yaw = rng.uniform(-0.05, 0.05)
+            sweeps.append(
+                dict(
+                    data_path=data_path,
+                    timestamp=1537290014899034 - 50000 * (j + 1),
+                    sensor2lidar_translation=rng.normal(0, 1, 3),
+                    sensor2lidar_rotation=np.array(
+                        [[np.cos(yaw), -np.sin(yaw), 0],
+                         [np.sin(yaw), np.cos(yaw), 0], [0, 0, 1]])))
+        samples.append(
+            dict(
+                sample_idx=f'sample_{i}',
+                timestamp=1537290014.899034,
+                sweeps=sweeps,
+                points=rng.normal(0, 20,
+                                  (points_per_sweep, 5)).astype(np.float32)))
+    return samples
+
+
+def run_epoch(loader, samples):
+    """Time of an epoch in s and the loaded points."""
+    np.random.seed(0)
+    outputs = list()
+    start = time.perf_counter()
+    for sample in samples:
+        results = dict(
+            sample_idx=sample['sample_idx'],
+            timestamp=sample['timestamp'],
+            sweeps=sample['sweeps'],
+            points=LiDARPoints(sample['points'].copy(), points_dim=5))
+        outputs.append(loader(results)['points'].tensor)
+    return time.perf_counter() - start, outputs
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp_dir:
+        samples = make_samples(tmp_dir, args.num_samples,
+                               args.sweeps_per_sample, args.points_per_sweep)
+        loaders = dict(
+            files=LoadPointsFromMultiSweeps(
+                sweeps_num=args.sweeps_num,
+                remove_close=args.remove_close,
+                test_mode=not args.train),
+            cache=LoadPointsFromMultiSweeps(
+                sweeps_num=args.sweeps_num,
+                remove_close=args.remove_close,
+                test_mode=not args.train,
+                cache_dir=osp.join(tmp_dir, 'cache')))
+        print(f'{args.num_samples} samples of {args.sweeps_per_sample} '
+              f'sweeps, sweeps_num {args.sweeps_num}, '
+              f'{"train" if args.train else "test"} mode')
+        print(f'{"loader":<12} {"s":>8} {"samples/s":>10}')
+        seconds, expected = run_epoch(loaders['files'], samples)
+        print(f'{"files":<12} {seconds:8.2f} '
+              f'{args.num_samples / seconds:10.1f}')
+        for epoch in ['cache fill', 'cache']:
+            seconds, outputs = run_epoch(loaders['cache'], samples)
+            print(f'{epoch:<12} {seconds:8.2f} '
+                  f'{args.num_samples / seconds:10.1f}')
+        identical = all(
+            output.equal(points) for output, points in zip(outputs, expected))
+        print(f'Identical points: {identical}')
+
+
+if __name__ == '__main__':
+    main()
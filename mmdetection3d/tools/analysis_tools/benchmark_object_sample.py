@@ -0,0 +1,107 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the ground truth database of DataBaseSampler.
+
+``DataBaseSampler.sample_all`` is timed with a file per object and with the
+packed memory-mapped database of ``tools/data_converter/pack_gt_database.py``
+and the sampled boxes, labels and points are checked to be identical. The
+packed database is created next to the infos if it does not exist. Drop the
+page cache before the run to measure cold reads, e.g.
+``sync && echo 3 > /proc/sys/vm/drop_caches``.
+
+Example:
+    python tools/analysis_tools/benchmark_object_sample.py \
+        data/kitti/kitti_dbinfos_train.pkl data/kitti --num-samples 500
+"""
+import argparse
+import os.path as osp
+import time
+
+import numpy as np
+
+from mmdet3d.datasets.pipelines.dbsampler import DataBaseSampler
+from tools.data_converter.pack_gt_database import pack_gt_database
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the ground truth database of DataBaseSampler')
+    parser.add_argument('info_path', help='path of the database infos')
+    parser.add_argument('data_root', help='root of the database paths')
+    parser.add_argument(
+        '--packed-db',
+        default=None,
+        help='prefix of the packed database, the infos path without the '
+        'extension and with the suffix "_packed" by default')
+    parser.add_argument(
+        '--classes', nargs='+', default=['Car', 'Pedestrian', 'Cyclist'])
+    parser.add_argument(
+        '--sample-groups',
+        type=int,
+        nargs='+',
+        default=[15, 10, 10],
+        help='Number of samples of each class')
+    parser.add_argument('--load-dim', type=int, default=4)
+    parser.add_argument('--num-samples', type=int, default=500)
+    return parser.parse_args()
+
+
+def build_sampler(args, packed_db=None):
+    return DataBaseSampler(
+        info_path=args.info_path,
+        data_root=args.data_root,
+        rate=1.0,
+        prepare=dict(
+            filter_by_difficulty=[-1],
+            filter_by_min_points={name: 5
+                                  for name in args.classes}),
+        sample_groups=dict(zip(args.classes, args.sample_groups)),
+        classes=args.classes,
+        points_loader=dict(
+            type='LoadPointsFromFile',
+            coord_type='LIDAR',
+            load_dim=args.load_dim,
+            use_dim=list(range(args.load_dim))),
+        packed_db=packed_db)
+
+
+def measure(sampler, num_samples):
+    """Time of ``sample_all`` in s and its outputs."""
+    gt_bboxes = np.zeros((0, 7), dtype=np.float32)
+    gt_labels = np.zeros(0, dtype=np.int64)
+    np.random.seed(0)
+    outputs = list()
+    start = time.perf_counter()
+    for _ in range(num_samples):
+        outputs.append(sampler.sample_all(gt_bboxes, gt_labels))
+    return time.perf_counter() - start, outputs
+
+
+def main():
+    args = parse_args()
+    packed_db = args.packed_db
+    if packed_db is None:
+        packed_db = osp.splitext(args.info_path)[0] + '_packed'
+    if not osp.exists(f'{packed_db}_objects.npy'):
+        pack_gt_database(args.info_path, args.data_root, packed_db,
+                         args.load_dim)
+    print(f'{"database":<8} {"init s":>8} {"sample s":>9} {"samples/s":>10}')
+    results = dict()
+    for name, cur_packed_db in [('files', None), ('packed', packed_db)]:
+        start = time.perf_counter()
+        sampler = build_sampler(args, cur_packed_db)
+        init_time = time.perf_counter() - start
+        seconds, results[name] = measure(sampler, args.num_samples)
+        print(f'{name:<8} {init_time:8.2f} {seconds:9.2f} '
+              f'{args.num_samples / seconds:10.1f}')
+    identical = all(
+        packed is files is None
+        or (np.array_equal(packed['gt_bboxes_3d'], files['gt_bboxes_3d'])
+            and np.array_equal(packed['gt_labels_3d'], files['gt_labels_3d'])
+            and np.array_equal(packed['points'].tensor.numpy(),
+                               files['points'].tensor.numpy()))
+        for packed, files in zip(results['packed'], results['files']))
+    print(f'Identical samples: {identical}')
+
+
+if __name__ == '__main__':
+    main()
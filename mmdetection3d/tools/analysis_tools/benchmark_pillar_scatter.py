@@ -0,0 +1,130 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the batched scatter of PointPillarsScatter.
+
+The throughput of ``PointPillarsScatter.forward_batch`` is compared with the
+per-sample loop it replaced over a range of batch sizes, in fp32 and fp16.
+
+Example:
+    python tools/analysis_tools/benchmark_pillar_scatter.py \
+        --batch-sizes 1 2 4 8 --num-pillars 12000
+"""
+import argparse
+import time
+
+import torch
+
+from mmdet3d.models import build_middle_encoder
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the batched scatter of PointPillarsScatter')
+    parser.add_argument(
+        '--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument(
+        '--num-pillars',
+        type=int,
+        default=12000,
+        help='Number of non-empty pillars per sample')
+    parser.add_argument('--in-channels', type=int, default=64)
+    parser.add_argument(
+        '--output-shape', type=int, nargs=2, default=[496, 432])
+    parser.add_argument(
+        '--dtypes', nargs='+', default=['fp32', 'fp16'],
+        choices=['fp32', 'fp16'])
+    parser.add_argument('--num-warmup', type=int, default=2)
+    parser.add_argument('--num-iters', type=int, default=10)
+    parser.add_argument('--device', default='cpu')
+    return parser.parse_args()
+
+
+def legacy_forward_batch(scatter, voxel_features, coors, batch_size):
+    """The per-sample loop replaced by ``forward_batch``."""
+    batch_canvas = []
+    for batch_itt in range(batch_size):
+        canvas = torch.zeros(
+            scatter.in_channels,
+            scatter.nx * scatter.ny,
+            dtype=voxel_features.dtype,
+            device=voxel_features.device)
+        batch_mask = coors[:, 0] == batch_itt
+        this_coors = coors[batch_mask, :]
+        indices = this_coors[:, 2] * scatter.nx + this_coors[:, 3]
+        indices = indices.type(torch.long)
+        voxels = voxel_features[batch_mask, :]
+        voxels = voxels.t()
+        canvas[:, indices] = voxels
+        batch_canvas.append(canvas)
+    batch_canvas = torch.stack(batch_canvas, 0)
+    return batch_canvas.view(batch_size, scatter.in_channels, scatter.ny,
+                             scatter.nx)
+
+
+def make_inputs(scatter, batch_size, num_pillars, dtype, device):
+    """Random features and unique pillar coordinates of every sample."""
+    num_pillars = min(num_pillars, scatter.ny * scatter.nx)
+    coors = []
+    for batch_idx in range(batch_size):
+        indices = torch.randperm(scatter.ny * scatter.nx)[:num_pillars]
+        coors.append(
+            torch.stack([
+                torch.full_like(indices, batch_idx),
+                torch.zeros_like(indices), indices // scatter.nx,
+                indices % scatter.nx
+            ], 1))
+    coors = torch.cat(coors).int().to(device)
+    voxel_features = torch.rand(
+        coors.shape[0], scatter.in_channels, dtype=dtype, device=device)
+    return voxel_features, coors
+
+
+def measure(func, device, num_warmup, num_iters):
+    """Median time of ``func`` in ms and its output."""
+    for _ in range(num_warmup):
+        output = func()
+    times = list()
+    for _ in range(num_iters):
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        start = time.perf_counter()
+        output = func()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000, output
+
+
+def main():
+    args = parse_args()
+    device = torch.device(args.device)
+    dtypes = dict(fp32=torch.float32, fp16=torch.float16)
+    scatter = build_middle_encoder(
+        dict(
+            type='PointPillarsScatter',
+            in_channels=args.in_channels,
+            output_shape=args.output_shape))
+    print(f'{args.num_pillars} pillars per sample, {args.in_channels} '
+          f'channels, {args.output_shape} canvas on {device.type}')
+    print(f'{"dtype":<6} {"batch":>6} {"loop ms":>9} {"batched ms":>11} '
+          f'{"speedup":>8} {"samples/s":>10}')
+    with torch.no_grad():
+        for dtype in args.dtypes:
+            for batch_size in args.batch_sizes:
+                voxel_features, coors = make_inputs(scatter, batch_size,
+                                                    args.num_pillars,
+                                                    dtypes[dtype], device)
+                loop_ms, expected = measure(
+                    lambda: legacy_forward_batch(scatter, voxel_features,
+                                                 coors, batch_size), device,
+                    args.num_warmup, args.num_iters)
+                ms, output = measure(
+                    lambda: scatter.forward_batch(voxel_features, coors,
+                                                  batch_size), device,
+                    args.num_warmup, args.num_iters)
+                assert torch.equal(output, expected)
+                print(f'{dtype:<6} {batch_size:>6} {loop_ms:9.2f} {ms:11.2f} '
+                      f'{loop_ms / ms:8.2f} {batch_size * 1000 / ms:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the CPU latency of the sampling and grouping ops of PointNets.
+
+The furthest point sampling, ball query, grouping and three-NN interpolation
+ops of ``mmdet3d.ops`` are timed on CPU tensors of the sizes of the first
+set abstraction of VoteNet, followed by the forward of the backbone of a
+config, e.g. VoteNet, PointNet++ or 3DSSD, on a random point cloud.
+
+Example:
+    python tools/analysis_tools/benchmark_pointnet_ops.py \
+        configs/votenet/votenet_8x8_scannet-3d-18class.py \
+        --num-points 40000 --num-threads 8
+"""
+import argparse
+import time
+
+import torch
+from mmcv import Config
+
+from mmdet3d.models import build_backbone
+from mmdet3d.ops import (ball_query, furthest_point_sample, gather_points,
+                         grouping_operation, three_interpolate, three_nn)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the CPU latency of the ops of PointNets')
+    parser.add_argument('config', help='config file of the backbone')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--num-points', type=int, default=20000)
+    parser.add_argument(
+        '--num-centers',
+        type=int,
+        default=2048,
+        help='Number of sampled points of the ops')
+    parser.add_argument(
+        '--num-samples',
+        type=int,
+        default=64,
+        help='Number of points of every ball query of the ops')
+    parser.add_argument('--radius', type=float, default=0.2)
+    parser.add_argument('--channels', type=int, default=64)
+    parser.add_argument('--num-iters', type=int, default=10)
+    parser.add_argument(
+        '--num-threads',
+        type=int,
+        default=None,
+        help='Number of threads of torch, all the cores by default')
+    return parser.parse_args()
+
+
+def measure(func, num_iters):
+    """Median time of ``func`` in ms after a warm up call."""
+    func()
+    times = list()
+    for _ in range(num_iters):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def main():
+    args = parse_args()
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    torch.manual_seed(0)
+    # points of an indoor scene of 10 x 10 x 3 m
+    xyz = torch.rand(args.batch_size, args.num_points, 3) * torch.tensor(
+        [10., 10., 3.])
+    features = torch.rand(args.batch_size, args.channels, args.num_points)
+    idx = furthest_point_sample(xyz, args.num_centers)
+    center_xyz = gather_points(xyz.transpose(1, 2).contiguous(),
+                               idx).transpose(1, 2).contiguous()
+    group_idx = ball_query(0, args.radius, args.num_samples, xyz, center_xyz)
+    center_features = gather_points(features, idx)
+    _, nn_idx = three_nn(xyz, center_xyz)
+    weight = torch.rand(args.batch_size, args.num_points, 3)
+
+    ops = dict(
+        furthest_point_sample=lambda: furthest_point_sample(
+            xyz, args.num_centers),
+        ball_query=lambda: ball_query(0, args.radius, args.num_samples, xyz,
+                                      center_xyz),
+        grouping_operation=lambda: grouping_operation(features, group_idx),
+        three_nn=lambda: three_nn(xyz, center_xyz),
+        three_interpolate=lambda: three_interpolate(center_features, nn_idx,
+                                                    weight))
+    print(f'{args.batch_size} x {args.num_points} points, '
+          f'{args.num_centers} centers, {args.num_samples} samples, '
+          f'{torch.get_num_threads()} threads')
+    print(f'{"op":<24} {"ms":>9}')
+    for name, func in ops.items():
+        print(f'{name:<24} {measure(func, args.num_iters):9.2f}')
+
+    cfg = Config.fromfile(args.config)
+    backbone = build_backbone(cfg.model.backbone).eval()
+    in_channels = cfg.model.backbone.in_channels
+    points = torch.cat([
+        xyz,
+        torch.rand(args.batch_size, args.num_points, in_channels - 3)
+    ],
+                       dim=2)
+    with torch.no_grad():
+        ms = measure(lambda: backbone(points), args.num_iters)
+    print(f'{cfg.model.backbone.type + " forward":<24} {ms:9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the rotated iou backends of the KITTI evaluation.
+
+The bev and 3d overlaps of ``calculate_iou_partly`` are timed with the
+parallel cpu backend and, if there is a gpu, with the cuda kernels on
+synthetic annotations of the size of the KITTI val set.
+
+Example:
+    python tools/analysis_tools/benchmark_rotate_iou.py --num-frames 3769
+"""
+import argparse
+import time
+
+import numpy as np
+from numba import cuda
+
+from mmdet3d.core.evaluation.kitti_utils.eval import calculate_iou_partly
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the rotated iou backends of KITTI evaluation')
+    parser.add_argument(
+        '--num-frames',
+        type=int,
+        default=3769,
+        help='Number of frames, 3769 in KITTI val')
+    parser.add_argument(
+        '--num-gts', type=int, default=8, help='Average gts per frame')
+    parser.add_argument(
+        '--num-dts', type=int, default=50, help='Average dts per frame')
+    parser.add_argument('--num-parts', type=int, default=50)
+    return parser.parse_args()
+
+
+def make_annos(num_frames, num_boxes, seed):
+    """Random camera boxes in the KITTI front view of every frame."""
+    rng = np.random.default_rng(seed)
+    annos = []
+    for _ in range(num_frames):
+        num = rng.poisson(num_boxes)
+        location = np.stack([
+            rng.uniform(-30, 30, num),
+            rng.uniform(1, 2.5, num),
+            rng.uniform(2, 70, num)
+        ], 1)
+        annos.append(
+            dict(
+                name=np.array(['Car'] * num),
+                location=location,
+                dimensions=rng.uniform(0.5, 4.5, (num, 3)),
+                rotation_y=rng.uniform(-np.pi, np.pi, num)))
+    return annos
+
+
+def main():
+    args = parse_args()
+    gt_annos = make_annos(args.num_frames, args.num_gts, 0)
+    dt_annos = make_annos(args.num_frames, args.num_dts, 1)
+    # jitter the first dts of the gts so that part of the pairs overlap
+    rng = np.random.default_rng(2)
+    for gt_anno, dt_anno in zip(gt_annos, dt_annos):
+        num = min(len(gt_anno['name']), len(dt_anno['name']))
+        for key in ['location', 'dimensions', 'rotation_y']:
+            dt_anno[key][:num] = gt_anno[key][:num] + rng.normal(
+                0, 0.2, gt_anno[key][:num].shape)
+    print(f'{args.num_frames} frames, '
+          f'{sum(len(a["name"]) for a in gt_annos)} gts, '
+          f'{sum(len(a["name"]) for a in dt_annos)} dts')
+    backends = [False, True] if cuda.is_available() else [False]
+    print(f'{"metric":<8} {"backend":<8} {"s":>8}')
+    for metric, metric_name in [(1, 'bev'), (2, '3d')]:
+        results = dict()
+        for use_gpu in backends:
+            backend = 'gpu' if use_gpu else 'cpu'
+            # the first call compiles the kernels
+            calculate_iou_partly(gt_annos[:1], dt_annos[:1], metric, 1,
+                                 use_gpu)
+            start = time.perf_counter()
+            results[backend] = calculate_iou_partly(gt_annos, dt_annos,
+                                                    metric, args.num_parts,
+                                                    use_gpu)[1]
+            print(f'{metric_name:<8} {backend:<8} '
+                  f'{time.perf_counter() - start:8.2f}')
+        if len(results) == 2:
+            diff = max(
+                np.abs(cpu - gpu).max() if cpu.size else 0.
+                for cpu, gpu in zip(results['cpu'], results['gpu']))
+            print(f'Max difference of the {metric_name} overlaps: '
+                  f'{diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
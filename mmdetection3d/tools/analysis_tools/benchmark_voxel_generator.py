@@ -0,0 +1,117 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Benchmark the CPU voxelization engines of VoxelGenerator.
+
+The numba and numpy engines of ``VoxelGenerator.generate`` and the dynamic
+voxelization of ``VoxelGenerator.generate_dynamic`` are timed on clouds of
+the size of 10 nuScenes sweeps, and the outputs of both engines are checked
+to be identical.
+
+Example:
+    python tools/analysis_tools/benchmark_voxel_generator.py \
+        --num-sweeps 10 --voxel-size 0.1 0.1 0.2 --max-voxels 90000
+    # or on a real cloud of 5 dims
+    python tools/analysis_tools/benchmark_voxel_generator.py \
+        --points-file data/nuscenes/samples/LIDAR_TOP/xxx.pcd.bin
+"""
+import argparse
+import time
+
+import numpy as np
+
+from mmdet3d.core.voxel import VoxelGenerator
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the CPU voxelization engines')
+    parser.add_argument(
+        '--points-file',
+        default=None,
+        help='Binary file of float32 points with 5 dims, synthetic sweeps '
+        'are used if not given')
+    parser.add_argument('--num-sweeps', type=int, default=10)
+    parser.add_argument(
+        '--points-per-sweep',
+        type=int,
+        default=34720,
+        help='Average number of points of a nuScenes sweep')
+    parser.add_argument(
+        '--voxel-size', type=float, nargs=3, default=[0.2, 0.2, 8])
+    parser.add_argument(
+        '--point-cloud-range',
+        type=float,
+        nargs=6,
+        default=[-51.2, -51.2, -5.0, 51.2, 51.2, 3.0])
+    parser.add_argument('--max-num-points', type=int, default=20)
+    parser.add_argument('--max-voxels', type=int, default=30000)
+    parser.add_argument('--num-iters', type=int, default=10)
+    return parser.parse_args()
+
+
+def make_sweeps(num_sweeps, points_per_sweep, seed=0):
+    """Synthetic sweeps of the range distribution of a 32 beam lidar."""
+    rng = np.random.default_rng(seed)
+    num_points = num_sweeps * points_per_sweep
+    # the density of points drops with the range
+    dist = 1 + rng.exponential(15, num_points)
+    angle = rng.uniform(-np.pi, np.pi, num_points)
+    elevation = rng.uniform(-0.53, 0.19, num_points)
+    height = dist * np.sin(elevation) + 1.8
+    points = np.stack([
+        dist * np.cos(angle) * np.cos(elevation),
+        dist * np.sin(angle) * np.cos(elevation), height,
+        rng.uniform(0, 255, num_points),
+        np.repeat(np.arange(num_sweeps) * 0.05, points_per_sweep)
+    ], 1)
+    return points.astype(np.float32)
+
+
+def measure(func, num_iters):
+    """Median time of ``func`` in ms and its output."""
+    # the first call compiles the numba kernels
+    output = func()
+    times = list()
+    for _ in range(num_iters):
+        start = time.perf_counter()
+        output = func()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000, output
+
+
+def main():
+    args = parse_args()
+    if args.points_file is not None:
+        points = np.fromfile(args.points_file, dtype=np.float32)
+        points = points.reshape(-1, 5)
+    else:
+        points = make_sweeps(args.num_sweeps, args.points_per_sweep)
+    generators = {
+        engine: VoxelGenerator(
+            args.voxel_size,
+            args.point_cloud_range,
+            args.max_num_points,
+            args.max_voxels,
+            engine=engine)
+        for engine in ['numba', 'numpy']
+    }
+    print(f'{points.shape[0]} points, grid size '
+          f'{generators["numpy"].grid_size.tolist()}, max_num_points '
+          f'{args.max_num_points}, max_voxels {args.max_voxels}')
+    print(f'{"engine":<18} {"ms":>9} {"voxels":>8}')
+    outputs = dict()
+    for engine, generator in generators.items():
+        ms, outputs[engine] = measure(lambda: generator.generate(points),
+                                      args.num_iters)
+        print(f'{engine:<18} {ms:9.2f} {outputs[engine][0].shape[0]:8d}')
+    ms, coors = measure(lambda: generators['numpy'].generate_dynamic(points),
+                        args.num_iters)
+    print(f'{"numpy dynamic":<18} {ms:9.2f} '
+          f'{np.unique(coors[coors[:, 0] >= 0], axis=0).shape[0]:8d}')
+    identical = all(
+        np.array_equal(result, expected)
+        for result, expected in zip(outputs['numpy'], outputs['numba']))
+    print(f'Identical outputs of the engines: {identical}')
+
+
+if __name__ == '__main__':
+    main()
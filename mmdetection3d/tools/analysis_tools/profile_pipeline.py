@@ -0,0 +1,112 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+"""Profile the data pipeline of a config without a model.
+
+The transforms of the training pipeline are run with ``ProfileCompose`` on
+``--num-samples`` samples by a dataloader of ``--num-workers`` workers, and
+the wall time, the allocated memory and the output size of every transform
+are aggregated over the samples of all the workers into a report of their
+p50 and p95.
+
+Example:
+    python tools/analysis_tools/profile_pipeline.py \
+        configs/second/hv_second_secfpn_6x8_80e_kitti-3d-car.py \
+        --num-samples 500 --num-workers 4
+"""
+import argparse
+import tempfile
+
+import torch
+from mmcv import Config, DictAction
+
+from mmdet3d.datasets import build_dataset
+from mmdet3d.datasets.pipelines import ProfileCompose
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Profile the data pipeline of a config')
+    parser.add_argument('config', help='train config file path')
+    parser.add_argument(
+        '--skip-type',
+        type=str,
+        nargs='+',
+        default=[],
+        help='skip some transforms of the pipeline')
+    parser.add_argument('--num-samples', type=int, default=200)
+    parser.add_argument('--num-workers', type=int, default=0)
+    parser.add_argument(
+        '--out-dir',
+        default=None,
+        help='Directory to dump the records of the workers to, a temporary '
+        'directory by default')
+    parser.add_argument(
+        '--trace-memory',
+        action='store_true',
+        help='Trace the peak memory allocated in every transform')
+    parser.add_argument(
+        '--cfg-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the used config, the key-value pair '
+        'in xxx=yyy format will be merged into config file. If the value to '
+        'be overwritten is a list, it should be like key="[a,b]" or key=a,b '
+        'It also allows nested list/tuple values, e.g. key="[(a,b),(c,d)]" '
+        'Note that the quotation marks are necessary and that no white space '
+        'is allowed.')
+    return parser.parse_args()
+
+
+def collate(batch):
+    """Drop the samples, only the records of the pipeline are kept."""
+    return len(batch)
+
+
+def profile(cfg, args, out_dir):
+    """Run the pipeline and return the report of the transforms."""
+    try:
+        dataset = build_dataset(
+            cfg.data.train, default_args=dict(filter_empty_gt=False))
+    except TypeError:  # seg dataset doesn't have `filter_empty_gt` key
+        dataset = build_dataset(cfg.data.train)
+    dataset.pipeline = ProfileCompose(
+        dataset.pipeline.transforms,
+        out_dir=out_dir,
+        trace_memory=args.trace_memory)
+    num_samples = min(args.num_samples, len(dataset))
+    data_loader = torch.utils.data.DataLoader(
+        torch.utils.data.Subset(dataset, range(num_samples)),
+        batch_size=1,
+        num_workers=args.num_workers,
+        collate_fn=collate)
+    for _ in data_loader:
+        pass
+    if args.num_workers == 0:
+        dataset.pipeline.dump()
+    return ProfileCompose.summarize(ProfileCompose.load(out_dir))
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    if args.cfg_options is not None:
+        cfg.merge_from_dict(args.cfg_options)
+    # extract inner dataset of `RepeatDataset` as `cfg.data.train`
+    # and use only first dataset for `ConcatDataset`
+    if cfg.data.train['type'] == 'RepeatDataset':
+        cfg.data.train = cfg.data.train.dataset
+    if cfg.data.train['type'] == 'ConcatDataset':
+        cfg.data.train = cfg.data.train.datasets[0]
+    cfg.data.train['pipeline'] = [
+        x for x in cfg.data.train['pipeline']
+        if x['type'] not in args.skip_type
+    ]
+
+    if args.out_dir is not None:
+        print(profile(cfg, args, args.out_dir))
+    else:
+        with tempfile.TemporaryDirectory() as out_dir:
+            print(profile(cfg, args, out_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import os
+from os import path as osp
+
+import mmcv
+import numpy as np
+
+
+def pack_gt_database(info_path,
+                     data_root,
+                     out_prefix=None,
+                     load_dim=4,
+                     name_length=32):
+    """Pack the ground truth database into two memory-mappable arrays.
+
+    The points of the objects in the database created by
+    :func:`create_groundtruth_database` are concatenated into one float32
+    array ``{out_prefix}_points.npy`` of shape (N, load_dim). The objects are
+    saved as a structured array ``{out_prefix}_objects.npy`` with fields
+    ``name``, ``box3d_lidar``, ``difficulty``, ``num_points_in_gt``,
+    ``group_id``, ``point_offset`` and ``num_points``, in the order of the
+    infos. Both can be used by ``DataBaseSampler`` through ``packed_db``.
+
+    Args:
+        info_path (str): Path of the database infos, e.g.
+            'data/kitti/kitti_dbinfos_train.pkl'.
+        data_root (str): Root of the paths of the infos, e.g. 'data/kitti'.
+        out_prefix (str, optional): Prefix of the packed files. Defaults to
+            ``info_path`` without the extension and with the suffix
+            '_packed'.
+        load_dim (int, optional): Dimension of the points in the database.
+            Defaults to 4.
+        name_length (int, optional): Max length of the class names.
+            Defaults to 32.
+
+    Returns:
+        str: Prefix of the packed files.
+    """
+    if out_prefix is None:
+        out_prefix = osp.splitext(info_path)[0] + '_packed'
+    db_infos = mmcv.load(info_path)
+    infos = [info for infos in db_infos.values() for info in infos]
+    assert len(infos) > 0, f'No objects in {info_path}'
+    box_dim = max(len(info['box3d_lidar']) for info in infos)
+    box_dtype = np.asarray(infos[0]['box3d_lidar']).dtype
+    objects = np.zeros(
+        len(infos),
+        dtype=[('name', f'U{name_length}'),
+               ('box3d_lidar', box_dtype, (box_dim, )),
+               ('difficulty', np.int32), ('num_points_in_gt', np.int64),
+               ('group_id', np.int64), ('point_offset', np.int64),
+               ('num_points', np.int64)])
+    paths = []
+    point_offset = 0
+    for i, info in enumerate(infos):
+        assert len(info['name']) <= name_length, \
+            f'The name {info["name"]} is longer than {name_length}'
+        path = osp.join(data_root, info['path']) if data_root else \
+            info['path']
+        num_points = os.path.getsize(path) // (4 * load_dim)
+        objects['name'][i] = info['name']
+        objects['box3d_lidar'][i, :len(info['box3d_lidar'])] = \
+            info['box3d_lidar']
+        objects['difficulty'][i] = info.get('difficulty', 0)
+        objects['num_points_in_gt'][i] = info.get('num_points_in_gt',
+                                                  num_points)
+        objects['group_id'][i] = info.get('group_id', i)
+        objects['point_offset'][i] = point_offset
+        objects['num_points'][i] = num_points
+        paths.append(path)
+        point_offset += num_points
+
+    mmcv.mkdir_or_exist(osp.dirname(osp.abspath(out_prefix)))
+    points = np.lib.format.open_memmap(
+        f'{out_prefix}_points.npy',
+        mode='w+',
+        dtype=np.float32,
+        shape=(point_offset, load_dim))
+    prog_bar = mmcv.ProgressBar(len(paths))
+    for obj, path in zip(objects, paths):
+        start = obj['point_offset']
+        points[start:start + obj['num_points']] = np.fromfile(
+            path, dtype=np.float32).reshape(-1, load_dim)
+        prog_bar.update()
+    points.flush()
+    del points
+    np.save(f'{out_prefix}_objects.npy', objects)
+    print(f'\nPacked {len(objects)} objects with {point_offset} points into '
+          f'{out_prefix}_points.npy and {out_prefix}_objects.npy')
+    return out_prefix
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Pack the ground truth database for DataBaseSampler')
+    parser.add_argument(
+        'info_path', help='path of the database infos, e.g. '
+        'data/kitti/kitti_dbinfos_train.pkl')
+    parser.add_argument('data_root', help='root of the database paths')
+    parser.add_argument('--out-prefix', default=None)
+    parser.add_argument('--load-dim', type=int, default=4)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    pack_gt_database(args.info_path, args.data_root, args.out_prefix,
+                     args.load_dim)
@@ -0,0 +1,368 @@
+"""Benchmark the models of experiment configs with synthetic inputs.
+
+Train forward (including targets and losses), backward and eval (forward,
+decode and NMS) latency and peak memory are measured for every config, device
+and batch size, without the dataset. On cpu, every config runs in its own
+process, since the peak resident set size of a process never goes down.
+
+Example:
+    # Benchmark all configs under bevdepth/exps/nuscenes.
+    python scripts/benchmark_exps.py --batch_sizes 1 2 --out bench.json
+    # Flag regressions of a new run against a baseline run.
+    python scripts/benchmark_exps.py --compare base.json bench.json
+"""
+import glob
+import importlib.util
+import inspect
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import torch
+
+from bevdepth.exps.nuscenes import base_exp
+from bevdepth.exps.nuscenes.base_exp import BEVDepthLightningModel
+
+METRICS = ['train_forward_ms', 'backward_ms', 'eval_ms', 'peak_memory_mb']
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('exp_paths',
+                        nargs='*',
+                        help='Experiment files, default: all configs under '
+                        'bevdepth/exps/nuscenes.')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1])
+    parser.add_argument('--devices',
+                        nargs='+',
+                        default=None,
+                        help='Devices to run on, default: cpu and cuda if '
+                        'available.')
+    parser.add_argument('--phases',
+                        nargs='+',
+                        default=['train', 'eval'],
+                        choices=['train', 'eval'])
+    parser.add_argument('--num_warmup', type=int, default=2)
+    parser.add_argument('--num_iters', type=int, default=5)
+    parser.add_argument('--num_threads', type=int, default=None)
+    parser.add_argument('--out', default='./outputs/benchmark.json')
+    parser.add_argument('--compare',
+                        nargs=2,
+                        metavar=('BASE', 'NEW'),
+                        help='Compare two result files instead of running.')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=0.1,
+                        help='Relative increase flagged as a regression.')
+    return parser.parse_args()
+
+
+def load_exp_class(exp_path):
+    """Import an experiment file and get its LightningModule class."""
+    module_name = os.path.splitext(os.path.basename(exp_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, exp_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for _, obj in inspect.getmembers(module, inspect.isclass):
+        if obj.__module__ == module.__name__ and issubclass(
+                obj, BEVDepthLightningModel):
+            return obj
+    raise ValueError(f'No BEVDepthLightningModel found in {exp_path}.')
+
+
+def _cam2ego_mats(num_cams):
+    """Cameras evenly placed around the ego car, looking outwards."""
+    # Camera axes (x right, y down, z forward) in ego axes (x front, y left).
+    cam2ego_rot = torch.tensor([[0., 0., 1.], [-1., 0., 0.], [0., -1., 0.]])
+    mats = torch.eye(4).repeat(num_cams, 1, 1)
+    for cam_idx in range(num_cams):
+        yaw = 2 * math.pi * cam_idx / num_cams
+        yaw_rot = torch.tensor([[math.cos(yaw), -math.sin(yaw), 0.],
+                                [math.sin(yaw), math.cos(yaw), 0.],
+                                [0., 0., 1.]])
+        mats[cam_idx, :3, :3] = yaw_rot @ cam2ego_rot
+        mats[cam_idx, :3, 3] = torch.tensor(
+            [1.5 * math.cos(yaw), 1.5 * math.sin(yaw), 1.6])
+    return mats
+
+
+def make_synthetic_batch(pl_model, batch_size, device):
+    """Build a batch in the format of `collate_fn` for `pl_model`.
+
+    Returns:
+        tuple: Images, matrices, img_metas, gt boxes, gt labels and depth
+            (lidar depth for fusion models, depth labels otherwise).
+    """
+    num_frames = (len(pl_model.key_idxes) + 1) * (len(pl_model.sweep_idxes) +
+                                                  1)
+    num_cams = pl_model.ida_aug_conf['Ncams']
+    img_h, img_w = pl_model.ida_aug_conf['final_dim']
+    imgs = torch.randn(batch_size, num_frames, num_cams, 3, img_h, img_w)
+    intrin_mat = torch.eye(4)
+    intrin_mat[0, 0] = intrin_mat[1, 1] = img_w / 2
+    intrin_mat[0, 2] = img_w / 2
+    intrin_mat[1, 2] = img_h / 2
+    frame_shape = (batch_size, num_frames, num_cams, 4, 4)
+    mats = dict(
+        sensor2ego_mats=_cam2ego_mats(num_cams).expand(*frame_shape),
+        intrin_mats=intrin_mat.expand(*frame_shape),
+        ida_mats=torch.eye(4).expand(*frame_shape),
+        sensor2sensor_mats=torch.eye(4).expand(*frame_shape),
+        bda_mat=torch.eye(4).expand(batch_size, 4, 4),
+    )
+    mats = {key: value.contiguous().to(device) for key, value in mats.items()}
+    img_metas = [dict(token='synthetic') for _ in range(batch_size)]
+
+    num_classes = len(pl_model.class_names)
+    x_bound = pl_model.backbone_conf['x_bound']
+    gt_boxes = list()
+    gt_labels = list()
+    for _ in range(batch_size):
+        num_boxes = 30
+        center = (torch.rand(num_boxes, 2) - 0.5) * 0.9 * (x_bound[1] -
+                                                           x_bound[0])
+        gt_box = torch.cat([
+            center,
+            torch.rand(num_boxes, 1) - 1,
+            torch.rand(num_boxes, 3) * 4 + 0.5,
+            (torch.rand(num_boxes, 1) - 0.5) * 2 * math.pi,
+            torch.randn(num_boxes, 2),
+        ], 1)
+        gt_boxes.append(gt_box.to(device))
+        gt_labels.append(
+            torch.randint(0, num_classes, (num_boxes, )).to(device))
+
+    d_bound = pl_model.dbound
+    depth = torch.rand(batch_size, num_frames, num_cams, img_h,
+                       img_w) * (d_bound[1] - d_bound[0]) + d_bound[0]
+    # Projected lidar points are sparse.
+    depth[torch.rand_like(depth) > 0.05] = 0
+    return (imgs.to(device), mats, img_metas, gt_boxes, gt_labels,
+            depth.to(device))
+
+
+def _synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def _timeit(func, device, num_warmup, num_iters):
+    for _ in range(num_warmup):
+        func()
+    times = list()
+    for _ in range(num_iters):
+        _synchronize(device)
+        start = time.perf_counter()
+        func()
+        _synchronize(device)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def benchmark_train(pl_model, batch, device, num_warmup, num_iters):
+    model = pl_model.model
+    model.train()
+    imgs, mats, _, gt_boxes, gt_labels, depth = batch
+
+    def _forward():
+        if pl_model.use_fusion:
+            preds = model(imgs, mats, depth)
+            depth_loss = 0
+        else:
+            preds, depth_preds = model(imgs, mats)
+            depth_loss = pl_model.get_depth_loss(depth[:, 0], depth_preds)
+        targets = model.get_targets(gt_boxes, gt_labels)
+        return model.loss(targets, preds) + depth_loss
+
+    def _forward_backward():
+        model.zero_grad(set_to_none=True)
+        _forward().backward()
+
+    forward_ms = _timeit(_forward, device, num_warmup, num_iters)
+    forward_backward_ms = _timeit(_forward_backward, device, num_warmup,
+                                  num_iters)
+    return dict(train_forward_ms=forward_ms,
+                backward_ms=forward_backward_ms - forward_ms)
+
+
+def benchmark_eval(pl_model, batch, device, num_warmup, num_iters):
+    model = pl_model.model
+    model.eval()
+    imgs, mats, img_metas, _, _, depth = batch
+
+    def _eval():
+        with torch.no_grad():
+            if pl_model.use_fusion:
+                preds = model(imgs, mats, depth)
+            else:
+                preds = model(imgs, mats)
+            model.get_bboxes(preds, img_metas)
+
+    return dict(eval_ms=_timeit(_eval, device, num_warmup, num_iters))
+
+
+def _max_rss_mb():
+    # Max resident set size of the process, in KB on linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def benchmark_config(exp_path, device, batch_size, args, work_dir):
+    """Benchmark one config on one device with one batch size.
+
+    Returns:
+        dict: Metrics of the config, or the error it raised.
+    """
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    exp_class = load_exp_class(exp_path)
+    exp_name = os.path.splitext(os.path.basename(exp_path))[0]
+    device = torch.device(device)
+    result = dict(exp=exp_name, device=device.type, batch_size=batch_size)
+    print(f'Benchmarking {exp_name} on {device.type} with batch size '
+          f'{batch_size}.')
+    # Only the increase of the peak is counted on cpu, not the imports.
+    base_rss_mb = _max_rss_mb()
+    try:
+        pl_model = exp_class(batch_size_per_device=batch_size,
+                             default_root_dir=work_dir)
+        pl_model.model.to(device)
+        batch = make_synthetic_batch(pl_model, batch_size, device)
+        if device.type == 'cuda':
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats(device)
+        if 'train' in args.phases:
+            result.update(
+                benchmark_train(pl_model, batch, device, args.num_warmup,
+                                args.num_iters))
+        if 'eval' in args.phases:
+            result.update(
+                benchmark_eval(pl_model, batch, device, args.num_warmup,
+                               args.num_iters))
+        if device.type == 'cuda':
+            result['peak_memory_mb'] = torch.cuda.max_memory_allocated(
+                device) / 2**20
+        else:
+            result['peak_memory_mb'] = _max_rss_mb() - base_rss_mb
+    except Exception as e:
+        # Keep going, e.g. some ops are not available on cpu.
+        result['error'] = f'{type(e).__name__}: {e}'
+        print(result['error'])
+    return result
+
+
+def _benchmark_config_in_subprocess(exp_path, device, batch_size, args,
+                                    work_dir):
+    """Run `benchmark_config` in a fresh process, e.g. for its peak RSS."""
+    with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn')) as executor:
+        future = executor.submit(benchmark_config, exp_path, device,
+                                 batch_size, args, work_dir)
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            # The process was killed, e.g. out of memory.
+            return dict(exp=os.path.splitext(os.path.basename(exp_path))[0],
+                        device=device,
+                        batch_size=batch_size,
+                        error=f'{type(e).__name__}: {e}')
+
+
+def run_benchmark(args):
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    exp_paths = args.exp_paths or sorted(
+        glob.glob(os.path.join(os.path.dirname(base_exp.__file__), '*',
+                               '*.py')))
+    devices = args.devices or (['cpu', 'cuda']
+                               if torch.cuda.is_available() else ['cpu'])
+    work_dir = tempfile.mkdtemp()
+    results = list()
+    for exp_path in exp_paths:
+        for device in devices:
+            for batch_size in args.batch_sizes:
+                if torch.device(device).type == 'cpu':
+                    result = _benchmark_config_in_subprocess(
+                        exp_path, device, batch_size, args, work_dir)
+                else:
+                    result = benchmark_config(exp_path, device, batch_size,
+                                              args, work_dir)
+                results.append(result)
+    report = dict(
+        meta=dict(
+            torch=torch.__version__,
+            python=platform.python_version(),
+            cpu=platform.processor() or platform.machine(),
+            num_threads=torch.get_num_threads(),
+            cuda=torch.cuda.get_device_name()
+            if torch.cuda.is_available() else None,
+            num_warmup=args.num_warmup,
+            num_iters=args.num_iters,
+        ),
+        results=results,
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results are saved to {args.out}.')
+
+
+def compare(base_path, new_path, threshold):
+    """Compare two result files.
+
+    Returns:
+        list[str]: Regressions whose metric increased by more than
+            `threshold`, or which fail in the new file only.
+    """
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def _key(result):
+        return result['exp'], result['device'], result['batch_size']
+
+    base_results = {_key(result): result for result in base['results']}
+    regressions = list()
+    for result in new['results']:
+        base_result = base_results.get(_key(result))
+        if base_result is None:
+            continue
+        exp, device, batch_size = _key(result)
+        if 'error' in result and 'error' not in base_result:
+            line = f'{exp} {device} bs{batch_size}: {result["error"]} ' \
+                'REGRESSION'
+            regressions.append(line)
+            print(line)
+            continue
+        for metric in METRICS:
+            if metric not in result or metric not in base_result:
+                continue
+            ratio = result[metric] / max(base_result[metric], 1e-6) - 1
+            line = (f'{exp} {device} bs{batch_size} {metric}: '
+                    f'{base_result[metric]:.2f} -> {result[metric]:.2f} '
+                    f'({ratio * 100:+.1f}%)')
+            if ratio > threshold:
+                line += ' REGRESSION'
+                regressions.append(line)
+            print(line)
+    return regressions
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.compare is not None:
+        regressions = compare(*args.compare, args.threshold)
+        print(f'{len(regressions)} regressions found.')
+        sys.exit(1 if len(regressions) > 0 else 0)
+    run_benchmark(args)
@@ -0,0 +1,124 @@
+"""Compare load time and memory of info pkl files and info stores.
+
+Load time and resident memory are measured in the main process, then
+`num_workers` forked processes read the fields used by `NuscDetDataset` from
+every sample, like dataloader workers do, and report their proportional set
+size (PSS), i.e. shared pages are counted once over all processes.
+
+Example:
+    python scripts/benchmark_info_store.py \
+        data/nuScenes/nuscenes_infos_train.pkl \
+        data/nuScenes/nuscenes_infos_train.infostore --num_workers 4
+"""
+import gc
+import json
+import multiprocessing
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from bevdepth.datasets.info_store import load_infos
+
+# Set before forking the workers, so that they share it like dataloader
+# workers share the dataset.
+_INFOS = None
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('info_paths',
+                        nargs='+',
+                        help='Info pkl files and/or info store directories.')
+    parser.add_argument('--num_workers', type=int, default=4)
+    parser.add_argument('--out', default=None, help='Save results as json.')
+    return parser.parse_args()
+
+
+def _memory_mb(field):
+    """Read a field of /proc/self/smaps_rollup or /proc/self/status."""
+    for path in ['/proc/self/smaps_rollup', '/proc/self/status']:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 2**10
+    raise KeyError(field)
+
+
+def touch_sample(infos, idx):
+    """Read the fields `NuscDetDataset.__getitem__` reads."""
+    info = infos[idx]
+    info['scene_token']
+    info['sample_token']
+    for cam_info in info['cam_infos'].values():
+        cam_info['filename']
+        cam_info['calibrated_sensor']['camera_intrinsic']
+        cam_info['ego_pose']['rotation']
+    for sweep in info['cam_sweeps']:
+        for cam_info in sweep.values():
+            cam_info['timestamp']
+    for sweep in info['lidar_sweeps']:
+        sweep['LIDAR_TOP']['timestamp']
+    for ann_info in info.get('ann_infos', list()):
+        ann_info['translation']
+
+
+def _worker(args):
+    rank, num_workers = args
+    infos = _INFOS
+    start = time.perf_counter()
+    for idx in range(rank, len(infos), num_workers):
+        touch_sample(infos, idx)
+    elapsed = time.perf_counter() - start
+    return dict(pss_mb=_memory_mb('Pss'),
+                rss_mb=_memory_mb('Rss'),
+                us_per_sample=elapsed / max(len(infos) // num_workers, 1) *
+                1e6)
+
+
+def benchmark(info_path, num_workers):
+    global _INFOS
+    gc.collect()
+    base_rss = _memory_mb('Rss')
+    start = time.perf_counter()
+    infos = load_infos(info_path)
+    load_s = time.perf_counter() - start
+    load_rss = _memory_mb('Rss') - base_rss
+    _INFOS = infos
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(num_workers) as pool:
+        stats = pool.map(_worker, [(rank, num_workers)
+                                   for rank in range(num_workers)],
+                         chunksize=1)
+    result = dict(info_path=info_path,
+                  num_samples=len(infos),
+                  load_s=load_s,
+                  load_rss_mb=load_rss,
+                  main_pss_mb=_memory_mb('Pss'),
+                  workers_pss_mb=sum(stat['pss_mb'] for stat in stats),
+                  workers_rss_mb=sum(stat['rss_mb'] for stat in stats),
+                  us_per_sample=float(
+                      np.mean([stat['us_per_sample'] for stat in stats])))
+    _INFOS = None
+    del infos
+    gc.collect()
+    return result
+
+
+def main(args):
+    results = list()
+    for info_path in args.info_paths:
+        result = benchmark(info_path, args.num_workers)
+        print(f'{info_path}: {result["num_samples"]} samples, load '
+              f'{result["load_s"]:.2f}s, +{result["load_rss_mb"]:.0f}MB RSS, '
+              f'{args.num_workers} workers PSS '
+              f'{result["workers_pss_mb"]:.0f}MB, '
+              f'{result["us_per_sample"]:.1f}us per sample')
+        results.append(result)
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,108 @@
+"""Compare BEVStereo inference on a sequence with and without `SweepCache`.
+
+A synthetic sequence is built where the previous key frame of every sample is
+the key frame of the previous sample, as in sequential inference on 2key
+configs. The sequence is run once without and once with the cache, and the
+latency per sample, the hit rate and the difference of the predicted heatmaps
+are printed.
+
+Example:
+    python scripts/benchmark_sweep_cache.py [EXP_PATH] --num_frames 20
+"""
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from benchmark_exps import load_exp_class, make_synthetic_batch
+
+from bevdepth.layers.backbones.bevstereo_lss_fpn import SweepCache
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('exp_path', help='BEVStereo experiment file.')
+    parser.add_argument('--num_frames', type=int, default=10)
+    parser.add_argument('--cache_size',
+                        type=int,
+                        default=12,
+                        help='Max number of cached images.')
+    parser.add_argument('--device',
+                        default='cuda' if torch.cuda.is_available() else 'cpu')
+    return parser.parse_args()
+
+
+def build_sequence(pl_model, num_frames, device):
+    """Samples whose sweep 1 is the sweep 0 of the previous sample."""
+    imgs, mats, _, _, _, _ = make_synthetic_batch(pl_model, 1, device)
+    num_sweeps, num_cams = imgs.shape[1:3]
+    assert num_sweeps == 2, 'Only exps with one previous frame are supported.'
+    frames = torch.randn(num_frames + 1, *imgs.shape[2:], device=device)
+    sequence = list()
+    for frame_idx in range(1, num_frames + 1):
+        sweep_imgs = torch.stack([frames[frame_idx],
+                                  frames[frame_idx - 1]]).unsqueeze(0)
+        timestamps = torch.tensor([[
+            [frame_idx * 500000 + cam_idx for cam_idx in range(num_cams)],
+            [(frame_idx - 1) * 500000 + cam_idx for cam_idx in range(num_cams)]
+        ]])
+        sequence.append((sweep_imgs, mats, timestamps))
+    return sequence
+
+
+def run_sequence(model, sequence, device):
+    """Run the samples in order.
+
+    Returns:
+        tuple[list[float], list[Tensor]]: Latency in ms and heatmap of the
+            first task of every sample.
+    """
+    times = list()
+    heatmaps = list()
+    with torch.no_grad():
+        for sweep_imgs, mats, timestamps in sequence:
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            start = time.perf_counter()
+            preds = model(sweep_imgs, mats, timestamps)
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            times.append((time.perf_counter() - start) * 1000)
+            heatmaps.append(preds[0][0]['heatmap'].sigmoid())
+    return times, heatmaps
+
+
+def main(args):
+    device = torch.device(args.device)
+    exp_class = load_exp_class(args.exp_path)
+    pl_model = exp_class(batch_size_per_device=1,
+                         default_root_dir=tempfile.mkdtemp())
+    model = pl_model.model.to(device).eval()
+    sequence = build_sequence(pl_model, args.num_frames, device)
+    # Warm up.
+    run_sequence(model, sequence[:1], device)
+
+    model.backbone.sweep_cache = None
+    base_times, base_heatmaps = run_sequence(model, sequence, device)
+    model.backbone.sweep_cache = SweepCache(args.cache_size)
+    cache_times, cache_heatmaps = run_sequence(model, sequence, device)
+    stats = model.backbone.sweep_cache.stats()
+    model.backbone.sweep_cache = None
+
+    # The first sample misses the cache.
+    base_ms = np.median(base_times[1:])
+    cache_ms = np.median(cache_times[1:])
+    max_diff = max((base - cached).abs().max().item()
+                   for base, cached in zip(base_heatmaps, cache_heatmaps))
+    print(f'{"":>10} {"median ms":>10} {"first ms":>10}')
+    print(f'{"no cache":>10} {base_ms:10.1f} {base_times[0]:10.1f}')
+    print(f'{"cache":>10} {cache_ms:10.1f} {cache_times[0]:10.1f}')
+    print(f'Speedup: {base_ms / cache_ms:.2f}x, hit rate: '
+          f'{stats["hit_rate"]:.2f} ({stats["hits"]}/'
+          f'{stats["hits"] + stats["misses"]}), max heatmap difference: '
+          f'{max_diff:.4f}')
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,80 @@
+"""Convert info pkl files to memory-mapped info stores.
+
+Every `xxx.pkl` is converted to a `xxx.infostore` directory next to it, which
+can be used in place of the pkl file in `info_paths` of `NuscDetDataset`.
+
+Example:
+    python scripts/convert_infos.py data/nuScenes/nuscenes_infos_train.pkl \
+        data/nuScenes/nuscenes_infos_val.pkl --verify
+"""
+import os
+from argparse import ArgumentParser
+
+import mmcv
+import numpy as np
+
+from bevdepth.datasets.info_store import (STORE_SUFFIX, NuscInfoStore,
+                                          convert_infos)
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('info_paths', nargs='+', help='Info pkl files.')
+    parser.add_argument('--verify',
+                        action='store_true',
+                        help='Check the store against the pkl file.')
+    return parser.parse_args()
+
+
+def _assert_equal(value, expected, name):
+    if isinstance(expected, dict):
+        for key in value.keys():
+            _assert_equal(value[key], expected[key], f'{name}.{key}')
+    elif isinstance(expected, (list, tuple, np.ndarray)) and not isinstance(
+            value, str):
+        if len(expected) == 0:
+            # Lidar records have an empty `camera_intrinsic`.
+            return
+        if name.endswith('velocity'):
+            expected = np.asarray(expected, np.float64)[:3]
+        assert np.allclose(np.asarray(value, np.float64),
+                           expected,
+                           equal_nan=True), name
+    else:
+        assert value == expected, name
+
+
+def verify(store, infos):
+    assert len(store) == len(infos)
+    for idx, info in enumerate(infos):
+        view = store[idx]
+        for key in view.keys():
+            if key == 'ann_infos':
+                assert len(view[key]) == len(info.get(key, list()))
+                for i, ann_info in enumerate(view[key]):
+                    _assert_equal(ann_info, info[key][i],
+                                  f'{idx}.{key}.{i}')
+            elif key == 'cam_infos' or key == 'lidar_infos':
+                _assert_equal(view[key], info[key], f'{idx}.{key}')
+            elif key == 'cam_sweeps' or key == 'lidar_sweeps':
+                assert len(view[key]) == len(info[key])
+                for i, sweep in enumerate(view[key]):
+                    assert sweep.keys() == info[key][i].keys()
+                    _assert_equal(sweep, info[key][i], f'{idx}.{key}.{i}')
+            else:
+                _assert_equal(view[key], info[key], f'{idx}.{key}')
+
+
+def main(args):
+    for info_path in args.info_paths:
+        out_dir = os.path.splitext(info_path)[0] + STORE_SUFFIX
+        infos = mmcv.load(info_path)
+        convert_infos(infos, out_dir)
+        print(f'Converted {len(infos)} samples of {info_path} to {out_dir}.')
+        if args.verify:
+            verify(NuscInfoStore(out_dir), infos)
+            print('Verified.')
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,169 @@
+"""Plan activation checkpointing of an experiment under a memory budget.
+
+The train step (forward, targets, losses and backward) is measured with
+synthetic inputs without checkpointing and with every segment checkpointed
+alone. Segments are then picked by memory saved per millisecond of
+recomputation until the estimated peak memory fits the budget, and every step
+of the plan is measured to report the peak memory vs step time trade-off.
+
+On cuda the peak allocated memory is measured. On cpu it is estimated as
+4 bytes per parameter byte (weights, gradients and the two AdamW states)
+plus the activations saved for backward.
+
+Example:
+    python scripts/plan_checkpointing.py [EXP_PATH] -b 2 --budget_gb 30
+    # Then train with the printed segments.
+    python [EXP_PATH] --amp_backend native -b 2 --gpus 8 \
+        --checkpoint_segments [SEGMENTS]
+"""
+import json
+import os
+import tempfile
+from argparse import ArgumentParser
+
+import torch
+from benchmark_exps import (benchmark_train, load_exp_class,
+                            make_synthetic_batch)
+
+from bevdepth.utils.checkpointing import (count_saved_activations,
+                                          get_checkpoint_segments,
+                                          plan_checkpointing,
+                                          set_checkpoint_segments)
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('exp_path', help='Experiment file.')
+    parser.add_argument('--budget_gb',
+                        type=float,
+                        required=True,
+                        help='Peak memory budget of the train step in GB.')
+    parser.add_argument('-b', '--batch_size_per_device', type=int, default=1)
+    parser.add_argument('--device',
+                        default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--segments',
+                        nargs='+',
+                        default=None,
+                        help='Candidate segments, default: all segments.')
+    parser.add_argument('--num_warmup', type=int, default=1)
+    parser.add_argument('--num_iters', type=int, default=3)
+    parser.add_argument('--out', default=None, help='Save the report to.')
+    return parser.parse_args()
+
+
+def _train_loss(pl_model, batch):
+    model = pl_model.model
+    imgs, mats, _, gt_boxes, gt_labels, depth = batch
+    if pl_model.use_fusion:
+        preds = model(imgs, mats, depth)
+        depth_loss = 0
+    else:
+        preds, depth_preds = model(imgs, mats)
+        depth_loss = pl_model.get_depth_loss(depth[:, 0], depth_preds)
+    targets = model.get_targets(gt_boxes, gt_labels)
+    return model.loss(targets, preds) + depth_loss
+
+
+def measure(pl_model, batch, device, names, num_warmup, num_iters):
+    """Measure the train step with the segments `names` checkpointed.
+
+    Returns:
+        dict: `activation_bytes`, `peak_bytes` and `step_ms`.
+    """
+    model = pl_model.model
+    set_checkpoint_segments(model, names)
+    model.train()
+    model.zero_grad(set_to_none=True)
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats(device)
+    with count_saved_activations() as stats:
+        loss = _train_loss(pl_model, batch)
+    loss.backward()
+    if device.type == 'cuda':
+        peak_bytes = torch.cuda.max_memory_allocated(device)
+    else:
+        peak_bytes = 4 * sum(param.numel() * param.element_size()
+                             for param in model.parameters()
+                             ) + stats['num_bytes']
+    del loss
+    times = benchmark_train(pl_model, batch, device, num_warmup, num_iters)
+    return dict(activation_bytes=stats['num_bytes'],
+                peak_bytes=peak_bytes,
+                step_ms=times['train_forward_ms'] + times['backward_ms'])
+
+
+def _format_row(names, peak_bytes, step_ms, base):
+    return (f'{peak_bytes / 2**30:9.2f} GB {step_ms:9.1f} ms '
+            f'{(step_ms / base["step_ms"] - 1) * 100:+7.1f}%  '
+            f'{", ".join(names) or "-"}')
+
+
+def main(args):
+    device = torch.device(args.device)
+    exp_class = load_exp_class(args.exp_path)
+    pl_model = exp_class(batch_size_per_device=args.batch_size_per_device,
+                         default_root_dir=tempfile.mkdtemp())
+    pl_model.model.to(device)
+    batch = make_synthetic_batch(pl_model, args.batch_size_per_device,
+                                 device)
+    names = args.segments or list(get_checkpoint_segments(pl_model.model))
+
+    def _measure(names):
+        return measure(pl_model, batch, device, names, args.num_warmup,
+                       args.num_iters)
+
+    base = _measure([])
+    print(f'{"peak":>12} {"step":>12} {"slower":>8}  segments')
+    print(_format_row([], base['peak_bytes'], base['step_ms'], base))
+    segments = list()
+    for name in names:
+        result = _measure([name])
+        segments.append(
+            dict(name=name,
+                 saved_bytes=base['peak_bytes'] - result['peak_bytes'],
+                 extra_ms=result['step_ms'] - base['step_ms'],
+                 **result))
+        print(
+            _format_row([name], result['peak_bytes'], result['step_ms'],
+                        base))
+
+    budget_bytes = int(args.budget_gb * 2**30)
+    steps, fits = plan_checkpointing(segments, base['peak_bytes'],
+                                     budget_bytes)
+    print(f'\nPlan under {args.budget_gb:.2f} GB, measured:')
+    for step in steps[1:]:
+        step.update(
+            {f'measured_{key}': value
+             for key, value in _measure(step['names']).items()})
+        print(
+            _format_row(step['names'], step['measured_peak_bytes'],
+                        step['measured_step_ms'], base))
+    if len(steps) == 1 and fits:
+        print('The budget is met without checkpointing.')
+    elif fits:
+        print(f'--checkpoint_segments {" ".join(steps[-1]["names"])}')
+    else:
+        print('The budget can not be met by checkpointing, use a smaller '
+              'batch size.')
+    set_checkpoint_segments(pl_model.model, [])
+    if args.out is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)),
+                    exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(
+                dict(exp=args.exp_path,
+                     device=device.type,
+                     batch_size=args.batch_size_per_device,
+                     budget_bytes=budget_bytes,
+                     base=base,
+                     segments=segments,
+                     plan=steps,
+                     fits=fits),
+                f,
+                indent=2)
+
+
+if __name__ == '__main__':
+    main(parse_args())
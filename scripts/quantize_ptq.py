@@ -0,0 +1,156 @@
+"""Post-training int8 quantization of the image branch on cpu.
+
+The image backbone, the image neck and `DepthNet` (except its DCN) are
+calibrated on val samples and converted to int8. Latency and the mAP / NDS
+delta against the float model are written to `[work_dir]/ptq_report.json`.
+
+Example:
+    python scripts/quantize_ptq.py [EXP_PATH] --ckpt_path [CKPT_PATH] \
+        --num_calib_samples 300
+"""
+import importlib.util
+import itertools
+import json
+import os
+import time
+from argparse import ArgumentParser
+
+import mmcv
+import numpy as np
+import torch
+
+from bevdepth.utils.quantization import (calibrate, convert_ptq,
+                                         get_model_size,
+                                         get_quantizable_module_names,
+                                         prepare_ptq, record_example_inputs,
+                                         save_quantized_checkpoint)
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('exp_path', help='Path of the experiment file.')
+    parser.add_argument('--exp_class',
+                        default='BEVDepthLightningModel',
+                        help='Name of the LightningModule in the exp file.')
+    parser.add_argument('--ckpt_path', required=True)
+    parser.add_argument('--data_root', default='data/nuScenes')
+    parser.add_argument('--work_dir', default='./outputs/ptq')
+    parser.add_argument('--num_calib_samples', type=int, default=300)
+    parser.add_argument('--num_eval_samples',
+                        type=int,
+                        default=None,
+                        help='Number of val samples to run. mAP and NDS are '
+                        'only computed on the full val set.')
+    parser.add_argument('--backend',
+                        default='fbgemm',
+                        choices=['fbgemm', 'qnnpack'])
+    parser.add_argument('--num_threads', type=int, default=None)
+    parser.add_argument('--num_workers', type=int, default=4)
+    return parser.parse_args()
+
+
+def load_exp(exp_path, exp_class, data_root, work_dir, num_workers):
+    spec = importlib.util.spec_from_file_location('exp', exp_path)
+    exp = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(exp)
+    model = getattr(exp, exp_class)(data_root=data_root,
+                                    batch_size_per_device=1,
+                                    default_root_dir=work_dir)
+    assert not model.use_fusion, 'Fusion models are not supported.'
+    val_loader = model.val_dataloader()
+    val_loader = torch.utils.data.DataLoader(
+        val_loader.dataset,
+        batch_size=1,
+        shuffle=False,
+        collate_fn=val_loader.collate_fn,
+        num_workers=num_workers,
+    )
+    return model, val_loader
+
+
+def forward_batch(model, batch):
+    (sweep_imgs, mats, _, img_metas, _, _) = batch[:6]
+    return model(sweep_imgs, mats)
+
+
+def run_eval(pl_model, data_loader, num_samples, output_dir):
+    """Run the model on cpu and evaluate it with `DetNuscEvaluator`."""
+    model = pl_model.model
+    model.eval()
+    forward_times = list()
+    all_pred_results = list()
+    all_img_metas = list()
+    data_iter = data_loader if num_samples is None else itertools.islice(
+        data_loader, num_samples)
+    with torch.no_grad():
+        for batch in mmcv.track_iter_progress(list(data_iter)):
+            img_metas = batch[3]
+            start = time.perf_counter()
+            preds = forward_batch(model, batch)
+            forward_times.append(time.perf_counter() - start)
+            results = model.get_bboxes(preds, img_metas)
+            for i in range(len(results)):
+                all_pred_results.append(
+                    [result.detach().cpu().numpy() for result in results[i]])
+                all_img_metas.append(img_metas[i])
+    # The first iterations are excluded as warmup.
+    forward_times = np.array(forward_times[min(5, len(forward_times) - 1):])
+    report = dict(latency_ms=dict(
+        mean=float(forward_times.mean() * 1000),
+        p50=float(np.percentile(forward_times, 50) * 1000),
+        p90=float(np.percentile(forward_times, 90) * 1000),
+    ))
+    if num_samples is None:
+        pl_model.evaluator.output_dir = output_dir
+        metrics = pl_model.evaluator.evaluate(all_pred_results, all_img_metas)
+        for name in ['mAP', 'NDS']:
+            report[name] = [
+                value for key, value in metrics.items()
+                if key.endswith(f'/{name}')
+            ][0]
+    return report
+
+
+def main(args):
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    mmcv.mkdir_or_exist(args.work_dir)
+    pl_model, val_loader = load_exp(args.exp_path, args.exp_class,
+                                    args.data_root, args.work_dir,
+                                    args.num_workers)
+    state_dict = torch.load(args.ckpt_path, map_location='cpu')['state_dict']
+    pl_model.load_state_dict(state_dict)
+    pl_model.cpu().eval()
+    model = pl_model.model
+
+    report = dict(exp=args.exp_path, backend=args.backend)
+    report['float'] = run_eval(pl_model, val_loader, args.num_eval_samples,
+                               os.path.join(args.work_dir, 'float'))
+    report['float']['size_mb'] = get_model_size(model) / 2**20
+
+    module_names = get_quantizable_module_names(model)
+    example_inputs = record_example_inputs(model, module_names,
+                                           *next(iter(val_loader))[:2])
+    prepare_ptq(model, example_inputs, args.backend)
+    calibrate(model, val_loader, forward_batch, args.num_calib_samples)
+    convert_ptq(model, module_names)
+    save_quantized_checkpoint(model, example_inputs,
+                              os.path.join(args.work_dir, 'int8.pth'),
+                              args.backend)
+
+    report['int8'] = run_eval(pl_model, val_loader, args.num_eval_samples,
+                              os.path.join(args.work_dir, 'int8'))
+    report['int8']['size_mb'] = get_model_size(model) / 2**20
+    report['speedup'] = report['float']['latency_ms']['mean'] / report[
+        'int8']['latency_ms']['mean']
+    for name in ['mAP', 'NDS']:
+        if name in report['float']:
+            report[f'{name}_delta'] = report['int8'][name] - report['float'][
+                name]
+    print(json.dumps(report, indent=2))
+    with open(os.path.join(args.work_dir, 'ptq_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(parse_args())
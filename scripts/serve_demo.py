@@ -0,0 +1,128 @@
+"""Run a local client against `BEVDepthInferenceServer`.
+
+Requests are built from the sample images under `test/data/nuscenes` with
+approximate nuScenes calibration, so no dataset is needed. Earlier frames of
+multi-frame exps reuse the same images.
+
+Example:
+    python scripts/serve_demo.py [EXP_PATH] --ckpt_path [CKPT_PATH] \
+        --num_requests 64 --num_clients 8 --max_batch_size 4
+"""
+import glob
+import importlib.util
+import inspect
+import json
+import math
+import os
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+from pyquaternion import Quaternion
+
+from bevdepth.exps.nuscenes.base_exp import BEVDepthLightningModel
+from bevdepth.utils.inference_server import BEVDepthInferenceServer
+
+# Yaw of every camera in ego frame and its focal length in pixels.
+CAM_CALIBS = {
+    'CAM_FRONT_LEFT': (55, 1257),
+    'CAM_FRONT': (0, 1266),
+    'CAM_FRONT_RIGHT': (-55, 1260),
+    'CAM_BACK_LEFT': (110, 1256),
+    'CAM_BACK': (180, 809),
+    'CAM_BACK_RIGHT': (-110, 1259),
+}
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('exp_path', help='Path of the experiment file.')
+    parser.add_argument('--ckpt_path', default=None)
+    parser.add_argument('--sample_dir',
+                        default='test/data/nuscenes/samples',
+                        help='Directory with one sub directory per camera.')
+    parser.add_argument('--num_requests', type=int, default=64)
+    parser.add_argument('--num_clients', type=int, default=8)
+    parser.add_argument('--max_batch_size', type=int, default=4)
+    parser.add_argument('--max_latency_ms', type=float, default=10.0)
+    parser.add_argument('--num_preprocess_workers', type=int, default=4)
+    parser.add_argument('--output_frame',
+                        default='ego',
+                        choices=['ego', 'global'])
+    parser.add_argument('--device', default=None)
+    return parser.parse_args()
+
+
+def load_exp(exp_path, ckpt_path):
+    spec = importlib.util.spec_from_file_location('exp', exp_path)
+    exp = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(exp)
+    exp_class = [
+        obj for _, obj in inspect.getmembers(exp, inspect.isclass)
+        if obj.__module__ == exp.__name__
+        and issubclass(obj, BEVDepthLightningModel)
+    ][0]
+    pl_model = exp_class()
+    if ckpt_path is not None:
+        pl_model.load_state_dict(
+            torch.load(ckpt_path, map_location='cpu')['state_dict'])
+    return pl_model
+
+
+def build_frame(sample_dir, cams):
+    """Build one frame from the sample images and nominal calibration."""
+    # Camera axes (x right, y down, z forward) in ego axes (x front, y left).
+    cam2ego_rot = np.array([[0., 0., 1.], [-1., 0., 0.], [0., -1., 0.]])
+    frame = dict()
+    for cam in cams:
+        yaw, focal = CAM_CALIBS[cam]
+        yaw = math.radians(yaw)
+        yaw_rot = np.array([[math.cos(yaw), -math.sin(yaw), 0.],
+                            [math.sin(yaw), math.cos(yaw), 0.], [0., 0., 1.]])
+        img_path = sorted(glob.glob(os.path.join(sample_dir, cam, '*.jpg')))[0]
+        img = Image.open(img_path).convert('RGB')
+        img.load()
+        frame[cam] = dict(
+            img=img,
+            calibrated_sensor=dict(
+                rotation=Quaternion(matrix=yaw_rot @ cam2ego_rot).elements,
+                translation=[1.5 * math.cos(yaw), 1.5 * math.sin(yaw), 1.6],
+                camera_intrinsic=[[focal, 0, img.width / 2],
+                                  [0, focal, img.height / 2], [0, 0, 1]],
+            ),
+            ego_pose=dict(rotation=[1, 0, 0, 0], translation=[0, 0, 0]),
+            timestamp=0,
+        )
+    return frame
+
+
+def main(args):
+    pl_model = load_exp(args.exp_path, args.ckpt_path)
+    num_frames = (len(pl_model.key_idxes) + 1) * (len(pl_model.sweep_idxes) +
+                                                  1)
+    cam_infos = [build_frame(args.sample_dir, pl_model.ida_aug_conf['cams'])
+                 ] * num_frames
+    server = BEVDepthInferenceServer.from_exp(
+        pl_model,
+        device=args.device,
+        max_batch_size=args.max_batch_size,
+        max_latency_ms=args.max_latency_ms,
+        num_preprocess_workers=args.num_preprocess_workers,
+        output_frame=args.output_frame)
+    with server:
+        # Warm up before measuring.
+        server.infer(cam_infos)
+        server.reset_stats()
+        with ThreadPoolExecutor(args.num_clients) as clients:
+            results = list(
+                clients.map(lambda _: server.infer(cam_infos),
+                            range(args.num_requests)))
+        stats = server.get_stats()
+    print(f'Boxes of the first request: {len(results[0]["boxes_3d"])}')
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,157 @@
+"""Accuracy and latency of EM schedules of BEVStereo against the default.
+
+Every schedule (`em_range_threshold`, `em_epsilon`) runs the model in eval
+mode on the same batches. The latency of the forward pass, the fraction of
+pixels entering every EM iteration and the difference of the key frame depth
+and heatmaps to the default schedule are printed.
+
+Example:
+    python scripts/study_em_schedule.py [EXP_PATH] --ckpt_path [CKPT_PATH] \
+        --num_batches 20 --range_thresholds 0.01 0.05 --epsilons 0.05 0.2
+"""
+import itertools
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from benchmark_exps import load_exp_class, make_synthetic_batch
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('exp_path', help='BEVStereo experiment file.')
+    parser.add_argument('--ckpt_path', default=None)
+    parser.add_argument('--num_batches', type=int, default=10)
+    parser.add_argument('--synthetic',
+                        action='store_true',
+                        help='Use synthetic inputs instead of the val set.')
+    parser.add_argument('--range_thresholds',
+                        type=float,
+                        nargs='+',
+                        default=[0.01, 0.05])
+    parser.add_argument('--epsilons',
+                        type=float,
+                        nargs='+',
+                        default=[0.05, 0.2])
+    parser.add_argument('--device',
+                        default='cuda' if torch.cuda.is_available() else 'cpu')
+    return parser.parse_args()
+
+
+def load_batches(pl_model, num_batches, synthetic, device):
+    if synthetic:
+        batches = [
+            make_synthetic_batch(pl_model, pl_model.batch_size_per_device,
+                                 device)[:2] for _ in range(num_batches)
+        ]
+    else:
+        batches = list()
+        for sweep_imgs, mats, _, _, _, _ in pl_model.val_dataloader():
+            if len(batches) == num_batches:
+                break
+            batches.append((sweep_imgs.to(device),
+                            {key: value.to(device)
+                             for key, value in mats.items()}))
+    return batches
+
+
+def run_schedule(model, batches, device):
+    """Run the batches under the current schedule of `model.backbone`.
+
+    Returns:
+        dict: Latency, active pixels per EM iteration, depth and heatmaps.
+    """
+    backbone = model.backbone
+    backbone.em_active_pixels = [0] * backbone.em_iteration
+    backbone.em_total_pixels = 0
+    times = list()
+    depths = list()
+    heatmaps = list()
+    with torch.no_grad():
+        for sweep_imgs, mats in batches:
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            start = time.perf_counter()
+            feature, depth = backbone(sweep_imgs,
+                                      mats,
+                                      is_return_depth=True)
+            preds = model.head(feature)
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+            times.append((time.perf_counter() - start) * 1000)
+            depths.append(depth.float())
+            heatmaps.append(
+                torch.cat([task_preds[0]['heatmap'] for task_preds in preds],
+                          1).sigmoid())
+    return dict(ms=float(np.median(times)),
+                active=[
+                    num_pixels / max(backbone.em_total_pixels, 1)
+                    for num_pixels in backbone.em_active_pixels
+                ],
+                depths=depths,
+                heatmaps=heatmaps)
+
+
+def compare(result, base, depth_values):
+    depth_diffs = list()
+    argmax_agreements = list()
+    heatmap_diffs = list()
+    for depth, base_depth, heatmap, base_heatmap in zip(
+            result['depths'], base['depths'], result['heatmaps'],
+            base['heatmaps']):
+        expected = (depth * depth_values).sum(1)
+        base_expected = (base_depth * depth_values).sum(1)
+        depth_diffs.append((expected - base_expected).abs().mean().item())
+        argmax_agreements.append(
+            (depth.argmax(1) == base_depth.argmax(1)).float().mean().item())
+        heatmap_diffs.append((heatmap - base_heatmap).abs().max().item())
+    return dict(depth_diff=float(np.mean(depth_diffs)),
+                argmax_agreement=float(np.mean(argmax_agreements)),
+                heatmap_diff=float(np.max(heatmap_diffs)))
+
+
+def main(args):
+    device = torch.device(args.device)
+    exp_class = load_exp_class(args.exp_path)
+    pl_model = exp_class(default_root_dir=tempfile.mkdtemp())
+    if args.ckpt_path is not None:
+        pl_model.load_state_dict(
+            torch.load(args.ckpt_path, map_location='cpu')['state_dict'])
+    model = pl_model.model.to(device).eval()
+    backbone = model.backbone
+    batches = load_batches(pl_model, args.num_batches, args.synthetic,
+                           device)
+    d_bound = backbone.d_bound
+    depth_values = torch.arange(*d_bound, device=device).view(1, -1, 1, 1)
+
+    schedules = [(None, None)] + [
+        (threshold, None) for threshold in args.range_thresholds
+    ] + [(None, epsilon) for epsilon in args.epsilons] + list(
+        itertools.product(args.range_thresholds, args.epsilons))
+    # Warm up.
+    run_schedule(model, batches[:1], device)
+    base = None
+    print(f'{"threshold":>10} {"epsilon":>8} {"ms":>8} {"speedup":>8} '
+          f'{"depth diff m":>13} {"argmax agree":>13} {"heatmap diff":>13}  '
+          'active pixels per iteration')
+    for threshold, epsilon in schedules:
+        backbone.em_range_threshold = threshold
+        backbone.em_epsilon = epsilon
+        result = run_schedule(model, batches, device)
+        if base is None:
+            base = result
+        metrics = compare(result, base, depth_values)
+        active = ' '.join(f'{fraction:.2f}' for fraction in result['active'])
+        print(f'{str(threshold):>10} {str(epsilon):>8} {result["ms"]:8.1f} '
+              f'{base["ms"] / result["ms"]:8.2f} '
+              f'{metrics["depth_diff"]:13.4f} '
+              f'{metrics["argmax_agreement"]:13.4f} '
+              f'{metrics["heatmap_diff"]:13.4f}  {active}')
+    backbone.em_range_threshold = None
+    backbone.em_epsilon = None
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,195 @@
+"""Measure the speed and output drift of half precision per module.
+
+Every candidate module is run on its inputs recorded from an fp32 forward
+with synthetic inputs, once in fp32 and once under a policy entry of the
+half dtype (fp16 on cuda, bf16 on cpu by default). The latency of both and
+the drift of the outputs relative to their fp32 max are printed. Candidates
+whose drift is below `--max_drift` form the suggested policy, which is then
+measured end to end.
+
+Example:
+    python scripts/study_precision_policy.py [EXP_PATH] --ckpt_path \
+        [CKPT_PATH] --channels_last
+    # Then set the printed policy in the exp.
+    self.precision_policy = {...}
+"""
+import tempfile
+from argparse import ArgumentParser
+
+import torch
+from benchmark_exps import _timeit, load_exp_class, make_synthetic_batch
+
+from bevdepth.utils.precision import (apply_precision_policy,
+                                      get_default_precision_policy,
+                                      remove_precision_policy)
+
+CANDIDATES = [
+    'backbone.img_backbone',
+    'backbone.img_neck',
+    'backbone.depth_net',
+    'backbone.depth_aggregation_net',
+    'head.trunk',
+    'head.neck',
+    'head.shared_conv',
+]
+
+
+def parse_args():
+    parser = ArgumentParser(add_help=True)
+    parser.add_argument('exp_path', help='Experiment file.')
+    parser.add_argument('--ckpt_path', default=None)
+    parser.add_argument('-b', '--batch_size_per_device', type=int, default=1)
+    parser.add_argument('--device',
+                        default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--dtype',
+                        default=None,
+                        choices=['fp16', 'bf16'],
+                        help='Default: fp16 on cuda, bf16 on cpu.')
+    parser.add_argument('--channels_last', action='store_true')
+    parser.add_argument('--modules',
+                        nargs='+',
+                        default=None,
+                        help='Candidate modules, default: the image backbone, '
+                        'neck, depth net and the BEV trunk and neck.')
+    parser.add_argument('--max_drift',
+                        type=float,
+                        default=1e-2,
+                        help='Max drift of the outputs relative to their '
+                        'fp32 max in the suggested policy.')
+    parser.add_argument('--num_warmup', type=int, default=2)
+    parser.add_argument('--num_iters', type=int, default=5)
+    return parser.parse_args()
+
+
+def _get_submodule(model, name):
+    for attr in name.split('.'):
+        model = getattr(model, attr, None)
+    return model
+
+
+def _tensors(obj):
+    if isinstance(obj, torch.Tensor):
+        return [obj]
+    if isinstance(obj, (list, tuple)):
+        return [tensor for item in obj for tensor in _tensors(item)]
+    if isinstance(obj, dict):
+        return [tensor for item in obj.values() for tensor in _tensors(item)]
+    return []
+
+
+def _clone(obj):
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().clone()
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_clone(item) for item in obj)
+    if isinstance(obj, dict):
+        return type(obj)((key, _clone(value)) for key, value in obj.items())
+    return obj
+
+
+def record_inputs(model, names, inputs):
+    """Record the inputs of the first call of every module in `names`."""
+    recorded = dict()
+    handles = list()
+
+    def _hook(name):
+
+        def _record(module, args, kwargs):
+            if name not in recorded:
+                recorded[name] = (_clone(args), _clone(kwargs))
+
+        return _record
+
+    for name in names:
+        handles.append(
+            _get_submodule(model, name).register_forward_pre_hook(
+                _hook(name), with_kwargs=True))
+    with torch.no_grad():
+        model(*inputs)
+    for handle in handles:
+        handle.remove()
+    return recorded
+
+
+def drift(outputs, ref_outputs):
+    """Max abs difference of the outputs relative to the fp32 max."""
+    drifts = [
+        ((output.float() - ref).abs().max() /
+         ref.abs().max().clamp(min=1e-6)).item()
+        for output, ref in zip(_tensors(outputs), _tensors(ref_outputs))
+        if ref.is_floating_point() and ref.numel() > 0
+    ]
+    return max(drifts) if drifts else 0.
+
+
+def measure(model, func, policy, device, num_warmup, num_iters):
+    """Latency in ms and outputs of `func` with `policy` applied."""
+    apply_precision_policy(model, policy)
+    with torch.no_grad():
+        outputs = func()
+        ms = _timeit(func, device, num_warmup, num_iters)
+    remove_precision_policy(model)
+    return ms, outputs
+
+
+def main(args):
+    device = torch.device(args.device)
+    dtype = args.dtype or ('fp16' if device.type == 'cuda' else 'bf16')
+    exp_class = load_exp_class(args.exp_path)
+    pl_model = exp_class(batch_size_per_device=args.batch_size_per_device,
+                         default_root_dir=tempfile.mkdtemp())
+    if args.ckpt_path is not None:
+        pl_model.load_state_dict(
+            torch.load(args.ckpt_path, map_location='cpu')['state_dict'])
+    model = pl_model.model.to(device).eval()
+    imgs, mats, _, _, _, depth = make_synthetic_batch(
+        pl_model, args.batch_size_per_device, device)
+    inputs = (imgs, mats, depth) if pl_model.use_fusion else (imgs, mats)
+    names = [
+        name for name in args.modules or CANDIDATES
+        if _get_submodule(model, name) is not None
+    ]
+    recorded = record_inputs(model, names, inputs)
+    entry = dict(dtype=dtype)
+    if args.channels_last:
+        entry['memory_format'] = 'channels_last'
+
+    print(f'{"module":<32} {"fp32 ms":>9} {dtype + " ms":>9} {"speedup":>8} '
+          f'{"drift":>9}')
+    suggested = dict()
+    for name in names:
+        if name not in recorded:
+            continue
+        module = _get_submodule(model, name)
+        module_args, module_kwargs = recorded[name]
+
+        def _run():
+            return module(*module_args, **module_kwargs)
+
+        ref_ms, ref_outputs = measure(model, _run, dict(), device,
+                                      args.num_warmup, args.num_iters)
+        ms, outputs = measure(model, _run, {name: entry}, device,
+                              args.num_warmup, args.num_iters)
+        module_drift = drift(outputs, ref_outputs)
+        print(f'{name:<32} {ref_ms:9.2f} {ms:9.2f} {ref_ms / ms:8.2f} '
+              f'{module_drift:9.2e}')
+        if module_drift <= args.max_drift:
+            suggested[name] = entry
+
+    def _run_model():
+        return model(*inputs)
+
+    policy = get_default_precision_policy(model)
+    ref_ms, ref_outputs = measure(model, _run_model, policy, device,
+                                  args.num_warmup, args.num_iters)
+    policy.update(suggested)
+    ms, outputs = measure(model, _run_model, policy, device, args.num_warmup,
+                          args.num_iters)
+    print(f'\nEnd to end with the suggested policy: {ref_ms:.2f} ms -> '
+          f'{ms:.2f} ms ({ref_ms / ms:.2f}x), drift of the predictions '
+          f'{drift(outputs, ref_outputs):.2e}')
+    print(f'self.precision_policy = {suggested}')
+
+
+if __name__ == '__main__':
+    main(parse_args())
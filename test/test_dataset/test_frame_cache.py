@@ -0,0 +1,78 @@
+import glob
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from bevdepth.datasets.frame_cache import FrameCache
+
+DATA_ROOT = './test/data/nuscenes'
+IMG_BYTES = 1600 * 900 * 3
+
+
+class TestFrameCache(unittest.TestCase):
+
+    def setUp(self):
+        self.filenames = [
+            os.path.relpath(path, DATA_ROOT) for path in sorted(
+                glob.glob(os.path.join(DATA_ROOT, 'samples/*/*.jpg')))
+        ][:3]
+
+    def test_image_lru(self):
+        cache = FrameCache(DATA_ROOT, max_image_bytes=2 * IMG_BYTES)
+        img = cache.get_image(self.filenames[0])
+        assert img.size == (1600, 900)
+        assert cache.get_image(self.filenames[0]) is img
+        cache.get_image(self.filenames[1])
+        # Evicts the least recently used image.
+        cache.get_image(self.filenames[2])
+        stats = cache.stats()['image']
+        assert stats['hits'] == 1 and stats['misses'] == 3
+        assert stats['num_items'] == 2
+        assert stats['num_bytes'] == 2 * IMG_BYTES
+        assert cache.get_image(self.filenames[0]) is not img
+
+    def test_disabled(self):
+        cache = FrameCache(DATA_ROOT)
+        img = cache.get_image(self.filenames[0])
+        assert cache.get_image(self.filenames[0]) is not img
+        assert cache.stats()['image']['num_items'] == 0
+        assert cache.total_stats() == dict()
+
+    def test_lidar(self):
+        data_root = tempfile.mkdtemp()
+        points = np.random.rand(100, 5).astype(np.float32)
+        points.tofile(os.path.join(data_root, 'points.bin'))
+        cache = FrameCache(data_root, max_lidar_bytes=points.nbytes)
+        lidar_points = cache.get_lidar('points.bin')
+        np.testing.assert_array_equal(lidar_points, points[:, :4])
+        # Callers get their own copy.
+        lidar_points[:] = 0
+        np.testing.assert_array_equal(cache.get_lidar('points.bin'),
+                                      points[:, :4])
+        assert cache.stats()['lidar']['hits'] == 1
+
+        # Points which are not cached are not copied.
+        cache = FrameCache(data_root)
+        lidar_points = cache.get_lidar('points.bin')
+        assert not lidar_points.flags.owndata
+        lidar_points[:] = 0
+        np.testing.assert_array_equal(cache.get_lidar('points.bin'),
+                                      points[:, :4])
+
+    def test_total_stats(self):
+        cache = FrameCache(DATA_ROOT, max_image_bytes=IMG_BYTES)
+        cache.get_image(self.filenames[0])
+        # A worker, with its own copy of the cache.
+        worker = multiprocessing.get_context('fork').Process(
+            target=lambda:
+            [cache.get_image(self.filenames[1]) for _ in range(2)])
+        worker.start()
+        worker.join()
+        assert cache.stats()['image']['hits'] == 0
+        stats = cache.total_stats()['image']
+        assert stats['hits'] == 1 and stats['misses'] == 2
+        cache.reset_total_stats()
+        assert cache.total_stats()['image']['hits'] == 0
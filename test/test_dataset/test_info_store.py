@@ -0,0 +1,119 @@
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from bevdepth.datasets.info_store import (NuscInfoStore, convert_infos,
+                                          load_infos)
+
+CAMS = ['CAM_FRONT', 'CAM_BACK']
+
+
+def build_record(filename, timestamp, intrinsic=True):
+    calibrated_sensor = dict(rotation=[1., 0., 0., 0.],
+                             translation=[timestamp, 1., 2.])
+    calibrated_sensor['camera_intrinsic'] = np.eye(3).tolist(
+    ) if intrinsic else list()
+    return dict(filename=filename,
+                timestamp=timestamp,
+                ego_pose=dict(rotation=[0., 1., 0., 0.],
+                              translation=[0., timestamp, 0.]),
+                calibrated_sensor=calibrated_sensor)
+
+
+def build_info(idx, scene_token, num_sweeps, num_anns):
+    info = dict(sample_token=f'sample_{idx}',
+                scene_token=scene_token,
+                timestamp=idx * 100)
+    info['cam_infos'] = {
+        cam: build_record(f'samples/{cam}/{idx}.jpg', idx * 100)
+        for cam in CAMS
+    }
+    info['lidar_infos'] = {
+        'LIDAR_TOP': build_record(f'samples/LIDAR_TOP/{idx}.bin', idx * 100,
+                                  False)
+    }
+    # The last sweep misses CAM_BACK.
+    info['cam_sweeps'] = [{
+        cam: build_record(f'sweeps/{cam}/{idx}_{i}.jpg', idx * 100 - i - 1)
+        for cam in (CAMS if i < num_sweeps - 1 else CAMS[:1])
+    } for i in range(num_sweeps)]
+    info['lidar_sweeps'] = [{
+        'LIDAR_TOP':
+        build_record(f'sweeps/LIDAR_TOP/{idx}_{i}.bin', idx * 100 - i - 1,
+                     False)
+    } for i in range(num_sweeps)]
+    info['ann_infos'] = [
+        dict(category_name=['vehicle.car', 'human.pedestrian.adult'][i % 2],
+             translation=[i, 2., 3.],
+             size=[1., 2., 3.],
+             rotation=[1., 0., 0., 0.],
+             velocity=np.array([i, 1., np.nan]),
+             num_lidar_pts=i,
+             num_radar_pts=1) for i in range(num_anns)
+    ]
+    return info
+
+
+class TestInfoStore(unittest.TestCase):
+
+    def setUp(self):
+        self.infos = [
+            build_info(0, 'scene_0', 2, 3),
+            build_info(1, 'scene_0', 0, 0),
+            build_info(2, 'scene_1', 3, 1),
+        ]
+        self.store_dir = tempfile.mkdtemp()
+        convert_infos(self.infos, self.store_dir)
+
+    def test_round_trip(self):
+        store = NuscInfoStore(self.store_dir)
+        assert len(store) == 3
+        for info, view in zip(self.infos, store):
+            assert view['sample_token'] == info['sample_token']
+            assert view['scene_token'] == info['scene_token']
+            assert view['cam_infos'] == info['cam_infos']
+            assert view['cam_sweeps'] == info['cam_sweeps']
+            assert len(view['lidar_sweeps']) == len(info['lidar_sweeps'])
+            for sweep, expected in zip(view['lidar_sweeps'],
+                                       info['lidar_sweeps']):
+                assert sweep['LIDAR_TOP']['filename'] == expected[
+                    'LIDAR_TOP']['filename']
+                assert sweep['LIDAR_TOP']['timestamp'] == expected[
+                    'LIDAR_TOP']['timestamp']
+            assert len(view['ann_infos']) == len(info['ann_infos'])
+            for ann_info, expected in zip(view['ann_infos'],
+                                          info['ann_infos']):
+                for key in [
+                        'category_name', 'translation', 'size', 'rotation',
+                        'num_lidar_pts', 'num_radar_pts'
+                ]:
+                    assert ann_info[key] == expected[key]
+                np.testing.assert_equal(ann_info['velocity'],
+                                        expected['velocity'])
+        assert store.get_scene_index(0) == store.get_scene_index(1)
+        assert store.get_scene_index(0) != store.get_scene_index(2)
+
+    def test_pickle(self):
+        store = NuscInfoStore(self.store_dir)
+        store[0]['cam_infos']
+        # Memory maps are reopened instead of being pickled.
+        store = pickle.loads(pickle.dumps(store))
+        assert store._arrays is None
+        assert store[-1]['sample_token'] == 'sample_2'
+
+    def test_concat(self):
+        infos = load_infos([self.store_dir, self.store_dir])
+        assert len(infos) == 6
+        assert infos[4]['sample_token'] == 'sample_1'
+        assert [info['sample_token'] for info in infos][3] == 'sample_0'
+
+    def test_ann_categories(self):
+        infos = load_infos([self.store_dir, self.store_dir])
+        sample_idxes, category_ids, categories = infos.get_ann_categories()
+        assert sample_idxes.tolist() == [0, 0, 0, 2, 3, 3, 3, 5]
+        assert [categories[i] for i in category_ids[:4]] == [
+            'vehicle.car', 'human.pedestrian.adult', 'vehicle.car',
+            'vehicle.car'
+        ]
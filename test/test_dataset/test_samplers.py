@@ -0,0 +1,128 @@
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from bevdepth.datasets import samplers
+from bevdepth.datasets.samplers import CBGSSampler, SceneChunkSampler
+
+
+class DummyDataset:
+
+    def __init__(self, scene_lengths):
+        self.infos = [
+            dict(scene_token=f'scene_{scene_idx}')
+            for scene_idx, length in enumerate(scene_lengths)
+            for _ in range(length)
+        ]
+
+    def __len__(self):
+        return len(self.infos)
+
+    def get_class_sample_indices(self):
+        # A frequent class, a rare class and a missing class.
+        return [np.arange(90), np.arange(90, 100), np.zeros(0, np.int64)]
+
+
+class TestSceneChunkSampler(unittest.TestCase):
+
+    def test_worker_runs(self):
+        dataset = DummyDataset([10, 10, 10, 10])
+        sampler = SceneChunkSampler(dataset,
+                                    batch_size=2,
+                                    num_workers=2,
+                                    shuffle=False)
+        indices = list(sampler)
+        assert sorted(indices) == list(range(40))
+        batches = np.array(indices).reshape(-1, 2)
+        # Worker 0 gets batch 0, 2, 4..., which walk through the first half.
+        assert batches[0::2].reshape(-1).tolist() == list(range(20))
+        assert batches[1::2].reshape(-1).tolist() == list(range(20, 40))
+
+    def test_distributed(self):
+        dataset = DummyDataset([7, 12, 5, 9])
+        indices = list()
+        for rank in range(3):
+            sampler = SceneChunkSampler(dataset,
+                                        batch_size=4,
+                                        num_workers=2,
+                                        chunk_size=5,
+                                        seed=1,
+                                        num_replicas=3,
+                                        rank=rank)
+            sampler.set_epoch(2)
+            assert len(list(sampler)) == len(sampler) == 11
+            indices.extend(sampler)
+        # Only padded samples are repeated.
+        assert set(indices) == set(range(33))
+        sampler.set_epoch(3)
+        assert list(sampler) != indices[-11:]
+
+    def test_exp_sampler(self):
+        pytest.importorskip('mmcv')
+        pytest.importorskip('pytorch_lightning')
+        from bevdepth.exps.nuscenes.base_exp import BEVDepthLightningModel
+
+        exp = BEVDepthLightningModel.__new__(BEVDepthLightningModel)
+        exp.data_use_cbgs = False
+        exp.data_use_scene_chunk_sampler = True
+        exp.batch_size_per_device = 2
+        dataset = DummyDataset([40] * 8)
+        epoch_indices = list()
+        for rank in range(2):
+            with mock.patch.dict(os.environ, PL_GLOBAL_SEED='3'), \
+                    mock.patch.object(samplers, '_get_dist_info',
+                                      return_value=(2, rank)):
+                sampler = exp._build_train_sampler(dataset, num_workers=2)
+            assert isinstance(sampler, SceneChunkSampler)
+            assert sampler.shuffle and sampler.seed == 3
+            indices = list()
+            for epoch in range(2):
+                sampler.set_epoch(epoch)
+                indices.append(list(sampler))
+            # Reshuffled every epoch.
+            assert indices[0] != indices[1]
+            epoch_indices.append(indices)
+        # The ranks split the same permutation of the chunks.
+        for epoch in range(2):
+            assert sorted(epoch_indices[0][epoch] +
+                          epoch_indices[1][epoch]) == list(range(320))
+
+
+class TestCBGSSampler(unittest.TestCase):
+
+    def test_balance(self):
+        sampler = CBGSSampler(DummyDataset([100]), num_replicas=1, rank=0)
+        indices = np.array(list(sampler))
+        assert len(indices) == len(sampler) == 100
+        assert (indices >= 90).sum() == 50
+        sampler.set_epoch(1)
+        assert list(sampler) != indices.tolist()
+
+    def test_distributed(self):
+        dataset = DummyDataset([100])
+        shards = list()
+        for rank in range(3):
+            sampler = CBGSSampler(dataset, seed=1, num_replicas=3, rank=rank)
+            sampler.set_epoch(4)
+            shards.append(list(sampler))
+        assert all(len(shard) == 34 for shard in shards)
+        # The shards are strided slices of the same draws.
+        merged = np.stack(shards, 1).reshape(-1)[:100]
+        sampler = CBGSSampler(dataset, seed=1, num_replicas=1, rank=0)
+        sampler.set_epoch(4)
+        assert merged.tolist() == list(sampler)
+
+    def test_infinite(self):
+        sampler = CBGSSampler(DummyDataset([100]),
+                              infinite=True,
+                              num_replicas=1,
+                              rank=0)
+        iterator = iter(sampler)
+        indices = [next(iterator) for _ in range(250)]
+        sampler.infinite = False
+        assert indices[:100] == list(sampler)
+        sampler.set_epoch(1)
+        assert indices[100:200] == list(sampler)
@@ -0,0 +1,73 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from bevdepth.datasets.temporal_index import (KEY_FRAME, MISSING,
+                                              build_temporal_index,
+                                              load_temporal_index)
+
+CAMS = ['CAM_FRONT', 'CAM_BACK']
+
+
+def build_info(scene_token, timestamp, sweep_cams):
+    return dict(
+        scene_token=scene_token,
+        cam_sweeps=[{
+            cam: dict(timestamp=timestamp - 10 * (i + 1))
+            for cam in cams
+        } for i, cams in enumerate(sweep_cams)],
+        lidar_sweeps=[
+            dict(LIDAR_TOP=dict(timestamp=timestamp - 5 * (i + 1)))
+            for i in range(10)
+        ])
+
+
+class TestTemporalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.infos = [
+            build_info('scene_0', 1000, [CAMS, CAMS[:1], CAMS]),
+            build_info('scene_0', 2000, [CAMS, CAMS]),
+            build_info('scene_1', 3000, []),
+            build_info('scene_1', 4000, [CAMS[:1]]),
+        ]
+
+    def test_build(self):
+        index = build_temporal_index(self.infos, [0, -1], [1], CAMS)
+        assert index.shape == (4, 4, 3)
+        # Sweep 1 misses a camera, falls back to sweep 0, whose closest lidar
+        # sweep is 10 ms (index 1) before the key frame.
+        assert index[0].tolist() == [[0, KEY_FRAME, KEY_FRAME], [0, 0, 1],
+                                     [0, KEY_FRAME, KEY_FRAME], [0, 0, 1]]
+        assert index[1].tolist() == [[1, KEY_FRAME, KEY_FRAME], [1, 1, 3],
+                                     [0, KEY_FRAME, KEY_FRAME], [0, 0, 1]]
+        # The previous key frame is from another scene.
+        assert index[2].tolist() == [[2, KEY_FRAME, KEY_FRAME],
+                                     [2, KEY_FRAME, KEY_FRAME],
+                                     [2, KEY_FRAME, KEY_FRAME],
+                                     [2, KEY_FRAME, KEY_FRAME]]
+        # No sweep has all cameras.
+        assert index[3, 1].tolist() == [3, MISSING, MISSING]
+        assert build_temporal_index(self.infos, [0], [1],
+                                    CAMS[:1])[3, 1].tolist() == [3, 0, 1]
+
+    def test_persist(self):
+        info_path = os.path.join(tempfile.mkdtemp(), 'infos.pkl')
+        with open(info_path, 'wb') as f:
+            pickle.dump(self.infos, f)
+        index = load_temporal_index(info_path, self.infos, [0, -1], [1],
+                                    CAMS)
+        index_paths = [
+            path for path in os.listdir(os.path.dirname(info_path))
+            if path.startswith('infos.pkl.temporal_')
+        ]
+        assert len(index_paths) == 1
+        np.testing.assert_array_equal(
+            load_temporal_index(info_path, self.infos, [0, -1], [1], CAMS),
+            index)
+        # Another config is saved to another file.
+        load_temporal_index(info_path, self.infos, [0], [1], CAMS)
+        assert len(os.listdir(os.path.dirname(info_path))) == 3
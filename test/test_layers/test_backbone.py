@@ -1,9 +1,18 @@
 import unittest
+from unittest import mock
 
 import pytest
 import torch
+import torch.utils.checkpoint as cp
 
-from bevdepth.layers.backbones.base_lss_fpn import BaseLSSFPN
+from bevdepth.layers.backbones.base_lss_fpn import (BaseLSSFPN, DepthNet,
+                                                    SEGateCache)
+from bevdepth.layers.backbones.bevstereo_lss_fpn import BEVStereoLSSFPN
+from bevdepth.layers.backbones.bevstereo_lss_fpn import \
+    DepthNet as StereoDepthNet
+from bevdepth.layers.backbones.bevstereo_lss_fpn import SweepCache
+from bevdepth.layers.backbones.fusion_lss_fpn import DepthNet as FusionDepthNet
+from bevdepth.utils.checkpointing import count_saved_activations
 
 
 class TestLSSFPN(unittest.TestCase):
@@ -55,3 +64,307 @@ class TestLSSFPN(unittest.TestCase):
         mats_dict['bda_mat'] = bda_mat
         preds = self.lss_fpn.forward(sweep_imgs, mats_dict)
         assert preds.shape == torch.Size([2, 20, 40, 40])
+
+
+class TestCameraAwareSE(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.depth_net = DepthNet(16, 16, 8, 10).cuda().eval()
+        self.depth_net.bn.running_mean.normal_()
+
+    def _get_mats_dict(self, batch_size):
+        return dict(intrin_mats=torch.rand(batch_size, 1, 3, 4, 4).cuda(),
+                    ida_mats=torch.rand(batch_size, 1, 3, 4, 4).cuda(),
+                    sensor2ego_mats=torch.rand(batch_size, 1, 3, 4, 4).cuda(),
+                    bda_mat=torch.rand(batch_size, 4, 4).cuda())
+
+    @pytest.mark.skipif(torch.cuda.is_available() is False,
+                        reason='No gpu available.')
+    def test_se_cache(self):
+        x = torch.rand(6, 16, 8, 8).cuda()
+        mats_dict = self._get_mats_dict(2)
+        other_mats_dict = self._get_mats_dict(2)
+        with torch.no_grad():
+            expected = self.depth_net(x, mats_dict)
+            other_expected = self.depth_net(x, other_mats_dict)
+            self.depth_net.se_cache = SEGateCache()
+            for _ in range(2):
+                torch.testing.assert_close(self.depth_net(x, mats_dict),
+                                           expected)
+            torch.testing.assert_close(self.depth_net(x, other_mats_dict),
+                                       other_expected)
+        assert self.depth_net.se_cache.stats()['hits'] == 1
+        self.depth_net.train()
+        assert self.depth_net.se_cache.key is None
+
+    @pytest.mark.skipif(torch.cuda.is_available() is False,
+                        reason='No gpu available.')
+    def test_fold_se(self):
+        x = torch.rand(6, 16, 8, 8).cuda()
+        mats_dict = self._get_mats_dict(1)
+        batch_mats_dict = {
+            key: value.repeat(2, *[1] * (value.dim() - 1))
+            for key, value in mats_dict.items()
+        }
+        with torch.no_grad():
+            expected = self.depth_net(x, batch_mats_dict)
+            self.depth_net.fold_se(mats_dict)
+            # Folded gates do not depend on the matrices.
+            torch.testing.assert_close(
+                self.depth_net(x, self._get_mats_dict(2)), expected)
+            self.depth_net.fold_se(None)
+            assert self.depth_net.depth_se.folded_gate is None
+
+    @pytest.mark.skipif(torch.cuda.is_available() is False,
+                        reason='No gpu available.')
+    def test_checkpoint(self):
+        mats_dict = self._get_mats_dict(2)
+        depth_nets = [
+            (self.depth_net, [mats_dict]),
+            (StereoDepthNet(16, 16, 8, 10, [2, 12, 1]).cuda(), [mats_dict]),
+            (FusionDepthNet(16, 16, 8, 10).cuda(),
+             [mats_dict, torch.rand(6, 1, 8, 8).cuda()]),
+        ]
+        for depth_net, args in depth_nets:
+            depth_net.train()
+            x = torch.rand(6, 16, 8, 8).cuda().requires_grad_()
+            grads = list()
+            for with_cp in [False, True]:
+                depth_net.with_cp = with_cp
+                x.grad = None
+                # Same dropout masks of ASPP.
+                torch.manual_seed(0)
+                outputs = depth_net(x, *args)
+                if isinstance(outputs, tuple):
+                    outputs = torch.cat(
+                        [output.flatten() for output in outputs])
+                outputs.sum().backward()
+                grads.append(x.grad)
+            torch.testing.assert_close(grads[1], grads[0])
+
+
+class TestBEVStereoCostVolume(unittest.TestCase):
+
+    def setUp(self) -> None:
+        backbone_conf = {
+            'x_bound': [-10, 10, 0.5],
+            'y_bound': [-10, 10, 0.5],
+            'z_bound': [-5, 3, 8],
+            'd_bound': [2.0, 22, 1.0],
+            'final_dim': [64, 64],
+            'output_channels':
+            10,
+            'downsample_factor':
+            16,
+            'img_backbone_conf':
+            dict(type='ResNet',
+                 depth=18,
+                 frozen_stages=0,
+                 out_indices=[0, 1, 2, 3],
+                 norm_eval=False,
+                 base_channels=8),
+            'img_neck_conf':
+            dict(
+                type='SECONDFPN',
+                in_channels=[8, 16, 32, 64],
+                upsample_strides=[0.25, 0.5, 1, 2],
+                out_channels=[16, 16, 16, 16],
+            ),
+            'depth_net_conf':
+            dict(in_channels=64, mid_channels=64),
+            'num_groups':
+            4,
+            'range_list': [[2, 8], [8, 12], [12, 16], [16, 22]],
+        }
+        self.stereo_fpn = BEVStereoLSSFPN(**backbone_conf).eval()
+
+    def test_chunked_cost_volume(self):
+        batch_size, num_sweeps, num_cams = 2, 2, 3
+        stereo_feats = [torch.rand(batch_size * num_cams, 8, 16, 16)] * 2
+        intrin_mats = torch.eye(4).repeat(batch_size, num_sweeps, num_cams, 1,
+                                          1)
+        intrin_mats[..., 0, 0] = intrin_mats[..., 1, 1] = 32
+        intrin_mats[..., :2, 2] = 32
+        mats_dict = dict(intrin_mats=intrin_mats,
+                         ida_mats=torch.eye(4).repeat(batch_size, num_sweeps,
+                                                      num_cams, 1, 1))
+        sensor2sensor_mats = torch.eye(4).repeat(batch_size, num_cams, 1, 1)
+        sensor2sensor_mats[..., 0, 3] = 0.5
+        depth_sample = torch.rand(batch_size * num_cams, 3, 16, 16) * 20 + 2
+        depth_sample_frustum = self.stereo_fpn.create_depth_sample_frustum(
+            depth_sample, 4)
+        # Reference: warp all candidates at once.
+        warped_stereo_fea = self.stereo_fpn.homo_warping(
+            stereo_feats[1], intrin_mats[:, 0], intrin_mats[:, 1],
+            sensor2sensor_mats, mats_dict['ida_mats'][:, 0],
+            mats_dict['ida_mats'][:, 1], depth_sample, depth_sample_frustum)
+        feat_cost = torch.mean(
+            stereo_feats[0].reshape(6, 4, 2, 1, 16, 16) *
+            warped_stereo_fea.reshape(6, 4, 2, 3, 16, 16), 2)
+        expected = self.stereo_fpn.similarity_net(feat_cost).squeeze(1)
+        for chunk_size, max_bytes in [(None, None), (2, None), (None, 1),
+                                      (None, 16 * 16 * 80 * 4)]:
+            self.stereo_fpn.cost_volume_chunk_size = chunk_size
+            self.stereo_fpn.cost_volume_max_bytes = max_bytes
+            with torch.no_grad():
+                depth_score = self.stereo_fpn._generate_cost_volume(
+                    0, stereo_feats, mats_dict, depth_sample, None,
+                    [sensor2sensor_mats] * 2)
+            torch.testing.assert_close(depth_score, expected)
+
+    def test_chunked_cost_volume_grad(self):
+        batch_size, num_sweeps, num_cams = 2, 2, 3
+        stereo_feats = [
+            torch.rand(batch_size * num_cams, 32, 16, 16).requires_grad_()
+            for _ in range(num_sweeps)
+        ]
+        intrin_mats = torch.eye(4).repeat(batch_size, num_sweeps, num_cams, 1,
+                                          1)
+        intrin_mats[..., 0, 0] = intrin_mats[..., 1, 1] = 32
+        intrin_mats[..., :2, 2] = 32
+        mats_dict = dict(intrin_mats=intrin_mats,
+                         ida_mats=torch.eye(4).repeat(batch_size, num_sweeps,
+                                                      num_cams, 1, 1))
+        sensor2sensor_mats = torch.eye(4).repeat(batch_size, num_cams, 1, 1)
+        sensor2sensor_mats[..., 0, 3] = 0.5
+        depth_sample = torch.rand(batch_size * num_cams, 3, 16, 16) * 20 + 2
+        results = list()
+        # All candidates at once, and one candidate of one image per chunk.
+        for max_bytes in [None, 16 * 16 * 272]:
+            self.stereo_fpn.cost_volume_max_bytes = max_bytes
+            with count_saved_activations() as stats:
+                depth_score = self.stereo_fpn._generate_cost_volume(
+                    0, stereo_feats, mats_dict, depth_sample, None,
+                    [sensor2sensor_mats] * 2)
+            grads = torch.autograd.grad(depth_score.square().sum(),
+                                        stereo_feats)
+            results.append((depth_score, grads, stats['num_bytes']))
+        torch.testing.assert_close(results[1][0], results[0][0])
+        for grad, expected_grad in zip(results[1][1], results[0][1]):
+            torch.testing.assert_close(grad, expected_grad)
+        # The warped features are recomputed in the backward pass, chunks
+        # only keep their projections.
+        warped_bytes = stereo_feats[1].numel() * 3 * 4
+        assert results[1][2] < results[0][2] - warped_bytes // 2
+
+        # The stereo features of the model are detached, autograd saves no
+        # warped features and chunks are not checkpointed.
+        stereo_feats = [feat.detach() for feat in stereo_feats]
+        num_bytes = list()
+        with mock.patch.object(cp, 'checkpoint',
+                               wraps=cp.checkpoint) as checkpoint:
+            for max_bytes in [None, 16 * 16 * 272]:
+                self.stereo_fpn.cost_volume_max_bytes = max_bytes
+                with count_saved_activations() as stats:
+                    self.stereo_fpn._generate_cost_volume(
+                        0, stereo_feats, mats_dict, depth_sample, None,
+                        [sensor2sensor_mats] * 2)
+                num_bytes.append(stats['num_bytes'])
+        assert not checkpoint.called
+        assert num_bytes[0] == num_bytes[1] < warped_bytes
+
+    def test_scheduled_em(self):
+        batch_size, num_sweeps, num_cams = 2, 2, 3
+        stereo_feats = [torch.rand(batch_size * num_cams, 8, 16, 16)] * 2
+        intrin_mats = torch.eye(4).repeat(batch_size, num_sweeps, num_cams, 1,
+                                          1)
+        intrin_mats[..., 0, 0] = intrin_mats[..., 1, 1] = 32
+        intrin_mats[..., :2, 2] = 32
+        mats_dict = dict(intrin_mats=intrin_mats,
+                         ida_mats=torch.eye(4).repeat(batch_size, num_sweeps,
+                                                      num_cams, 1, 1))
+        sensor2sensor_mats = torch.eye(4).repeat(batch_size, num_cams, 1, 1)
+        sensor2sensor_mats[..., 0, 3] = 0.5
+        sensor2sensor_mats = [sensor2sensor_mats] * 2
+        init_mu = torch.rand(batch_size * num_cams, 1, 16, 16) * 20 + 2
+        init_sigma = torch.rand(batch_size * num_cams, 1, 16, 16) * 3 + 0.5
+        range_score = torch.rand(batch_size * num_cams, 1, 16, 16)
+        # Reference: EM of all pixels.
+        mus, sigmas = [init_mu], [init_sigma]
+        with torch.no_grad():
+            for _ in range(self.stereo_fpn.em_iteration):
+                depth_sample = torch.cat(
+                    [mus[-1] + sigmas[-1] * k for k in self.stereo_fpn.k_list],
+                    1)
+                mu_score = self.stereo_fpn._generate_cost_volume(
+                    0, stereo_feats, mats_dict, depth_sample, None,
+                    sensor2sensor_mats).softmax(1)
+                center = self.stereo_fpn.num_samples // 2
+                scale_factor = torch.clamp(
+                    0.5 / (1e-4 + mu_score[:, center:center + 1]),
+                    min=0.1,
+                    max=10)
+                sigmas.append(
+                    torch.clamp(sigmas[-1] * scale_factor, min=0.1, max=10))
+                mus.append((depth_sample * mu_score).sum(1, keepdim=True))
+        mu, sigma = mus[-1], sigmas[-1]
+        for threshold in [0., 0.5]:
+            self.stereo_fpn.em_range_threshold = threshold
+            with torch.no_grad():
+                scheduled_mu, scheduled_sigma = (
+                    self.stereo_fpn._forward_scheduled_em(
+                        0, stereo_feats, mats_dict, sensor2sensor_mats, dict(),
+                        init_mu, init_sigma, range_score))
+            active = range_score >= threshold
+            torch.testing.assert_close(scheduled_mu[active], mu[active])
+            torch.testing.assert_close(scheduled_sigma[active], sigma[active])
+            assert torch.equal(scheduled_mu[~active], init_mu[~active])
+        self.stereo_fpn.em_range_threshold = None
+
+        # About half of the pixels leave after the first iteration.
+        self.stereo_fpn.em_epsilon = (mus[1] - mus[0]).abs().median().item()
+        self.stereo_fpn.em_active_pixels = [0] * self.stereo_fpn.em_iteration
+        with torch.no_grad():
+            scheduled_mu, scheduled_sigma = (
+                self.stereo_fpn._forward_scheduled_em(0, stereo_feats,
+                                                      mats_dict,
+                                                      sensor2sensor_mats,
+                                                      dict(), init_mu,
+                                                      init_sigma, range_score))
+        # Pixels keep the reference results of the iteration they leave
+        # after, and pixels still active at the end match the reference.
+        expected_mu, expected_sigma = mus[1], sigmas[1]
+        active = (mus[1] - mus[0]).abs() >= self.stereo_fpn.em_epsilon
+        expected_active_pixels = [init_mu.numel(), int(active.sum())]
+        for iteration in range(2, self.stereo_fpn.em_iteration + 1):
+            expected_mu = torch.where(active, mus[iteration], expected_mu)
+            expected_sigma = torch.where(active, sigmas[iteration],
+                                         expected_sigma)
+            active &= (mus[iteration] -
+                       mus[iteration - 1]).abs() >= self.stereo_fpn.em_epsilon
+            expected_active_pixels.append(int(active.sum()))
+        torch.testing.assert_close(scheduled_mu, expected_mu)
+        torch.testing.assert_close(scheduled_sigma, expected_sigma)
+        active_pixels = self.stereo_fpn.em_active_pixels
+        assert active_pixels == expected_active_pixels[:-1]
+        assert active_pixels[1] < active_pixels[0]
+        assert all(cur <= prev
+                   for prev, cur in zip(active_pixels[:-1], active_pixels[1:]))
+        self.stereo_fpn.em_epsilon = None
+
+
+class TestSweepCache(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = SweepCache(max_images=4)
+        timestamps = torch.tensor([[10, 11], [20, 21]])
+        results = {
+            field: torch.rand(4, 3, 2, 2)
+            for field in SweepCache.FIELDS
+        }
+        assert cache.get(timestamps) is None
+        cache.put(timestamps, **results)
+        cached = cache.get(timestamps)
+        for field in SweepCache.FIELDS:
+            assert torch.equal(cached[field], results[field])
+        # Images are keyed by camera and timestamp.
+        assert cache.get(torch.tensor([[11, 10]])) is None
+        assert cache.get(torch.tensor([[20, 21]])) is not None
+        cache.put(torch.tensor([[30, 31]]),
+                  **{field: value[:2]
+                     for field, value in results.items()})
+        assert cache.get(torch.tensor([[10, 11]])) is None
+        assert cache.stats() == dict(hits=2,
+                                     misses=3,
+                                     hit_rate=0.4,
+                                     num_images=4)
@@ -3,6 +3,7 @@ import unittest
 import pytest
 import torch
 
+from bevdepth.ops.voxel_pooling_inference import voxel_pooling_inference
 from bevdepth.ops.voxel_pooling_train import voxel_pooling_train
 
 
@@ -36,3 +37,42 @@ class TestLSSFPN(unittest.TestCase):
         assert torch.allclose(gt_bev_featuremap.cuda(),
                               bev_featuremap,
                               rtol=1e-3)
+
+    def test_voxel_pooling_cpu(self):
+        torch.manual_seed(0)
+        geom_xyz = (torch.rand([2, 200, 3]) * 12 - 2).int()
+        geom_xyz[..., 2] = geom_xyz[..., 2] % 2
+        features = torch.rand([2, 200, 8], requires_grad=True)
+        gt_bev_featuremap = features.new_zeros(2, 8, 8, 8)
+        for i in range(2):
+            for j in range(geom_xyz.shape[1]):
+                x, y, z = geom_xyz[i, j].tolist()
+                if x < 0 or x >= 8 or y < 0 or y >= 8 or z < 0 or z >= 1:
+                    continue
+                gt_bev_featuremap[i, :, y, x] += features[i, j].detach()
+        bev_featuremap = voxel_pooling_train(
+            geom_xyz, features, torch.tensor([8, 8, 1], dtype=torch.int))
+        assert torch.allclose(gt_bev_featuremap, bev_featuremap)
+        bev_featuremap.sum().backward()
+        kept = ((geom_xyz[..., :2] >= 0) &
+                (geom_xyz[..., :2] < 8)).all(-1) & (geom_xyz[..., 2] == 0)
+        # Every kept point gets the gradient of its cell.
+        assert torch.equal(features.grad[..., 0], kept.float())
+
+    def test_voxel_pooling_inference_cpu(self):
+        torch.manual_seed(0)
+        geom_xyz = (torch.rand([2, 3, 4, 5, 6, 3]) * 12 - 2).int()
+        geom_xyz[..., 2] = geom_xyz[..., 2] % 2
+        depth_features = torch.rand([6, 4, 5, 6]).softmax(1)
+        context_features = torch.rand([6, 8, 5, 6])
+        voxel_num = torch.tensor([8, 8, 1], dtype=torch.int)
+        bev_featuremap = voxel_pooling_inference(geom_xyz, depth_features,
+                                                 context_features, voxel_num)
+        # The train op pools the outer product of depth and context.
+        features = depth_features.unsqueeze(1) * context_features.unsqueeze(2)
+        features = features.view(2, 3, 8, 4, 5, 6).permute(0, 1, 3, 4, 5, 2)
+        gt_bev_featuremap = voxel_pooling_train(geom_xyz,
+                                                features.contiguous(),
+                                                voxel_num)
+        assert bev_featuremap.shape == torch.Size([2, 8, 8, 8])
+        assert torch.allclose(gt_bev_featuremap, bev_featuremap, atol=1e-6)
@@ -0,0 +1,55 @@
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+
+spec = importlib.util.spec_from_file_location(
+    'benchmark_exps',
+    os.path.join(os.path.dirname(__file__), '../../scripts/benchmark_exps.py'))
+benchmark_exps = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(benchmark_exps)
+
+
+def make_result(exp, batch_size=1, **metrics):
+    return dict(exp=exp, device='cpu', batch_size=batch_size, **metrics)
+
+
+class TestBenchmarkExps(unittest.TestCase):
+
+    def compare(self, base_results, new_results, threshold=0.1):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = list()
+            for name, results in [('base', base_results),
+                                  ('new', new_results)]:
+                paths.append(os.path.join(tmp_dir, f'{name}.json'))
+                with open(paths[-1], 'w') as f:
+                    json.dump(dict(results=results), f)
+            return benchmark_exps.compare(*paths, threshold)
+
+    def test_compare(self):
+        base_results = [
+            make_result('a', eval_ms=100., peak_memory_mb=1000.),
+            make_result('a', batch_size=2, eval_ms=200.),
+            make_result('b', eval_ms=100.),
+            make_result('c', error='RuntimeError: out of memory'),
+        ]
+        new_results = [
+            # Slower by 20 % and smaller, only the latency regresses.
+            make_result('a', eval_ms=120., peak_memory_mb=500.),
+            # Within the threshold.
+            make_result('a', batch_size=2, eval_ms=210., backward_ms=5.),
+            make_result('b', error='RuntimeError: out of memory'),
+            # Still failing, and missing from the base.
+            make_result('c', error='RuntimeError: out of memory'),
+            make_result('d', eval_ms=100.),
+        ]
+        regressions = self.compare(base_results, new_results)
+        assert len(regressions) == 2
+        assert regressions[0].startswith('a cpu bs1 eval_ms: 100.00 -> 120.00')
+        assert regressions[1] == \
+            'b cpu bs1: RuntimeError: out of memory REGRESSION'
+
+        assert self.compare(base_results, base_results) == []
+        assert len(self.compare(base_results, new_results,
+                                threshold=0.25)) == 1
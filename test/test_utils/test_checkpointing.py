@@ -0,0 +1,102 @@
+import unittest
+
+import pytest
+import torch
+import torch.utils.checkpoint as cp
+from torch import nn
+
+from bevdepth.utils.checkpointing import (count_saved_activations,
+                                          get_checkpoint_segments,
+                                          plan_checkpointing,
+                                          set_checkpoint_segments)
+
+
+class Block(nn.Module):
+
+    def __init__(self, channels):
+        super().__init__()
+        self.conv = nn.Conv2d(channels, channels, 3, padding=1)
+        self.with_cp = False
+
+    def forward(self, x):
+
+        def _inner_forward(x):
+            return torch.relu(self.conv(x)).sigmoid()
+
+        if self.with_cp and x.requires_grad:
+            return cp.checkpoint(_inner_forward, x)
+        return _inner_forward(x)
+
+
+class ResNet(nn.Module):
+
+    def __init__(self, channels):
+        super().__init__()
+        self.with_cp = False
+        self.res_layers = ['layer1', 'layer2']
+        self.layer1 = nn.Sequential(Block(channels), Block(channels))
+        self.layer2 = nn.Sequential(Block(channels))
+
+    def forward(self, x):
+        return self.layer2(self.layer1(x))
+
+
+class Model(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.stem = nn.Conv2d(3, 8, 1)
+        self.trunk = ResNet(8)
+        self.head = Block(8)
+
+    def forward(self, x):
+        return self.head(self.trunk(self.stem(x)))
+
+
+class TestCheckpointing(unittest.TestCase):
+
+    def test_segments(self):
+        model = Model()
+        segments = get_checkpoint_segments(model)
+        assert list(segments) == ['trunk.layer1', 'trunk.layer2', 'head']
+        assert len(segments['trunk.layer1']) == 2
+        set_checkpoint_segments(model, ['trunk.layer1', 'head'])
+        assert [block.with_cp for block in model.trunk.layer1] == [True, True]
+        assert not model.trunk.layer2[0].with_cp
+        assert model.head.with_cp
+        with pytest.raises(KeyError):
+            set_checkpoint_segments(model, ['trunk.layer3'])
+
+    def test_saved_activations(self):
+        model = Model()
+        x = torch.randn(2, 3, 16, 16)
+        num_bytes = dict()
+        grads = dict()
+        for names in [[], ['trunk.layer1']]:
+            set_checkpoint_segments(model, names)
+            model.zero_grad()
+            with count_saved_activations() as stats:
+                loss = model(x).sum()
+            loss.backward()
+            num_bytes[len(names)] = stats['num_bytes']
+            grads[len(names)] = model.trunk.layer1[0].conv.weight.grad.clone()
+        assert num_bytes[1] < num_bytes[0]
+        torch.testing.assert_close(grads[0], grads[1])
+
+    def test_plan(self):
+        segments = [
+            dict(name='a', saved_bytes=100, extra_ms=10.),
+            dict(name='b', saved_bytes=300, extra_ms=10.),
+            dict(name='c', saved_bytes=50, extra_ms=1.),
+            dict(name='d', saved_bytes=0, extra_ms=1.),
+        ]
+        steps, fits = plan_checkpointing(segments, 1000, 700)
+        assert fits
+        assert [step['names'] for step in steps] == [[], ['c'], ['c', 'b']]
+        assert steps[-1]['peak_bytes'] == 650
+        assert steps[-1]['extra_ms'] == 11.
+        steps, fits = plan_checkpointing(segments, 1000, 2000)
+        assert fits and len(steps) == 1
+        steps, fits = plan_checkpointing(segments, 1000, 100)
+        assert not fits
+        assert steps[-1]['names'] == ['c', 'b', 'a']
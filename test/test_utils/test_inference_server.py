@@ -0,0 +1,89 @@
+import time
+import unittest
+
+import numpy as np
+import torch
+from PIL import Image
+from pyquaternion import Quaternion
+
+from bevdepth.utils.inference_server import (BEVDepthInferenceServer,
+                                             boxes_to_global, prepare_inputs)
+
+CAMS = ['CAM_FRONT', 'CAM_BACK']
+ida_aug_conf = {
+    'final_dim': (32, 64),
+    'H': 90,
+    'W': 160,
+    'bot_pct_lim': (0.0, 0.0),
+    'cams': CAMS,
+    'Ncams': 2,
+}
+img_conf = dict(img_mean=[123.675, 116.28, 103.53],
+                img_std=[58.395, 57.12, 57.375],
+                to_rgb=True)
+
+
+def build_frame(ego_x, cam_x=1):
+    return {
+        cam: dict(img=Image.new('RGB', (160, 90)),
+                  calibrated_sensor=dict(rotation=[1, 0, 0, 0],
+                                         translation=[cam_x, 0, 0],
+                                         camera_intrinsic=np.eye(3)),
+                  ego_pose=dict(rotation=[1, 0, 0, 0],
+                                translation=[ego_x, 0, 0]),
+                  timestamp=0)
+        for cam in CAMS
+    }
+
+
+class DummyModel(torch.nn.Module):
+
+    def forward(self, sweep_imgs, mats_dict, timestamps=None):
+        time.sleep(0.01)
+        return mats_dict['sensor2ego_mats'][:, 0, 0, 0, 3]
+
+    def get_bboxes(self, preds, img_metas):
+        return [[
+            pred.new_tensor([[1, 0, 0, 1, 1, 1, 0, 1, 0]]),
+            pred.view(1),
+            pred.new_zeros(1).int()
+        ] for pred in preds]
+
+
+class TestInferenceServer(unittest.TestCase):
+
+    def test_prepare_inputs(self):
+        imgs, mats, _, _ = prepare_inputs(
+            [build_frame(0), build_frame(2)], CAMS, ida_aug_conf, img_conf)
+        assert imgs.shape == (2, 2, 3, 32, 64)
+        assert mats['sensor2ego_mats'].shape == (2, 2, 4, 4)
+        # The sweep camera is 2m ahead of the key camera.
+        assert torch.allclose(mats['sensor2ego_mats'][1, :, 0, 3],
+                              torch.tensor([3., 3.]))
+        assert torch.allclose(mats['sensor2sensor_mats'][1, :, 0, 3],
+                              torch.tensor([-2., -2.]))
+
+    def test_dynamic_batching(self):
+        server = BEVDepthInferenceServer(DummyModel(),
+                                         ida_aug_conf,
+                                         img_conf,
+                                         device='cpu',
+                                         max_batch_size=4,
+                                         max_latency_ms=50)
+        with server:
+            futures = [
+                server.submit([build_frame(0, cam_x=i)]) for i in range(8)
+            ]
+            results = [future.result() for future in futures]
+        for i, result in enumerate(results):
+            # Every request gets its own result back.
+            assert np.isclose(result['scores_3d'][0], i)
+        stats = server.get_stats()
+        assert stats['num_requests'] == 8
+        assert stats['mean_batch_size'] > 1
+
+    def test_boxes_to_global(self):
+        boxes = np.array([[1., 0, 0, 1, 1, 1, 0, 1, 0]])
+        rotation = Quaternion(axis=[0, 0, 1], degrees=90).elements
+        boxes = boxes_to_global(boxes, [10, 0, 0], rotation)
+        assert np.allclose(boxes, [[10, 1, 0, 1, 1, 1, np.pi / 2, 0, 1]])
@@ -0,0 +1,104 @@
+import copy
+import pickle
+import unittest
+
+import pytest
+import torch
+from torch import nn
+
+from bevdepth.utils.precision import (apply_precision_policy,
+                                      get_applied_precision_policy,
+                                      get_default_precision_policy)
+
+
+class Trunk(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(4, 4, 3, padding=1)
+
+    def forward(self, x):
+        return [self.conv(x)]
+
+
+class Head(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.trunk = Trunk()
+        self.out_conv = nn.Conv2d(4, 2, 1)
+
+    def forward(self, x):
+        self.input_dtype = x.dtype
+        x = self.trunk(x)[0]
+        self.trunk_dtype = x.dtype
+        return self.out_conv(x)
+
+
+class Backbone(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 4, 1)
+
+    def reduce_and_project(self, x):
+        self.project_dtype = x.dtype
+        return x * 2
+
+    def forward(self, x):
+        return self.reduce_and_project(self.conv(x))
+
+
+class Model(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.backbone = Backbone()
+        self.head = Head()
+
+    def forward(self, x):
+        return self.head(self.backbone(x))
+
+
+class TestPrecisionPolicy(unittest.TestCase):
+
+    def test_apply(self):
+        model = Model()
+        x = torch.randn(2, 3, 8, 8)
+        expected = model(x)
+        policy = get_default_precision_policy(model)
+        assert list(policy) == ['head', 'backbone.reduce_and_project']
+        policy['head.trunk'] = dict(dtype='bf16',
+                                    memory_format='channels_last')
+        apply_precision_policy(model, policy)
+        assert get_applied_precision_policy(model)['head.trunk'] == dict(
+            dtype='bf16', memory_format='channels_last')
+        assert model.head.trunk.conv.weight.is_contiguous(
+            memory_format=torch.channels_last)
+        with torch.autocast('cpu', dtype=torch.bfloat16):
+            output = model(x)
+        # fp32 islands cast their inputs and the outputs of inner half
+        # entries.
+        assert model.backbone.project_dtype == torch.float32
+        assert model.head.input_dtype == torch.float32
+        assert model.head.trunk_dtype == torch.float32
+        assert output.dtype == torch.float32
+        torch.testing.assert_close(output, expected, atol=0.05, rtol=0.05)
+        # Copies call their own modules.
+        model_copy = copy.deepcopy(model)
+        assert model_copy.head.trunk.forward.__self__ is model_copy.head.trunk
+        model_copy = pickle.loads(pickle.dumps(model))
+        assert model_copy.head.trunk.forward.__self__ is model_copy.head.trunk
+        assert get_applied_precision_policy(
+            model_copy) == get_applied_precision_policy(model)
+        apply_precision_policy(model, dict())
+        assert len(get_applied_precision_policy(model)) == 0
+        assert 'forward' not in vars(model.head)
+        assert model.head.trunk.conv.weight.is_contiguous()
+
+    def test_invalid(self):
+        model = Model()
+        with pytest.raises(KeyError):
+            apply_precision_policy(model, {'head.neck': dict(dtype='fp32')})
+        with pytest.raises(ValueError):
+            apply_precision_policy(model, {'head': dict(dtype='fp8')})
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+
+import pytest
+
+from bevdepth.utils.profiler import (disable_profiler, enable_profiler,
+                                     get_profiler, profile_region,
+                                     profile_stage)
+
+
+@profile_stage('stage_b')
+def stage_b(x):
+    time.sleep(0.001)
+    return x + 1
+
+
+def run_steps(num_steps):
+    for _ in range(num_steps):
+        with profile_region('step'):
+            with profile_region('stage_a'):
+                time.sleep(0.002)
+            stage_b(0)
+
+
+class TestStageProfiler(unittest.TestCase):
+
+    def tearDown(self):
+        disable_profiler()
+
+    def test_disabled(self):
+        assert get_profiler() is None
+        with profile_region('step') as region:
+            assert stage_b(1) == 2
+        assert not hasattr(region, 'name')
+
+    def test_summary_and_chrome_trace(self):
+        profiler = enable_profiler(timer='cpu', record_memory=False)
+        assert get_profiler() is profiler
+        run_steps(3)
+        assert disable_profiler() is profiler
+        assert get_profiler() is None
+
+        stats = profiler.summary()
+        assert list(stats.keys()) == ['stage_a', 'stage_b', 'step']
+        for stat in stats.values():
+            assert stat['count'] == 3
+            assert stat['p50_ms'] <= stat['p95_ms'] <= stat['max_ms']
+            assert 'peak_memory_mb' not in stat
+        assert stats['stage_a']['mean_ms'] >= 2
+        assert stats['step']['mean_ms'] >= stats['stage_a']['mean_ms'] + \
+            stats['stage_b']['mean_ms']
+        lines = profiler.format_summary().split('\n')
+        assert len(lines) == 4
+        assert lines[0].startswith('Stage') and lines[3].startswith('step')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'trace.json')
+            profiler.export_chrome_trace(path, pid=3)
+            with open(path) as f:
+                events = json.load(f)['traceEvents']
+        assert len(events) == 9
+        assert all(event['pid'] == 3 and event['ph'] == 'X'
+                   for event in events)
+        steps = [event for event in events if event['name'] == 'step']
+        assert all(prev['ts'] + prev['dur'] <= cur['ts']
+                   for prev, cur in zip(steps[:-1], steps[1:]))
+        # Every stage lies within its step.
+        for event in events:
+            if event['name'] == 'step':
+                continue
+            end = event['ts'] + event['dur']
+            assert any(
+                step['ts'] <= event['ts'] and end <= step['ts'] + step['dur']
+                for step in steps)
+
+    def test_callback(self):
+        pytest.importorskip('pytorch_lightning')
+        from bevdepth.callbacks.stage_profiler import StageProfilerCallback
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trainer = SimpleNamespace(log_dir=tmp_dir,
+                                      default_root_dir=tmp_dir)
+            callback = StageProfilerCallback(timer='cpu', record_memory=False)
+            callback.on_test_start(trainer, None)
+            run_steps(2)
+            callback.on_test_batch_end(trainer, None)
+            callback.on_test_end(trainer, None)
+            assert get_profiler() is None
+            with open(os.path.join(tmp_dir,
+                                   'stage_profile_test_rank0.json')) as f:
+                assert json.load(f)['step']['count'] == 2
+            assert os.path.exists(
+                os.path.join(tmp_dir, 'stage_trace_test_rank0.json'))
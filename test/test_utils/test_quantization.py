@@ -0,0 +1,65 @@
+import copy
+import os
+import tempfile
+import unittest
+
+import torch
+from torch import nn
+
+from bevdepth.utils.quantization import (calibrate, convert_ptq,
+                                         get_model_size,
+                                         load_quantized_checkpoint,
+                                         prepare_ptq, record_example_inputs,
+                                         save_quantized_checkpoint)
+
+
+class Backbone(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.img_backbone = nn.Sequential(nn.Conv2d(3, 8, 3, padding=1),
+                                          nn.BatchNorm2d(8), nn.ReLU(),
+                                          nn.Conv2d(8, 8, 3, padding=1))
+
+
+class Model(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.backbone = Backbone()
+        # Not quantized, stays in float.
+        self.head = nn.Conv2d(8, 2, 1)
+
+    def forward(self, x):
+        return self.head(self.backbone.img_backbone(x))
+
+
+class TestQuantization(unittest.TestCase):
+
+    def test_ptq_round_trip(self):
+        torch.manual_seed(0)
+        model = Model().eval()
+        float_model = copy.deepcopy(model)
+        inputs = [torch.rand(2, 3, 16, 16) for _ in range(4)]
+        module_names = ['backbone.img_backbone']
+
+        example_inputs = record_example_inputs(model, module_names, inputs[0])
+        assert example_inputs['backbone.img_backbone'][0].shape == (2, 3, 16,
+                                                                    16)
+        model = prepare_ptq(model, example_inputs)
+        calibrate(model, inputs, lambda model, batch: model(batch), 3)
+        model = convert_ptq(model, module_names)
+        with torch.no_grad():
+            quantized_outputs = model(inputs[3])
+            float_outputs = float_model(inputs[3])
+        assert quantized_outputs.dtype == torch.float32
+        assert torch.allclose(quantized_outputs, float_outputs, atol=0.05)
+        assert get_model_size(model) < get_model_size(float_model)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'quantized.pth')
+            save_quantized_checkpoint(model, example_inputs, path)
+            loaded_model = load_quantized_checkpoint(Model(), path)
+        with torch.no_grad():
+            loaded_outputs = loaded_model(inputs[3])
+        torch.testing.assert_close(loaded_outputs, quantized_outputs)